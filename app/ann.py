@@ -0,0 +1,317 @@
+import json
+import os
+
+import numpy as np
+
+# --- MOTOR DE VECINOS (EXACTO / APROXIMADO) ---
+# Interfaz común para el recomendador:
+#     backend.search(Q, k) -> (distancias, ids)   con Q de forma (n_consultas, d)
+#
+# - ExactSearch: fuerza bruta euclídea con GEMM por bloques (resultado exacto).
+# - IVFIndex: cuantización gruesa con k-means (nlist celdas) + listas
+#   invertidas. Cada consulta solo visita las `nprobe` celdas más cercanas.
+#   nlist/nprobe son los mandos de recall vs latencia. Las consultas por lotes
+#   se agrupan por celda, de modo que cada lista se recorre una sola vez por
+#   lote con una multiplicación de matrices.
+# - QuantizedSearch: cuantización escalar int8 por feature (17 bytes por
+#   canción en vez de 136 en float64) para recorrer todo el catálogo, y
+#   re-ranking exacto de los `rerank * k` mejores candidatos contra los
+#   vectores originales en float32 (solo se leen esas filas).
+
+# Máximo de elementos de la matriz de distancias que se materializa a la vez
+MAX_BLOCK = 1 << 24
+# Filas de códigos int8 que se convierten a float32 a la vez (el bloque cabe en L2)
+CODE_BLOCK = 8192
+# Candidatos que se re-ordenan con los originales: rerank * k (y al menos RERANK_MIN)
+RERANK = 8
+RERANK_MIN = 32
+
+
+def _sq_norms(X):
+    return np.einsum('ij,ij->i', X, X)
+
+
+def _topk(d2, ids, k):
+    # Selecciona y ordena los k menores por fila. Empates: gana el id más bajo
+    if ids.ndim == 1:
+        ids = np.broadcast_to(ids, d2.shape)
+    if k < d2.shape[1]:
+        part = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        d2 = np.take_along_axis(d2, part, axis=1)
+        ids = np.take_along_axis(ids, part, axis=1)
+    order = np.lexsort((ids, d2), axis=1)
+    return np.take_along_axis(d2, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+def _sq_distances(Q, q_norms, X, x_norms):
+    # d^2 = ||q||^2 - 2 q·x + ||x||^2  (recortado a 0 por redondeo)
+    d2 = x_norms[None, :] - 2.0 * (Q @ X.T)
+    d2 += q_norms[:, None]
+    np.maximum(d2, 0, out=d2)
+    return d2
+
+
+def _no_neighbors(nq, dtype):
+    # k <= 0: (n, 0) vacíos, igual en todos los backends
+    return np.empty((nq, 0), dtype=dtype), np.empty((nq, 0), dtype=np.int64)
+
+
+def exact_search(X, x_norms, Q, k):
+    Q = np.atleast_2d(Q).astype(X.dtype, copy=False)
+    n = X.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return _no_neighbors(len(Q), X.dtype)
+    q_norms = _sq_norms(Q)
+    ids = np.arange(n)
+
+    out_d = np.empty((len(Q), k), dtype=X.dtype)
+    out_i = np.empty((len(Q), k), dtype=np.int64)
+    step = max(1, MAX_BLOCK // max(n, 1))
+    for s in range(0, len(Q), step):
+        d2 = _sq_distances(Q[s:s + step], q_norms[s:s + step], X, x_norms)
+        if k == 1:
+            # Caso 1-NN (asignación de k-means): argmin ya desempata por el id más bajo
+            best = d2.argmin(axis=1)
+            out_i[s:s + step, 0] = best
+            out_d[s:s + step, 0] = d2[np.arange(len(best)), best]
+        else:
+            out_d[s:s + step], out_i[s:s + step] = _topk(d2, ids, k)
+    return np.sqrt(out_d), out_i
+
+
+class ExactSearch:
+    kind = 'exact'
+
+    def __init__(self, X):
+        self.X = X
+        self.sq_norms = _sq_norms(X)
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    def search(self, Q, k):
+        return exact_search(self.X, self.sq_norms, Q, k)
+
+
+def kmeans(X, n_clusters, n_iter=10, sample_size=None, seed=42):
+    # Lloyd sobre una muestra (k-means "grueso": basta con centroides razonables)
+    rng = np.random.default_rng(seed)
+    n = X.shape[0]
+    sample_size = min(n, sample_size or 64 * n_clusters)
+    sample = np.asarray(X[rng.choice(n, sample_size, replace=False)], dtype=np.float32)
+
+    centroids = sample[rng.choice(sample_size, n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        _, assign = exact_search(centroids, _sq_norms(centroids), sample, 1)
+        assign = assign[:, 0]
+        counts = np.bincount(assign, minlength=n_clusters)
+        sums = np.stack([np.bincount(assign, weights=sample[:, j], minlength=n_clusters)
+                         for j in range(sample.shape[1])], axis=1)
+        empty = counts == 0
+        centroids[~empty] = (sums[~empty] / counts[~empty, None]).astype(np.float32)
+        # Celdas vacías: se re-siembran con puntos aleatorios de la muestra
+        if empty.any():
+            centroids[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    kind = 'ivf'
+
+    def __init__(self, centroids, offsets, ids, vectors, nprobe=8):
+        self.centroids = centroids
+        self.offsets = offsets     # lista l = vectors[offsets[l]:offsets[l+1]]
+        self.ids = ids             # id original de cada vector reordenado
+        self.vectors = vectors     # vectores agrupados por celda (contiguos)
+        self.nprobe = nprobe
+        self.c_norms = _sq_norms(centroids)
+        self.v_norms = _sq_norms(vectors)
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, X, nlist=None, nprobe=None, n_iter=10, seed=42):
+        n = X.shape[0]
+        nlist = nlist or max(1, min(int(2 * np.sqrt(n)), n))
+        centroids = kmeans(X, nlist, n_iter=n_iter, seed=seed).astype(X.dtype)
+
+        # Asignación de todo el catálogo por bloques
+        assign = np.empty(n, dtype=np.int64)
+        c_norms = _sq_norms(centroids)
+        step = max(1, MAX_BLOCK // nlist)
+        for s in range(0, n, step):
+            _, a = exact_search(centroids, c_norms, X[s:s + step], 1)
+            assign[s:s + step] = a[:, 0]
+
+        order = np.argsort(assign, kind='stable')
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        vectors = np.ascontiguousarray(X[order])
+        return cls(centroids, offsets, order, vectors, nprobe=nprobe or min(nlist, max(4, nlist // 64)))
+
+    def search(self, Q, k, nprobe=None):
+        Q = np.atleast_2d(Q).astype(self.vectors.dtype, copy=False)
+        nq = len(Q)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        k = min(k, len(self))
+        if k <= 0:
+            return _no_neighbors(nq, self.vectors.dtype)
+        q_norms = _sq_norms(Q)
+
+        # 1) celdas a visitar por consulta
+        _, probes = exact_search(self.centroids, self.c_norms, Q, nprobe)
+
+        # 2) agrupamos (consulta, celda) por celda: cada lista se recorre una vez
+        flat_lists = probes.ravel()
+        flat_queries = np.repeat(np.arange(nq), nprobe)
+        order = np.argsort(flat_lists, kind='stable')
+        flat_lists, flat_queries = flat_lists[order], flat_queries[order]
+        bounds = np.flatnonzero(np.diff(flat_lists)) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [len(flat_lists)]))
+
+        best_d = np.full((nq, k), np.inf, dtype=self.vectors.dtype)
+        best_i = np.full((nq, k), -1, dtype=np.int64)
+        for s, e in zip(starts, ends):
+            lst = flat_lists[s]
+            lo, hi = self.offsets[lst], self.offsets[lst + 1]
+            if lo == hi:
+                continue
+            qs = flat_queries[s:e]
+            d2 = _sq_distances(Q[qs], q_norms[qs], self.vectors[lo:hi], self.v_norms[lo:hi])
+            cand_d = np.concatenate((best_d[qs], d2), axis=1)
+            cand_i = np.concatenate((best_i[qs], np.broadcast_to(self.ids[lo:hi], d2.shape)), axis=1)
+            best_d[qs], best_i[qs] = _topk(cand_d, cand_i, k)
+
+        # 3) consultas cuyas celdas no llegan a k vectores: se repiten ampliando
+        #    nprobe (con nprobe == nlist se recorre todo, así que siempre hay k)
+        short = np.flatnonzero(best_i[:, -1] < 0)
+        if len(short) and nprobe < self.nlist:
+            d, i = self.search(Q[short], k, nprobe=2 * nprobe)
+            best_d[short], best_i[short] = d * d, i
+
+        return np.sqrt(best_d), best_i
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ('centroids', 'offsets', 'ids', 'vectors'):
+            np.save(os.path.join(directory, f'ivf_{name}.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'ivf.json'), 'w') as f:
+            json.dump({'nlist': self.nlist, 'nprobe': self.nprobe}, f)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'ivf.json')) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f'ivf_{name}.npy'), mmap_mode='r')
+                  for name in ('centroids', 'offsets', 'ids', 'vectors')}
+        return cls(nprobe=meta['nprobe'], **arrays)
+
+
+def _smallest(d2, m):
+    # Columnas de los m menores de cada fila (sin ordenar). El m-ésimo menor de
+    # una muestra con paso fijo es cota superior del global: filtrar con él deja
+    # unas pocas filas para el argpartition en vez del catálogo entero
+    nq, n = d2.shape
+    if m >= n:
+        return np.broadcast_to(np.arange(n), d2.shape)
+    stride = n // max(m * 64, 1)
+    if stride < 2:
+        return np.argpartition(d2, m - 1, axis=1)[:, :m]
+    thr = np.partition(d2[:, ::stride], m - 1, axis=1)[:, m - 1]
+    out = np.empty((nq, m), dtype=np.int64)
+    for r in range(nq):
+        idx = np.flatnonzero(d2[r] <= thr[r])
+        out[r] = idx[np.argpartition(d2[r, idx], m - 1)[:m]]
+    return out
+
+
+class QuantizedSearch:
+    kind = 'sq8'
+
+    def __init__(self, codes, lo, step, code_norms, vectors, rerank=RERANK):
+        self.codes = codes              # int8 (n, d): x ~ lo + step * (code + 128)
+        self.lo = lo
+        self.step = step
+        self.code_norms = code_norms    # sum_j (step_j * code_j)^2 por fila (float32)
+        self.vectors = vectors          # originales en float32 para el re-ranking
+        self.rerank = rerank
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    @property
+    def nbytes(self):
+        # Lo que se recorre en cada consulta (códigos + normas)
+        return self.codes.nbytes + self.code_norms.nbytes
+
+    @classmethod
+    def build(cls, X, rerank=RERANK):
+        X = np.asarray(X, dtype=np.float32)
+        lo = X.min(axis=0)
+        span = X.max(axis=0) - lo
+        step = np.where(span > 0, span / 255, 1).astype(np.float32)
+        codes = np.empty(X.shape, dtype=np.int8)
+        for s in range(0, len(X), CODE_BLOCK):
+            q = np.rint((X[s:s + CODE_BLOCK] - lo) / step)
+            codes[s:s + CODE_BLOCK] = np.clip(q, 0, 255) - 128
+        code_norms = _sq_norms(codes.astype(np.float32) * step)
+        return cls(codes, lo, step, code_norms.astype(np.float32), np.ascontiguousarray(X), rerank)
+
+    def _approx_scores(self, Q):
+        # ||q - x||^2 ~ ||a||^2 - 2 (a*step)·code + ||step*code||^2, con a = q - lo - 128 step.
+        # ||a||^2 es constante por consulta y no cambia el orden: no se suma.
+        # Los códigos se pasan a float32 por bloques que caben en caché (GEMM en BLAS)
+        U = -2 * (Q - self.lo - 128 * self.step) * self.step
+        n = len(self)
+        d2 = np.empty((len(Q), n), dtype=np.float32)
+        for s in range(0, n, CODE_BLOCK):
+            e = min(s + CODE_BLOCK, n)
+            block = d2[:, s:e]
+            np.matmul(U, self.codes[s:e].astype(np.float32).T, out=block)
+            block += self.code_norms[s:e]
+        return d2
+
+    def search(self, Q, k, rerank=None):
+        Q = np.atleast_2d(Q)
+        n = len(self)
+        k = min(k, n)
+        if k <= 0:
+            return _no_neighbors(len(Q), np.float64)
+        n_cand = min(n, max(k * (rerank or self.rerank), RERANK_MIN))
+        out_d = np.empty((len(Q), k), dtype=np.float64)
+        out_i = np.empty((len(Q), k), dtype=np.int64)
+        step = max(1, MAX_BLOCK // max(n, 1))
+        for s in range(0, len(Q), step):
+            q = Q[s:s + step].astype(np.float64)
+            d2 = self._approx_scores(q.astype(np.float32))
+            cand = _smallest(d2, n_cand)
+            # Re-ranking exacto: solo las filas candidatas de los originales
+            diff = self.vectors[cand.ravel()].reshape(cand.shape + (-1,)).astype(np.float64) - q[:, None, :]
+            d2_exact = np.einsum('qcd,qcd->qc', diff, diff)
+            out_d[s:s + step], out_i[s:s + step] = _topk(d2_exact, cand, k)
+        return np.sqrt(out_d), out_i
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ('codes', 'lo', 'step', 'code_norms', 'vectors'):
+            np.save(os.path.join(directory, f'sq8_{name}.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'sq8.json'), 'w') as f:
+            json.dump({'rerank': self.rerank, 'n_rows': len(self)}, f)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'sq8.json')) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f'sq8_{name}.npy'), mmap_mode='r')
+                  for name in ('codes', 'lo', 'step', 'code_norms', 'vectors')}
+        return cls(rerank=meta['rerank'], **arrays)
+
+
+BACKENDS = {'exact': ExactSearch, 'ivf': IVFIndex, 'sq8': QuantizedSearch}
@@ -1,11 +1,18 @@
-import os
+# Primero: con APP_PROFILE=1 instala el medidor de imports antes del resto
+from startup_profile import PROFILE
+
+import time
+
 import streamlit as st
-import pandas as pd
-import joblib
-import numpy as np
-import plotly.graph_objects as go
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import StandardScaler
+
+from explanations import ETIQUETAS
+from features import FEATURE_SCHEMA
+from metrics import METRICS
+from resources import CLASES, load_app_resources, load_filtered_index as build_filtered_index
+from resources import load_explanations as build_explanations
+from resources import model_handle
+from resources import load_search_index as build_search_index
+from result_cache import LRUCache
 
 # --- CONFIGURACIÓN DE LA PÁGINA ---
 # Cambiado a layout="wide" para ocupar toda la pantalla
@@ -36,122 +43,116 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+# --- COLUMNAS DEL MODELO ---
+# El esquema (y el cálculo de intensity/dance_tempo/chill_factor) vive en features.py
+columnas_modelo = FEATURE_SCHEMA
+
 # --- FUNCIONES DE CARGA ---
 @st.cache_resource
 def load_resources():
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    model_path = os.path.join(current_dir, 'modelo_xgboost_final.pkl')
-    # Apuntamos al nuevo dataset equilibrado
-    dataset_path = os.path.join(current_dir, '..', 'dataset', 'dataset_demo_balanced.csv')
-    
-    model = None
-    df = None
-
+    # Modelo, catálogo, índice KNN y predicciones (pasos en resources.py)
     try:
-        model = joblib.load(model_path)
-    except FileNotFoundError:
-        return None, None
+        return load_app_resources()
+    except Exception:
+        return None, None, None, None
 
-    try:
-        # Cargamos el dataset "Perfecto"
-        df = pd.read_csv(dataset_path)
-        
-        # Como este dataset YA TIENE las columnas correctas,
-        # borramos todo el código de "column_mapping" y "defaults".
-        # ¡Mucho más limpio! ✨
-        
-        df = df.dropna()
-        
-        # Conversión básica de seguridad
-        str_cols = ['name', 'artists', 'album_name']
-        for col in str_cols:
-            if col in df.columns:
-                df[col] = df[col].astype(str)
-        
-        if 'name' in df.columns and 'artists' in df.columns:
-             df['display_name'] = df['name'] + " - " + df['artists']
-             
-        return model, df
+@st.cache_resource
+def load_model_handle(_df, _knn_index, _resultados):
+    # Versión activa del registro de modelos: un hilo la vigila y la cambia en caliente
+    return model_handle(_df, _knn_index, _resultados)
 
-    except Exception:
-        return model, None
+@st.cache_resource
+def radar_cache():
+    # Figuras de radar ya construidas (las canciones populares se repiten mucho)
+    return LRUCache(maxsize=256, name='radar')
 
-model, df_music = load_resources()
+@st.cache_resource
+def load_search_index(_df, dataset_hash):
+    # Índice del buscador (prefijos + trigramas): uno por versión del catálogo
+    return build_search_index(_df, dataset_hash)
+
+@st.cache_resource
+def load_filtered_index(_df, _knn_index, _resultados, dataset_hash, model_version):
+    # Similares con filtros (género predicho, popularidad, explícitas) y varias semillas
+    return build_filtered_index(_df, _knn_index, _resultados, classes=clases)
+
+@st.cache_resource
+def load_explanations(_df, _resultados, dataset_hash, model_version):
+    # Contribuciones por feature del catálogo (float16 con mmap), una por versión del modelo
+    return build_explanations(_df, _resultados, dataset_hash)
 
-# --- COLUMNAS DEL MODELO ---
-columnas_modelo = [
-    'popularity', 'duration_ms', 'danceability', 'energy', 'key', 'loudness', 
-    'mode', 'speechiness', 'acousticness', 'instrumentalness', 'liveness', 
-    'valence', 'tempo', 'time_signature', 'intensity', 'dance_tempo', 'chill_factor'
-]
 
 # --- LÓGICA DEL RECOMENDADOR (KNN) ---
 def get_recommendations(df, current_song_features, n_recommendations=4):
-    df_features = df.copy()
-    df_features['intensity'] = df_features['energy'] * df_features['loudness']
-    df_features['dance_tempo'] = df_features['danceability'] / (df_features['tempo'] + 1)
-    df_features['chill_factor'] = df_features['valence'] - df_features['energy']
-    
-    try:
-        X = df_features[columnas_modelo]
-    except KeyError:
-        cols_basic = ['energy', 'danceability', 'acousticness', 'valence', 'tempo', 'loudness']
-        X = df_features[cols_basic]
-    
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    
-    knn = NearestNeighbors(n_neighbors=n_recommendations+1, algorithm='auto', metric='euclidean')
-    knn.fit(X_scaled)
-    
-    if isinstance(current_song_features, pd.DataFrame):
-        try:
-            current_feat = current_song_features[columnas_modelo]
-        except:
-            current_feat = current_song_features[cols_basic]
-            
-        current_scaled = scaler.transform(current_feat)
-        distances, indices = knn.kneighbors(current_scaled)
-        return df.iloc[indices[0][1:]]
+    # Consulta al índice precalculado: sin copiar el DataFrame ni reajustar nada
+    if current_song_features is not None:
+        indices = knn_index.recommend(current_song_features, n_recommendations)
+        return df.iloc[indices]
     return None
 
 
+def build_radar(values, color):
+    # plotly se importa al dibujar el primer radar, no al arrancar
+    import plotly.graph_objects as go
+    categories = ['Energy', 'Danceability', 'Acousticness', 'Valence', 'Instrumentalness']
+    with METRICS.timer('figura plotly'):
+        fig = go.Figure()
+        fig.add_trace(go.Scatterpolar(r=values, theta=categories, fill='toself', line_color=color))
+        fig.update_layout(polar=dict(radialaxis=dict(visible=True, range=[0, 1])), showlegend=False, height=350, margin=dict(l=40, r=40, t=20, b=20))
+    return fig
+
+
 # --- INTERFAZ PRINCIPAL ---
 st.title("🎵 Spotify AI Analyzer")
 st.markdown("Descubre el género musical y encuentra canciones similares.")
 
-if model is None or df_music is None:
+# Título ya pintado: la carga (la primera vez, lenta) va después
+model, df_music, knn_index, resultados = load_resources()
+
+if model is None or df_music is None or knn_index is None:
     st.error("🚨 Error: No se encontraron los archivos (modelo o dataset).")
     st.stop()
 
+# Modelo de este re-run: se lee una vez, un cambio de versión a mitad no lo afecta
+activo = load_model_handle(df_music, knn_index, resultados).current
+model, resultados = activo.model, activo.resources
+clases = (activo.metadata or {}).get('classes', CLASES)
+
 # --- BUSCADOR CENTRAL ---
 # Usamos columnas para centrar el buscador aunque la pantalla sea ancha
 c_search1, c_search2, c_search3 = st.columns([1, 2, 1])
 with c_search2:
     st.markdown("### 🔍 Busca una canción")
-    opciones = df_music['display_name'].unique()
-    seleccion_nombre = st.selectbox(
-        "Escribe el nombre de la canción:", 
-        opciones, 
-        index=None, 
+    buscador = load_search_index(df_music, knn_index.manifest['dataset_hash'])
+    consulta = st.text_input(
+        "Escribe el nombre de la canción:",
         placeholder="Ej: Blinding Lights - The Weeknd",
         label_visibility="collapsed"
     )
+    # Solo las mejores sugerencias (por popularidad), no el catálogo entero
+    with METRICS.timer('buscador'):
+        opciones = buscador.suggest(consulta, limit=20)
+    seleccion_nombre = st.selectbox(
+        "Sugerencias:",
+        opciones,
+        index=0 if consulta and opciones else None,
+        placeholder="Elige una sugerencia",
+        label_visibility="collapsed"
+    )
 
 if seleccion_nombre:
-    cancion_data = df_music[df_music['display_name'] == seleccion_nombre].iloc[0]
-    
-    # Feature Engineering
-    df_input = pd.DataFrame([cancion_data])
-    df_input['intensity'] = df_input['energy'] * df_input['loudness']
-    df_input['dance_tempo'] = df_input['danceability'] / (df_input['tempo'] + 1)
-    df_input['chill_factor'] = df_input['valence'] - df_input['energy']
+    inicio_cancion = time.perf_counter()
+    with METRICS.timer('display_name -> fila'):
+        cancion_data = df_music.iloc[buscador.row_of(seleccion_nombre)]
     
-    df_input_model = df_input[columnas_modelo]
+    track_key = cancion_data['track_id'] if 'track_id' in cancion_data else cancion_data.name
 
     # --- PREDICCIÓN ---
-    pred_num = model.predict(df_input_model)[0]
-    clases = ['Acoustic', 'Classical', 'Dance', 'Hard-Rock']
+    # Canción del catálogo: acceso a la caché (sin llamar al modelo).
+    # Si no estuviera, se calcula con features.build_matrix y se guarda en el LRU.
+    with METRICS.timer('predicción'):
+        resultado = resultados.lookup(track_key, features=cancion_data)
+    pred_num = resultado.label
     pred_label = clases[pred_num]
 
     st.markdown("---")
@@ -181,12 +182,8 @@ if seleccion_nombre:
     
     with c1:
         st.markdown("#### 📊 ADN Sónico")
-        categories = ['Energy', 'Danceability', 'Acousticness', 'Valence', 'Instrumentalness']
         values = [cancion_data['energy'], cancion_data['danceability'], cancion_data['acousticness'], cancion_data['valence'], cancion_data['instrumentalness']]
-        
-        fig = go.Figure()
-        fig.add_trace(go.Scatterpolar(r=values, theta=categories, fill='toself', line_color=color))
-        fig.update_layout(polar=dict(radialaxis=dict(visible=True, range=[0, 1])), showlegend=False, height=350, margin=dict(l=40, r=40, t=20, b=20))
+        fig = radar_cache().get_or_compute((track_key, color), lambda: build_radar(values, color))
         st.plotly_chart(fig, use_container_width=True)
     
     with c2:
@@ -211,24 +208,51 @@ if seleccion_nombre:
         m5.metric("Instrumental 🎻", f"{instru_val:.2f}", help="Probabilidad de que no tenga voz (>0.5 es instrumental)")
         m6.metric("Valencia 😊", f"{cancion_data['valence']:.2f}", help="Positividad musical (Triste-Feliz)")
         
-        # Explicación Inteligente (Lógica de Negocio)
+        # Explicación: lo que más ha pesado en el modelo para esta predicción
+        # (contribuciones precalculadas del catálogo; ad-hoc, calculadas y al LRU)
         st.write("")
-        if pred_label == 'Classical':
-            st.info(f"💡 **Dato Clave:** La IA ha detectado una **Instrumentalidad muy alta ({instru_val:.2f})**. Al no detectar voz humana, descarta géneros como Acoustic o Rock.")
-        elif pred_label == 'Hard-Rock':
-            st.info(f"💡 **Dato Clave:** El alto **Volumen ({cancion_data['loudness']:.1f} dB)** y Energía definen este género, diferenciándolo del Acoustic.")
-        elif pred_label == 'Acoustic':
-             st.info(f"💡 **Dato Clave:** A diferencia del Classical, aquí la Instrumentalidad es baja (hay voz), pero la Energía no es suficiente para ser Rock.")
-        else:
-            st.info(f"💡 **Dato Clave:** La combinación de **Bailabilidad ({cancion_data['danceability']:.2f})** y Energía posiciona esta canción en el clúster de {pred_label}.")
+        explicaciones = load_explanations(df_music, resultados, knn_index.manifest['dataset_hash'],
+                                          resultados.model_version)
+        with METRICS.timer('explicación'):
+            claves = explicaciones.explain(track_key, cancion_data, pred_num, k=3)
+        motivos = [f"**{ETIQUETAS.get(f, f)} ({valor:.2f})** {'empuja hacia' if c > 0 else 'aleja de'} {pred_label} ({c:+.2f})"
+                   for f, c, valor in claves]
+        st.info("💡 **Dato Clave:** " + "; ".join(motivos) + ".")
 
     st.markdown("---")
 
     # --- RECOMENDACIONES ---
     st.subheader("✨ Canciones Similares (KNN)")
-    
-    with st.spinner("Analizando base de datos..."):
-        recomendaciones = get_recommendations(df_music, df_input_model, n_recommendations=4)
+
+    # Filtros y canciones semilla extra: se aplican ANTES de buscar (filtered_search.py)
+    with st.expander("🎛️ Filtrar recomendaciones"):
+        f1, f2, f3 = st.columns(3)
+        generos = f1.multiselect("Género (predicho)", clases)
+        popularidad = f2.slider("Popularidad", 0, 100, (0, 100))
+        explicitas = f3.selectbox("Letras explícitas", ["Todas", "Sin explícitas", "Solo explícitas"])
+        consulta_extra = st.text_input("Añade más canciones semilla:", placeholder="Ej: Levitating - Dua Lipa")
+        semillas_extra = st.multiselect("Semillas adicionales", buscador.suggest(consulta_extra, limit=20),
+                                        label_visibility="collapsed")
+
+    filtros = {}
+    if popularidad != (0, 100):
+        filtros['popularity'] = popularidad
+    if explicitas != "Todas":
+        filtros['explicit'] = explicitas == "Solo explícitas"
+
+    with st.spinner("Analizando base de datos..."), METRICS.timer('recomendaciones'):
+        if generos or filtros or semillas_extra:
+            filtrado = load_filtered_index(df_music, knn_index, resultados,
+                                           knn_index.manifest['dataset_hash'], resultados.model_version)
+            semillas = [buscador.row_of(seleccion_nombre)] + [buscador.row_of(s) for s in semillas_extra]
+            _, ids = filtrado.similar(semillas, 4, genres=generos or None, filters=filtros)
+            recomendaciones = df_music.iloc[ids] if len(ids) else None
+            if not len(ids):
+                st.warning("Ninguna canción cumple esos filtros.")
+        elif resultado.neighbors is not None:
+            recomendaciones = df_music.iloc[resultado.neighbors]
+        else:
+            recomendaciones = get_recommendations(df_music, cancion_data, n_recommendations=4)
     
     if recomendaciones is not None:
         # Volvemos a 4 columnas porque ahora tenemos espacio de sobra
@@ -247,5 +271,24 @@ if seleccion_nombre:
                 </div>
                 """, unsafe_allow_html=True)
 
+    # Todo el camino de una canción (de la selección a las tarjetas pintadas)
+    METRICS.observe('canción (total)', (time.perf_counter() - inicio_cancion) * 1000)
+
 else:
     st.info("👆 Utiliza el buscador para comenzar.")
+
+# --- MÉTRICAS (APP_METRICS=1) ---
+# Prometheus en APP_METRICS_FILE y una línea JSON por re-run en APP_METRICS_LOG
+if METRICS.enabled:
+    METRICS.export(selection=seleccion_nombre)
+    with st.expander("📈 Latencias por etapa"):
+        st.code(METRICS.table())
+
+# --- PERFIL DE ARRANQUE (APP_PROFILE=1) ---
+if PROFILE.enabled:
+    if not PROFILE.reported:
+        PROFILE.mark('primer render completo')
+        PROFILE.reported = True
+        print(PROFILE.to_json(), flush=True)
+    with st.expander("⏱️ Perfil de arranque"):
+        st.code(PROFILE.table())
@@ -0,0 +1,162 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from features import FEATURE_SCHEMA, build_matrix, required_columns
+
+# --- CLASIFICACIÓN POR LOTES (SIN STREAMLIT) ---
+# Lee un CSV por trozos de tamaño fijo, construye la matriz de features de
+# forma vectorizada, llama a predict_proba UNA vez por trozo y va escribiendo
+# etiquetas + probabilidades en CSV o Parquet. La memoria queda acotada por
+# el tamaño del trozo (y el nº de trozos en vuelo), no por el del fichero.
+#
+# Uso:
+#   python app/batch_classify.py dataset/dataset.csv salida.parquet --chunksize 50000 --workers 4
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(CURRENT_DIR, 'modelo_xgboost_final.pkl')
+
+columnas_modelo = FEATURE_SCHEMA
+columnas_audio = required_columns(columnas_modelo)
+clases = ['Acoustic', 'Classical', 'Dance', 'Hard-Rock']
+
+# Columnas identificativas que se copian a la salida si existen en la entrada
+COLUMNAS_ID = ['track_id', 'track_name', 'name', 'artists', 'track_genre', 'music_genre']
+
+
+def classify_chunk(model, chunk):
+    X = build_matrix(chunk, columnas_modelo)
+    probs = model.predict_proba(X)
+    pred = probs.argmax(axis=1)
+
+    out = chunk[[c for c in COLUMNAS_ID if c in chunk.columns]].reset_index(drop=True)
+    out['pred_label'] = np.asarray(clases)[pred]
+    for i, clase in enumerate(clases):
+        out[f'prob_{clase}'] = probs[:, i].astype(np.float32)
+    return out
+
+
+# --- POOL DE PROCESOS: el modelo se carga una vez por worker ---
+_worker_model = None
+
+
+def _init_worker(model_path, n_threads):
+    global _worker_model
+    _worker_model = load_model(model_path, n_threads)
+
+
+def _classify_in_worker(chunk):
+    return classify_chunk(_worker_model, chunk)
+
+
+def load_model(model_path=MODEL_PATH, n_threads=None):
+    model = joblib.load(model_path)
+    if n_threads is not None:
+        model.set_params(n_jobs=n_threads)
+    return model
+
+
+class ChunkWriter:
+    # Escritura incremental: cada trozo se añade al final del fichero
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self._writer = None
+        self._first = True
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode='w' if self._first else 'a', header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def classify_csv(input_path, output_path, chunksize=50_000, workers=1, n_threads=None,
+                 model_path=MODEL_PATH, verbose=True):
+    usecols = lambda c: c in columnas_audio or c in COLUMNAS_ID
+    reader = pd.read_csv(input_path, chunksize=chunksize, usecols=usecols)
+    writer = ChunkWriter(output_path)
+
+    n_cpus = os.cpu_count() or 1
+    if n_threads is None:
+        # Repartimos los núcleos: workers x hilos del booster <= nº de CPUs
+        n_threads = max(1, n_cpus // max(1, workers))
+
+    total_rows = 0
+    start = time.perf_counter()
+
+    def report(n):
+        nonlocal total_rows
+        total_rows += n
+        if verbose:
+            elapsed = time.perf_counter() - start
+            print(f"{total_rows:>10,} filas  |  {total_rows / elapsed:,.0f} filas/s", file=sys.stderr)
+
+    try:
+        if workers <= 1:
+            model = load_model(model_path, n_threads)
+            for chunk in reader:
+                result = classify_chunk(model, chunk)
+                writer.write(result)
+                report(len(result))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(model_path, n_threads)) as pool:
+                # Como mucho 2 trozos en vuelo por worker: memoria acotada y orden preservado
+                pending = []
+                for chunk in reader:
+                    pending.append(pool.submit(_classify_in_worker, chunk))
+                    if len(pending) >= 2 * workers:
+                        result = pending.pop(0).result()
+                        writer.write(result)
+                        report(len(result))
+                for future in pending:
+                    result = future.result()
+                    writer.write(result)
+                    report(len(result))
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': total_rows,
+        'seconds': elapsed,
+        'rows_per_sec': total_rows / elapsed if elapsed > 0 else float('inf'),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clasifica un catálogo completo de canciones por trozos.")
+    parser.add_argument('input', help="CSV de entrada con las columnas de audio de Spotify")
+    parser.add_argument('output', help="Fichero de salida (.csv o .parquet)")
+    parser.add_argument('--chunksize', type=int, default=50_000, help="Filas por trozo")
+    parser.add_argument('--workers', type=int, default=1, help="Procesos en paralelo (uno por trozo)")
+    parser.add_argument('--threads', type=int, default=None, help="Hilos del booster por proceso")
+    parser.add_argument('--model', default=MODEL_PATH, help="Ruta al modelo .pkl")
+    args = parser.parse_args(argv)
+
+    stats = classify_csv(args.input, args.output, chunksize=args.chunksize, workers=args.workers,
+                         n_threads=args.threads, model_path=args.model)
+    print(f"✅ {stats['rows']:,} canciones clasificadas en {stats['seconds']:.1f}s "
+          f"({stats['rows_per_sec']:,.0f} filas/s) -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
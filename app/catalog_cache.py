@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from recommender import file_hash
+
+# --- CACHÉ BINARIA DEL CATÁLOGO ---
+# La primera vez se parsea el CSV (read_csv + dropna + astype(str) +
+# display_name) y se guarda en formato columnar:
+#   - columnas numéricas/booleanas -> un .npy por columna
+#   - columnas de texto            -> códigos .npy + tabla de strings (.bin)
+# Los arranques siguientes cargan los .npy con mmap_mode='r', de modo que
+# varios workers de Streamlit comparten las mismas páginas del page cache en
+# lugar de tener cada uno su copia parseada.
+#
+# La caché se invalida por (tamaño, mtime) del CSV y, si estos cambian, por su
+# hash SHA-1 (un "touch" sin cambios no obliga a reconstruir).
+
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'catalog')
+
+STR_COLS = ['name', 'artists', 'album_name']
+SEPARADOR = '\x00'
+
+
+def _cache_dir_for(csv_path, cache_dir):
+    key = hashlib.sha1(os.path.abspath(csv_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, key)
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_manifest(directory, manifest):
+    # Temporal propio de cada escritor: varios procesos pueden escribir a la vez
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='manifest.json.', suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(directory, 'manifest.json'))
+
+
+def parse_csv(csv_path):
+    # Lectura "de siempre" (la que hacía load_resources en cada arranque)
+    df = pd.read_csv(csv_path)
+    df = df.dropna()
+
+    for col in STR_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype(str)
+
+    if 'name' in df.columns and 'artists' in df.columns:
+        df['display_name'] = df['name'] + " - " + df['artists']
+
+    return df.reset_index(drop=True)
+
+
+def _codes_dtype(n_categories):
+    # Mismo tipo que usa pandas internamente -> from_codes no copia los códigos
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _save_columns(df, directory):
+    columns = []
+    for col in df.columns:
+        s = df[col]
+        fname = f'{len(columns):03d}'
+        if pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+            np.save(os.path.join(directory, fname + '.npy'), np.ascontiguousarray(s.to_numpy()))
+            columns.append({'name': col, 'kind': 'numeric', 'file': fname})
+        else:
+            # Codificación por diccionario: códigos enteros + tabla de strings
+            codes, uniques = pd.factorize(s.astype(str))
+            codes = codes.astype(_codes_dtype(len(uniques)))
+            np.save(os.path.join(directory, fname + '.npy'), codes)
+            table = SEPARADOR.join(u.replace(SEPARADOR, '') for u in uniques)
+            with open(os.path.join(directory, fname + '.bin'), 'wb') as f:
+                f.write(table.encode('utf-8'))
+            columns.append({'name': col, 'kind': 'string', 'file': fname, 'n_categories': len(uniques)})
+    return columns
+
+
+def build_cache(csv_path, directory, sha1=None):
+    df = parse_csv(csv_path)
+    stat = os.stat(csv_path)
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp-catalog-')
+    try:
+        columns = _save_columns(df, tmp_dir)
+        _write_manifest(tmp_dir, {
+            'cache_version': CACHE_VERSION,
+            'source_path': os.path.abspath(csv_path),
+            'source_size': stat.st_size,
+            'source_mtime_ns': stat.st_mtime_ns,
+            'source_sha1': sha1 or file_hash(csv_path),
+            'n_rows': len(df),
+            'columns': columns,
+            'created_at': time.time(),
+        })
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp_dir, directory)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return df
+
+
+def load_cache(directory, manifest=None):
+    manifest = manifest or _read_manifest(directory)
+    data = {}
+    for col in manifest['columns']:
+        arr = np.load(os.path.join(directory, col['file'] + '.npy'), mmap_mode='r')
+        if col['kind'] == 'numeric':
+            data[col['name']] = arr
+        else:
+            with open(os.path.join(directory, col['file'] + '.bin'), 'rb') as f:
+                table = f.read().decode('utf-8')
+            categories = table.split(SEPARADOR) if col['n_categories'] else []
+            categories = pd.Index(categories, dtype=object)
+            data[col['name']] = pd.Categorical.from_codes(arr, categories, validate=False)
+    # copy=False: las columnas siguen apuntando a los ficheros mapeados
+    return pd.DataFrame(data, copy=False)
+
+
+def _is_fresh(csv_path, directory, manifest):
+    if manifest is None or manifest.get('cache_version') != CACHE_VERSION:
+        return False
+    stat = os.stat(csv_path)
+    if stat.st_size == manifest['source_size'] and stat.st_mtime_ns == manifest['source_mtime_ns']:
+        return True
+    # mtime distinto pero mismo contenido: se reaprovecha la caché
+    if stat.st_size == manifest['source_size'] and file_hash(csv_path) == manifest['source_sha1']:
+        manifest['source_mtime_ns'] = stat.st_mtime_ns
+        try:
+            _write_manifest(directory, manifest)
+        except OSError:
+            pass
+        return True
+    return False
+
+
+def source_hash(csv_path, cache_dir=CACHE_DIR):
+    # SHA-1 del CSV sin releerlo si la caché sigue vigente
+    directory = _cache_dir_for(csv_path, cache_dir)
+    manifest = _read_manifest(directory)
+    if _is_fresh(csv_path, directory, manifest):
+        return manifest['source_sha1']
+    return file_hash(csv_path)
+
+
+def load_catalog(csv_path, cache_dir=CACHE_DIR):
+    directory = _cache_dir_for(csv_path, cache_dir)
+    manifest = _read_manifest(directory)
+    if _is_fresh(csv_path, directory, manifest):
+        return load_cache(directory, manifest)
+
+    try:
+        build_cache(csv_path, directory)
+        return load_cache(directory)
+    except OSError:
+        # Sin permisos de escritura: lectura directa del CSV
+        return parse_csv(csv_path)
@@ -0,0 +1,298 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from catalog_cache import _codes_dtype, load_catalog, source_hash
+from features import FEATURE_SCHEMA, required_columns
+
+# --- CATÁLOGO COMPACTO PARA LA APP ---
+# df_music guardaba name / artists / album_name / display_name como strings de
+# Python (objetos de ~50-100 bytes cada uno), las features en float64 y
+# columnas que la app no lee. CatalogStore guarda solo lo que se usa:
+#   - texto único por fila (track_id, name): tabla de strings UTF-8 = un blob
+#     de bytes + offsets, sin objetos de Python
+#   - texto repetido (artists, género): codificación por diccionario
+#     (códigos int8/16/32 + tabla de strings de los valores distintos)
+#   - features: float32; enteros con el tipo más pequeño que los contiene
+#   - display_name ("name - artists") se forma al pedirlo, no se guarda
+#
+# Los strings se decodifican solo para las filas que se piden: iloc[i] da una
+# fila (pd.Series) e iloc[ids] un DataFrame pequeño, como con df_music.
+#
+# Es inmutable (arrays de solo lectura): se comparte sin locks entre sesiones
+# con st.cache_resource. En disco son .npy que se abren con mmap, así que los
+# procesos de la misma máquina comparten las páginas (memoria compartida del
+# page cache) en lugar de tener cada uno su copia.
+
+STORE_VERSION = 2
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'catalog_store')
+
+# Columnas que lee la app (las que no estén en el dataset se omiten)
+COLUMNAS_TEXTO = ['track_id', 'name', 'artists', 'music_genre', 'track_genre']
+# explicit: filtro de la búsqueda de similares (filtered_search.py)
+COLUMNAS_APP = COLUMNAS_TEXTO + required_columns(FEATURE_SCHEMA) + ['explicit']
+
+# Con menos de esta fracción de valores distintos, el texto va por diccionario
+DICT_MAX_UNIQUE = 0.5
+
+
+class StringTable:
+    # Strings UTF-8 concatenados + offsets: el string i es data[offsets[i]:offsets[i+1]]
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [s.encode('utf-8') for s in strings]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        total = int(lengths.sum())
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int32 if total < 2 ** 31 else np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes
+
+    def get(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def take(self, ids):
+        return [self.get(i) for i in ids]
+
+    def to_list(self):
+        blob, offsets = self.data.tobytes(), self.offsets.tolist()
+        return [blob[a:b].decode('utf-8') for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def arrays(self):
+        return {'data': self.data, 'offsets': self.offsets}
+
+
+class FixedTable:
+    # Strings de longitud fija (track_id: 22 caracteres): array 'S<n>', sin offsets
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def from_strings(cls, strings):
+        return cls(np.array([s.encode('utf-8') for s in strings], dtype=np.bytes_))
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def get(self, i):
+        return self.data[i].decode('utf-8')
+
+    def take(self, ids):
+        return [b.decode('utf-8') for b in self.data[np.asarray(ids)].tolist()]
+
+    def to_list(self):
+        return [b.decode('utf-8') for b in self.data.tolist()]
+
+    def arrays(self):
+        return {'data': self.data}
+
+
+def _text_table(strings):
+    # Longitud fija si todos los strings ocupan lo mismo (y no terminan en NUL, que 'S' recorta)
+    lengths = {len(s.encode('utf-8')) for s in strings}
+    if len(lengths) == 1 and not any(s.endswith('\x00') for s in strings):
+        return 'fixed', FixedTable.from_strings(strings)
+    return 'text', StringTable.from_strings(strings)
+
+
+def _int_dtype(values):
+    lo, hi = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for dtype in (np.int8, np.int16, np.int32):
+        if np.iinfo(dtype).min <= lo and hi <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class CatalogStore:
+    def __init__(self, columns, manifest=None):
+        # columns: nombre -> {'kind': 'numeric', 'values'} | {'kind': 'text' / 'fixed', 'table'}
+        #                  | {'kind': 'dict', 'codes', 'table'}
+        self._columns = columns
+        self.manifest = manifest or {}
+        self.n_rows = self.manifest.get('n_rows', 0)
+        names = list(columns)
+        if 'name' in columns and 'artists' in columns:
+            names.append('display_name')
+        self.columns = pd.Index(names)
+        self.iloc = _ILoc(self)
+
+    def __len__(self):
+        return self.n_rows
+
+    @classmethod
+    def from_frame(cls, df, columns=COLUMNAS_APP):
+        store = {}
+        for col in columns:
+            if col not in df.columns:
+                continue
+            s = df[col]
+            if pd.api.types.is_bool_dtype(s):
+                store[col] = {'kind': 'numeric', 'values': s.to_numpy(dtype=bool)}
+            elif pd.api.types.is_integer_dtype(s):
+                values = s.to_numpy()
+                store[col] = {'kind': 'numeric', 'values': values.astype(_int_dtype(values))}
+            elif pd.api.types.is_float_dtype(s):
+                store[col] = {'kind': 'numeric', 'values': s.to_numpy(dtype=np.float32)}
+            else:
+                codes, uniques = pd.factorize(s.astype(str))
+                if len(uniques) <= DICT_MAX_UNIQUE * len(s):
+                    store[col] = {'kind': 'dict', 'codes': codes.astype(_codes_dtype(len(uniques))),
+                                  'table': StringTable.from_strings(uniques)}
+                else:
+                    kind, table = _text_table(s.astype(str).tolist())
+                    store[col] = {'kind': kind, 'table': table}
+        return cls(store, {'store_version': STORE_VERSION, 'n_rows': len(df)})
+
+    # --- disco (mmap) ---
+    def _arrays(self):
+        for col, c in self._columns.items():
+            if c['kind'] == 'numeric':
+                yield col, 'values', c['values']
+            else:
+                for part, arr in c['table'].arrays().items():
+                    yield col, part, arr
+                if c['kind'] == 'dict':
+                    yield col, 'codes', c['codes']
+
+    def save(self, directory):
+        # Escritura atómica: otro proceso nunca ve un catálogo a medias
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp-store-')
+        try:
+            files = {}
+            for i, (col, part, arr) in enumerate(self._arrays()):
+                fname = f'{i:03d}.npy'
+                np.save(os.path.join(tmp_dir, fname), np.ascontiguousarray(arr))
+                files.setdefault(col, {'kind': self._columns[col]['kind']})[part] = fname
+            manifest = dict(self.manifest, columns=files, created_at=time.time())
+            with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+            os.replace(tmp_dir, directory)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest.get('store_version') != STORE_VERSION:
+            raise ValueError(f"Versión de catálogo no soportada: {manifest.get('store_version')}")
+
+        def arr(fname):
+            # ndarray normal sobre el mapeo: indexar np.memmap elemento a elemento es mucho más lento
+            return np.asarray(np.load(os.path.join(directory, fname), mmap_mode='r'))
+
+        columns = {}
+        for col, files in manifest['columns'].items():
+            if files['kind'] == 'numeric':
+                columns[col] = {'kind': 'numeric', 'values': arr(files['values'])}
+            elif files['kind'] == 'fixed':
+                columns[col] = {'kind': 'fixed', 'table': FixedTable(arr(files['data']))}
+            else:
+                columns[col] = {'kind': files['kind'], 'table': StringTable(arr(files['data']), arr(files['offsets']))}
+                if files['kind'] == 'dict':
+                    columns[col]['codes'] = arr(files['codes'])
+        return cls(columns, manifest)
+
+    # --- acceso ---
+    @property
+    def nbytes(self):
+        return sum(arr.nbytes for _, _, arr in self._arrays())
+
+    def memory_usage(self):
+        usage = {}
+        for col, _, arr in self._arrays():
+            usage[col] = usage.get(col, 0) + arr.nbytes
+        return usage
+
+    def values(self, col, ids=None):
+        # Columna (o filas ids) como array; el texto se decodifica solo para esas filas
+        if col == 'display_name' and col not in self._columns:
+            names, artists = self.values('name', ids), self.values('artists', ids)
+            return np.array([f'{n} - {a}' for n, a in zip(names, artists)], dtype=object)
+        c = self._columns[col]
+        if c['kind'] == 'numeric':
+            return np.asarray(c['values']) if ids is None else np.asarray(c['values'][ids])
+        if c['kind'] == 'dict':
+            if ids is None:
+                return np.array(c['table'].to_list(), dtype=object)[np.asarray(c['codes'])]
+            return np.array(c['table'].take(np.atleast_1d(c['codes'][ids])), dtype=object)
+        if ids is None:
+            return np.array(c['table'].to_list(), dtype=object)
+        return np.array(c['table'].take(np.atleast_1d(ids)), dtype=object)
+
+    def __getitem__(self, col):
+        if col not in self.columns:
+            raise KeyError(col)
+        return pd.Series(self.values(col), name=col, copy=False)
+
+    def row(self, i):
+        i = int(i)
+        if not -self.n_rows <= i < self.n_rows:
+            raise IndexError(i)
+        i %= self.n_rows
+        return pd.Series([self.value(col, i) for col in self.columns], index=self.columns, dtype=object, name=i)
+
+    def value(self, col, i):
+        # Un único valor (camino de iloc[i]: sin arrays intermedios)
+        if col == 'display_name' and col not in self._columns:
+            return f"{self.value('name', i)} - {self.value('artists', i)}"
+        c = self._columns[col]
+        if c['kind'] == 'numeric':
+            return c['values'][i].item()
+        if c['kind'] == 'dict':
+            return c['table'].get(c['codes'][i])
+        return c['table'].get(i)
+
+    def rows(self, ids):
+        ids = np.arange(self.n_rows)[ids] if isinstance(ids, slice) else np.asarray(ids, dtype=np.int64)
+        return pd.DataFrame({col: self.values(col, ids) for col in self.columns}, index=ids)
+
+
+class _ILoc:
+    # store.iloc[i] -> pd.Series;  store.iloc[ids] / store.iloc[a:b] -> pd.DataFrame
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self._store.row(key)
+        return self._store.rows(key)
+
+
+def load_catalog_store(csv_path, cache_dir=CACHE_DIR):
+    # Se construye una vez por versión del CSV (a partir de la caché columnar) y se abre con mmap
+    directory = os.path.join(cache_dir, source_hash(csv_path)[:16])
+    try:
+        return CatalogStore.load(directory)
+    except (FileNotFoundError, ValueError, KeyError, json.JSONDecodeError):
+        pass
+    store = CatalogStore.from_frame(load_catalog(csv_path))
+    try:
+        store.save(directory)
+        return CatalogStore.load(directory)
+    except OSError:
+        return store
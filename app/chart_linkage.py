@@ -0,0 +1,481 @@
+import argparse
+import os
+import pickle
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from ingest import _hash_keys
+from search_index import normalize, trigrams
+from training_data import COLUMNAS_NOMBRE, _first_present
+
+# --- top10s.csv -> ESPACIO DEL MODELO + ENLACE CON EL CATÁLOGO ---
+# top10s.csv (listas de éxitos 2010-2019) tiene otro esquema: title/artist,
+# bpm, nrgy, dnce, dB, live, val, dur, acous, spch, pop, casi todo en escala
+# 0-100. Aquí:
+#   1) adaptador vectorizado: renombra y reescala las columnas al espacio
+#      del modelo (una multiplicación por columna, sin apply por fila). Las
+#      que top10s no tiene (key, mode, instrumentalness, time_signature) se
+#      toman de la canción enlazada o se imputan
+#   2) enlace (record linkage) título/artista contra el catálogo, por etapas
+#      y sin comparar nunca todas las parejas n·m:
+#        exacto   hash de (título normalizado, artista principal)
+#        clave    igual, con el título sin "(feat. X)", "[...]", " - Radio Edit"...
+#                 (remix, live, acoustic se conservan: son otra grabación)
+#        artista  bloque = mismo artista y alguna palabra (o el prefijo) del
+#                 título en común; se compara el título por trigramas
+#                 (Jaccard) solo dentro del bloque
+#        titulo   bloque = mismo título (clave); se compara el artista
+#      Los hashes del catálogo (uint64, como en ingest.py) se guardan
+#      ordenados por (hash, -popularidad): el join es un searchsorted y, si
+#      hay varias ediciones de la misma canción, gana la más popular
+#   3) métricas: cobertura por etapa, ambigüedades, parejas comparadas frente
+#      a n·m, coherencia de los rasgos de audio en las parejas enlazadas
+#      (misma canción -> mismos valores, salvo redondeo) y filas/s
+#   4) enriquecimiento (track_id, álbum, género del catálogo) y clasificación
+#      en bloque con el modelo de la app
+#
+#   python app/chart_linkage.py dataset/top10s.csv --output top10s_clasificado.csv
+
+LINK_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'chart_linkage')
+CHART_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataset', 'top10s.csv')
+
+# Columna del modelo -> (columna de top10s, factor)
+ADAPTADOR = {
+    'popularity': ('pop', 1.0),
+    'duration_ms': ('dur', 1000.0),
+    'danceability': ('dnce', 0.01),
+    'energy': ('nrgy', 0.01),
+    'loudness': ('dB', 1.0),
+    'speechiness': ('spch', 0.01),
+    'acousticness': ('acous', 0.01),
+    'liveness': ('live', 0.01),
+    'valence': ('val', 0.01),
+    'tempo': ('bpm', 1.0),
+}
+RENOMBRAR = {'title': 'name', 'artist': 'artists', 'top genre': 'top_genre'}
+# Sin equivalente en top10s: de la canción enlazada o, si no hay, estos valores
+# (los más frecuentes en el catálogo completo)
+IMPUTACION = {'key': 0, 'mode': 1, 'instrumentalness': 0.0, 'time_signature': 4}
+# Columnas del catálogo que se copian a las filas enlazadas
+ENRIQUECER = ['track_id', 'album_name', 'music_genre']
+
+ETAPAS = ['exacto', 'clave', 'artista', 'titulo']
+SIN_ENLACE = 'sin_enlace'
+# Similitud mínima (Jaccard de trigramas) para aceptar un enlace aproximado
+SIMILITUD_MIN = 0.5
+# Bloques más grandes se recortan a sus canciones más populares
+BLOQUE_MAX = 2000
+# Control de calidad: rasgos 0-1 que existen en los dos esquemas
+CONTROL = ['danceability', 'energy', 'valence', 'acousticness', 'speechiness']
+TOLERANCIA = 0.05
+
+_PARENTESIS = re.compile(r'\s*[\(\[][^\)\]]*[\)\]]')
+_GUION = re.compile(r'\s+-\s+.*$')
+_FEAT = re.compile(r'\s+(?:feat|ft|featuring)\b\.?.*$', re.IGNORECASE)
+VERSIONES = ('remix', 'live', 'acoustic', 'instrumental')
+_VERSION = re.compile(r'\b(' + '|'.join(VERSIONES) + r')\b', re.IGNORECASE)
+
+
+def read_chart(path=CHART_PATH):
+    # top10s.csv viene en latin-1 ("Beyoncé" no es UTF-8 válido)
+    try:
+        return pd.read_csv(path, index_col=0)
+    except UnicodeDecodeError:
+        return pd.read_csv(path, index_col=0, encoding='latin-1')
+
+
+def adapt_schema(chart):
+    # -> DataFrame con name/artists + las columnas crudas del modelo (las que
+    # faltan, con IMPUTACION); el resto de columnas de top10s se conservan
+    missing = [src for src, _ in ADAPTADOR.values() if src not in chart.columns]
+    if missing:
+        raise KeyError(f"Faltan columnas en el chart: {missing}")
+    out = chart.drop(columns=[src for src, _ in ADAPTADOR.values()]).rename(columns=RENOMBRAR).reset_index(drop=True)
+
+    sources = [src for src, _ in ADAPTADOR.values()]
+    factors = np.array([f for _, f in ADAPTADOR.values()])
+    values = chart[sources].to_numpy(dtype=np.float64) * factors
+    for j, col in enumerate(ADAPTADOR):
+        out[col] = values[:, j]
+    for col, default in IMPUTACION.items():
+        out[col] = default
+    out['features_source'] = 'imputado'
+    return out
+
+
+# --- CLAVES NORMALIZADAS ---
+def title_key(text):
+    # "Club Can't Handle Me (feat. David Guetta)" -> "club can t handle me"
+    text = str(text)
+    base = _FEAT.sub('', _GUION.sub('', _PARENTESIS.sub('', text)))
+    key = normalize(base) or normalize(text)
+    # Un remix o un directo no es la misma grabación: la marca se queda en la clave
+    marks = {m.lower() for m in _VERSION.findall(text)} - {m.lower() for m in _VERSION.findall(base)}
+    return ' '.join([key] + sorted(marks))
+
+
+def artist_key(text):
+    # Artista principal ("A;B" en el catálogo), sin "feat." ni "The" inicial
+    key = normalize(_FEAT.sub('', str(text).split(';')[0]))
+    return key[4:] if key.startswith('the ') else key
+
+
+def _profile(key):
+    # -> (trigramas, marcas de versión) de una clave normalizada
+    return trigrams(key), frozenset(w for w in key.split() if w in VERSIONES)
+
+
+def _factorized(column, fn):
+    # -> (códigos int32, claves distintas). Cada valor distinto se normaliza
+    # una vez (los artistas se repiten mucho); el código -1 (NaN) cae en la
+    # '' final
+    codes, uniques = pd.factorize(column)
+    keys = np.array([fn(u) for u in uniques] + [''], dtype=object)
+    return codes.astype(np.int32), keys
+
+
+def link_keys(df, name_col='name', factorized=False):
+    columns = {'title': (name_col, normalize), 'title_key': (name_col, title_key), 'artist': ('artists', artist_key)}
+    encoded = {field: _factorized(df[col], fn) for field, (col, fn) in columns.items()}
+    keys = pd.DataFrame({field: uniques[codes] for field, (codes, uniques) in encoded.items()})
+    return (keys, encoded) if factorized else keys
+
+
+def _block_tokens(key):
+    # Claves de bloque de un título: sus palabras y su prefijo de 3 letras.
+    # Una errata cambia una palabra, no todas; el prefijo cubre los títulos
+    # de una sola palabra
+    return set(key.split()) | {'^' + key[:3]}
+
+
+def _exploded_tokens(keys, rows):
+    # -> (fila de cada token, hash de (artista, token)) para los tokens de bloque de cada fila
+    title_keys = keys['title_key'].to_numpy()
+    tokens = [sorted(_block_tokens(title_keys[r])) for r in rows]
+    counts = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+    rep = np.repeat(rows, counts)
+    table = pd.DataFrame({'artist': keys['artist'].to_numpy()[rep],
+                          'token': [t for ts in tokens for t in ts]})
+    return rep, _hash_keys(table, ['artist', 'token'])
+
+
+def _stage_hashes(keys):
+    # Etapas exactas y bloque por título: un hash por fila; las claves vacías
+    # no enlazan con nada
+    empty_title = (keys['title_key'] == '').to_numpy()
+    empty_artist = (keys['artist'] == '').to_numpy()
+    both = ~(empty_title | empty_artist)
+    return {
+        'exacto': (_hash_keys(keys, ['title', 'artist']), both),
+        'clave': (_hash_keys(keys, ['title_key', 'artist']), both),
+        'titulo': (_hash_keys(keys, ['title_key']), ~empty_title),
+    }, both
+
+
+class Postings:
+    # hash -> filas del catálogo, ordenadas por (hash, -popularidad): las filas
+    # de un hash son un tramo contiguo y la primera es la más popular
+    def __init__(self, hashes, rows):
+        self.hashes = hashes
+        self.rows = rows
+
+    @classmethod
+    def build(cls, hashes, rows, popularity):
+        order = np.lexsort((-popularity[rows], hashes))
+        return cls(hashes[order], rows[order].astype(np.int64))
+
+    def ranges(self, hashes):
+        return (np.searchsorted(self.hashes, hashes, side='left'),
+                np.searchsorted(self.hashes, hashes, side='right'))
+
+    @property
+    def nbytes(self):
+        return self.hashes.nbytes + self.rows.nbytes
+
+
+class LinkIndex:
+    def __init__(self, postings, text, popularity):
+        self.postings = postings      # etapa -> Postings
+        self.text = text              # 'title_key' / 'artist' -> (códigos, claves distintas)
+        self.popularity = popularity  # float32, desempate en las etapas aproximadas
+
+    def __len__(self):
+        return len(self.popularity)
+
+    @property
+    def nbytes(self):
+        # Arrays NumPy (sin contar el texto de las claves distintas)
+        return (sum(p.nbytes for p in self.postings.values()) + self.popularity.nbytes
+                + sum(codes.nbytes for codes, _ in self.text.values()))
+
+    @classmethod
+    def build(cls, catalog):
+        keys, encoded = link_keys(catalog, _first_present(catalog, COLUMNAS_NOMBRE), factorized=True)
+        popularity = (catalog['popularity'].to_numpy(dtype=np.float32) if 'popularity' in catalog.columns
+                      else np.zeros(len(catalog), dtype=np.float32))
+        stage_hashes, both = _stage_hashes(keys)
+        postings = {}
+        for etapa, (hashes, valid) in stage_hashes.items():
+            rows = np.flatnonzero(valid)
+            postings[etapa] = Postings.build(hashes[rows], rows, popularity)
+        rep, hashes = _exploded_tokens(keys, np.flatnonzero(both))
+        postings['artista'] = Postings.build(hashes, rep, popularity)
+        # Claves normalizadas del catálogo (para comparar en los bloques sin
+        # volver a leer ni normalizar el texto)
+        text = {field: encoded[field] for field in ('title_key', 'artist')}
+        return cls(postings, text, popularity)
+
+    def link(self, chart):
+        # -> (DataFrame alineado con chart: catalog_row (-1 = sin enlace),
+        #     link_stage, link_score, n_candidates; parejas comparadas)
+        keys = link_keys(chart)
+        stage_hashes, both = _stage_hashes(keys)
+        n = len(chart)
+        row = np.full(n, -1, dtype=np.int64)
+        stage = np.full(n, SIN_ENLACE, dtype=object)
+        score = np.zeros(n)
+        n_candidates = np.zeros(n, dtype=np.int64)
+
+        # Etapas exactas: todo el chart a la vez
+        for etapa in ('exacto', 'clave'):
+            hashes, valid = stage_hashes[etapa]
+            pending = np.flatnonzero((row < 0) & valid)
+            postings = self.postings[etapa]
+            lo, hi = postings.ranges(hashes[pending])
+            hit = hi > lo
+            found = pending[hit]
+            row[found] = postings.rows[lo[hit]]
+            stage[found] = etapa
+            score[found] = 1.0
+            n_candidates[found] = (hi - lo)[hit]
+
+        # Etapas aproximadas: se compara solo dentro de los bloques
+        pairs = 0
+        for etapa, field in (('artista', 'title_key'), ('titulo', 'artist')):
+            if etapa == 'artista':
+                query_rows, hashes = _exploded_tokens(keys, np.flatnonzero((row < 0) & both))
+            else:
+                hashes, valid = stage_hashes[etapa]
+                query_rows = np.flatnonzero((row < 0) & valid)
+                hashes = hashes[query_rows]
+            # Tokens de bloque que debe compartir cada candidata: la mitad
+            needed = np.maximum(np.bincount(query_rows, minlength=n) // 2, 1)
+            lo, hi = self.postings[etapa].ranges(hashes)
+            hi = np.minimum(hi, lo + BLOQUE_MAX)
+            hit = hi > lo
+            query_rows, lo, hi = query_rows[hit], lo[hit], hi[hit]
+            if not len(query_rows):
+                continue
+            cand_rows = self.postings[etapa].rows[np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)])]
+            # Parejas (consulta, candidata) distintas; cuántas veces aparece cada
+            # una = tokens de bloque en común
+            pair_ids, shared = np.unique(np.repeat(query_rows, hi - lo) * len(self) + cand_rows,
+                                         return_counts=True)
+            owner, cand_rows = np.divmod(pair_ids, len(self))
+            keep = shared >= needed[owner]
+            owner, cand_rows = owner[keep], cand_rows[keep]
+            if not len(owner):
+                continue
+            pairs += len(owner)
+
+            # Perfiles (trigramas) de cada candidata distinta
+            codes, uniques = self.text[field]
+            uniq = np.unique(cand_rows)
+            profiles = dict(zip(uniq.tolist(), (_profile(k) for k in uniques[codes[uniq]])))
+            # Por consulta, de más a menos popular (desempate)
+            order = np.lexsort((cand_rows, -self.popularity[cand_rows], owner))
+            owner, cand_rows = owner[order], cand_rows[order]
+            bounds = np.flatnonzero(np.diff(owner)) + 1
+            query_keys = keys[field].to_numpy()
+            for i, group in zip(owner[np.r_[0, bounds]].tolist(), np.split(cand_rows, bounds)):
+                query_grams, query_marks = _profile(query_keys[i])
+                best, best_row, ties = SIMILITUD_MIN, -1, 0
+                for r in group.tolist():
+                    grams, marks = profiles[r]
+                    # Remix frente a original (o directo, acústica...): otra grabación
+                    if marks != query_marks:
+                        continue
+                    s = len(query_grams & grams) / len(query_grams | grams)
+                    # Empates: se queda la primera (la más popular)
+                    if s > best or (s == best and best_row < 0):
+                        best, best_row, ties = s, r, 1
+                    elif s == best:
+                        ties += 1
+                if best_row >= 0:
+                    row[i], stage[i], score[i], n_candidates[i] = best_row, etapa, best, ties
+
+        links = pd.DataFrame({'catalog_row': row, 'link_stage': stage, 'link_score': score,
+                              'n_candidates': n_candidates})
+        return links, pairs
+
+
+def load_or_build_link_index(catalog, dataset_hash, cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, f'{dataset_hash[:16]}.pkl')
+    try:
+        with open(path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached.get('version') == LINK_VERSION and cached.get('n_rows') == len(catalog):
+            return cached['index']
+    except (FileNotFoundError, EOFError, KeyError, AttributeError, pickle.UnpicklingError):
+        pass
+
+    index = LinkIndex.build(catalog)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump({'version': LINK_VERSION, 'n_rows': len(catalog), 'index': index}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return index
+
+
+# --- ENRIQUECIMIENTO + MÉTRICAS ---
+def enrich(adapted, links, catalog):
+    # Filas enlazadas: columnas sin equivalente y ENRIQUECER desde el catálogo
+    out = pd.concat([adapted, links], axis=1)
+    matched = np.flatnonzero(links['catalog_row'].to_numpy() >= 0)
+    rows = links['catalog_row'].to_numpy()[matched]
+    for col in list(IMPUTACION) + ENRIQUECER:
+        if col not in catalog.columns:
+            continue
+        values = np.asarray(catalog[col].to_numpy()[rows])
+        if col in IMPUTACION:
+            out[col] = out[col].astype(np.float64)
+            out.loc[matched, col] = values.astype(np.float64)
+        else:
+            out[col] = pd.Series(pd.NA, index=out.index, dtype=object)
+            out.loc[matched, col] = values.astype(str)
+    out.loc[matched, 'features_source'] = 'catalogo'
+    return out
+
+
+def match_quality(adapted, links, catalog, pairs):
+    stages = links['link_stage'].to_numpy()
+    rows = links['catalog_row'].to_numpy()
+    matched = rows >= 0
+    n, m = len(adapted), len(catalog)
+    # Coherencia: los rasgos de audio de la pareja enlazada deben coincidir
+    # salvo el redondeo de top10s (enteros 0-100)
+    diff = np.abs(adapted[CONTROL].to_numpy(dtype=np.float64)[matched]
+                  - catalog[CONTROL].to_numpy(dtype=np.float64)[rows[matched]]).max(axis=1)
+    coherent = diff <= TOLERANCIA
+    por_etapa = {}
+    for etapa in ETAPAS + [SIN_ENLACE]:
+        mask = stages == etapa
+        stats = {'rows': int(mask.sum())}
+        if etapa != SIN_ENLACE and mask.any():
+            sel = mask[matched]
+            stats['coherent'] = float(coherent[sel].mean())
+            stats['mean_score'] = float(links['link_score'].to_numpy()[mask].mean())
+        por_etapa[etapa] = stats
+    return {
+        'rows': n, 'catalog_rows': m,
+        'matched': int(matched.sum()), 'coverage': float(matched.mean()) if n else 0.0,
+        'coherent': float(coherent.mean()) if matched.any() else None,
+        'ambiguous': int((links['n_candidates'].to_numpy() > 1).sum()),
+        'stages': por_etapa,
+        'pairs_compared': int(pairs), 'pairs_naive': n * m,
+    }
+
+
+def classify_chart(model, enriched):
+    from batch_classify import classify_chunk
+
+    out = classify_chunk(model, enriched)
+    extra = [c for c in ('year', 'top_genre', 'album_name', 'link_stage', 'link_score', 'features_source')
+             if c in enriched.columns and c not in out.columns]
+    return pd.concat([out, enriched[extra].reset_index(drop=True)], axis=1)
+
+
+def link_chart(chart, catalog, index, model=None):
+    # -> (salida enriquecida [y clasificada si hay modelo], métricas)
+    seconds = {}
+    start = time.perf_counter()
+    adapted = adapt_schema(chart)
+    seconds['adaptar'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    links, pairs = index.link(adapted)
+    seconds['enlazar'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    out = enrich(adapted, links, catalog)
+    seconds['enriquecer'] = time.perf_counter() - start
+
+    if model is not None:
+        start = time.perf_counter()
+        out = classify_chart(model, out)
+        seconds['clasificar'] = time.perf_counter() - start
+
+    metrics = match_quality(adapted, links, catalog, pairs)
+    metrics['seconds'] = seconds
+    metrics['rows_per_s'] = len(chart) / sum(seconds.values()) if len(chart) else 0.0
+    return out, metrics
+
+
+def format_report(metrics):
+    lines = [f"{metrics['rows']:,} filas del chart contra {metrics['catalog_rows']:,} del catálogo: "
+             f"{metrics['matched']:,} enlazadas ({metrics['coverage']:.1%})"]
+    for etapa, stats in metrics['stages'].items():
+        line = f"  {etapa:<11}{stats['rows']:6d}"
+        if 'coherent' in stats:
+            line += f"  similitud media {stats['mean_score']:.2f}  rasgos coherentes {stats['coherent']:.0%}"
+        lines.append(line)
+    if metrics['coherent'] is not None:
+        lines.append(f"  coherencia total {metrics['coherent']:.1%} (|diferencia| <= {TOLERANCIA} en {', '.join(CONTROL)}); "
+                     f"{metrics['ambiguous']} con varias candidatas (gana la más popular)")
+    naive = metrics['pairs_naive']
+    lines.append(f"  parejas comparadas {metrics['pairs_compared']:,} de {naive:,} "
+                 f"({metrics['pairs_compared'] / naive if naive else 0:.4%})")
+    tiempos = ', '.join(f"{k} {v * 1e3:.1f} ms" for k, v in metrics['seconds'].items())
+    lines.append(f"  {tiempos}  ->  {metrics['rows_per_s']:,.0f} filas/s")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    from catalog_cache import load_catalog, source_hash
+    from resources import DATASET_PATH, load_deployment
+
+    parser = argparse.ArgumentParser(description="Adapta top10s.csv al modelo, lo enlaza con el catálogo y lo clasifica.")
+    parser.add_argument('chart', nargs='?', default=CHART_PATH)
+    parser.add_argument('--catalog', default=DATASET_PATH)
+    parser.add_argument('--output', default=None, help="CSV o .parquet con la salida enriquecida")
+    parser.add_argument('--no-classify', action='store_true')
+    args = parser.parse_args(argv)
+
+    chart = read_chart(args.chart)
+    catalog = load_catalog(args.catalog)
+    start = time.perf_counter()
+    index = load_or_build_link_index(catalog, source_hash(args.catalog))
+    print(f"Índice de enlace: {len(index):,} canciones, {index.nbytes / 2 ** 20:.1f} MB "
+          f"({time.perf_counter() - start:.2f} s)")
+
+    model = None if args.no_classify else load_deployment().model
+    out, metrics = link_chart(chart, catalog, index, model)
+    print(format_report(metrics))
+
+    if model is not None:
+        linked = out[out['link_stage'] != SIN_ENLACE]
+        known = linked['music_genre'].notna()
+        if known.any():
+            agree = (linked.loc[known, 'pred_label'].str.lower() == linked.loc[known, 'music_genre'].str.lower()).mean()
+            print(f"  predicción = género del catálogo en {agree:.1%} de las {int(known.sum())} enlazadas")
+        print(out['pred_label'].value_counts().to_string())
+
+    if args.output:
+        if args.output.endswith('.parquet'):
+            out.to_parquet(args.output, index=False)
+        else:
+            out.to_csv(args.output, index=False)
+        print(f"Salida: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,374 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from training_data import load_training_data
+from tuning import booster_params, plan_resources
+
+# --- EVALUACIÓN EN UNA PASADA (PREDICCIONES FUERA DE FOLD EN CACHÉ) ---
+# El notebook evalúa el modelo varias veces desde cero: cross_val_score con
+# 10 KFold, otro fit + predict_proba para las curvas ROC y el barrido de
+# test_size (17 valores, cada uno repitiendo el GridSearchCV de 72
+# candidatos) en serie. Aquí:
+#
+#   - Cada partición (KFold o split train/test) se entrena UNA vez por fold,
+#     los folds en procesos en paralelo. X e y se guardan una vez como .npy y
+#     cada proceso los abre con mmap (solo lectura, sin copias por proceso).
+#   - Cada fold escribe sus probabilidades directamente en probs.npy (mmap,
+#     filas disjuntas): el resultado son las probabilidades fuera de fold de
+#     todas las filas evaluadas.
+#   - Precisión, classification report, matriz de confusión, ROC / AUC
+#     multiclase y la curva de sensibilidad al split salen de esas
+#     probabilidades, sin volver a entrenar.
+#   - Cada ejecución se guarda en cache/evaluation/<hash datos>/<clave>, con
+#     clave = (parámetros, rounds, partición, semilla): repetir es leer.
+#
+# La curva de sensibilidad usa parámetros fijos (los del modelo de la app o
+# los que salgan de tuning.py) en vez de repetir la búsqueda en cada split.
+#
+# Uso:
+#   python app/evaluation.py --dataset dataset/dataset_demo_balanced.csv --cv 10 --splits
+#   python app/evaluation.py --params cache/tuning/<run>/report.json
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(CURRENT_DIR, '..', 'dataset', 'dataset_demo_balanced.csv')
+CACHE_DIR = os.path.join(CURRENT_DIR, '..', 'cache', 'evaluation')
+EVAL_VERSION = 1
+
+# Parámetros del modelo de la app (modelo_xgboost_final.pkl)
+DEFAULT_PARAMS = {
+    'n_estimators': 200,
+    'learning_rate': 0.2,
+    'max_depth': 10,
+    'subsample': 1.0,
+    'colsample_bytree': 0.8,
+}
+# Mismo barrido que el notebook: np.arange(0.1, 0.95, 0.05)
+SPLIT_SIZES = tuple(round(0.10 + 0.05 * i, 2) for i in range(17))
+
+
+def data_hash(X, y):
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(X).tobytes())
+    h.update(np.ascontiguousarray(y).tobytes())
+    return h.hexdigest()
+
+
+def kfold_split(n_splits=10, shuffle=True, stratify=False, seed=42):
+    # Por defecto el KFold(n_splits=10, shuffle=True, random_state=42) del notebook
+    return {'kind': 'kfold', 'n_splits': n_splits, 'shuffle': shuffle, 'stratify': stratify, 'seed': seed}
+
+
+def holdout_split(test_size=0.30, stratify=True, seed=42):
+    # Por defecto el split 70/30 estratificado de training_data.split
+    return {'kind': 'holdout', 'test_size': round(float(test_size), 4), 'stratify': stratify, 'seed': seed}
+
+
+def fold_assignment(y, spec):
+    # Fold de evaluación de cada fila; -1 = solo entrenamiento (split train/test)
+    from sklearn.model_selection import KFold, StratifiedKFold, train_test_split
+    n = len(y)
+    fold = np.full(n, -1, dtype=np.int8)
+    if spec['kind'] == 'kfold':
+        seed = spec['seed'] if spec['shuffle'] else None
+        cls = StratifiedKFold if spec['stratify'] else KFold
+        splitter = cls(n_splits=spec['n_splits'], shuffle=spec['shuffle'], random_state=seed)
+        for i, (_, val_idx) in enumerate(splitter.split(np.zeros(n), y)):
+            fold[val_idx] = i
+    elif spec['kind'] == 'holdout':
+        _, test_idx = train_test_split(np.arange(n), test_size=spec['test_size'], random_state=spec['seed'],
+                                       stratify=y if spec['stratify'] else None)
+        fold[test_idx] = 0
+    else:
+        raise ValueError(f"Tipo de partición desconocido: {spec['kind']}")
+    return fold
+
+
+def classification_metrics(y, probs, fold, classes):
+    # Todo lo que el notebook calculaba re-entrenando, a partir de las probabilidades
+    from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score
+    mask = fold >= 0
+    y_eval, p_eval = y[mask], np.asarray(probs[mask])
+    pred = p_eval.argmax(axis=1)
+    labels = list(range(len(classes)))
+    fold_acc = [float((pred[fold[mask] == f] == y_eval[fold[mask] == f]).mean())
+                for f in range(int(fold.max()) + 1)]
+    auc = {c: float(roc_auc_score(y_eval == i, p_eval[:, i])) for i, c in enumerate(classes)}
+    return {
+        'n_eval': int(mask.sum()),
+        'accuracy': float((pred == y_eval).mean()),
+        'fold_accuracy': fold_acc,
+        'fold_mean': float(np.mean(fold_acc)),
+        'fold_std': float(np.std(fold_acc)),
+        'confusion': confusion_matrix(y_eval, pred, labels=labels).tolist(),
+        'report': classification_report(y_eval, pred, labels=labels, target_names=classes,
+                                        output_dict=True, zero_division=0),
+        'auc': auc,
+        'auc_macro': float(np.mean(list(auc.values()))),
+    }
+
+
+class EvaluationRun:
+    def __init__(self, y, fold, probs, manifest):
+        self.y = y
+        self.fold = fold
+        self.probs = probs
+        self.manifest = manifest
+
+    @property
+    def classes(self):
+        return self.manifest['classes']
+
+    @property
+    def metrics(self):
+        return self.manifest['metrics']
+
+    @property
+    def accuracy(self):
+        return self.metrics['accuracy']
+
+    @property
+    def mask(self):
+        return self.fold >= 0
+
+    def predictions(self):
+        return np.asarray(self.probs[self.mask]).argmax(axis=1)
+
+    def report(self):
+        # Texto del classification_report (el del notebook), desde las predicciones guardadas
+        from sklearn.metrics import classification_report
+        return classification_report(self.y[self.mask], self.predictions(), labels=list(range(len(self.classes))),
+                                     target_names=self.classes, zero_division=0)
+
+    def roc_curves(self):
+        # {clase: (fpr, tpr, auc)} uno-contra-todos, como label_binarize + roc_curve
+        from sklearn.metrics import auc, roc_curve
+        y_eval, p_eval = self.y[self.mask], np.asarray(self.probs[self.mask])
+        curves = {}
+        for i, c in enumerate(self.classes):
+            fpr, tpr, _ = roc_curve(y_eval == i, p_eval[:, i])
+            curves[c] = (fpr, tpr, float(auc(fpr, tpr)))
+        return curves
+
+    @classmethod
+    def load(cls, directory, y):
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest.get('eval_version') != EVAL_VERSION:
+            raise ValueError(f"Versión de evaluación no soportada: {manifest.get('eval_version')}")
+        fold = np.asarray(np.load(os.path.join(directory, 'fold.npy'), mmap_mode='r'))
+        probs = np.asarray(np.load(os.path.join(directory, 'probs.npy'), mmap_mode='r'))
+        return cls(y, fold, probs, manifest)
+
+
+def _fit_fold(X, y, fold, f, params, rounds):
+    import xgboost as xgb
+    train, test = fold != f, fold == f
+    # Las filas de cada fold se copian al construir la DMatrix; X sigue en mmap
+    dtrain = xgb.DMatrix(X[train], label=y[train])
+    booster = xgb.train(params, dtrain, num_boost_round=rounds)
+    return test, booster.predict(xgb.DMatrix(X[test]))
+
+
+def _worker(args):
+    # Proceso del pool: X, y y el reparto en mmap; escribe las filas de su fold
+    data_dir, run_dir, f, params, rounds = args
+    start = time.perf_counter()
+    X = np.load(os.path.join(data_dir, 'X.npy'), mmap_mode='r')
+    y = np.load(os.path.join(data_dir, 'y.npy'), mmap_mode='r')
+    fold = np.load(os.path.join(run_dir, 'fold.npy'), mmap_mode='r')
+    test, p = _fit_fold(X, y, fold, f, params, rounds)
+    probs = np.load(os.path.join(run_dir, 'probs.npy'), mmap_mode='r+')
+    probs[test] = p
+    probs.flush()
+    return run_dir, f, time.perf_counter() - start
+
+
+class Evaluator:
+    def __init__(self, X, y, classes, params=None, n_workers=None, n_threads=None,
+                 cache_dir=CACHE_DIR, seed=42):
+        self.X = np.ascontiguousarray(X, dtype=np.float32)
+        self.y = np.ascontiguousarray(y, dtype=np.int32)
+        self.classes = list(classes)
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.n_workers, self.n_threads = n_workers, n_threads
+        self.seed = seed
+        self.data_hash = data_hash(self.X, self.y)
+        self.data_dir = os.path.join(cache_dir, self.data_hash[:16])
+
+    def _run_key(self, spec):
+        payload = json.dumps([EVAL_VERSION, self.params, spec, self.seed, self.classes], sort_keys=True)
+        return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+    def run_dir(self, spec):
+        return os.path.join(self.data_dir, self._run_key(spec))
+
+    def _save_data(self):
+        # X / y compartidos por todos los procesos (y por todas las ejecuciones de estos datos)
+        if os.path.exists(os.path.join(self.data_dir, 'y.npy')):
+            return
+        os.makedirs(self.data_dir, exist_ok=True)
+        for name, arr in (('X.npy', self.X), ('y.npy', self.y)):
+            fd, tmp = tempfile.mkstemp(dir=self.data_dir, prefix='.tmp-data-', suffix='.npy')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, arr)
+            os.replace(tmp, os.path.join(self.data_dir, name))
+
+    def load(self, spec):
+        # Ejecución ya calculada para (datos, parámetros, partición) o None
+        try:
+            return EvaluationRun.load(self.run_dir(spec), self.y)
+        except (FileNotFoundError, ValueError, KeyError, json.JSONDecodeError):
+            return None
+
+    def run(self, specs, verbose=False):
+        # Todas las particiones pendientes en un único pool: un entrenamiento por fold
+        runs = [self.load(spec) for spec in specs]
+        pending = [(i, spec) for i, (spec, run) in enumerate(zip(specs, runs)) if run is None]
+        if not pending:
+            return runs
+
+        self._save_data()
+        start = time.perf_counter()
+        builds, tasks = {}, []
+        try:
+            for i, spec in pending:
+                tmp_dir = tempfile.mkdtemp(dir=self.data_dir, prefix='.tmp-eval-')
+                fold = fold_assignment(self.y, spec)
+                np.save(os.path.join(tmp_dir, 'fold.npy'), fold)
+                probs = np.lib.format.open_memmap(os.path.join(tmp_dir, 'probs.npy'), mode='w+', dtype=np.float32,
+                                                  shape=(len(self.y), len(self.classes)))
+                probs[:] = np.nan
+                probs.flush()
+                del probs
+                builds[tmp_dir] = (i, spec, {})
+                tasks += [(tmp_dir, f) for f in range(int(fold.max()) + 1)]
+
+            n_workers, n_threads = plan_resources(len(tasks), self.n_workers, self.n_threads)
+            params = booster_params(self.params, len(self.classes), n_threads, self.seed)
+            rounds = int(self.params['n_estimators'])
+            for run_dir, f, seconds in self._train(tasks, params, rounds, n_workers):
+                builds[run_dir][2][f] = seconds
+
+            for tmp_dir, (i, spec, fold_seconds) in builds.items():
+                fold = np.load(os.path.join(tmp_dir, 'fold.npy'))
+                probs = np.load(os.path.join(tmp_dir, 'probs.npy'), mmap_mode='r')
+                manifest = {
+                    'eval_version': EVAL_VERSION,
+                    'data_hash': self.data_hash,
+                    'split': spec,
+                    'params': self.params,
+                    'seed': self.seed,
+                    'classes': self.classes,
+                    'n_rows': int(len(self.y)),
+                    'workers': n_workers,
+                    'threads': n_threads,
+                    'fold_seconds': [round(fold_seconds[f], 3) for f in sorted(fold_seconds)],
+                    'metrics': classification_metrics(self.y, probs, fold, self.classes),
+                    'created_at': time.time(),
+                }
+                del probs
+                with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+                    json.dump(manifest, f, indent=2)
+                directory = self.run_dir(spec)
+                if os.path.isdir(directory):
+                    shutil.rmtree(directory)
+                os.replace(tmp_dir, directory)
+                runs[i] = EvaluationRun.load(directory, self.y)
+        finally:
+            for tmp_dir in builds:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        if verbose:
+            print(f"{len(tasks)} entrenamientos ({len(pending)} particiones) en {time.perf_counter() - start:.1f} s, "
+                  f"{n_workers} procesos x {n_threads} hilos")
+        return runs
+
+    def _train(self, tasks, params, rounds, n_workers):
+        args = [(self.data_dir, run_dir, f, params, rounds) for run_dir, f in tasks]
+        if n_workers == 1:
+            for a in args:
+                yield _worker(a)
+            return
+        import multiprocessing
+        with multiprocessing.get_context('spawn').Pool(n_workers) as pool:
+            yield from pool.imap_unordered(_worker, args)
+
+    # --- atajos del notebook ---
+    def cross_validate(self, n_splits=10, shuffle=True, stratify=False):
+        return self.run([kfold_split(n_splits, shuffle, stratify, self.seed)])[0]
+
+    def holdout(self, test_size=0.30):
+        return self.run([holdout_split(test_size, seed=self.seed)])[0]
+
+    def split_curve(self, test_sizes=SPLIT_SIZES, verbose=False):
+        # [(test_size, precisión en test)]: cada split es un entrenamiento, todos en el mismo pool
+        runs = self.run([holdout_split(t, seed=self.seed) for t in test_sizes], verbose=verbose)
+        return [(float(t), run.accuracy) for t, run in zip(test_sizes, runs)]
+
+
+def load_params(value):
+    # JSON en línea o ruta a un informe de tuning.py (halving.best_params)
+    if value is None:
+        return None
+    if os.path.exists(value):
+        with open(value) as f:
+            data = json.load(f)
+        return data.get('halving', {}).get('best_params', data)
+    return json.loads(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluación del modelo con predicciones fuera de fold en caché.")
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--cv', type=int, default=10, help="Folds del KFold (0 = no)")
+    parser.add_argument('--stratify', action='store_true', help="StratifiedKFold en vez de KFold")
+    parser.add_argument('--splits', action='store_true', help="Curva de sensibilidad al tamaño del test")
+    parser.add_argument('--params', default=None, help="JSON o informe de tuning.py (por defecto los del modelo de la app)")
+    parser.add_argument('--workers', type=int, default=None, help="Folds entrenando en paralelo")
+    parser.add_argument('--threads', type=int, default=None, help="Hilos por booster")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    X, y, clases = load_training_data(args.dataset)
+    nombres = [c.title() for c in clases]
+    evaluator = Evaluator(X, y, nombres, params=load_params(args.params), n_workers=args.workers,
+                          n_threads=args.threads, cache_dir=args.cache_dir)
+    print(f"Datos: {len(y)} filas, clases {nombres}, parámetros {evaluator.params}")
+
+    specs = []
+    if args.cv:
+        specs.append(kfold_split(args.cv, stratify=args.stratify))
+    if args.splits:
+        specs += [holdout_split(t) for t in SPLIT_SIZES]
+    start = time.perf_counter()
+    runs = evaluator.run(specs, verbose=True)
+    print(f"Listo en {time.perf_counter() - start:.2f} s")
+
+    if args.cv:
+        run, m = runs[0], runs[0].metrics
+        print(f"\nValidación cruzada ({args.cv} folds):")
+        print('  ' + ' '.join(f"{a * 100:.2f}%" for a in m['fold_accuracy']))
+        print(f"  media {m['fold_mean'] * 100:.2f}% +/- {m['fold_std'] * 100:.2f}% | fuera de fold {m['accuracy'] * 100:.2f}%")
+        print('\n' + run.report())
+        print("Matriz de confusión (filas = realidad):")
+        for c, row in zip(nombres, m['confusion']):
+            print(f"  {c:<12}" + ''.join(f"{v:>7}" for v in row))
+        print("AUC (uno contra todos): " + ', '.join(f"{c} {a:.4f}" for c, a in m['auc'].items()))
+
+    if args.splits:
+        curve = [(t, run.accuracy) for t, run in zip(SPLIT_SIZES, runs[1 if args.cv else 0:])]
+        best = max(curve, key=lambda p: p[1])
+        print("\nSensibilidad al tamaño del test:")
+        for t, acc in curve:
+            print(f"  test {t * 100:3.0f}%  {acc * 100:6.2f}%" + ('  <- mejor' if (t, acc) == best else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    main()
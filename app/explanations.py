@@ -0,0 +1,168 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from features import FEATURE_SCHEMA, build_matrix, required_columns
+from metrics import METRICS
+from result_cache import LRUCache
+
+# --- EXPLICACIONES: CONTRIBUCIÓN DE CADA FEATURE A LA PREDICCIÓN ---
+# En vez de textos fijos por género, lo que el modelo ha usado de verdad:
+# contribución de cada feature al margen de cada clase (atribución por
+# caminos de los árboles, el approx_contribs de XGBoost). Con el export NumPy,
+# NumpyBooster.predict_contribs (sin xgboost); con el XGBClassifier del
+# pickle, pred_contribs con approx_contribs=True: el mismo método en las dos
+# apps, así que la misma canción tiene los mismos "motivos" en ambas.
+#
+# Todo el catálogo se calcula en una pasada por bloques, repartidos entre
+# hilos, y se guarda como float16 (filas x (features + sesgo) x clases) en
+# un .npy por modelo + dataset que se abre con mmap: explicar una canción es
+# leer una fila del array. Las entradas ad-hoc se calculan al pedirlas y se
+# guardan en un LRU por (versión del modelo, vector de features).
+#
+# Precalcular (también lo hace el warm-up de resources.py):
+#   python app/explanations.py
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'explanations')
+# Sube al cambiar el método de atribución (invalida los .npy guardados)
+CONTRIB_VERSION = 2
+BLOCK_ROWS = 4096
+
+# Nombres para la app
+ETIQUETAS = {
+    'popularity': 'Popularidad', 'duration_ms': 'Duración', 'danceability': 'Bailabilidad',
+    'energy': 'Energía', 'key': 'Tonalidad', 'loudness': 'Volumen', 'mode': 'Modo (mayor/menor)',
+    'speechiness': 'Presencia de voz hablada', 'acousticness': 'Acusticidad',
+    'instrumentalness': 'Instrumentalidad', 'liveness': 'Directo', 'valence': 'Valencia',
+    'tempo': 'Tempo', 'time_signature': 'Compás', 'intensity': 'Intensidad (energía x volumen)',
+    'dance_tempo': 'Bailabilidad / tempo', 'chill_factor': 'Factor chill (valencia - energía)',
+}
+
+
+def contributions(model, X):
+    # -> (filas, features + 1, clases) float32; la última "feature" es el sesgo
+    if hasattr(model, 'predict_contribs'):
+        return model.predict_contribs(X).astype(np.float32)
+    import xgboost as xgb
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    dmatrix = xgb.DMatrix(np.asarray(X, dtype=np.float32), feature_names=booster.feature_names)
+    contribs = booster.predict(dmatrix, pred_contribs=True, approx_contribs=True)
+    # XGBoost devuelve (filas, clases, features + 1)
+    return np.ascontiguousarray(contribs.transpose(0, 2, 1), dtype=np.float32)
+
+
+def top_drivers(contribs, class_idx, values=None, schema=FEATURE_SCHEMA, k=3):
+    # -> [(feature, contribución, valor)] de mayor a menor |contribución| hacia class_idx
+    c = np.asarray(contribs[:len(schema), class_idx], dtype=np.float32)
+    order = np.argsort(-np.abs(c), kind='stable')[:k]
+    return [(schema[i], float(c[i]), None if values is None else float(values[i])) for i in order]
+
+
+class ContributionStore:
+    def __init__(self, model, model_version, schema=FEATURE_SCHEMA, maxsize=1024, n_threads=None):
+        self.model = model
+        self.model_version = model_version
+        self.schema = list(schema)
+        self.n_threads = n_threads or os.cpu_count() or 1
+        self.adhoc = LRUCache(maxsize, name='explicaciones')
+        self._row_of = {}
+        self.contribs = None
+        self.build_seconds = None
+
+    def _compute_catalog(self, df, out, batch_rows):
+        # Bloques independientes: cada hilo escribe su trozo del array de salida
+        columns = {c: df[c].to_numpy() for c in required_columns(self.schema)}
+
+        def block(s):
+            X = build_matrix({c: v[s:s + batch_rows] for c, v in columns.items()}, self.schema)
+            out[s:s + len(X)] = contributions(self.model, X)
+
+        with ThreadPoolExecutor(max_workers=self.n_threads) as pool:
+            list(pool.map(block, range(0, len(df), batch_rows)))
+
+    def _shape(self, n_rows):
+        n_classes = getattr(self.model, 'n_classes', None) or len(self.model.classes_)
+        return n_rows, len(self.schema) + 1, n_classes
+
+    def _cached_contribs(self, df, dataset_hash, cache_dir, batch_rows):
+        path = os.path.join(cache_dir, f'v{CONTRIB_VERSION}_{str(self.model_version)[:16]}_{dataset_hash[:16]}.npy')
+        try:
+            contribs = np.load(path, mmap_mode='r')
+            if contribs.shape == self._shape(len(df)):
+                return contribs
+        except (FileNotFoundError, ValueError):
+            pass
+        # Se escribe directamente en un memmap temporal (memoria acotada por el bloque)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = path + '.tmp.npy'
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float16, shape=self._shape(len(df)))
+        self._compute_catalog(df, out, batch_rows)
+        out.flush()
+        del out
+        os.replace(tmp, path)
+        return np.load(path, mmap_mode='r')
+
+    def fill(self, df, id_column='track_id', dataset_hash=None, cache_dir=CACHE_DIR, batch_rows=BLOCK_ROWS):
+        start = time.perf_counter()
+        if dataset_hash is not None:
+            self.contribs = self._cached_contribs(df, dataset_hash, cache_dir, batch_rows)
+        else:
+            self.contribs = np.empty(self._shape(len(df)), dtype=np.float16)
+            self._compute_catalog(df, self.contribs, batch_rows)
+        self.build_seconds = time.perf_counter() - start
+
+        ids = df[id_column].to_numpy() if id_column in df.columns else np.arange(len(df))
+        row_of = {}
+        for row, track_id in enumerate(ids):
+            # Duplicados: gana la primera aparición (como PredictionCache)
+            row_of.setdefault(track_id, row)
+        self._row_of = row_of
+        return self
+
+    def lookup(self, track_id, features=None):
+        # -> (features + 1, clases) float32; features: la fila si no está en el catálogo
+        row = self._row_of.get(track_id)
+        METRICS.cache('explicaciones (catálogo)', row is not None)
+        if row is not None:
+            return self.contribs[row].astype(np.float32)
+        return None if features is None else self.lookup_features(features)
+
+    def lookup_features(self, features):
+        X = build_matrix(features, self.schema)
+        key = (self.model_version, X.tobytes())
+        return self.adhoc.get_or_compute(key, lambda: contributions(self.model, X)[0])
+
+    def explain(self, track_id, features, class_idx, k=3):
+        # Top-k de lo que ha empujado (o frenado) la clase class_idx, con el valor de cada feature
+        contribs = self.lookup(track_id, features=features)
+        values = build_matrix(features, self.schema)[0]
+        return top_drivers(contribs, class_idx, values, self.schema, k)
+
+    def stats(self):
+        return {'model_version': self.model_version, 'catalog_rows': len(self._row_of),
+                'bytes': 0 if self.contribs is None else int(self.contribs.nbytes),
+                'build_seconds': self.build_seconds, 'adhoc': self.adhoc.stats()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precalcula las contribuciones por feature del catálogo.")
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    from catalog_cache import source_hash
+    from catalog_store import load_catalog_store
+    from resources import DATASET_PATH, load_deployment
+
+    deployment = load_deployment()
+    df = load_catalog_store(DATASET_PATH)
+    store = ContributionStore(deployment.model, deployment.checksum, n_threads=args.threads)
+    store.fill(df, dataset_hash=source_hash(DATASET_PATH))
+    print(f"Contribuciones de {len(df):,} canciones: {store.contribs.shape}, "
+          f"{store.contribs.nbytes / 2 ** 20:.1f} MB float16 ({store.build_seconds:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
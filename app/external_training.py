@@ -0,0 +1,416 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from evaluation import DEFAULT_PARAMS, load_params
+from features import FEATURE_SCHEMA, build_matrix
+from ingest import COLUMNA_GENERO, _hash_keys, iter_shards, read_manifest, validate
+from recommender import file_hash
+from startup_profile import rss_mb
+from training_data import GENEROS
+from tuning import booster_params
+
+# --- ENTRENAMIENTO FUERA DE MEMORIA (TODOS LOS GÉNEROS) ---
+# El notebook carga el dump entero en pandas, se queda con los 4
+# generos_a_elegir y entrena XGBClassifier sobre DataFrames en memoria: con
+# los 114 track_genre del dataset completo (o dumps más grandes) no escala.
+# Aquí:
+#   - los datos llegan por bloques de --batch-rows filas: shards columnares de
+#     ingest.py (leídos con mmap) o un CSV con chunksize (+ ingest.validate).
+#     Las features derivadas se calculan por bloque (features.build_matrix)
+#   - xgboost los consume con un DataIter: ExtMemQuantileDMatrix (páginas
+#     cuantizadas en disco; la RAM depende del bloque, no del dataset) o
+#     QuantileDMatrix (cuantizada en RAM: ~1 byte por celda en vez de 4-8)
+#   - géneros configurables (--genres o --all-genres) con pesos por clase
+#     'balanced' (n / (k * n_clase)), contados en una primera pasada (con
+#     shards, del manifest de la ingesta: gratis)
+#   - validación: filas con hash(track_id) % 1000 < --val-permil, hasta
+#     --val-rows (memoria acotada también aquí); no entran en train
+#   - checkpoint cada --checkpoint-every rounds (booster + log de rounds): una
+#     ejecución interrumpida sigue desde el último, y pedir más rounds
+#     continúa el mismo booster
+#   - por round: segundos, filas/s, mlogloss / error de validación y RSS
+#
+# Memoria: con ExtMem la matriz de features ya no depende del dataset, pero
+# xgboost guarda por fila y clase gradiente, hessiano y predicción (~12 bytes
+# x 114 clases = 1,4 KB por fila): con todos los géneros es lo que domina.
+# --max-rows fija ese presupuesto: muestreo por hash de track_id con una
+# cuota por clase (las clases pequeñas entran enteras) y pesos que
+# compensan el muestreo. Con él, el pico de RAM no crece con el dataset.
+#
+#   python app/ingest.py dataset/dataset.csv --output dataset/ingested --all-genres
+#   python app/external_training.py dataset/ingested --all-genres --rounds 200
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(CURRENT_DIR, '..', 'cache', 'external_training')
+SOURCE_PATH = os.path.join(CURRENT_DIR, '..', 'dataset', 'ingested')
+
+TRAINING_VERSION = 1
+BATCH_ROWS = 100_000
+MAX_BIN = 256
+VAL_PERMIL = 20
+VAL_ROWS = 100_000
+CHECKPOINT_EVERY = 10
+MATRICES = ('extmem', 'quantile')
+SAMPLE_SCALE = 1 << 20
+
+
+# --- DATOS POR BLOQUES ---
+def _csv_genre_column(csv_path):
+    header = pd.read_csv(csv_path, nrows=0).columns
+    return 'track_genre' if 'track_genre' in header else COLUMNA_GENERO
+
+
+def iter_source(source, genres=None, batch_rows=BATCH_ROWS):
+    # DataFrames de como mucho batch_rows filas con el esquema de ingest.py.
+    # source: directorio de shards (ingest.py) o CSV en bruto
+    if os.path.isdir(source):
+        for _, df in iter_shards(source, genres):
+            for start in range(0, len(df), batch_rows):
+                yield df.iloc[start:start + batch_rows]
+    else:
+        for raw in pd.read_csv(source, chunksize=batch_rows, dtype={c: str for c in ('track_id', 'track_name', 'name')}):
+            chunk, valid, _ = validate(raw)
+            yield chunk[valid]
+
+
+def count_genres(source, batch_rows=BATCH_ROWS):
+    # -> {género en minúsculas: filas}
+    if os.path.isdir(source):
+        counts = read_manifest(source)['rows_per_genre']
+    else:
+        # Misma validación que el entrenamiento: solo cuentan las filas que entrarán
+        counts = {}
+        for chunk in iter_source(source, batch_rows=batch_rows):
+            for g, n in chunk[COLUMNA_GENERO].astype(str).value_counts().items():
+                counts[g] = counts.get(g, 0) + int(n)
+    merged = {}
+    for g, n in counts.items():
+        merged[g.lower()] = merged.get(g.lower(), 0) + n
+    return merged
+
+
+def sample_rates(counts, classes, max_rows=None):
+    # Fracción de filas de cada clase que entra en train: cuota max_rows / k,
+    # repartiendo lo que sobra de las clases pequeñas entre las grandes
+    n = np.array([counts.get(c, 0) for c in classes], dtype=np.float64)
+    if max_rows is None or n.sum() <= max_rows:
+        return np.ones(len(classes))
+    kept = np.zeros(len(classes))
+    pending = np.ones(len(classes), dtype=bool)
+    while pending.any():
+        quota = (max_rows - kept[~pending].sum()) / pending.sum()
+        small = pending & (n <= quota)
+        if not small.any():
+            kept[pending] = quota
+            break
+        kept[small] = n[small]
+        pending &= ~small
+    return kept / np.maximum(n, 1)
+
+
+def class_weights(counts, classes, mode='balanced', rates=None):
+    n = np.array([counts.get(c, 0) for c in classes], dtype=np.float64)
+    rates = np.ones(len(classes)) if rates is None else rates
+    kept = n * rates
+    if mode == 'none':
+        # Se deshace el muestreo: cada fila representa 1 / rate filas
+        return (kept.sum() / n.sum() / rates).astype(np.float32)
+    # Como class_weight='balanced' de sklearn: cada clase pesa lo mismo en total
+    return (kept.sum() / (len(classes) * np.maximum(kept, 1))).astype(np.float32)
+
+
+class BatchIter(xgb.DataIter):
+    # Un bloque por llamada a next(): matriz de features, etiqueta y peso.
+    # part='train' o 'val'. El reparto y el muestreo van por hash de track_id
+    # (bits distintos para cada cosa): estables entre pasadas
+    def __init__(self, source, classes, weights, part='train', rates=None, batch_rows=BATCH_ROWS,
+                 val_permil=VAL_PERMIL, val_rows=VAL_ROWS, schema=FEATURE_SCHEMA, cache_prefix=None):
+        self.source = source
+        self.classes = np.asarray(classes)
+        self.weights = weights
+        self.rates = rates
+        self.part = part
+        self.batch_rows = batch_rows
+        self.val_permil = val_permil
+        self.val_rows = val_rows
+        self.schema = list(schema)
+        self._batches = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def _iter_batches(self):
+        taken = 0
+        for chunk in iter_source(self.source, list(self.classes), self.batch_rows):
+            genre = chunk[COLUMNA_GENERO].astype(str).str.lower().to_numpy()
+            y = np.searchsorted(self.classes, genre).clip(max=len(self.classes) - 1)
+            keep = self.classes[y] == genre
+            h = _hash_keys(chunk, ['track_id'])
+            in_val = h % 1000 < self.val_permil
+            keep &= in_val if self.part == 'val' else ~in_val
+            if self.part == 'train' and self.rates is not None:
+                keep &= (h >> np.uint64(32)) % SAMPLE_SCALE < (self.rates[y] * SAMPLE_SCALE).astype(np.uint64)
+            if self.part == 'val' and self.val_rows is not None:
+                keep &= np.cumsum(keep) <= self.val_rows - taken
+            if not keep.any():
+                continue
+            taken += int(keep.sum())
+            y = y[keep]
+            yield build_matrix(chunk[keep], self.schema), y, self.weights[y]
+            if self.part == 'val' and self.val_rows is not None and taken >= self.val_rows:
+                return
+
+    def next(self, input_data):
+        if self._batches is None:
+            self._batches = self._iter_batches()
+        batch = next(self._batches, None)
+        if batch is None:
+            return False
+        X, y, w = batch
+        input_data(data=X, label=y, weight=w, feature_names=self.schema)
+        return True
+
+    def reset(self):
+        self._batches = None
+
+
+# --- CHECKPOINTS Y LOG POR ROUND ---
+class RoundLog(xgb.callback.TrainingCallback):
+    def __init__(self, trainer, n_rows, verbose=True):
+        super().__init__()
+        self.trainer = trainer
+        self.n_rows = n_rows
+        self.verbose = verbose
+        self._start = None
+
+    def before_iteration(self, model, epoch, evals_log):
+        self._start = time.perf_counter()
+        return False
+
+    def after_iteration(self, model, epoch, evals_log):
+        seconds = time.perf_counter() - self._start
+        rec = {'round': model.num_boosted_rounds(), 'seconds': seconds,
+               'rows_per_s': self.n_rows / seconds, 'rss_mb': rss_mb()}
+        for metric, values in evals_log.get('val', {}).items():
+            rec[f'val_{metric}'] = float(values[-1])
+        self.trainer.log_round(rec)
+        if rec['round'] % self.trainer.checkpoint_every == 0:
+            self.trainer.save_checkpoint(model)
+        if self.verbose:
+            metrics = '  '.join(f"{k[4:]} {v:.4f}" for k, v in rec.items() if k.startswith('val_'))
+            print(f"  round {rec['round']:4d}  {seconds:6.2f} s  {rec['rows_per_s']:>10,.0f} filas/s  "
+                  f"RSS {rec['rss_mb']:6.0f} MB  {metrics}")
+        return False
+
+
+class ExternalTrainer:
+    def __init__(self, source=SOURCE_PATH, genres=GENEROS, params=None, rounds=None, batch_rows=BATCH_ROWS,
+                 class_weight='balanced', matrix='extmem', max_bin=MAX_BIN, val_permil=VAL_PERMIL,
+                 val_rows=VAL_ROWS, max_rows=None, checkpoint_every=CHECKPOINT_EVERY, n_threads=None,
+                 cache_dir=CACHE_DIR, seed=42):
+        if matrix not in MATRICES:
+            raise ValueError(f"matrix debe ser uno de {MATRICES}")
+        self.source = source
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.rounds = rounds or self.params['n_estimators']
+        self.batch_rows = batch_rows
+        self.class_weight = class_weight
+        self.matrix = matrix
+        self.max_bin = max_bin
+        self.val_permil = val_permil
+        self.val_rows = val_rows
+        self.max_rows = max_rows
+        self.checkpoint_every = checkpoint_every
+        self.n_threads = n_threads or os.cpu_count() or 1
+        self.seed = seed
+
+        self.counts = count_genres(source, batch_rows)
+        # Mismo orden que el LabelEncoder del notebook (alfabético); None = todos
+        self.classes = sorted(self.counts if genres is None else {g.lower() for g in genres})
+        missing = [g for g in self.classes if not self.counts.get(g)]
+        if missing:
+            raise ValueError(f"Géneros sin filas en {source}: {missing}")
+        self.rates = sample_rates(self.counts, self.classes, max_rows)
+        self.weights = class_weights(self.counts, self.classes, class_weight, self.rates)
+        self.run_dir = os.path.join(cache_dir, self._run_key())
+
+    def _source_fingerprint(self):
+        if os.path.isdir(self.source):
+            m = read_manifest(self.source)
+            return [m.get('source_sha1'), m['rows_out'], m['shards']]
+        return file_hash(self.source)
+
+    def _run_key(self):
+        # Sin el nº de rounds: pedir más continúa el mismo booster
+        payload = json.dumps([TRAINING_VERSION, os.path.abspath(self.source), self._source_fingerprint(),
+                              self.classes, self.class_weight, self.params, self.max_bin, self.val_permil,
+                              self.val_rows, self.max_rows, self.seed], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+    # --- persistencia (reanudación) ---
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.run_dir, 'checkpoint.ubj')
+
+    def save_checkpoint(self, booster):
+        tmp = self.checkpoint_path + '.tmp.ubj'
+        booster.save_model(tmp)
+        os.replace(tmp, self.checkpoint_path)
+        self._checkpoint_round = booster.num_boosted_rounds()
+
+    def log_round(self, rec):
+        with open(os.path.join(self.run_dir, 'rounds.jsonl'), 'a') as f:
+            f.write(json.dumps(rec) + '\n')
+
+    def _resume(self):
+        # -> (booster del último checkpoint o None, rounds ya hechos). Las
+        # líneas del log posteriores al checkpoint se descartan (se repiten)
+        booster, done = None, 0
+        if os.path.exists(self.checkpoint_path):
+            booster = xgb.Booster(model_file=self.checkpoint_path)
+            booster.set_param({'nthread': self.n_threads})
+            done = booster.num_boosted_rounds()
+        path = os.path.join(self.run_dir, 'rounds.jsonl')
+        if os.path.exists(path):
+            with open(path) as f:
+                kept = [line for line in f if json.loads(line)['round'] <= done]
+            with open(path, 'w') as f:
+                f.writelines(kept)
+        return booster, done
+
+    def rounds_log(self):
+        path = os.path.join(self.run_dir, 'rounds.jsonl')
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    # --- entrenamiento ---
+    def _matrices(self, cache_prefix):
+        common = dict(source=self.source, classes=self.classes, weights=self.weights, batch_rows=self.batch_rows,
+                      val_permil=self.val_permil, val_rows=self.val_rows)
+        if self.matrix == 'extmem':
+            dtrain = xgb.ExtMemQuantileDMatrix(BatchIter(part='train', rates=self.rates, cache_prefix=cache_prefix,
+                                                         **common), max_bin=self.max_bin, nthread=self.n_threads)
+        else:
+            dtrain = xgb.QuantileDMatrix(BatchIter(part='train', rates=self.rates, **common), max_bin=self.max_bin,
+                                         nthread=self.n_threads)
+        dval = xgb.QuantileDMatrix(BatchIter(part='val', **common), ref=dtrain, nthread=self.n_threads)
+        return dtrain, dval
+
+    def run(self, verbose=True):
+        os.makedirs(self.run_dir, exist_ok=True)
+        with open(os.path.join(self.run_dir, 'config.json'), 'w') as f:
+            json.dump({'source': os.path.abspath(self.source), 'classes': self.classes, 'params': self.params,
+                       'class_weight': self.class_weight, 'weights': self.weights.tolist(),
+                       'sample_rates': self.rates.tolist(), 'max_bin': self.max_bin, 'val_permil': self.val_permil,
+                       'val_rows': self.val_rows, 'max_rows': self.max_rows}, f, indent=2)
+        booster, done = self._resume()
+        self._checkpoint_round = done
+        if verbose and done:
+            print(f"Reanudando desde el checkpoint del round {done}")
+
+        # Caché de páginas de ExtMemQuantileDMatrix: se borra al terminar
+        cache_prefix = os.path.join(self.run_dir, 'pages', 'train')
+        os.makedirs(os.path.dirname(cache_prefix), exist_ok=True)
+        start = time.perf_counter()
+        dtrain, dval = self._matrices(cache_prefix)
+        build_s = time.perf_counter() - start
+        n_train, n_val = dtrain.num_row(), dval.num_row()
+        if verbose:
+            print(f"{n_train:,} filas de train + {n_val:,} de validación, {len(self.classes)} clases, "
+                  f"matriz {self.matrix} en {build_s:.1f} s (RSS {rss_mb():.0f} MB)")
+
+        start = time.perf_counter()
+        try:
+            if self.rounds > done:
+                config = {k: v for k, v in self.params.items() if k != 'n_estimators'}
+                params = booster_params(config, len(self.classes), self.n_threads, self.seed)
+                params['max_bin'] = self.max_bin
+                params['eval_metric'] = ['mlogloss', 'merror']
+                booster = xgb.train(params, dtrain, num_boost_round=self.rounds - done, evals=[(dval, 'val')],
+                                    xgb_model=booster, verbose_eval=False,
+                                    callbacks=[RoundLog(self, n_train, verbose)])
+                if booster.num_boosted_rounds() != self._checkpoint_round:
+                    self.save_checkpoint(booster)
+        finally:
+            del dtrain, dval
+            shutil.rmtree(os.path.dirname(cache_prefix), ignore_errors=True)
+        train_s = time.perf_counter() - start
+
+        rounds = self.rounds_log()
+        last = rounds[-1] if rounds else {}
+        result = {
+            'run_dir': self.run_dir,
+            'classes': self.classes,
+            'class_counts': {c: self.counts[c] for c in self.classes},
+            'weights': self.weights.tolist(),
+            'sample_rates': self.rates.tolist(),
+            'rows_train': n_train,
+            'rows_val': n_val,
+            'matrix': self.matrix,
+            'rounds': booster.num_boosted_rounds(),
+            'resumed_from': done,
+            'build_seconds': build_s,
+            'train_seconds': train_s,
+            'rows_per_s': float(np.median([r['rows_per_s'] for r in rounds])) if rounds else None,
+            'peak_rss_mb': max((r['rss_mb'] for r in rounds), default=rss_mb()),
+            'val_mlogloss': last.get('val_mlogloss'),
+            'val_accuracy': 1 - last['val_merror'] if 'val_merror' in last else None,
+        }
+        with open(os.path.join(self.run_dir, 'result.json'), 'w') as f:
+            json.dump(result, f, indent=2)
+        return booster, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Entrena XGBoost por bloques (shards o CSV) sin cargar el dataset.")
+    parser.add_argument('source', nargs='?', default=SOURCE_PATH, help="directorio de ingest.py o CSV en bruto")
+    parser.add_argument('--genres', nargs='+', default=GENEROS)
+    parser.add_argument('--all-genres', action='store_true', help="todos los géneros del dataset")
+    parser.add_argument('--params', default=None, help="JSON o informe de tuning.py (por defecto los del modelo de la app)")
+    parser.add_argument('--rounds', type=int, default=None)
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS)
+    parser.add_argument('--class-weight', choices=('balanced', 'none'), default='balanced')
+    parser.add_argument('--matrix', choices=MATRICES, default='extmem')
+    parser.add_argument('--max-bin', type=int, default=MAX_BIN)
+    parser.add_argument('--val-permil', type=int, default=VAL_PERMIL)
+    parser.add_argument('--val-rows', type=int, default=VAL_ROWS)
+    parser.add_argument('--max-rows', type=int, default=None, help="presupuesto de filas de train (muestreo por clase)")
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--publish', action='store_true', help="registra el modelo (model_registry.py) sin activarlo")
+    args = parser.parse_args(argv)
+
+    trainer = ExternalTrainer(args.source, genres=None if args.all_genres else args.genres,
+                              params=load_params(args.params), rounds=args.rounds, batch_rows=args.batch_rows,
+                              class_weight=args.class_weight, matrix=args.matrix, max_bin=args.max_bin,
+                              val_permil=args.val_permil, val_rows=args.val_rows, max_rows=args.max_rows,
+                              checkpoint_every=args.checkpoint_every, n_threads=args.threads,
+                              cache_dir=args.cache_dir)
+    booster, result = trainer.run()
+    print(f"\n{result['rounds']} rounds en {result['train_seconds']:.1f} s "
+          f"(mediana {result['rows_per_s']:,.0f} filas/s por round), pico de RSS {result['peak_rss_mb']:.0f} MB")
+    if result['val_accuracy'] is not None:
+        print(f"  validación: mlogloss {result['val_mlogloss']:.4f}, precisión {result['val_accuracy']:.2%}")
+    print(f"  modelo: {trainer.checkpoint_path}")
+
+    if args.publish:
+        from model_registry import ModelRegistry
+        # Nombres como en la app ('hard-rock' -> 'Hard-Rock')
+        version = ModelRegistry().publish(booster, [c.title() for c in result['classes']],
+                                          metrics={'accuracy': result['val_accuracy'], 'n_eval': result['rows_val']},
+                                          notes=f"external_training {os.path.basename(trainer.run_dir)}",
+                                          activate=False)
+        print(f"  publicado como {version} (sin activar)")
+
+
+if __name__ == '__main__':
+    main()
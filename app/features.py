@@ -0,0 +1,68 @@
+import numpy as np
+
+# --- FEATURE ENGINEERING COMPARTIDO ---
+# Única definición de las variables del modelo. La usan la app, el índice
+# KNN, los trabajos por lotes y el notebook de entrenamiento, así que nunca
+# pueden divergir.
+#
+# build_matrix() convierte las columnas de audio en una matriz NumPy
+# C-contigua (float32 por defecto) en una sola pasada vectorizada, sin
+# DataFrames intermedios. Acepta un DataFrame, un dict de arrays o una sola
+# fila (pd.Series / dict de escalares).
+
+# Columnas de audio "en bruto" tal y como vienen del dataset de Spotify
+COLUMNAS_AUDIO = [
+    'popularity', 'duration_ms', 'danceability', 'energy', 'key', 'loudness',
+    'mode', 'speechiness', 'acousticness', 'instrumentalness', 'liveness',
+    'valence', 'tempo', 'time_signature',
+]
+
+# Variables sintéticas: nombre -> (columnas de las que depende, fórmula)
+FEATURES_DERIVADAS = {
+    'intensity':      (('energy', 'loudness'),      lambda c: c['energy'] * c['loudness']),
+    'dance_tempo':    (('danceability', 'tempo'),   lambda c: c['danceability'] / (c['tempo'] + 1)),
+    'chill_factor':   (('valence', 'energy'),       lambda c: c['valence'] - c['energy']),
+    'electric_ratio': (('energy', 'acousticness'),  lambda c: c['energy'] / (c['acousticness'] + 0.01)),
+}
+
+# Esquema (ordenado) con el que se entrenó modelo_xgboost_final.pkl
+FEATURE_SCHEMA = COLUMNAS_AUDIO + ['intensity', 'dance_tempo', 'chill_factor']
+
+# Esquema completo del notebook (incluye electric_ratio)
+FEATURE_SCHEMA_COMPLETO = FEATURE_SCHEMA + ['electric_ratio']
+
+
+def required_columns(schema=FEATURE_SCHEMA):
+    # Columnas en bruto necesarias para construir el esquema, sin repetir
+    needed = []
+    for name in schema:
+        deps = FEATURES_DERIVADAS[name][0] if name in FEATURES_DERIVADAS else (name,)
+        for dep in deps:
+            if dep not in needed:
+                needed.append(dep)
+    return needed
+
+
+def _raw_columns(data, names):
+    # Cálculo en float64 (igual que pandas) y conversión final al dtype pedido
+    return {c: np.atleast_1d(np.asarray(data[c], dtype=np.float64)) for c in names}
+
+
+def build_matrix(data, schema=FEATURE_SCHEMA, dtype=np.float32):
+    cols = _raw_columns(data, required_columns(schema))
+    n_rows = len(next(iter(cols.values())))
+
+    X = np.empty((n_rows, len(schema)), dtype=dtype, order='C')
+    for j, name in enumerate(schema):
+        if name in FEATURES_DERIVADAS:
+            X[:, j] = FEATURES_DERIVADAS[name][1](cols)
+        else:
+            X[:, j] = cols[name]
+    return X
+
+
+def add_features(df, derived=('intensity', 'dance_tempo', 'chill_factor', 'electric_ratio')):
+    # Versión DataFrame para el notebook (GridSearchCV, gráficos...)
+    deps = [c for name in derived for c in FEATURES_DERIVADAS[name][0]]
+    cols = _raw_columns(df, dict.fromkeys(deps))
+    return df.assign(**{name: FEATURES_DERIVADAS[name][1](cols) for name in derived})
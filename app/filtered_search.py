@@ -0,0 +1,283 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from ann import _sq_norms, _topk
+
+# --- BÚSQUEDA DE SIMILARES CON FILTROS Y VARIAS SEMILLAS ---
+# "Similares, pero solo Dance", "similares a estas tres canciones",
+# "popularidad entre 40 y 80, sin explícitas". Filtrar después de kneighbors
+# devuelve pocos resultados (o obliga a pedir un k enorme); aquí los filtros
+# se aplican antes de medir distancias:
+#   - Particiones por género PREDICHO (etiquetas del clasificador): las filas
+#     de cada género son contiguas, así que filtrar por género es recorrer un
+#     rango del array, sin copias.
+#   - Dentro de cada partición, filas ordenadas por popularity (y tempo) y
+#     agrupadas en bloques de BLOCK_ROWS con el mínimo / máximo de cada
+#     columna filtrable: un filtro por rango descarta bloques enteros sin
+#     mirar sus filas; solo los bloques del borde se filtran fila a fila.
+#   - Varias semillas: 'centroid' busca alrededor de la media de las semillas
+#     (una sola consulta); 'min' puntúa cada candidata con su distancia a la
+#     semilla más cercana (una GEMM semillas x candidatas y un mínimo).
+#
+# Distancias en el mismo espacio estandarizado que RecommendationIndex; los
+# ids devueltos son filas del catálogo original. Se guarda en disco (.npy con
+# mmap + manifest.json) por versión del catálogo y del modelo.
+
+INDEX_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'filtered_index')
+
+FILTER_COLUMNS = ['popularity', 'tempo', 'explicit']
+BLOCK_ROWS = 512
+# Con más tramos contiguos que esto, las filas candidatas se reúnen en un array (una GEMM)
+MAX_RANGES = 16
+
+
+def _ranges(selected, block_start):
+    # Bloques seleccionados -> tramos contiguos de filas [a, b)
+    edges = np.diff(np.concatenate([[0], selected.astype(np.int8), [0]]))
+    first, last = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    return block_start[first], block_start[last]
+
+
+def _concat_ranges(starts, stops):
+    # np.concatenate([np.arange(a, b) ...]) sin bucle
+    lengths = stops - starts
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return offsets + np.arange(int(lengths.sum()))
+
+
+class FilteredIndex:
+    def __init__(self, X, row_ids, values, block_start, block_label, block_min, block_max, manifest=None):
+        self.X = X                        # (n, d) X_scaled en el orden de las particiones
+        self.row_ids = row_ids            # posición -> fila del catálogo original
+        self.values = values              # columna filtrable -> valores (mismo orden que X)
+        self.block_start = block_start    # (n_bloques + 1,) inicio de cada bloque
+        self.block_label = block_label    # (n_bloques,) género predicho del bloque
+        self.block_min = block_min        # (n_bloques, n_columnas)
+        self.block_max = block_max
+        self.manifest = manifest or {}
+        self.classes = list(self.manifest.get('classes', []))
+        self.filter_columns = list(self.manifest.get('filter_columns', values))
+        self.sq_norms = _sq_norms(X)
+        self._position_of = None
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    @classmethod
+    def build(cls, knn_index, labels, df, classes=None, columns=FILTER_COLUMNS, block_rows=BLOCK_ROWS):
+        labels = np.asarray(labels)
+        columns = [c for c in columns if c in df.columns]
+        values = {c: np.asarray(df[c].to_numpy()) for c in columns}
+        # Orden: género predicho, luego popularity, luego tempo (lexsort: la última clave manda)
+        order = np.lexsort([values[c] for c in reversed(columns[:2])] + [labels])
+        sorted_labels = labels[order]
+
+        # Bloques que nunca cruzan de un género a otro
+        part_edges = np.flatnonzero(np.diff(sorted_labels)) + 1
+        starts = []
+        for a, b in zip(np.concatenate([[0], part_edges]), np.concatenate([part_edges, [len(order)]])):
+            starts.extend(range(int(a), int(b), block_rows))
+        block_start = np.asarray(starts + [len(order)], dtype=np.int64)
+
+        sorted_values = {c: v[order] for c, v in values.items()}
+        as_float = [sorted_values[c].astype(np.float64) for c in columns]
+        if len(order):
+            block_min = np.stack([np.minimum.reduceat(v, block_start[:-1]) for v in as_float], axis=1)
+            block_max = np.stack([np.maximum.reduceat(v, block_start[:-1]) for v in as_float], axis=1)
+        else:
+            block_min = block_max = np.empty((0, len(columns)))
+
+        manifest = {
+            'index_version': INDEX_VERSION,
+            'dataset_hash': knn_index.manifest.get('dataset_hash'),
+            'n_rows': int(len(order)),
+            'classes': list(classes) if classes is not None else sorted(int(c) for c in np.unique(labels)),
+            'filter_columns': columns,
+            'block_rows': int(block_rows),
+            'created_at': time.time(),
+        }
+        return cls(np.ascontiguousarray(np.asarray(knn_index.X_scaled)[order]), order.astype(np.int32),
+                   sorted_values, block_start, sorted_labels[block_start[:-1]].astype(np.int16),
+                   block_min, block_max, manifest)
+
+    def save(self, directory):
+        # Escritura atómica: otro proceso nunca ve un índice a medias
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp-filtered-')
+        try:
+            arrays = {'X': self.X, 'row_ids': self.row_ids, 'block_start': self.block_start,
+                      'block_label': self.block_label, 'block_min': self.block_min, 'block_max': self.block_max}
+            arrays.update({f'values_{c}': v for c, v in self.values.items()})
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmp_dir, f'{name}.npy'), arr)
+            with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+                json.dump(self.manifest, f, indent=2)
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+            os.replace(tmp_dir, directory)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest.get('index_version') != INDEX_VERSION:
+            raise ValueError(f"Versión de índice filtrado no soportada: {manifest.get('index_version')}")
+
+        def arr(name):
+            return np.asarray(np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r'))
+
+        values = {c: arr(f'values_{c}') for c in manifest['filter_columns']}
+        return cls(arr('X'), arr('row_ids'), values, arr('block_start'), arr('block_label'),
+                   arr('block_min'), arr('block_max'), manifest)
+
+    # --- consultas ---
+    def position_of(self, rows):
+        # Fila del catálogo -> posición en el índice (se calcula la primera vez)
+        if self._position_of is None:
+            position_of = np.empty(len(self.row_ids), dtype=np.int32)
+            position_of[self.row_ids] = np.arange(len(self.row_ids), dtype=np.int32)
+            self._position_of = position_of
+        return self._position_of[np.asarray(rows, dtype=np.int64)]
+
+    def _label_ids(self, genres):
+        # Acepta nombres de clase ('Dance') o etiquetas numéricas
+        ids = []
+        for g in np.atleast_1d(genres):
+            if isinstance(g, str):
+                if g not in self.classes:
+                    raise ValueError(f"Género desconocido: {g} (disponibles: {self.classes})")
+                ids.append(self.classes.index(g))
+            else:
+                ids.append(int(g))
+        return ids
+
+    def _bounds(self, filters):
+        # {'popularity': (40, None), 'explicit': False} -> [(columna, lo, hi)] inclusivos
+        bounds = []
+        for col, spec in (filters or {}).items():
+            if col not in self.values:
+                raise ValueError(f"Columna no filtrable: {col} (disponibles: {self.filter_columns})")
+            if isinstance(spec, (tuple, list)):
+                lo, hi = spec
+            else:
+                lo = hi = spec
+            lo = -np.inf if lo is None else float(lo)
+            hi = np.inf if hi is None else float(hi)
+            bounds.append((col, lo, hi))
+        return bounds
+
+    def select_blocks(self, genres=None, filters=None):
+        # -> (bloques a recorrer, bloques que necesitan filtrar fila a fila, límites)
+        bounds = self._bounds(filters)
+        keep = np.ones(len(self.block_label), dtype=bool)
+        if genres is not None:
+            keep &= np.isin(self.block_label, self._label_ids(genres))
+        partial = np.zeros_like(keep)
+        for col, lo, hi in bounds:
+            j = self.filter_columns.index(col)
+            bmin, bmax = self.block_min[:, j], self.block_max[:, j]
+            keep &= (bmax >= lo) & (bmin <= hi)
+            partial |= (bmin < lo) | (bmax > hi)
+        return keep, keep & partial, bounds
+
+    def _candidates(self, genres, filters):
+        # Posiciones candidatas: tramos contiguos (slices) si son pocos; si no, un array
+        keep, partial, bounds = self.select_blocks(genres, filters)
+        starts, stops = _ranges(keep, self.block_start)
+        if not bounds or not partial.any():
+            if len(starts) <= MAX_RANGES:
+                return [slice(int(a), int(b)) for a, b in zip(starts, stops)], bounds
+            return [_concat_ranges(starts, stops)], bounds
+        # Solo las filas de los bloques del borde se comprueban una a una
+        positions = _concat_ranges(starts, stops)
+        mask = np.ones(len(positions), dtype=bool)
+        check = np.repeat(partial[keep], np.diff(self.block_start)[keep])
+        for col, lo, hi in bounds:
+            v = self.values[col][positions[check]]
+            mask[check] &= (v >= lo) & (v <= hi)
+        return [positions[mask]], bounds
+
+    def search(self, seeds, k=4, genres=None, filters=None, exclude=None, fusion='centroid'):
+        # seeds: (m, d) en el espacio escalado (RecommendationIndex.transform o X_scaled[filas])
+        # exclude: filas del catálogo que no pueden salir (p. ej. las propias semillas)
+        # -> (distancias, filas del catálogo), de la más cercana a la más lejana
+        Q = np.atleast_2d(np.asarray(seeds, dtype=np.float64))
+        if fusion == 'centroid':
+            Q = Q.mean(axis=0, keepdims=True)
+        elif fusion != 'min':
+            raise ValueError(f"Fusión desconocida: {fusion} (usa 'centroid' o 'min')")
+        q_norms = _sq_norms(Q)
+
+        chunks, _ = self._candidates(genres, filters)
+        cand_d, cand_p = [], []
+        for chunk in chunks:
+            positions = np.arange(chunk.start, chunk.stop) if isinstance(chunk, slice) else chunk
+            if not len(positions):
+                continue
+            Xc = self.X[chunk]
+            d2 = self.sq_norms[chunk][None, :] - 2.0 * (Q @ Xc.T)
+            d2 += q_norms[:, None]
+            cand_d.append(d2.min(axis=0) if len(Q) > 1 else d2[0])
+            cand_p.append(positions)
+        if not cand_d:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        d2 = np.concatenate(cand_d)
+        positions = np.concatenate(cand_p)
+
+        # Top-(k + excluidas) y después se quitan las excluidas: sin recorrer todas las candidatas
+        exclude = np.asarray([] if exclude is None else exclude, dtype=np.int64)
+        n_top = min(k + len(exclude), len(d2))
+        if n_top == 0:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        if n_top < len(d2):
+            top = np.argpartition(d2, n_top - 1)[:n_top]
+            d2, positions = d2[top], positions[top]
+        rows = self.row_ids[positions].astype(np.int64)
+        keep = ~np.isin(rows, exclude)
+        d2, rows = d2[keep], rows[keep]
+        best_d, best_i = _topk(d2[None, :], rows, min(k, len(d2)))
+        return np.sqrt(np.maximum(best_d[0], 0)), best_i[0]
+
+    def similar(self, rows, k=4, genres=None, filters=None, fusion='centroid'):
+        # Semillas del catálogo (una o varias filas); ellas mismas quedan fuera del resultado
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        seeds = self.X[self.position_of(rows)]
+        return self.search(seeds, k, genres=genres, filters=filters, exclude=rows, fusion=fusion)
+
+
+def filtered_index_dir(dataset_hash, model_version, cache_dir=CACHE_DIR):
+    # Las particiones dependen de las etiquetas: una versión por (catálogo, modelo)
+    return os.path.join(cache_dir, f'{dataset_hash[:16]}_{str(model_version)[:16]}')
+
+
+def load_or_build_filtered_index(knn_index, labels, df, model_version, classes=None, cache_dir=CACHE_DIR):
+    # labels: géneros predichos del catálogo, o una función que los calcula
+    # (solo se llama si hay que construir el índice)
+    dataset_hash = knn_index.manifest.get('dataset_hash')
+    directory = filtered_index_dir(dataset_hash or 'memoria', model_version, cache_dir)
+    try:
+        index = FilteredIndex.load(directory)
+        m = index.manifest
+        if m.get('n_rows') == len(df) and m.get('dataset_hash') == dataset_hash and dataset_hash:
+            return index
+    except (FileNotFoundError, ValueError, KeyError, json.JSONDecodeError):
+        pass
+    if callable(labels):
+        labels = labels()
+    index = FilteredIndex.build(knn_index, labels, df, classes=classes)
+    try:
+        index.save(directory)
+        return FilteredIndex.load(directory)
+    except OSError:
+        # Sin permisos de escritura: seguimos con el índice en memoria
+        return index
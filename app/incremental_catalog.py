@@ -0,0 +1,855 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo el lock entre hilos
+    fcntl = None
+
+from ann import ExactSearch, IVFIndex, QuantizedSearch
+from catalog_cache import _read_manifest, _save_columns, _write_manifest, load_cache, parse_csv
+from features import FEATURE_SCHEMA, build_matrix
+from recommender import ANN_MIN_ROWS, CACHE_DIR as INDEX_CACHE_DIR, COLUMNAS_BASICAS, INDEX_VERSION, QUANT_MIN_ROWS
+from recommender import RecommendationIndex
+
+# --- CATÁLOGO INCREMENTAL (SEGMENTOS + TOMBSTONES) ---
+# Añadir canciones ya no obliga a reemplazar el CSV y reajustar
+# StandardScaler + índice sobre todo el catálogo:
+#   - add(df): las filas nuevas se escriben como un segmento más (columnas
+#     como en catalog_cache.py + vectores escalados .npy) y se buscan con su
+#     propio backend. Coste O(filas nuevas).
+#   - Estadísticas del escalado (media / varianza) con Welford por lotes: se
+#     actualizan con cada alta o baja sin releer el catálogo.
+#   - Los vectores guardados usan una estandarización "congelada". Solo se
+#     re-estandariza (en la compactación) cuando las estadísticas reales se
+#     han desviado más de DRIFT_TOLERANCE.
+#   - delete(ids): tombstones (log binario append-only). Las consultas las
+#     filtran; la compactación las elimina físicamente.
+#   - Compactación en segundo plano: funde los segmentos en uno cuando hay
+#     demasiados, demasiados tombstones o deriva del escalado. Las consultas
+#     siguen usando los segmentos viejos hasta el cambio (bajo lock).
+#   - Varios procesos (workers de Streamlit, servidor) abren y sincronizan el
+#     mismo catálogo: toda escritura (crear, abrir, altas, bajas, sync,
+#     compactar) va bajo catalog_lock, un flock sobre <carpeta>.lock (junto a
+#     la carpeta: create() la borra entera), y antes de escribir se recarga
+#     lo que otro proceso haya cambiado en disco (campo 'revision' del
+#     manifest). Los temporales llevan nombre único por escritor.
+#
+# Cada fila tiene un id estable (orden de llegada) que no cambia al compactar:
+# recommend() devuelve ids y rows(ids) las filas del catálogo.
+#
+# La app (resources.py, server.py) usa load_or_build_incremental_index: un
+# catálogo incremental por dataset que se sincroniza con el CSV por track_id
+# (las canciones nuevas van a un segmento, las que faltan a tombstones; un
+# track_id que ya estaba se considera la misma canción, y un track_id
+# repetido en el CSV son tantas filas como apariciones, igual que en el índice
+# exacto). Al crearlo, el escalado es el de StandardScaler sobre el CSV
+# entero. IncrementalIndex lo expone con la interfaz de RecommendationIndex
+# (filas del DataFrame de la app): cambiar el catálogo ya no reajusta el
+# escalado ni reconstruye el índice entero.
+#
+#   python app/incremental_catalog.py init --dataset dataset/dataset_demo_balanced.csv
+#   python app/incremental_catalog.py add nuevas.csv
+#   python app/incremental_catalog.py delete --track-id 0abc... 1def...
+#   python app/incremental_catalog.py compact
+#   python app/incremental_catalog.py stats
+
+CATALOG_VERSION = 2
+CATALOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'incremental_catalog')
+
+# Política de compactación
+MAX_SEGMENTS = 8
+MAX_TOMBSTONE_RATIO = 0.10
+# Re-estandarizar si la media se mueve más de un 5% de la desviación o la desviación más de un 5%
+DRIFT_TOLERANCE = 0.05
+
+
+class _DirLock:
+    # flock entre procesos + RLock entre hilos, re-entrante en el mismo hilo
+    # (sync() llama a add/delete/compact, que también lo piden)
+    def __init__(self, path):
+        self.path = path
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._rlock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+            except BaseException:
+                self._rlock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._rlock.release()
+
+
+_DIR_LOCKS = {}
+_DIR_LOCKS_GUARD = threading.Lock()
+
+
+def catalog_lock(directory):
+    # Un lock por carpeta de catálogo y proceso
+    path = os.path.abspath(directory).rstrip(os.sep) + '.lock'
+    with _DIR_LOCKS_GUARD:
+        return _DIR_LOCKS.setdefault(path, _DirLock(path))
+
+
+def _read_tombstones(directory, n_tombstones):
+    # Tombstones confirmados = los que cuenta el manifest (una cola sin confirmar se descarta)
+    path = os.path.join(directory, 'tombstones.bin')
+    tombstones = np.fromfile(path, dtype=np.int64) if os.path.exists(path) else np.empty(0, np.int64)
+    if len(tombstones) > n_tombstones:
+        tombstones = tombstones[:n_tombstones]
+        with open(path, 'r+b') as f:
+            f.truncate(tombstones.nbytes)
+    return tombstones
+
+
+class RunningStats:
+    # Media / M2 por columna. Un lote se combina con la fórmula de Chan (Welford
+    # por lotes), así que añadir o quitar n filas cuesta O(n)
+    def __init__(self, n_features, count=0, mean=None, m2=None):
+        self.count = int(count)
+        self.mean = np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.m2 = np.zeros(n_features) if m2 is None else np.asarray(m2, dtype=np.float64)
+
+    @staticmethod
+    def _batch(X):
+        X = np.asarray(X, dtype=np.float64)
+        mean = X.mean(axis=0)
+        return len(X), mean, ((X - mean) ** 2).sum(axis=0)
+
+    def update(self, X):
+        if len(X) == 0:
+            return self
+        n_b, mean_b, m2_b = self._batch(X)
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * (n_b / n)
+        self.m2 = self.m2 + m2_b + delta ** 2 * (self.count * n_b / n)
+        self.count = n
+        return self
+
+    def remove(self, X):
+        if len(X) == 0:
+            return self
+        n_b, mean_b, m2_b = self._batch(X)
+        n_a = self.count - n_b
+        if n_a <= 0:
+            self.count, self.mean, self.m2 = 0, np.zeros_like(self.mean), np.zeros_like(self.m2)
+            return self
+        mean_a = (self.count * self.mean - n_b * mean_b) / n_a
+        delta = mean_b - mean_a
+        self.m2 = np.maximum(self.m2 - m2_b - delta ** 2 * (n_a * n_b / self.count), 0)
+        self.mean = mean_a
+        self.count = n_a
+        return self
+
+    @property
+    def var(self):
+        # Varianza poblacional, como StandardScaler
+        return self.m2 / max(self.count, 1)
+
+    def scale(self):
+        scale = np.sqrt(self.var)
+        scale[scale < 10 * np.finfo(np.float64).eps] = 1.0
+        return scale
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean.tolist(), 'm2': self.m2.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(len(d['mean']), d['count'], d['mean'], d['m2'])
+
+
+def drift(stats, mean, scale):
+    # Desviación de las estadísticas reales respecto a la estandarización congelada
+    if stats.count == 0:
+        return 0.0
+    return float(max(np.max(np.abs(stats.mean - mean) / scale), np.max(np.abs(stats.scale() / scale - 1))))
+
+
+def _restandardize(vectors, old_mean, old_scale, new_mean, new_scale):
+    # Afín por columna: no hace falta volver a los datos en bruto
+    return (np.asarray(vectors) * old_scale + (old_mean - new_mean)) / new_scale
+
+
+class Segment:
+    def __init__(self, name, directory, ids, vectors):
+        self.name = name
+        self.directory = directory
+        self.ids = ids             # ids estables, crecientes
+        self.vectors = vectors     # escalados con la estandarización del catálogo
+        self._frame = None
+        self.backend = _backend(vectors, directory)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def write(cls, directory, name, df, ids, vectors):
+        # Escritura atómica: carpeta temporal (única por escritor) + rename
+        path = os.path.join(directory, name)
+        tmp_dir = tempfile.mkdtemp(dir=directory, prefix=f'.tmp-{name}-')
+        try:
+            columns = _save_columns(df.reset_index(drop=True), tmp_dir)
+            np.save(os.path.join(tmp_dir, 'ids.npy'), np.asarray(ids, dtype=np.int64))
+            np.save(os.path.join(tmp_dir, 'vectors.npy'), np.ascontiguousarray(vectors, dtype=np.float64))
+            _write_manifest(tmp_dir, {'n_rows': len(ids), 'columns': columns})
+            if len(ids) >= ANN_MIN_ROWS:
+                IVFIndex.build(np.load(os.path.join(tmp_dir, 'vectors.npy'))).save(os.path.join(tmp_dir, 'ivf'))
+            elif len(ids) >= QUANT_MIN_ROWS:
+                QuantizedSearch.build(np.load(os.path.join(tmp_dir, 'vectors.npy'))).save(os.path.join(tmp_dir, 'sq8'))
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_dir, path)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return cls.load(directory, name)
+
+    @classmethod
+    def load(cls, directory, name):
+        path = os.path.join(directory, name)
+        ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode='r')
+        vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        return cls(name, path, ids, vectors)
+
+    @property
+    def frame(self):
+        # Columnas del catálogo, abiertas con mmap la primera vez que se piden
+        if self._frame is None:
+            self._frame = load_cache(self.directory)
+        return self._frame
+
+    def positions(self, ids):
+        # -> posición de cada id en el segmento, -1 si no está
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self):
+            return np.full(len(ids), -1)
+        pos = np.searchsorted(self.ids, ids).clip(0, len(self) - 1)
+        return np.where(np.asarray(self.ids)[pos] == ids, pos, -1)
+
+    def dead_count(self, dead):
+        # Tombstones dentro del rango de ids del segmento (dead ordenado)
+        if not len(self) or not len(dead):
+            return 0
+        return int(np.searchsorted(dead, self.ids[-1], side='right') - np.searchsorted(dead, self.ids[0]))
+
+
+def _backend(vectors, directory):
+    if len(vectors) >= ANN_MIN_ROWS and os.path.exists(os.path.join(directory, 'ivf', 'ivf.json')):
+        return IVFIndex.load(os.path.join(directory, 'ivf'))
+    if len(vectors) >= QUANT_MIN_ROWS and os.path.exists(os.path.join(directory, 'sq8', 'sq8.json')):
+        return QuantizedSearch.load(os.path.join(directory, 'sq8'))
+    return ExactSearch(vectors)
+
+
+class IncrementalCatalog:
+    def __init__(self, directory, manifest, segments, tombstones):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._compactor = None
+        self.compactions = 0
+        self._set_state(manifest, segments, tombstones)
+
+    def _set_state(self, manifest, segments, tombstones):
+        self.columns = list(manifest['columns'])
+        self.mean = np.asarray(manifest['mean'], dtype=np.float64)
+        self.scale = np.asarray(manifest['scale'], dtype=np.float64)
+        self.stats = RunningStats.from_dict(manifest['stats'])
+        self.next_id = manifest['next_id']
+        self.next_segment = manifest['next_segment']
+        self.generation = manifest['generation']
+        self.uid = manifest.get('uid')
+        self.source_hash = manifest.get('source_hash')
+        self.revision = manifest.get('revision')
+        self.segments = segments
+        self._tombstones = set(int(i) for i in tombstones)
+        self._dead = None
+        self._by_track = None
+
+    # --- creación / apertura ---
+    @classmethod
+    def create(cls, directory, df, columns=FEATURE_SCHEMA, source_hash=None):
+        from sklearn.preprocessing import StandardScaler
+
+        try:
+            X = build_matrix(df, columns, dtype=np.float64)
+        except KeyError:
+            columns = COLUMNAS_BASICAS
+            X = build_matrix(df, columns, dtype=np.float64)
+        stats = RunningStats(len(columns)).update(X)
+        # La estandarización congelada es la de RecommendationIndex.build (mismo
+        # ajuste, mismo orden Fortran): al crear, el escalado es idéntico bit a bit
+        scaler = StandardScaler().fit(np.asfortranarray(X))
+        mean, scale = scaler.mean_.astype(np.float64), scaler.scale_.astype(np.float64)
+
+        with catalog_lock(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+            os.makedirs(directory)
+            segments = []
+            if len(df):
+                segments.append(Segment.write(directory, 'seg_000000', df, np.arange(len(df)), (X - mean) / scale))
+            manifest = {
+                'catalog_version': CATALOG_VERSION,
+                'columns': list(columns),
+                'mean': mean.tolist(),
+                'scale': scale.tolist(),
+                'stats': stats.to_dict(),
+                'next_id': len(df),
+                'next_segment': 1,
+                'generation': 0,
+                'uid': os.urandom(8).hex(),
+                'revision': os.urandom(8).hex(),
+                'source_hash': source_hash,
+                'segments': [s.name for s in segments],
+                'n_tombstones': 0,
+            }
+            open(os.path.join(directory, 'tombstones.bin'), 'wb').close()
+            _write_manifest(directory, manifest)
+        return cls(directory, manifest, segments, [])
+
+    @classmethod
+    def open(cls, directory=CATALOG_DIR):
+        with catalog_lock(directory):
+            manifest = _read_manifest(directory)
+            if manifest is None or manifest.get('catalog_version') != CATALOG_VERSION:
+                raise FileNotFoundError(f"No hay catálogo incremental en {directory}")
+            segments = [Segment.load(directory, name) for name in manifest['segments']]
+            tombstones = _read_tombstones(directory, manifest['n_tombstones'])
+        return cls(directory, manifest, segments, tombstones)
+
+    @classmethod
+    def open_or_create(cls, directory, df, columns=FEATURE_SCHEMA):
+        # Bajo el lock: dos procesos no crean (ni borran) el mismo catálogo a la vez
+        with catalog_lock(directory):
+            try:
+                return cls.open(directory)
+            except FileNotFoundError:
+                return cls.create(directory, df, columns)
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        # Escrituras: lock entre procesos y después el del objeto (siempre en
+        # este orden), partiendo del estado en disco
+        with catalog_lock(self.directory), self._lock:
+            self._refresh()
+            yield
+
+    def _refresh(self):
+        # Si otro proceso (u otro objeto sobre la misma carpeta) ha escrito
+        # desde nuestra última lectura, se recarga; los segmentos no cambian
+        # nunca con el mismo nombre, así que los ya abiertos se reutilizan
+        manifest = _read_manifest(self.directory)
+        if manifest is None or manifest.get('catalog_version') != CATALOG_VERSION:
+            raise FileNotFoundError(f"No hay catálogo incremental en {self.directory}")
+        if manifest.get('revision') == self.revision:
+            return
+        opened = {s.name: s for s in self.segments}
+        segments = [opened.get(name) or Segment.load(self.directory, name) for name in manifest['segments']]
+        self._set_state(manifest, segments, _read_tombstones(self.directory, manifest['n_tombstones']))
+
+    def _save_manifest(self):
+        self.revision = os.urandom(8).hex()
+        _write_manifest(self.directory, {
+            'catalog_version': CATALOG_VERSION,
+            'columns': self.columns,
+            'mean': self.mean.tolist(),
+            'scale': self.scale.tolist(),
+            'stats': self.stats.to_dict(),
+            'next_id': self.next_id,
+            'next_segment': self.next_segment,
+            'generation': self.generation,
+            'uid': self.uid,
+            'revision': self.revision,
+            'source_hash': self.source_hash,
+            'segments': [s.name for s in self.segments],
+            'n_tombstones': len(self._tombstones),
+            'updated_at': time.time(),
+        })
+
+    def _segment_name(self):
+        name = f'seg_{self.next_segment:06d}'
+        self.next_segment += 1
+        return name
+
+    def __len__(self):
+        return sum(len(s) for s in self.segments) - len(self._tombstones)
+
+    # --- altas y bajas (coste proporcional al delta) ---
+    def add(self, df, compact=True):
+        X = build_matrix(df, self.columns, dtype=np.float64)
+        if not len(X):
+            return np.empty(0, dtype=np.int64)
+        with self._exclusive():
+            ids = np.arange(self.next_id, self.next_id + len(X), dtype=np.int64)
+            segment = Segment.write(self.directory, self._segment_name(), df, ids, (X - self.mean) / self.scale)
+            self.stats.update(X)
+            self.next_id += len(X)
+            self.segments.append(segment)
+            self._save_manifest()
+            if self._by_track is not None and 'track_id' in df.columns:
+                for track_id, i in zip(df['track_id'], ids):
+                    self._by_track.setdefault(track_id, []).append(int(i))
+        if compact:
+            self.maybe_compact()
+        return ids
+
+    def _locate(self, ids, segments):
+        # -> (segmento, posición) de cada id; -1 si no existe
+        ids = np.asarray(ids, dtype=np.int64)
+        seg_of = np.full(len(ids), -1)
+        pos_of = np.full(len(ids), -1)
+        for s, segment in enumerate(segments):
+            pos = segment.positions(ids)
+            hit = pos >= 0
+            seg_of[hit], pos_of[hit] = s, pos[hit]
+        return seg_of, pos_of
+
+    def delete(self, ids, compact=True):
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        with self._exclusive():
+            seg_of, pos_of = self._locate(ids, self.segments)
+            live = (seg_of >= 0) & ~np.isin(ids, self.dead_ids())
+            ids, seg_of, pos_of = ids[live], seg_of[live], pos_of[live]
+            if not len(ids):
+                return ids
+            # Quitamos sus valores de las estadísticas (vector escalado -> valor en bruto)
+            vectors = np.stack([self.segments[s].vectors[p] for s, p in zip(seg_of, pos_of)])
+            self.stats.remove(vectors * self.scale + self.mean)
+            with open(os.path.join(self.directory, 'tombstones.bin'), 'ab') as f:
+                f.write(ids.tobytes())
+            self._tombstones.update(int(i) for i in ids)
+            self._dead = None
+            # Se reconstruye al pedirlo: si la canción vuelve, será con un id nuevo
+            self._by_track = None
+            self._save_manifest()
+        if compact:
+            self.maybe_compact()
+        return ids
+
+    def _track_map(self):
+        # track_id -> ids de sus filas VIVAS, crecientes (construido al pedirlo,
+        # O(delta) con las altas; una baja lo invalida). Llamar bajo self._lock
+        if self._by_track is None:
+            by_track, dead = {}, self.dead_ids()
+            for segment in self.segments:
+                if 'track_id' in segment.frame.columns:
+                    live = ~np.isin(segment.ids, dead)
+                    for track_id, i in zip(segment.frame['track_id'][live], np.asarray(segment.ids)[live]):
+                        by_track.setdefault(track_id, []).append(int(i))
+            self._by_track = by_track
+        return self._by_track
+
+    def ids_for_tracks(self, track_ids):
+        # track_id -> id estable de su primera fila viva; -1 si no está o se borró
+        with self._lock:
+            by_track = self._track_map()
+            return np.asarray([by_track.get(t, [-1])[0] for t in track_ids], dtype=np.int64)
+
+    def ids_for_rows(self, track_ids):
+        # Un id por fila: la n-ésima aparición de un track_id es su n-ésima fila
+        # viva (un CSV con repetidos se guarda entero, como lo indexa el exacto)
+        out = np.full(len(track_ids), -1, dtype=np.int64)
+        seen = {}
+        with self._lock:
+            by_track = self._track_map()
+            for r, track_id in enumerate(track_ids):
+                n = seen.get(track_id, 0)
+                seen[track_id] = n + 1
+                ids = by_track.get(track_id, ())
+                if n < len(ids):
+                    out[r] = ids[n]
+        return out
+
+    def delete_tracks(self, track_ids, compact=True):
+        ids = self.ids_for_tracks(track_ids)
+        return self.delete(ids[ids >= 0], compact=compact)
+
+    def live_ids(self):
+        with self._lock:
+            segments, dead = list(self.segments), self.dead_ids()
+        ids = np.concatenate([np.asarray(s.ids) for s in segments]) if segments else np.empty(0, dtype=np.int64)
+        return ids[~np.isin(ids, dead)]
+
+    def sync(self, df, source_hash=None):
+        # Deja el catálogo igual que df (por track_id y nº de aparición): altas
+        # de las filas nuevas y bajas de las que ya no están. Coste O(delta)
+        # salvo el cruce de track_ids. -> (filas añadidas, filas borradas)
+        with self._exclusive():
+            # Otro proceso puede haberlo sincronizado ya con este mismo CSV
+            if source_hash is not None and source_hash == self.source_hash:
+                return 0, 0
+            ids = self.ids_for_rows(df['track_id'].to_numpy())
+            # Bajas antes que altas: las filas recién añadidas no están en ids
+            gone = np.setdiff1d(self.live_ids(), ids[ids >= 0])
+            deleted = self.delete(gone, compact=False) if len(gone) else gone
+            new = np.flatnonzero(ids < 0)
+            added = self.add(df.iloc[new], compact=False) if len(new) else np.empty(0, dtype=np.int64)
+            self.source_hash = source_hash
+            self._save_manifest()
+            self.maybe_compact(background=False)
+        return len(added), len(deleted)
+
+    def dead_ids(self):
+        # Tombstones ordenados (se recalcula solo tras un cambio)
+        dead = self._dead
+        if dead is None:
+            dead = self._dead = np.fromiter(sorted(self._tombstones), dtype=np.int64, count=len(self._tombstones))
+        return dead
+
+    # --- consultas ---
+    def transform(self, features):
+        if isinstance(features, np.ndarray):
+            Q = np.atleast_2d(features).astype(np.float64, copy=False)
+        else:
+            Q = build_matrix(features, self.columns, dtype=np.float64)
+        return (Q - self.mean) / self.scale
+
+    def search(self, Q_scaled, k):
+        # k vecinos vivos en todos los segmentos -> (distancias, ids estables)
+        with self._lock:
+            segments, dead = list(self.segments), self.dead_ids()
+        Q = np.atleast_2d(Q_scaled)
+        if k <= 0:
+            return np.empty((len(Q), 0)), np.empty((len(Q), 0), dtype=np.int64)
+        dists, ids = [], []
+        for segment in segments:
+            if not len(segment):
+                continue
+            # Se piden tantos extra como tombstones tenga el segmento
+            kk = min(k + segment.dead_count(dead), len(segment))
+            d, local = segment.backend.search(Q, kk)
+            missing = local < 0
+            found = np.asarray(segment.ids)[np.where(missing, 0, local)]
+            found[missing] = -1
+            d[missing] = np.inf
+            dists.append(d)
+            ids.append(found)
+        if not dists:
+            return np.empty((len(Q), 0)), np.empty((len(Q), 0), dtype=np.int64)
+        d, i = np.concatenate(dists, axis=1), np.concatenate(ids, axis=1)
+        if len(dead):
+            d[np.isin(i, dead)] = np.inf
+        order = np.lexsort((i, d), axis=1)[:, :k]
+        d, i = np.take_along_axis(d, order, axis=1), np.take_along_axis(i, order, axis=1)
+        i[~np.isfinite(d)] = -1
+        return d, i
+
+    def seed_id(self, features):
+        # Id estable de la canción consultada (si es del catálogo) o -1
+        if isinstance(features, (pd.Series, dict)) and 'track_id' in features:
+            return int(self.ids_for_tracks([features['track_id']])[0])
+        return -1
+
+    def recommend(self, current_song_features, n_recommendations=4):
+        # Se pide k+1 y se excluye la propia canción (no el primer resultado a
+        # ciegas: con empates puede no ser el primero; ad-hoc no se excluye nada)
+        _, ids = self.search(self.transform(current_song_features), n_recommendations + 1)
+        ids = ids[0]
+        return ids[(ids >= 0) & (ids != self.seed_id(current_song_features))][:n_recommendations]
+
+    def rows(self, ids):
+        # Filas del catálogo por id estable (índice del DataFrame = id)
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            segments = list(self.segments)
+        seg_of, pos_of = self._locate(ids, segments)
+        parts, order = [], []
+        for s, segment in enumerate(segments):
+            sel = np.flatnonzero(seg_of == s)
+            if len(sel):
+                parts.append(segment.frame.iloc[pos_of[sel]])
+                order.append(sel)
+        if not parts:
+            return pd.DataFrame()
+        out = pd.concat(parts, ignore_index=True).iloc[np.argsort(np.concatenate(order))]
+        out.index = ids[np.sort(np.concatenate(order))]
+        return out
+
+    # --- compactación ---
+    def needs_compaction(self):
+        n_stored = sum(len(s) for s in self.segments)
+        if len(self.segments) > MAX_SEGMENTS:
+            return 'segmentos'
+        if n_stored and len(self._tombstones) / n_stored > MAX_TOMBSTONE_RATIO:
+            return 'tombstones'
+        if drift(self.stats, self.mean, self.scale) > DRIFT_TOLERANCE:
+            return 'deriva del escalado'
+        return None
+
+    def maybe_compact(self, background=True):
+        if self.needs_compaction() is None:
+            return None
+        return self.compact_async() if background else self.compact()
+
+    def compact_async(self):
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return self._compactor
+            self._compactor = threading.Thread(target=self.compact, name='catalog-compaction', daemon=True)
+            self._compactor.start()
+            return self._compactor
+
+    def wait(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def compact(self):
+        with self._exclusive():
+            snapshot, dead = list(self.segments), self.dead_ids()
+            old_mean, old_scale = self.mean, self.scale
+            restandardize = drift(self.stats, old_mean, old_scale) > DRIFT_TOLERANCE
+            new_mean, new_scale = (self.stats.mean.copy(), self.stats.scale()) if restandardize else (old_mean, old_scale)
+            # El nombre queda reservado en disco: ningún otro proceso lo reutiliza
+            name = self._segment_name()
+            self._save_manifest()
+            uid = self.uid
+
+        # Fuera del lock (O(catálogo)): altas, bajas y consultas siguen mientras tanto
+        frames, ids, vectors = [], [], []
+        for segment in snapshot:
+            keep = np.flatnonzero(~np.isin(segment.ids, dead))
+            frames.append(segment.frame.iloc[keep])
+            ids.append(np.asarray(segment.ids)[keep])
+            vectors.append(np.asarray(segment.vectors)[keep])
+        ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+        merged = None
+        if len(ids):
+            vectors = np.concatenate(vectors)
+            if restandardize:
+                vectors = _restandardize(vectors, old_mean, old_scale, new_mean, new_scale)
+            frame = pd.concat(frames, ignore_index=True)
+            merged = Segment.write(self.directory, name, frame, ids, vectors)
+
+        with self._exclusive():
+            current = {s.name for s in self.segments}
+            if self.uid != uid or any(s.name not in current for s in snapshot):
+                # Otro proceso ha compactado (o recreado el catálogo) entretanto: se descarta
+                if merged is not None:
+                    shutil.rmtree(merged.directory, ignore_errors=True)
+                return self
+            merged_names = {s.name for s in snapshot}
+            later = [s for s in self.segments if s.name not in merged_names]
+            retired = list(snapshot)
+            if restandardize:
+                # Segmentos añadidos durante la compactación: se pasan a la nueva escala (O(delta))
+                rewritten = []
+                for segment in later:
+                    v = _restandardize(segment.vectors, old_mean, old_scale, new_mean, new_scale)
+                    rewritten.append(Segment.write(self.directory, self._segment_name(), segment.frame,
+                                                   segment.ids, v))
+                retired += later
+                later = rewritten
+            self.segments = ([merged] if merged is not None else []) + later
+            self.mean, self.scale = new_mean, new_scale
+            # Los tombstones de filas ya eliminadas físicamente sobran
+            self._tombstones.difference_update(int(i) for i in dead)
+            self._dead = None
+            self._by_track = None
+            tmp = os.path.join(self.directory, 'tombstones.bin.tmp')
+            self.dead_ids().tofile(tmp)
+            os.replace(tmp, os.path.join(self.directory, 'tombstones.bin'))
+            self.generation += 1
+            self._save_manifest()
+            self.compactions += 1
+
+            # Bajo el lock: un open() de otro proceso no ve el manifest viejo sin
+            # sus carpetas. Los lectores con mmap siguen siendo válidos tras el borrado
+            for segment in retired:
+                shutil.rmtree(segment.directory, ignore_errors=True)
+        return self
+
+    def info(self):
+        with self._lock:
+            return {
+                'rows': len(self),
+                'segments': [{'name': s.name, 'rows': len(s), 'backend': s.backend.kind} for s in self.segments],
+                'tombstones': len(self._tombstones),
+                'generation': self.generation,
+                'drift': drift(self.stats, self.mean, self.scale),
+                'needs_compaction': self.needs_compaction(),
+            }
+
+
+# --- ÍNDICE DE LA APP SOBRE EL CATÁLOGO INCREMENTAL ---
+class SegmentSearch:
+    # Backend para IncrementalIndex: busca en los segmentos y traduce ids estables a filas de df
+    def __init__(self, catalog, row_ids):
+        self.catalog = catalog
+        self._order = np.argsort(row_ids, kind='stable')
+        self._sorted = np.asarray(row_ids)[self._order]
+
+    def rows_of(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self._sorted):
+            return np.full(ids.shape, -1)
+        pos = np.searchsorted(self._sorted, ids).clip(0, len(self._sorted) - 1)
+        return np.where((self._sorted[pos] == ids) & (ids >= 0), self._order[pos], -1)
+
+    @property
+    def kind(self):
+        # 'segmentos:' + backends de los segmentos (p. ej. segmentos:exact o segmentos:exact+sq8)
+        return 'segmentos:' + '+'.join(sorted({s.backend.kind for s in self.catalog.segments}))
+
+    def search(self, Q, k):
+        d, ids = self.catalog.search(Q, k)
+        return d, self.rows_of(ids)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(s.backend, 'nbytes', 0) for s in self.catalog.segments)
+
+
+class IncrementalIndex(RecommendationIndex):
+    # RecommendationIndex cuyos vecinos salen del catálogo incremental. X_scaled
+    # (grafo, índice filtrado, servidor) se copia de los vectores guardados, sin reajustar
+    def __init__(self, catalog, row_ids, X_scaled, manifest):
+        super().__init__(X_scaled, catalog.mean, catalog.scale, catalog.columns, manifest)
+        self.catalog = catalog
+        self.row_ids = row_ids
+        self.backend = SegmentSearch(catalog, row_ids)
+
+    def recommend(self, current_song_features, n_recommendations=4):
+        # Como IncrementalCatalog.recommend, pero con filas de df
+        seed = self.catalog.seed_id(current_song_features)
+        _, rows = self.kneighbors(self.transform(current_song_features), n_recommendations + 1)
+        rows = rows[0]
+        keep = rows >= 0
+        if seed >= 0:
+            keep &= self.row_ids[np.where(keep, rows, 0)] != seed
+        return rows[keep][:n_recommendations]
+
+
+def app_catalog_dir(dataset_path, root=CATALOG_DIR):
+    # Un catálogo incremental por fichero de dataset (el CSV puede cambiar; la carpeta no)
+    return os.path.join(root, 'app_' + hashlib.sha1(os.path.abspath(dataset_path).encode()).hexdigest()[:16])
+
+
+def _gather_vectors(catalog, row_ids, path):
+    # Vectores escalados en el orden de df, escritos directamente a un .npy
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(len(row_ids), len(catalog.columns)))
+    seg_of, pos_of = catalog._locate(row_ids, catalog.segments)
+    for s, segment in enumerate(catalog.segments):
+        sel = np.flatnonzero(seg_of == s)
+        if len(sel):
+            out[sel] = np.asarray(segment.vectors)[pos_of[sel]]
+    out.flush()
+    del out
+
+
+def load_or_build_incremental_index(df, dataset_path, dataset_hash, columns=FEATURE_SCHEMA,
+                                     catalog_root=CATALOG_DIR, cache_dir=INDEX_CACHE_DIR):
+    catalog_dir = app_catalog_dir(dataset_path, catalog_root)
+    # Todo bajo el lock del catálogo: con varios workers arrancando a la vez,
+    # el primero crea o sincroniza y el resto abre lo que ha dejado escrito
+    with catalog_lock(catalog_dir):
+        try:
+            catalog = IncrementalCatalog.open(catalog_dir)
+            catalog.sync(df, dataset_hash)
+        except FileNotFoundError:
+            # Todas las filas, también las de un track_id repetido: mismos
+            # candidatos y mismo escalado que el índice exacto (iloc[:]: un
+            # DataFrame también cuando df es un CatalogStore)
+            catalog = IncrementalCatalog.create(catalog_dir, df.iloc[:], columns, dataset_hash)
+
+        # Ids estables por fila de df + X_scaled: una vez por versión del dataset y
+        # del catálogo (revision cambia con cada escritura: una canción que vuelve
+        # tiene id nuevo y una compactación puede re-estandarizar los vectores)
+        directory = os.path.join(cache_dir, f'inc_{dataset_hash[:16]}')
+        manifest = {'index_version': INDEX_VERSION, 'dataset_hash': dataset_hash, 'n_rows': len(df),
+                    'columns': list(catalog.columns), 'catalog_uid': catalog.uid,
+                    'catalog_revision': catalog.revision, 'incremental': True}
+        try:
+            with open(os.path.join(directory, 'manifest.json')) as f:
+                cached = json.load(f)
+            if any(cached.get(key) != value for key, value in manifest.items()):
+                raise ValueError("índice de otra versión")
+            row_ids = np.load(os.path.join(directory, 'row_ids.npy'), mmap_mode='r')
+            X_scaled = np.load(os.path.join(directory, 'X_scaled.npy'), mmap_mode='r')
+        except (FileNotFoundError, ValueError, KeyError, json.JSONDecodeError):
+            row_ids = catalog.ids_for_rows(df['track_id'].to_numpy())
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=f'.tmp-inc-{dataset_hash[:16]}-')
+            try:
+                np.save(os.path.join(tmp_dir, 'row_ids.npy'), row_ids)
+                _gather_vectors(catalog, row_ids, os.path.join(tmp_dir, 'X_scaled.npy'))
+                with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+                    json.dump(dict(manifest, created_at=time.time()), f, indent=2)
+                shutil.rmtree(directory, ignore_errors=True)
+                os.replace(tmp_dir, directory)
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+            row_ids = np.load(os.path.join(directory, 'row_ids.npy'), mmap_mode='r')
+            X_scaled = np.load(os.path.join(directory, 'X_scaled.npy'), mmap_mode='r')
+    index = IncrementalIndex(catalog, np.asarray(row_ids), X_scaled, manifest)
+    index.directory = directory
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Catálogo incremental: altas, bajas y compactación.")
+    parser.add_argument('--dir', default=CATALOG_DIR, help="Carpeta del catálogo")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_init = sub.add_parser('init', help="Crea el catálogo a partir de un CSV")
+    p_init.add_argument('--dataset', required=True)
+    p_add = sub.add_parser('add', help="Añade las canciones de un CSV como segmento nuevo")
+    p_add.add_argument('csv')
+    p_delete = sub.add_parser('delete', help="Marca canciones como borradas (tombstones)")
+    p_delete.add_argument('--track-id', nargs='+', required=True)
+    sub.add_parser('compact', help="Compacta ahora (y re-estandariza si hay deriva)")
+    sub.add_parser('stats', help="Segmentos, tombstones y deriva del escalado")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == 'init':
+        catalog = IncrementalCatalog.create(args.dir, parse_csv(args.dataset))
+    else:
+        catalog = IncrementalCatalog.open(args.dir)
+        if args.command == 'add':
+            ids = catalog.add(parse_csv(args.csv), compact=False)
+            print(f"Añadidas {len(ids):,} canciones (ids {ids[0] if len(ids) else '-'}..)")
+        elif args.command == 'delete':
+            ids = catalog.delete_tracks(args.track_id, compact=False)
+            print(f"Borradas {len(ids):,} canciones")
+        elif args.command == 'compact':
+            catalog.compact()
+        # El CLI compacta en primer plano: el proceso termina enseguida
+        if args.command in ('add', 'delete'):
+            catalog.maybe_compact(background=False)
+    print(json.dumps(catalog.info(), indent=2, ensure_ascii=False))
+    print(f"({time.perf_counter() - start:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
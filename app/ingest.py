@@ -0,0 +1,296 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from catalog_cache import _save_columns, _write_manifest, load_cache
+from recommender import file_hash
+from training_data import GENEROS
+
+# --- INGESTA EN STREAMING DEL DATASET ---
+# Sustituye a "mover el CSV descargado y limpiarlo en el notebook"
+# (read_csv entero + filtro de generos_a_elegir + drop_duplicates):
+#   1) lectura por bloques (read_csv con chunksize): la memoria no depende del
+#      tamaño del fichero
+#   2) validación de tipos y rangos por columna; las filas inválidas se
+#      descartan y se cuentan por motivo
+#   3) filtro por género (o partición por género con --partition)
+#   4) duplicados como en el notebook: primero por track_id y después por
+#      nombre + artistas, quedándose con la primera aparición. Los conjuntos
+#      de "ya vistos" guardan hashes de 64 bits en arrays ordenados
+#      (8 bytes por clave), no los strings
+#   5) salida en shards columnares (mismo formato que catalog_cache.py,
+#      se leen con load_cache) + manifest.json con los recuentos
+#
+# Columnas de salida: las del dataset demo (track_name -> name,
+# track_genre -> music_genre), así la app y training_data las leen igual.
+#
+#   python app/ingest.py dataset/dataset.csv --output dataset/ingested
+#   python app/ingest.py dataset/dataset.csv --output dataset/por_genero --all-genres --partition
+
+INGEST_VERSION = 1
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataset', 'ingested')
+
+CHUNK_ROWS = 50_000
+SHARD_ROWS = 100_000
+
+RENOMBRAR = {'track_name': 'name', 'track_genre': 'music_genre'}
+COLUMNAS_TEXTO = ['track_id', 'artists', 'album_name', 'name']
+# Rangos válidos (ambos incluidos; None = sin límite)
+RANGOS = {
+    'popularity': (0, 100), 'duration_ms': (1, None), 'danceability': (0, 1), 'energy': (0, 1),
+    'key': (-1, 11), 'loudness': (-60, 5), 'mode': (0, 1), 'speechiness': (0, 1),
+    'acousticness': (0, 1), 'instrumentalness': (0, 1), 'liveness': (0, 1), 'valence': (0, 1),
+    'tempo': (0, 300), 'time_signature': (0, 7),
+}
+ENTEROS = ('popularity', 'duration_ms', 'key', 'mode', 'time_signature')
+COLUMNA_GENERO = 'music_genre'
+# Orden de salida (el de dataset_demo_balanced.csv)
+ESQUEMA = COLUMNAS_TEXTO[:3] + ['name', 'popularity', 'duration_ms', 'explicit'] + \
+    [c for c in RANGOS if c not in ('popularity', 'duration_ms')] + [COLUMNA_GENERO]
+
+
+class HashSet:
+    # Hashes uint64 en un array ordenado: 8 bytes por clave (un set de str
+    # ocuparía ~100). Cada lote se funde con un sort estable (dos tramos ya
+    # ordenados -> lineal)
+    def __init__(self):
+        self._hashes = np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    @property
+    def nbytes(self):
+        return self._hashes.nbytes
+
+    def _contains(self, hashes):
+        if not len(self._hashes):
+            return np.zeros(len(hashes), dtype=bool)
+        pos = np.searchsorted(self._hashes, hashes).clip(0, len(self._hashes) - 1)
+        return self._hashes[pos] == hashes
+
+    def first_seen(self, hashes):
+        # -> máscara: True en la primera aparición de cada hash (en este lote y en los anteriores)
+        uniq, first = np.unique(hashes, return_index=True)
+        new = ~self._contains(uniq)
+        mask = np.zeros(len(hashes), dtype=bool)
+        mask[first[new]] = True
+        if new.any():
+            self._hashes = np.sort(np.concatenate((self._hashes, uniq[new])), kind='stable')
+        return mask
+
+
+def _hash_keys(df, columns):
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy(dtype=np.uint64)
+
+
+def validate(chunk):
+    # -> (chunk normalizado, máscara de filas válidas, {motivo: nº de filas})
+    chunk = chunk.rename(columns=RENOMBRAR)
+    missing = [c for c in ESQUEMA if c not in chunk.columns]
+    if missing:
+        raise KeyError(f"Faltan columnas en el dataset: {missing}")
+    chunk = chunk[ESQUEMA].copy()
+    valid = np.ones(len(chunk), dtype=bool)
+    rejected = {}
+
+    def reject(reason, bad):
+        bad = bad & valid
+        if bad.any():
+            rejected[reason] = rejected.get(reason, 0) + int(bad.sum())
+            valid[bad] = False
+
+    for col in COLUMNAS_TEXTO + [COLUMNA_GENERO]:
+        values = chunk[col]
+        reject(f'{col}: vacío', (values.isna() | (values.astype(str).str.strip() == '')).to_numpy())
+        chunk[col] = values.astype(str)
+
+    explicit = chunk['explicit'].astype(str).str.lower().map({'true': True, 'false': False, '1': True, '0': False})
+    reject('explicit: tipo', explicit.isna().to_numpy())
+    chunk['explicit'] = explicit.fillna(False).astype(bool)
+
+    for col, (lo, hi) in RANGOS.items():
+        values = pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=np.float64, copy=True)
+        nan = np.isnan(values)
+        reject(f'{col}: tipo', nan)
+        out = np.zeros(len(values), dtype=bool)
+        if lo is not None:
+            out |= values < lo
+        if hi is not None:
+            out |= values > hi
+        if col in ENTEROS:
+            out |= ~nan & (values != np.round(values))
+        reject(f'{col}: rango', out & ~nan)
+        values[nan] = 0
+        chunk[col] = values.astype(np.int64) if col in ENTEROS else values
+    return chunk, valid, rejected
+
+
+class ShardWriter:
+    # Búferes por partición; un shard se escribe al llegar a shard_rows. Si el
+    # total en memoria pasa de shard_rows se vacía el búfer más grande
+    def __init__(self, directory, shard_rows=SHARD_ROWS):
+        self.directory = directory
+        self.shard_rows = shard_rows
+        self.buffers = {}
+        self.shards = []
+
+    def write(self, partition, df):
+        if not len(df):
+            return
+        self.buffers.setdefault(partition, []).append(df)
+        while True:
+            sizes = {p: sum(len(d) for d in parts) for p, parts in self.buffers.items()}
+            full = [p for p, n in sizes.items() if n >= self.shard_rows]
+            if full:
+                self._flush(full[0], limit=self.shard_rows)
+            elif sum(sizes.values()) > self.shard_rows:
+                self._flush(max(sizes, key=sizes.get))
+            else:
+                return
+
+    def _flush(self, partition, limit=None):
+        df = pd.concat(self.buffers.pop(partition), ignore_index=True)
+        if limit is not None and len(df) > limit:
+            self.buffers[partition] = [df.iloc[limit:]]
+            df = df.iloc[:limit]
+        subdir = f"{COLUMNA_GENERO}={partition.replace(os.sep, '_')}" if partition is not None else ''
+        name = os.path.join(subdir, f'part-{len(self.shards):05d}')
+        path = os.path.join(self.directory, name)
+        os.makedirs(path)
+        _write_manifest(path, {'n_rows': len(df), 'columns': _save_columns(df.reset_index(drop=True), path)})
+        self.shards.append({'path': name, 'rows': len(df), 'partition': partition})
+
+    def close(self):
+        for partition in list(self.buffers):
+            self._flush(partition)
+        return self.shards
+
+
+def ingest(csv_path, output_dir=OUTPUT_DIR, genres=GENEROS, partition=False,
+           chunk_rows=CHUNK_ROWS, shard_rows=SHARD_ROWS):
+    start = time.perf_counter()
+    genres = None if genres is None else {g.lower() for g in genres}
+    seen_ids, seen_names = HashSet(), HashSet()
+    counts = {'rows_in': 0, 'rejected': {}, 'other_genre': 0, 'dup_track_id': 0, 'dup_name_artists': 0,
+              'rows_out': 0, 'rows_per_genre': {}}
+
+    # Escritura atómica: carpeta temporal + rename
+    parent = os.path.dirname(os.path.abspath(output_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp-ingest-')
+    try:
+        writer = ShardWriter(tmp_dir, shard_rows)
+        for raw in pd.read_csv(csv_path, chunksize=chunk_rows, dtype={c: str for c in ('track_id', 'track_name', 'name')}):
+            counts['rows_in'] += len(raw)
+            chunk, valid, rejected = validate(raw)
+            for reason, n in rejected.items():
+                counts['rejected'][reason] = counts['rejected'].get(reason, 0) + n
+            chunk = chunk[valid]
+
+            genre = chunk[COLUMNA_GENERO].str.lower()
+            if genres is not None:
+                keep = genre.isin(genres).to_numpy()
+                counts['other_genre'] += int((~keep).sum())
+                chunk, genre = chunk[keep], genre[keep]
+
+            # Igual que el notebook: drop_duplicates('track_id') y luego por nombre + artistas
+            first = seen_ids.first_seen(_hash_keys(chunk, ['track_id']))
+            counts['dup_track_id'] += int((~first).sum())
+            chunk, genre = chunk[first], genre[first]
+            first = seen_names.first_seen(_hash_keys(chunk, ['name', 'artists']))
+            counts['dup_name_artists'] += int((~first).sum())
+            chunk, genre = chunk[first], genre[first]
+
+            counts['rows_out'] += len(chunk)
+            for g, n in genre.value_counts().items():
+                counts['rows_per_genre'][g] = counts['rows_per_genre'].get(g, 0) + int(n)
+            if partition:
+                for g, part in chunk.groupby(genre.to_numpy(), sort=False):
+                    writer.write(g, part)
+            else:
+                writer.write(None, chunk)
+
+        shards = writer.close()
+        manifest = {
+            'ingest_version': INGEST_VERSION,
+            'source_path': os.path.abspath(csv_path),
+            'source_sha1': file_hash(csv_path),
+            'genres': sorted(genres) if genres is not None else None,
+            'partitioned': bool(partition),
+            'columns': ESQUEMA,
+            **counts,
+            'dedup_bytes': seen_ids.nbytes + seen_names.nbytes,
+            'shards': shards,
+            'seconds': time.perf_counter() - start,
+            'created_at': time.time(),
+        }
+        _write_manifest(tmp_dir, manifest)
+        if os.path.isdir(output_dir):
+            shutil.rmtree(output_dir)
+        os.replace(tmp_dir, output_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return manifest
+
+
+def read_manifest(directory=OUTPUT_DIR):
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        return json.load(f)
+
+
+def iter_shards(directory=OUTPUT_DIR, genres=None):
+    # Un DataFrame por shard (columnas con mmap); con genres, solo esas particiones
+    genres = None if genres is None else {g.lower() for g in genres}
+    for shard in read_manifest(directory)['shards']:
+        if genres is not None and shard['partition'] is not None and shard['partition'].lower() not in genres:
+            continue
+        yield shard, load_cache(os.path.join(directory, shard['path']))
+
+
+def load_ingested(directory=OUTPUT_DIR, genres=None):
+    frames = [df for _, df in iter_shards(directory, genres)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ESQUEMA)
+
+
+def find_csv(path):
+    # kagglehub devuelve una carpeta: buscamos el CSV dentro
+    if os.path.isfile(path):
+        return path
+    candidates = sorted(glob.glob(os.path.join(path, '**', '*.csv'), recursive=True), key=os.path.getsize)
+    if not candidates:
+        raise FileNotFoundError(f"No hay ningún CSV en {path}")
+    return candidates[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingesta en streaming del dataset (validación, duplicados, shards).")
+    parser.add_argument('csv', help="CSV en bruto (o carpeta descargada con kagglehub)")
+    parser.add_argument('--output', default=OUTPUT_DIR)
+    parser.add_argument('--genres', nargs='+', default=GENEROS)
+    parser.add_argument('--all-genres', action='store_true', help="No filtrar por género")
+    parser.add_argument('--partition', action='store_true', help="Un directorio por género")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--shard-rows', type=int, default=SHARD_ROWS)
+    args = parser.parse_args(argv)
+
+    manifest = ingest(find_csv(args.csv), args.output, genres=None if args.all_genres else args.genres,
+                      partition=args.partition, chunk_rows=args.chunk_rows, shard_rows=args.shard_rows)
+    print(f"{manifest['rows_in']:,} filas leídas -> {manifest['rows_out']:,} escritas en "
+          f"{len(manifest['shards'])} shards ({manifest['seconds']:.1f} s)")
+    print(f"  inválidas: {sum(manifest['rejected'].values()):,}  otro género: {manifest['other_genre']:,}  "
+          f"duplicadas: {manifest['dup_track_id']:,} (track_id) + {manifest['dup_name_artists']:,} (nombre + artistas)")
+    for reason, n in sorted(manifest['rejected'].items()):
+        print(f"    {reason:<28}{n:>8,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+import argparse
+import bisect
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+
+# --- MÉTRICAS DE LA APP Y DEL SERVIDOR (LATENCIAS POR ETAPA + CACHÉS) ---
+# Temporizadores alrededor de cada etapa del camino de una canción
+# (display_name -> fila, features, predict, recomendaciones, figura Plotly) y
+# contadores de aciertos / fallos de cada caché. Cada etapa tiene:
+#   - un histograma acumulado con buckets fijos (formato Prometheus)
+#   - una ventana deslizante con las últimas WINDOW muestras, de la que salen
+#     p50 / p95 / p99 "de ahora" (no diluidos por todo el histórico)
+# Exportación: texto de Prometheus (fichero o GET /metrics del servidor) y
+# líneas JSON estructuradas (una por exportación) para los logs.
+#
+# Desactivado (por defecto) timer() devuelve siempre el mismo nullcontext y
+# los contadores salen en la primera línea: coste prácticamente cero.
+#
+#   APP_METRICS=1 APP_METRICS_FILE=/tmp/app.prom APP_METRICS_LOG=- streamlit run app/app.py
+#   python app/metrics.py /tmp/app.prom          (resumen p50/p95/p99 de un fichero exportado)
+
+ENABLED = os.environ.get('APP_METRICS', '').lower() not in ('', '0', 'false', 'no')
+PROM_FILE = os.environ.get('APP_METRICS_FILE') or None
+# Fichero de líneas JSON ('-' = stdout)
+LOG_FILE = os.environ.get('APP_METRICS_LOG') or None
+
+PREFIX = 'app'
+WINDOW = 2048
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_NOOP = nullcontext()
+
+
+class LatencyHistogram:
+    def __init__(self, window=WINDOW, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)      # el último es +Inf
+        self.count = 0
+        self.sum_ms = 0.0
+        self._window = [0.0] * window
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        with self._lock:
+            self._window[self.count % len(self._window)] = ms
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.count += 1
+            self.sum_ms += ms
+
+    def recent(self):
+        with self._lock:
+            return sorted(self._window[:min(self.count, len(self._window))])
+
+    def quantiles(self, qs=QUANTILES):
+        # Percentiles de la ventana deslizante (interpolación lineal, como np.percentile)
+        values = self.recent()
+        out = {}
+        for q in qs:
+            if not values:
+                out[q] = float('nan')
+                continue
+            pos = q * (len(values) - 1)
+            lo = int(pos)
+            hi = min(lo + 1, len(values) - 1)
+            out[q] = values[lo] + (values[hi] - values[lo]) * (pos - lo)
+        return out
+
+
+class _Timer:
+    __slots__ = ('metrics', 'stage', 't0')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, (time.perf_counter() - self.t0) * 1000)
+        return False
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in items) + '}'
+
+
+class Metrics:
+    def __init__(self, enabled=ENABLED, window=WINDOW, prefix=PREFIX):
+        self.enabled = enabled
+        self.window = window
+        self.prefix = prefix
+        self.started = time.time()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._cache_keys = {}
+        self._lock = threading.Lock()
+
+    # --- registro ---
+    def timer(self, stage):
+        return _Timer(self, stage) if self.enabled else _NOOP
+
+    def observe(self, stage, ms):
+        if not self.enabled:
+            return
+        hist = self._histograms.get(stage)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(stage, LatencyHistogram(self.window))
+        hist.observe(ms)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def cache(self, name, hit):
+        # Acierto / fallo de una caché (LRU, resultados del catálogo, radar...).
+        # Camino caliente: la clave del contador se construye una vez por (caché, resultado)
+        if not self.enabled:
+            return
+        key = self._cache_keys.get((name, bool(hit)))
+        if key is None:
+            key = self._cache_keys.setdefault(
+                (name, bool(hit)), ('cache_requests', _labels({'cache': name, 'result': 'hit' if hit else 'miss'})))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def gauge(self, name, value, **labels):
+        if self.enabled:
+            with self._lock:
+                self._gauges[(name, _labels(labels))] = value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    # --- exportación ---
+    def snapshot(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        stages = {}
+        for stage, hist in sorted(histograms.items()):
+            q = hist.quantiles()
+            stages[stage] = {'count': hist.count, 'mean_ms': hist.sum_ms / hist.count if hist.count else 0.0,
+                             'p50_ms': q[0.5], 'p95_ms': q[0.95], 'p99_ms': q[0.99]}
+        caches = {}
+        for (name, labels), value in counters.items():
+            if name == 'cache_requests':
+                labels = dict(labels)
+                entry = caches.setdefault(labels['cache'], {'hits': 0, 'misses': 0})
+                entry['hits' if labels['result'] == 'hit' else 'misses'] += value
+        for entry in caches.values():
+            total = entry['hits'] + entry['misses']
+            entry['hit_ratio'] = entry['hits'] / total if total else 0.0
+        return {
+            'ts': time.time(),
+            'uptime_s': time.time() - self.started,
+            'stages': stages,
+            'caches': caches,
+            'counters': {name + _format_labels(labels): v for (name, labels), v in sorted(counters.items())
+                         if name != 'cache_requests'},
+            'gauges': {name + _format_labels(labels): v for (name, labels), v in sorted(gauges.items())},
+        }
+
+    def prometheus(self):
+        p = self.prefix
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+        lines = []
+        if histograms:
+            lines += [f'# HELP {p}_stage_latency_seconds Latencia por etapa (histórico acumulado).',
+                      f'# TYPE {p}_stage_latency_seconds histogram']
+            for stage, hist in histograms:
+                cumulative = 0
+                for le, n in zip(hist.buckets, hist.counts):
+                    cumulative += n
+                    lines.append(f'{p}_stage_latency_seconds_bucket{{stage="{stage}",le="{le / 1000:g}"}} {cumulative}')
+                lines.append(f'{p}_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+                lines.append(f'{p}_stage_latency_seconds_sum{{stage="{stage}"}} {hist.sum_ms / 1000:.6f}')
+                lines.append(f'{p}_stage_latency_seconds_count{{stage="{stage}"}} {hist.count}')
+            lines += [f'# HELP {p}_stage_latency_window_seconds Percentiles de las últimas {self.window} muestras.',
+                      f'# TYPE {p}_stage_latency_window_seconds gauge']
+            for stage, hist in histograms:
+                for q, ms in hist.quantiles().items():
+                    lines.append(f'{p}_stage_latency_window_seconds{{stage="{stage}",quantile="{q:g}"}} {ms / 1000:.6f}')
+        for name in dict.fromkeys(n for (n, _), _ in counters):
+            lines.append(f'# TYPE {p}_{name}_total counter')
+            lines += [f'{p}_{name}_total{_format_labels(labels)} {value}'
+                      for (n, labels), value in counters if n == name]
+        for name in dict.fromkeys(n for (n, _), _ in gauges):
+            lines.append(f'# TYPE {p}_{name} gauge')
+            lines += [f'{p}_{name}{_format_labels(labels)} {value}' for (n, labels), value in gauges if n == name]
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        # Escritura atómica (node_exporter textfile collector lee el fichero en cualquier momento)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-metrics-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.prometheus())
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def log_json(self, target='-', **extra):
+        # Una línea JSON con el estado actual (para agregadores de logs)
+        line = json.dumps(dict(self.snapshot(), event='metrics', **extra), ensure_ascii=False)
+        if target == '-':
+            print(line, flush=True)
+        else:
+            with open(target, 'a') as f:
+                f.write(line + '\n')
+
+    def export(self, prom_file=PROM_FILE, log_file=LOG_FILE, **extra):
+        # Destinos configurados por entorno (APP_METRICS_FILE / APP_METRICS_LOG)
+        if not self.enabled:
+            return
+        if prom_file:
+            self.write_prometheus(prom_file)
+        if log_file:
+            self.log_json(log_file, **extra)
+
+    def table(self):
+        snap = self.snapshot()
+        lines = [f"{'etapa':<28}{'n':>8}{'p50':>10}{'p95':>10}{'p99':>10}"]
+        for stage, s in snap['stages'].items():
+            lines.append(f"{stage[:28]:<28}{s['count']:>8}{s['p50_ms']:>8.2f}ms{s['p95_ms']:>8.2f}ms{s['p99_ms']:>8.2f}ms")
+        for cache, c in snap['caches'].items():
+            lines.append(f"caché {cache:<22}{c['hits']:>8} aciertos {c['misses']:>6} fallos ({c['hit_ratio']:.0%})")
+        return '\n'.join(lines)
+
+
+# Una única instancia por proceso (sobrevive a los re-runs de Streamlit)
+METRICS = Metrics()
+
+
+def parse_prometheus(text, prefix=PREFIX):
+    # Percentiles de la ventana por etapa a partir de un fichero exportado
+    stages = {}
+    for line in text.splitlines():
+        if not line.startswith(f'{prefix}_stage_latency_window_seconds{{'):
+            continue
+        labels, value = line.rsplit(' ', 1)
+        fields = dict(part.split('=', 1) for part in labels[labels.index('{') + 1:-1].split(','))
+        stage, q = fields['stage'].strip('"'), fields['quantile'].strip('"')
+        stages.setdefault(stage, {})[f'p{round(float(q) * 100)}_ms'] = float(value) * 1000
+    return stages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumen p50/p95/p99 por etapa de un fichero de métricas.")
+    parser.add_argument('path', nargs='?', default=PROM_FILE)
+    args = parser.parse_args(argv)
+    if not args.path:
+        parser.error("indica el fichero (o APP_METRICS_FILE)")
+    with open(args.path) as f:
+        stages = parse_prometheus(f.read())
+    print(f"{'etapa':<28}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, q in stages.items():
+        print(f"{stage:<28}" + ''.join(f"{q.get(k, float('nan')):>8.2f}ms" for k in ('p50_ms', 'p95_ms', 'p99_ms')))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,370 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from features import FEATURE_SCHEMA
+from metrics import METRICS
+from numpy_booster import NumpyBooster, export_booster
+
+# --- REGISTRO DE MODELOS VERSIONADOS (CAMBIO EN CALIENTE) ---
+# Cada versión es un directorio models/vNNNN con el export NumPy del booster
+# (numpy_booster.py: .npy que se abren con mmap, sin pickle) y un
+# metadata.json con el esquema de features (columnas_modelo), las clases, las
+# métricas y el checksum SHA-256 de los ficheros. active.json dice qué versión
+# sirve la app; history.jsonl guarda cada activación (de ella sale la pila
+# que deshace rollback: rollbacks seguidos van cada vez más atrás).
+#
+#   models/
+#     v0001/  manifest.json  feature.npy ... value.npy  metadata.json
+#     v0002/  ...
+#     active.json     {"version": "v0002", "checksum": "...", ...}
+#     history.jsonl
+#
+# ModelHandle: referencia al modelo activo de un proceso (app o servidor).
+# Un hilo vigila active.json; al cambiar carga la nueva versión (verificando
+# el checksum y el esquema), prepara lo que dependa del modelo (predicciones
+# del catálogo, índice filtrado), la calienta con un lote de filas y solo
+# entonces la publica con una única asignación. Cada petición lee
+# handle.current una vez y usa ese modelo hasta el final: no se corta
+# ninguna petición en curso. Si la nueva versión falla, sigue la anterior.
+#
+# Uso:
+#   python app/model_registry.py publish app/modelo_xgboost_final.pkl --metrics cache/evaluation/<...>/manifest.json
+#   python app/model_registry.py publish app/modelo_numpy        (export ya hecho, sin xgboost)
+#   python app/model_registry.py list
+#   python app/model_registry.py activate v0001
+#   python app/model_registry.py rollback
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.environ.get('APP_MODEL_REGISTRY') or os.path.join(CURRENT_DIR, '..', 'models')
+REGISTRY_VERSION = 1
+METADATA = 'metadata.json'
+ACTIVE = 'active.json'
+HISTORY = 'history.jsonl'
+# Métricas que se copian del manifest de evaluation.py
+METRIC_KEYS = ('accuracy', 'fold_mean', 'fold_std', 'auc', 'auc_macro', 'n_eval')
+
+# version: nombre en el registro (None = modelo fuera del registro)
+# checksum: clave de las cachés que dependen del modelo (predicciones, índice filtrado)
+# resources: lo que el dueño del handle construye para este modelo
+Deployment = namedtuple('Deployment', ['model', 'version', 'checksum', 'metadata', 'resources'])
+
+
+def artifact_checksum(directory):
+    # SHA-256 de todos los ficheros del artefacto (nombre + contenido), salvo metadata.json
+    h = hashlib.sha256()
+    for name in sorted(os.listdir(directory)):
+        if name == METADATA or name.startswith('.'):
+            continue
+        h.update(name.encode() + b'\0')
+        with open(os.path.join(directory, name), 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    return h.hexdigest()
+
+
+def _write_json(path, data):
+    # Escritura atómica: los lectores ven el fichero viejo o el nuevo, nunca a medias
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class ModelRegistry:
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = os.path.abspath(root)
+
+    def path(self, version):
+        return os.path.join(self.root, version)
+
+    def versions(self):
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(n for n in names if n.startswith('v') and n[1:].isdigit()
+                      and os.path.exists(os.path.join(self.root, n, METADATA)))
+
+    def metadata(self, version):
+        with open(os.path.join(self.path(version), METADATA)) as f:
+            return json.load(f)
+
+    def active(self):
+        # {'version', 'checksum', 'activated_at'} o None si no hay versión activa
+        try:
+            with open(os.path.join(self.root, ACTIVE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def history(self):
+        try:
+            with open(os.path.join(self.root, HISTORY)) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def find(self, checksum):
+        # Versión del registro con este contenido (o None)
+        for version in reversed(self.versions()):
+            if self.metadata(version).get('checksum') == checksum:
+                return version
+        return None
+
+    # --- escritura ---
+    def publish(self, source, classes, metrics=None, schema=FEATURE_SCHEMA, notes=None, activate=True):
+        # source: directorio con un export NumPy, ruta a un .pkl o el propio modelo
+        # (estos dos últimos se exportan aquí y necesitan xgboost)
+        os.makedirs(self.root, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.root, prefix='.tmp-publish-')
+        try:
+            artifact = os.path.join(tmp_dir, 'artifact')
+            if isinstance(source, str) and os.path.isdir(source):
+                shutil.copytree(source, artifact)
+                source_name = os.path.abspath(source)
+            elif isinstance(source, str):
+                import joblib
+                export_booster(joblib.load(source), artifact, source_path=source)
+                source_name = os.path.abspath(source)
+            else:
+                export_booster(source, artifact)
+                source_name = type(source).__name__
+            model = NumpyBooster.load(artifact)
+            self._check(model, list(schema), list(classes))
+
+            metadata = {
+                'registry_version': REGISTRY_VERSION,
+                'feature_schema': list(schema),
+                'classes': list(classes),
+                'metrics': metrics or {},
+                'checksum': artifact_checksum(artifact),
+                'source': source_name,
+                'source_sha1': model.manifest.get('source_sha1'),
+                'n_trees': model.manifest['n_trees'],
+                'notes': notes,
+                'created_at': time.time(),
+            }
+            # El nombre se reserva con el rename (falla si otro proceso ya lo tomó)
+            while True:
+                # Cuenta también directorios sin metadata (otra publicación a medias)
+                numbers = [int(n[1:]) for n in os.listdir(self.root) if n.startswith('v') and n[1:].isdigit()]
+                version = f'v{max(numbers, default=0) + 1:04d}'
+                metadata['version'] = version
+                with open(os.path.join(artifact, METADATA), 'w') as f:
+                    json.dump(metadata, f, indent=2)
+                try:
+                    os.rename(artifact, self.path(version))
+                    break
+                except OSError:
+                    if not os.path.exists(self.path(version)):
+                        raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version, reason='activate'):
+        metadata = self.metadata(version)
+        entry = {'version': version, 'checksum': metadata['checksum'], 'activated_at': time.time()}
+        _write_json(os.path.join(self.root, ACTIVE), entry)
+        with open(os.path.join(self.root, HISTORY), 'a') as f:
+            f.write(json.dumps(dict(entry, reason=reason)) + '\n')
+        return entry
+
+    def activation_stack(self):
+        # Pila de activaciones reconstruida desde history.jsonl: una activación
+        # apila; un rollback desapila hasta la versión a la que volvió. Así los
+        # rollbacks seguidos van cada vez más atrás en vez de alternar entre dos
+        stack = []
+        for entry in self.history():
+            version = entry['version']
+            if entry.get('reason') == 'rollback':
+                while stack and stack[-1] != version:
+                    stack.pop()
+                if not stack:
+                    stack.append(version)
+            elif not stack or stack[-1] != version:
+                stack.append(version)
+        return stack
+
+    def rollback(self):
+        # Vuelve a la versión activada antes que la actual
+        active = self.active()
+        current = active['version'] if active else None
+        stack = self.activation_stack()
+        while stack and stack[-1] == current:
+            stack.pop()
+        while stack:
+            version = stack.pop()
+            if version != current and os.path.isdir(self.path(version)):
+                return self.activate(version, reason='rollback')
+        raise ValueError("No hay una versión anterior a la que volver")
+
+    # --- lectura ---
+    @staticmethod
+    def _check(model, schema, classes):
+        names = model.manifest.get('feature_names')
+        if model.n_features != len(schema) or (names is not None and list(names) != schema):
+            raise ValueError(f"El modelo espera las features {names}, no {schema}")
+        if model.n_classes != len(classes):
+            raise ValueError(f"El modelo tiene {model.n_classes} clases y la lista {len(classes)}")
+
+    def verify(self, version):
+        return artifact_checksum(self.path(version)) == self.metadata(version)['checksum']
+
+    def load(self, version=None, verify=True, schema=FEATURE_SCHEMA):
+        # -> Deployment de la versión pedida (por defecto la activa), sin recursos
+        if version is None:
+            active = self.active()
+            if active is None:
+                raise FileNotFoundError(f"No hay versión activa en {self.root}")
+            version = active['version']
+        metadata = self.metadata(version)
+        if metadata.get('registry_version') != REGISTRY_VERSION:
+            raise ValueError(f"Versión de registro no soportada: {metadata.get('registry_version')}")
+        if metadata['feature_schema'] != list(schema):
+            raise ValueError(f"{version}: esquema de features distinto al de la app")
+        if verify and not self.verify(version):
+            raise ValueError(f"{version}: el checksum no coincide (artefacto dañado)")
+        model = NumpyBooster.load(self.path(version))
+        self._check(model, metadata['feature_schema'], metadata['classes'])
+        return Deployment(model, version, metadata['checksum'], metadata, None)
+
+
+class ModelHandle:
+    def __init__(self, deployment, registry=None, prepare=None, warm_rows=None, interval=2.0):
+        # prepare(deployment) -> recursos que dependen del modelo; warm_rows: matriz
+        # de features para un predict de calentamiento antes de publicar la versión
+        self.current = deployment
+        self.registry = registry
+        self.prepare = prepare
+        self.warm_rows = warm_rows
+        self.interval = interval
+        self.swaps = []
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        # Una comprobación: True si se ha cambiado de versión
+        if self.registry is None:
+            return False
+        with self._lock:
+            active = self.registry.active()
+            if active is None or active.get('checksum') == self.current.checksum:
+                return False
+            start = time.perf_counter()
+            try:
+                new = self.registry.load(active['version'])
+                if self.prepare is not None:
+                    new = new._replace(resources=self.prepare(new))
+                if self.warm_rows is not None and len(self.warm_rows):
+                    new.model.predict_proba(self.warm_rows)
+            except Exception as exc:
+                # Versión rota (checksum, esquema, ficheros): se sigue sirviendo la actual
+                self.last_error = f"{active.get('version')}: {exc!r}"
+                print(f"⚠️ No se pudo activar el modelo {self.last_error}")
+                return False
+            previous, self.current = self.current, new
+            self.last_error = None
+            self.swaps.append({'from': previous.version, 'to': new.version, 'ts': time.time(),
+                               'warm_up_s': round(time.perf_counter() - start, 3)})
+            METRICS.inc('model_swaps', version=new.version)
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def start(self):
+        if self.registry is not None and self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def info(self):
+        d = self.current
+        return {'version': d.version, 'checksum': d.checksum,
+                'classes': (d.metadata or {}).get('classes'), 'metrics': (d.metadata or {}).get('metrics'),
+                'swaps': self.swaps[-10:], 'last_error': self.last_error}
+
+
+def load_metrics(value):
+    # JSON en línea, fichero JSON o manifest.json de evaluation.py (se toman sus métricas)
+    if value is None:
+        return None
+    if os.path.exists(value):
+        with open(value) as f:
+            data = json.load(f)
+    else:
+        data = json.loads(value)
+    if isinstance(data.get('metrics'), dict):
+        data = {k: data['metrics'][k] for k in METRIC_KEYS if k in data['metrics']}
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registro de modelos versionados.")
+    parser.add_argument('--registry', default=REGISTRY_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('publish', help="Registra un modelo (.pkl o export NumPy)")
+    p.add_argument('source')
+    p.add_argument('--metrics', default=None, help="JSON, fichero JSON o manifest de evaluation.py")
+    p.add_argument('--notes', default=None)
+    p.add_argument('--no-activate', action='store_true')
+    sub.add_parser('list', help="Versiones registradas")
+    p = sub.add_parser('activate', help="Activa una versión")
+    p.add_argument('version')
+    sub.add_parser('rollback', help="Vuelve a la versión activada antes que la actual")
+    p = sub.add_parser('verify', help="Comprueba el checksum de una versión (por defecto todas)")
+    p.add_argument('version', nargs='?')
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.registry)
+    if args.command == 'publish':
+        from resources import CLASES
+        version = registry.publish(args.source, CLASES, metrics=load_metrics(args.metrics), notes=args.notes,
+                                   activate=not args.no_activate)
+        print(f"Publicado {version}" + ('' if args.no_activate else ' (activo)'))
+    elif args.command == 'list':
+        active = (registry.active() or {}).get('version')
+        for version in registry.versions():
+            m = registry.metadata(version)
+            metrics = ', '.join(f"{k} {v:.4f}" for k, v in m['metrics'].items() if isinstance(v, float))
+            print(f"{'*' if version == active else ' '} {version}  {m['checksum'][:12]}  "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(m['created_at']))}  {m['n_trees']} árboles  {metrics}")
+    elif args.command == 'activate':
+        registry.activate(args.version)
+        print(f"Activa: {args.version}")
+    elif args.command == 'rollback':
+        print(f"Activa: {registry.rollback()['version']}")
+    elif args.command == 'verify':
+        bad = [v for v in ([args.version] if args.version else registry.versions()) if not registry.verify(v)]
+        print("Checksums correctos" if not bad else f"Checksum incorrecto: {', '.join(bad)}")
+        return 1 if bad else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from ann import _sq_norms, _topk
+
+# --- GRAFO DE VECINOS PRECALCULADO (TOP-K DE TODO EL CATÁLOGO) ---
+# Un trabajo offline calcula, para cada canción del catálogo, sus k vecinos
+# más cercanos en el espacio estandarizado del índice KNN (X_scaled, las
+# columnas del modelo). Después, recomendar es leer una fila de un array:
+#     ids.npy   (n, k) int32    vecinos de cada fila, del más cercano al más lejano
+#     dist.npy  (n, k) float16  distancias euclídeas
+#     manifest.json
+# Mismo criterio que RecommendationIndex.recommend: se piden k+1 y se descarta
+# el primero (la propia canción); empates a la misma distancia: id más bajo.
+#
+# Cálculo por bloques: consultas de QUERY_BLOCK filas contra el catálogo en
+# tiles de MAX_TILE elementos, con una sola GEMM por tile (vectores aumentados:
+# [q, 1] · [-2x, ||x||²] = ||x||² - 2 q·x, que ordena igual que la distancia).
+# Tras el primer tile, solo se fusionan los candidatos que mejoran el k-ésimo
+# actual de su fila, así que el coste es la GEMM + una comparación. La memoria
+# no depende de n: un tile + el top-k del bloque. Los bloques de consultas se
+# reparten entre procesos (BLAS a un hilo en cada uno) que escriben directamente
+# en los .npy de salida con mmap.
+#
+#   python app/neighbor_graph.py --k 4 --workers 8
+
+GRAPH_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'neighbor_graph')
+
+QUERY_BLOCK = 256
+MAX_TILE = 1 << 20
+
+
+def _augment(X, ones):
+    # ones=True: [x, 1] (consultas);  ones=False: [-2x, ||x||²] (catálogo)
+    X = np.asarray(X, dtype=np.float64)
+    last = np.ones(len(X)) if ones else _sq_norms(X)
+    return np.hstack([X if ones else -2.0 * X, last[:, None]])
+
+
+def block_neighbors(X, start, stop, k, max_tile=MAX_TILE):
+    # Top-k (incluida la propia fila) de las consultas X[start:stop] contra todo X.
+    # Devuelve (d2, ids) ordenados por (distancia, id)
+    n = X.shape[0]
+    Q = np.asarray(X[start:stop], dtype=np.float64)
+    nq = len(Q)
+    Qa = _augment(Q, ones=True)
+    col_block = max(k, max_tile // max(nq, 1))
+
+    best_d = best_i = None
+    rows = np.repeat(np.arange(nq), k)
+    for c in range(0, n, col_block):
+        d2 = Qa @ _augment(X[c:c + col_block], ones=False).T
+        if best_d is None:
+            best_d, best_i = _topk(d2, np.arange(c, c + d2.shape[1]), min(k, d2.shape[1]))
+            continue
+        if best_d.shape[1] < k:
+            cand_d, cand_i = _topk(np.hstack([best_d, d2]),
+                                   np.hstack([best_i, np.broadcast_to(np.arange(c, c + d2.shape[1]), d2.shape)]),
+                                   min(k, best_d.shape[1] + d2.shape[1]))
+            best_d, best_i = cand_d, cand_i
+            continue
+        # Solo mejora quien queda por debajo del k-ésimo actual. Empate exacto: los ids
+        # de este tile son mayores que todos los ya vistos, así que pierde (como en _topk)
+        # (flatnonzero sobre la máscara plana es ~10x más rápido que np.nonzero en 2D)
+        hits = np.flatnonzero(d2 < best_d[:, -1:])
+        if not len(hits):
+            continue
+        r, col = np.divmod(hits, d2.shape[1])
+        all_r = np.concatenate([rows, r])
+        all_d = np.concatenate([best_d.ravel(), d2[r, col]])
+        all_i = np.concatenate([best_i.ravel(), col + c])
+        order = np.lexsort((all_i, all_d, all_r))
+        first = np.searchsorted(all_r[order], np.arange(nq))
+        take = order[first[:, None] + np.arange(k)]
+        best_d, best_i = all_d[take], all_i[take]
+
+    # ||q||² se suma al final: no cambia el orden dentro de la fila
+    best_d = np.maximum(best_d + _sq_norms(Q)[:, None], 0)
+    return best_d, best_i
+
+
+def _graph_rows(X, start, stop, k, max_tile):
+    # Vecinos de las filas [start, stop) descartando el primero (la propia canción)
+    d2, ids = block_neighbors(X, start, stop, k + 1, max_tile)
+    return ids[:, 1:].astype(np.int32), np.sqrt(d2[:, 1:]).astype(np.float16)
+
+
+def _worker(args):
+    # Proceso del pool: abre X y la salida con mmap y escribe su rango de filas
+    x_path, out_dir, start, stop, k, max_tile = args
+    X = np.load(x_path, mmap_mode='r')
+    ids = np.load(os.path.join(out_dir, 'ids.npy'), mmap_mode='r+')
+    dist = np.load(os.path.join(out_dir, 'dist.npy'), mmap_mode='r+')
+    for s in range(start, stop, QUERY_BLOCK):
+        e = min(s + QUERY_BLOCK, stop)
+        ids[s:e], dist[s:e] = _graph_rows(X, s, e, k, max_tile)
+    ids.flush()
+    dist.flush()
+    return stop - start
+
+
+class NeighborGraph:
+    def __init__(self, ids, dist, manifest=None):
+        self.ids = ids
+        self.dist = dist
+        self.manifest = manifest or {}
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    @property
+    def k(self):
+        return self.ids.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.dist.nbytes
+
+    def neighbors(self, row, n_neighbors=None):
+        return self.ids[row, :n_neighbors]
+
+    def distances(self, row, n_neighbors=None):
+        return self.dist[row, :n_neighbors]
+
+    @classmethod
+    def build(cls, knn_index, directory, k=4, workers=None, max_tile=MAX_TILE, rows=None):
+        # Escritura atómica: se construye en un directorio temporal y se renombra.
+        # rows: solo las primeras `rows` filas como consultas (para medir y extrapolar)
+        X = knn_index.X_scaled
+        n = X.shape[0]
+        k = min(k, max(n - 1, 0))
+        n_query = n if rows is None else min(rows, n)
+        workers = max(1, min(workers or os.cpu_count() or 1, -(-n_query // QUERY_BLOCK)))
+
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp-graph-')
+        start = time.perf_counter()
+        try:
+            np.lib.format.open_memmap(os.path.join(tmp_dir, 'ids.npy'), mode='w+', dtype=np.int32,
+                                      shape=(n_query, k))
+            np.lib.format.open_memmap(os.path.join(tmp_dir, 'dist.npy'), mode='w+', dtype=np.float16,
+                                      shape=(n_query, k))
+            x_path = os.path.join(knn_index.directory, 'X_scaled.npy') if knn_index.directory else None
+            if workers == 1 or x_path is None:
+                workers = 1
+                ids = np.load(os.path.join(tmp_dir, 'ids.npy'), mmap_mode='r+')
+                dist = np.load(os.path.join(tmp_dir, 'dist.npy'), mmap_mode='r+')
+                for s in range(0, n_query, QUERY_BLOCK):
+                    e = min(s + QUERY_BLOCK, n_query)
+                    ids[s:e], dist[s:e] = _graph_rows(X, s, e, k, max_tile)
+                ids.flush()
+                dist.flush()
+                del ids, dist
+            else:
+                _run_pool(x_path, tmp_dir, n_query, k, workers, max_tile)
+
+            manifest = {
+                'graph_version': GRAPH_VERSION,
+                'dataset_hash': knn_index.manifest.get('dataset_hash'),
+                **index_identity(knn_index),
+                'n_rows': int(n),
+                'n_query_rows': int(n_query),
+                'k': int(k),
+                'columns': list(knn_index.columns),
+                'workers': int(workers),
+                'build_seconds': round(time.perf_counter() - start, 3),
+                'created_at': time.time(),
+            }
+            with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+            os.replace(tmp_dir, directory)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return cls.load(directory)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest.get('graph_version') != GRAPH_VERSION:
+            raise ValueError(f"Versión de grafo no soportada: {manifest.get('graph_version')}")
+        # ndarray sobre el mapeo (sin copia): leer una fila es un acceso a memoria
+        ids = np.asarray(np.load(os.path.join(directory, 'ids.npy'), mmap_mode='r'))
+        dist = np.asarray(np.load(os.path.join(directory, 'dist.npy'), mmap_mode='r'))
+        return cls(ids, dist, manifest)
+
+
+def _run_pool(x_path, out_dir, n_query, k, workers, max_tile):
+    # 'spawn' + BLAS a un hilo: cada proceso usa un core sin sobresuscribir
+    import multiprocessing
+
+    blocks = -(-n_query // QUERY_BLOCK)
+    # Trozos de varios bloques, más trozos que workers para equilibrar la carga
+    per_task = max(1, blocks // (workers * 4)) * QUERY_BLOCK
+    tasks = [(x_path, out_dir, s, min(s + per_task, n_query), k, max_tile) for s in range(0, n_query, per_task)]
+    env_vars = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+    saved = {v: os.environ.get(v) for v in env_vars}
+    os.environ.update({v: '1' for v in env_vars})
+    try:
+        with multiprocessing.get_context('spawn').Pool(workers) as pool:
+            for _ in pool.imap_unordered(_worker, tasks):
+                pass
+    finally:
+        for v, value in saved.items():
+            if value is None:
+                os.environ.pop(v, None)
+            else:
+                os.environ[v] = value
+
+
+def index_identity(knn_index):
+    # Qué X_scaled (escalado y orden de filas) se usó: con el mismo CSV, el
+    # índice exacto y el del catálogo incremental no tienen por qué coincidir,
+    # y el incremental cambia con cada escritura del catálogo (p. ej. una
+    # compactación que re-estandariza)
+    return {'index_kind': type(knn_index).__name__,
+            'catalog_uid': knn_index.manifest.get('catalog_uid'),
+            'catalog_revision': knn_index.manifest.get('catalog_revision')}
+
+
+def graph_dir(dataset_hash, k, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f'{dataset_hash[:16]}_k{k}')
+
+
+def load_neighbor_graph(knn_index, k=4, cache_dir=CACHE_DIR):
+    # Grafo ya construido para este catálogo (o None: la app calcula los vecinos al vuelo)
+    dataset_hash = knn_index.manifest.get('dataset_hash')
+    if not dataset_hash:
+        return None
+    try:
+        graph = NeighborGraph.load(graph_dir(dataset_hash, k, cache_dir))
+    except (FileNotFoundError, ValueError, KeyError, json.JSONDecodeError):
+        return None
+    m = graph.manifest
+    if m.get('dataset_hash') != dataset_hash or m.get('n_query_rows') != len(knn_index) or m.get('k') != k:
+        return None
+    if any(m.get(key) != value for key, value in index_identity(knn_index).items()):
+        return None
+    return graph
+
+
+def load_or_build_graph(knn_index, k=4, cache_dir=CACHE_DIR, workers=None):
+    graph = load_neighbor_graph(knn_index, k, cache_dir)
+    if graph is None:
+        directory = graph_dir(knn_index.manifest.get('dataset_hash') or 'memoria', k, cache_dir)
+        graph = NeighborGraph.build(knn_index, directory, k=k, workers=workers)
+    return graph
+
+
+def main(argv=None):
+    from catalog_cache import source_hash
+    from catalog_store import load_catalog_store
+    from resources import DATASET_PATH, load_index
+
+    parser = argparse.ArgumentParser(description="Precalcula el grafo top-k de vecinos del catálogo.")
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--k', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=None, help="procesos (por defecto, todos los cores)")
+    parser.add_argument('--max-tile', type=int, default=MAX_TILE, help="elementos por tile de distancias")
+    args = parser.parse_args(argv)
+
+    df = load_catalog_store(args.dataset)
+    dataset_hash = source_hash(args.dataset)
+    # El mismo índice que sirve la app (resources.load_index): mismas filas y mismo escalado
+    knn_index = load_index(df, args.dataset, dataset_hash)
+    graph = NeighborGraph.build(knn_index, graph_dir(dataset_hash, args.k), k=args.k,
+                                workers=args.workers, max_tile=args.max_tile)
+    m = graph.manifest
+    print(f"Grafo top-{m['k']}: {m['n_rows']:,} canciones en {m['build_seconds']:.1f} s "
+          f"({m['workers']} procesos), {graph.nbytes / 2 ** 20:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
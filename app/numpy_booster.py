@@ -0,0 +1,326 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# --- MODELO XGBOOST EN NUMPY (SIN XGBOOST PARA PREDECIR) ---
+# export_booster() aplana los árboles del XGBClassifier entrenado en arrays
+# planos (feature, umbral, hijos, dirección por defecto, valor de hoja) que se
+# guardan como .npy + manifest.json. NumpyBooster los carga con mmap y
+# evalúa lotes enteros nivel a nivel: en cada nivel, todas las filas x todos
+# los árboles bajan un paso a la vez con gathers vectorizados.
+#
+# Las hojas apuntan a sí mismas, así que tras `max_depth` pasos todas las
+# filas han llegado a su hoja sin bucles por árbol. Los árboles se ordenan
+# por profundidad: en el nivel L solo se avanzan los que son más profundos
+# que L (un bloque contiguo al final). Se compara en float32 (x < umbral)
+# igual que XGBoost; NaN sigue la rama por defecto.
+#
+# Interfaz compatible con el modelo original: predict_proba(X) / predict(X).
+# predict_contribs(X): contribución de cada feature al margen de cada clase
+# (atribución por camino, la de pred_contribs(approx_contribs=True) de
+# XGBoost). Necesita el cover de cada nodo (cover.npy, opcional: los exports
+# anteriores no lo tienen).
+#
+# Exportar (necesita xgboost, solo una vez):
+#   python app/numpy_booster.py --model app/modelo_xgboost_final.pkl --output app/modelo_numpy
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(CURRENT_DIR, 'modelo_xgboost_final.pkl')
+EXPORT_DIR = os.path.join(CURRENT_DIR, 'modelo_numpy')
+
+FORMAT_VERSION = 1
+ARRAYS = ('feature', 'threshold', 'children', 'default_left', 'value', 'roots', 'tree_class', 'tree_depth')
+OPTIONAL_ARRAYS = ('cover',)
+
+# Filas por bloque: el estado de recorrido (árboles x filas, int32) cabe en caché
+CHUNK_ROWS = 128
+
+
+def _file_sha1(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def flatten_trees(trees):
+    # Concatena todos los árboles; los ids de nodo pasan a ser globales
+    sizes = [len(t['left_children']) for t in trees]
+    roots = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int32)
+    n_nodes = int(sum(sizes))
+
+    feature = np.zeros(n_nodes, dtype=np.int32)
+    threshold = np.zeros(n_nodes, dtype=np.float32)
+    children = np.zeros((n_nodes, 2), dtype=np.int32)   # [:, 0] = izquierda, [:, 1] = derecha
+    default_left = np.zeros(n_nodes, dtype=bool)
+    value = np.zeros(n_nodes, dtype=np.float32)
+    cover = np.zeros(n_nodes, dtype=np.float32)
+    tree_depth = np.zeros(len(trees), dtype=np.int32)
+
+    for t, (tree, base) in enumerate(zip(trees, roots)):
+        left = np.asarray(tree['left_children'], dtype=np.int64)
+        right = np.asarray(tree['right_children'], dtype=np.int64)
+        cond = np.asarray(tree['split_conditions'], dtype=np.float32)
+        ids = base + np.arange(len(left))
+        leaf = left < 0
+
+        feature[ids] = np.where(leaf, 0, tree['split_indices'])
+        threshold[ids] = np.where(leaf, 0, cond)
+        # Una hoja es su propio hijo (izquierdo y derecho)
+        children[ids, 0] = np.where(leaf, ids, base + left)
+        children[ids, 1] = np.where(leaf, ids, base + right)
+        default_left[ids] = np.asarray(tree['default_left'], dtype=bool) & ~leaf
+        # En XGBoost el valor de una hoja se guarda en split_conditions
+        value[ids] = np.where(leaf, cond, 0)
+        cover[ids] = tree['sum_hessian']
+        tree_depth[t] = _tree_depth(left, right)
+
+    return {'feature': feature, 'threshold': threshold, 'children': children,
+            'default_left': default_left, 'value': value, 'cover': cover, 'roots': roots, 'tree_depth': tree_depth}
+
+
+def _tree_depth(left, right):
+    depth, level = 0, [0]
+    while True:
+        level = [c for n in level for c in (left[n], right[n]) if c >= 0]
+        if not level:
+            return depth
+        depth += 1
+
+
+def export_booster(model, directory, source_path=None):
+    # Necesita xgboost (solo aquí): lee la estructura con save_raw('json')
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    raw = json.loads(booster.save_raw(raw_format='json'))
+    learner = raw['learner']
+    objective = learner['objective']['name']
+    if objective not in ('multi:softprob', 'multi:softmax'):
+        raise ValueError(f"Objetivo no soportado: {objective}")
+    gbm = learner['gradient_booster']
+    if gbm['name'] != 'gbtree':
+        raise ValueError(f"Booster no soportado: {gbm['name']}")
+    trees = gbm['model']['trees']
+    if any(t['categories_nodes'] for t in trees):
+        raise ValueError("Los splits categóricos no están soportados")
+
+    arrays = flatten_trees(trees)
+    n_classes = int(learner['learner_model_param']['num_class'])
+    arrays['tree_class'] = np.asarray(gbm['model']['tree_info'], dtype=np.int32)
+
+    # Margen base: se mide en vez de interpretar base_score (su codificación
+    # cambia entre versiones de XGBoost). margen = base + suma de hojas
+    import xgboost as xgb
+    n_features = int(learner['learner_model_param']['num_feature'])
+    probe = xgb.DMatrix(np.zeros((1, n_features), dtype=np.float32), feature_names=booster.feature_names)
+    margin = booster.predict(probe, output_margin=True)[0].astype(np.float64)
+    leaves = booster.predict(probe, pred_leaf=True)[0].astype(np.int64)
+    leaf_sum = np.zeros(n_classes)
+    np.add.at(leaf_sum, arrays['tree_class'], arrays['value'][arrays['roots'] + leaves])
+    base_margin = margin - leaf_sum
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'objective': objective,
+        'n_classes': n_classes,
+        'n_features': n_features,
+        'feature_names': booster.feature_names,
+        'n_trees': len(trees),
+        'n_nodes': int(len(arrays['value'])),
+        'max_depth': int(arrays['tree_depth'].max()),
+        'base_margin': base_margin.tolist(),
+        'source_sha1': _file_sha1(source_path) if source_path else None,
+    }
+
+    # Escritura atómica: directorio temporal + rename
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp_export_')
+    try:
+        for name in ARRAYS + OPTIONAL_ARRAYS:
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), arrays[name])
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp_dir, directory)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return NumpyBooster.load(directory)
+
+
+def _softmax(margin):
+    margin = margin - margin.max(axis=1, keepdims=True)
+    np.exp(margin, out=margin)
+    margin /= margin.sum(axis=1, keepdims=True)
+    return margin
+
+
+class NumpyBooster:
+    def __init__(self, feature, threshold, children, default_left, value, roots, tree_class, tree_depth, manifest,
+                 cover=None):
+        # Índices en intp: take() con int32 convierte el array de índices en cada llamada
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold)
+        self.children = np.asarray(children, dtype=np.intp).ravel()   # 2*nodo + (0 izq / 1 der)
+        self.default_left = np.asarray(default_left)
+        self.value = np.asarray(value)
+        self.cover = None if cover is None else np.asarray(cover)
+        self._expected = None
+        self.manifest = manifest
+        self.n_classes = manifest['n_classes']
+        self.n_features = manifest['n_features']
+        self.max_depth = manifest['max_depth']
+        self.base_margin = np.asarray(manifest['base_margin'], dtype=np.float64)
+        self.classes_ = np.arange(self.n_classes)
+
+        # Árboles de menos a más profundos; _level_start[L] = primer árbol con profundidad > L
+        order = np.argsort(tree_depth, kind='stable')
+        self.roots = np.asarray(roots, dtype=np.intp)[order]
+        self.tree_class = np.asarray(tree_class, dtype=np.intp)[order]
+        self._level_start = np.searchsorted(np.asarray(tree_depth)[order], np.arange(self.max_depth), side='right')
+        # (clases x árboles): suma de hojas por clase con un único matmul
+        self._class_matrix = np.zeros((self.n_classes, len(order)), dtype=np.float64)
+        self._class_matrix[np.asarray(tree_class)[order], np.arange(len(order))] = 1.0
+
+    @classmethod
+    def load(cls, directory=EXPORT_DIR, mmap_mode='r'):
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Versión de export no soportada: {manifest.get('format_version')}")
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode) for name in ARRAYS}
+        for name in OPTIONAL_ARRAYS:
+            path = os.path.join(directory, f'{name}.npy')
+            if os.path.exists(path):
+                arrays[name] = np.load(path, mmap_mode=mmap_mode)
+        return cls(manifest=manifest, **arrays)
+
+    def _step(self, flat, row_base, active, has_nan):
+        # Un nivel: hijo al que baja cada (árbol, fila) activo
+        # Los índices son válidos por construcción: mode='wrap' evita la comprobación de rango
+        x = flat.take(row_base + self.feature.take(active, mode='wrap'), mode='wrap')
+        go_right = ~(x < self.threshold.take(active, mode='wrap'))
+        if has_nan:
+            missing = np.isnan(x)
+            go_right[missing] = ~self.default_left.take(active[missing])
+        return self.children.take(2 * active + go_right, mode='wrap')
+
+    def _leaves(self, X):
+        # -> ids globales de la hoja alcanzada, (árboles x filas)
+        n_rows = X.shape[0]
+        node = np.repeat(self.roots[:, None], n_rows, axis=1)
+        row_base = np.arange(n_rows, dtype=np.intp) * self.n_features
+        flat = X.ravel()
+        has_nan = np.isnan(flat).any()
+        for level in range(self.max_depth):
+            active = node[self._level_start[level]:]
+            active[...] = self._step(flat, row_base, active, has_nan)
+        return node
+
+    def expected_values(self):
+        # Valor esperado de cada nodo: media de sus hojas ponderada por cover
+        # (de abajo arriba: tras max_depth pasadas ha llegado a todas las raíces)
+        if self._expected is None:
+            if self.cover is None:
+                raise ValueError("El export no tiene cover.npy: vuelve a exportar el modelo")
+            left, right = self.children[0::2], self.children[1::2]
+            internal = np.flatnonzero(left != np.arange(len(left)))
+            l, r = left[internal], right[internal]
+            cover = self.cover.astype(np.float64)
+            w = cover[l] / np.maximum(cover[l] + cover[r], 1e-12)
+            expected = self.value.astype(np.float64)
+            for _ in range(self.max_depth):
+                expected[internal] = w * expected[l] + (1 - w) * expected[r]
+            self._expected = expected
+        return self._expected
+
+    def predict_contribs(self, X):
+        # -> (filas, features + 1, clases); la última "feature" es el sesgo
+        # (margen base + valor esperado de las raíces). Cada paso del camino
+        # suma E[hijo] - E[nodo] a la feature del split: la suma por clase es
+        # exactamente el margen
+        X = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float32)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Se esperaban {self.n_features} columnas y hay {X.shape[1]}")
+        expected = self.expected_values()
+        n_out = (self.n_features + 1) * self.n_classes
+        out = np.empty((X.shape[0], self.n_features + 1, self.n_classes), dtype=np.float64)
+        bias = self.base_margin + np.bincount(self.tree_class, expected[self.roots], minlength=self.n_classes)
+        for s in range(0, X.shape[0], CHUNK_ROWS):
+            chunk = X[s:s + CHUNK_ROWS]
+            n_rows = chunk.shape[0]
+            node = np.repeat(self.roots[:, None], n_rows, axis=1)
+            row_base = np.arange(n_rows, dtype=np.intp) * self.n_features
+            flat = chunk.ravel()
+            has_nan = np.isnan(flat).any()
+            # Celda de salida (fila, feature, clase) de cada (árbol, fila), sin la feature
+            cell = np.arange(n_rows, dtype=np.intp) * n_out + self.tree_class[:, None]
+            contribs = np.zeros(n_rows * n_out)
+            for level in range(self.max_depth):
+                start = self._level_start[level]
+                active = node[start:]
+                child = self._step(flat, row_base, active, has_nan)
+                # En una hoja el hijo es el propio nodo: aporta 0
+                target = cell[start:] + self.feature.take(active, mode='wrap') * self.n_classes
+                contribs += np.bincount(target.ravel(), (expected[child] - expected[active]).ravel(),
+                                        minlength=len(contribs))
+                active[...] = child
+            out[s:s + n_rows] = contribs.reshape(n_rows, self.n_features + 1, self.n_classes)
+        out[:, -1, :] = bias
+        return out
+
+    def predict_margin(self, X):
+        X = np.ascontiguousarray(np.atleast_2d(X), dtype=np.float32)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Se esperaban {self.n_features} columnas y hay {X.shape[1]}")
+        out = np.empty((X.shape[0], self.n_classes), dtype=np.float64)
+        for s in range(0, X.shape[0], CHUNK_ROWS):
+            leaves = self._leaves(X[s:s + CHUNK_ROWS])
+            out[s:s + CHUNK_ROWS] = (self._class_matrix @ self.value.take(leaves, mode='wrap')).T
+        out += self.base_margin
+        return out
+
+    def predict_proba(self, X):
+        return _softmax(self.predict_margin(X)).astype(np.float32)
+
+    def predict(self, X):
+        return self.predict_margin(X).argmax(axis=1)
+
+
+def load_model(model_path=MODEL_PATH, export_dir=EXPORT_DIR):
+    # Preferimos el export NumPy si corresponde a este .pkl (no importa xgboost);
+    # si no existe o está desfasado, se carga el pickle de siempre
+    try:
+        model = NumpyBooster.load(export_dir)
+        sha1 = model.manifest.get('source_sha1')
+        if sha1 is None or not os.path.exists(model_path) or sha1 == _file_sha1(model_path):
+            return model
+    except (FileNotFoundError, ValueError, KeyError, json.JSONDecodeError):
+        pass
+    import joblib
+    return joblib.load(model_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta el XGBClassifier a arrays NumPy.")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--output', default=EXPORT_DIR)
+    args = parser.parse_args(argv)
+
+    import joblib
+    model = joblib.load(args.model)
+    exported = export_booster(model, args.output, source_path=args.model)
+    m = exported.manifest
+    print(f"Exportado en {args.output}: {m['n_trees']} árboles, {m['n_nodes']:,} nodos, "
+          f"profundidad máx. {m['max_depth']}, {m['n_classes']} clases")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from ann import ExactSearch, IVFIndex, QuantizedSearch
+from features import build_matrix
+
+# --- ÍNDICE DE RECOMENDACIÓN (KNN PRECALCULADO) ---
+# En lugar de reajustar StandardScaler + NearestNeighbors en cada clic,
+# el índice se construye una sola vez por versión del catálogo y se guarda
+# en disco como arrays .npy (memory-mappable) + un manifest.json.
+# Las consultas no reajustan nada: búsqueda exacta euclídea por defecto, o
+# aproximada (IVF, ver ann.py) para catálogos grandes. En medio, vectores
+# int8 + re-ranking en float32 (sq8, ver ann.py): mismo resultado que la
+# exacta en la práctica leyendo 8 veces menos memoria por consulta.
+
+INDEX_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'knn_index')
+
+# A partir de este tamaño de catálogo la app usa el backend aproximado (IVF)
+ANN_MIN_ROWS = 200_000
+# ...y a partir de este, los vectores cuantizados con re-ranking (sq8)
+QUANT_MIN_ROWS = 50_000
+
+COLUMNAS_BASICAS = ['energy', 'danceability', 'acousticness', 'valence', 'tempo', 'loudness']
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class RecommendationIndex:
+    def __init__(self, X_scaled, mean, scale, columns, manifest=None):
+        self.X_scaled = X_scaled
+        self.mean = mean
+        self.scale = scale
+        self.columns = list(columns)
+        self.manifest = manifest or {}
+        self.backend = ExactSearch(X_scaled)
+        # Directorio en disco (si se abrió de la caché): el grafo de vecinos lo reabre con mmap
+        self.directory = None
+
+    def __len__(self):
+        return self.X_scaled.shape[0]
+
+    @classmethod
+    def build(cls, df, columns, dataset_hash=None):
+        from sklearn.preprocessing import StandardScaler
+
+        try:
+            X = build_matrix(df, columns, dtype=np.float64)
+        except KeyError:
+            columns = COLUMNAS_BASICAS
+            X = build_matrix(df, columns, dtype=np.float64)
+
+        # Se ajusta UNA vez; guardamos sus parámetros para no volver a ajustar
+        # (en orden Fortran, como un DataFrame, para reproducir bit a bit el escalado de antes)
+        scaler = StandardScaler()
+        X_scaled = np.ascontiguousarray(scaler.fit_transform(np.asfortranarray(X)), dtype=np.float64)
+
+        manifest = {
+            'index_version': INDEX_VERSION,
+            'dataset_hash': dataset_hash,
+            'n_rows': int(X_scaled.shape[0]),
+            'columns': list(columns),
+            'created_at': time.time(),
+        }
+        return cls(X_scaled, scaler.mean_.astype(np.float64), scaler.scale_.astype(np.float64), columns, manifest)
+
+    def save(self, directory):
+        # Escritura atómica: otro worker nunca ve un índice a medias
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp-index-')
+        try:
+            np.save(os.path.join(tmp_dir, 'X_scaled.npy'), self.X_scaled)
+            np.save(os.path.join(tmp_dir, 'mean.npy'), self.mean)
+            np.save(os.path.join(tmp_dir, 'scale.npy'), self.scale)
+            with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+                json.dump(self.manifest, f, indent=2)
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+            os.replace(tmp_dir, directory)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        # mmap_mode='r': todas las sesiones/procesos comparten las mismas páginas
+        X_scaled = np.load(os.path.join(directory, 'X_scaled.npy'), mmap_mode='r')
+        mean = np.load(os.path.join(directory, 'mean.npy'))
+        scale = np.load(os.path.join(directory, 'scale.npy'))
+        index = cls(X_scaled, mean, scale, manifest['columns'], manifest)
+        index.directory = directory
+        return index
+
+    def transform(self, features):
+        # Equivalente a scaler.transform sin volver a ajustar.
+        # Acepta una fila/DataFrame con columnas de audio o una matriz ya construida
+        if isinstance(features, np.ndarray):
+            Q = np.atleast_2d(features).astype(np.float64, copy=False)
+        else:
+            Q = build_matrix(features, self.columns, dtype=np.float64)
+        return (Q - self.mean) / self.scale
+
+    def kneighbors(self, Q_scaled, n_neighbors):
+        # Búsqueda por lotes (una fila de Q por consulta) en el backend activo
+        return self.backend.search(Q_scaled, n_neighbors)
+
+    def use_ivf(self, directory=None, nlist=None, nprobe=None):
+        # Cambia al backend aproximado; si hay directorio, se reutiliza/guarda allí
+        ivf_dir = os.path.join(directory, 'ivf') if directory else None
+        if ivf_dir and os.path.exists(os.path.join(ivf_dir, 'ivf.json')):
+            backend = IVFIndex.load(ivf_dir)
+        else:
+            backend = IVFIndex.build(self.X_scaled, nlist=nlist, nprobe=nprobe)
+            if ivf_dir:
+                try:
+                    backend.save(ivf_dir)
+                except OSError:
+                    pass
+        if nprobe:
+            backend.nprobe = nprobe
+        self.backend = backend
+        return self
+
+    def use_quantized(self, directory=None, rerank=None):
+        # Backend int8 + re-ranking exacto; si hay directorio, se reutiliza/guarda allí
+        sq8_dir = os.path.join(directory, 'sq8') if directory else None
+        if sq8_dir and os.path.exists(os.path.join(sq8_dir, 'sq8.json')):
+            backend = QuantizedSearch.load(sq8_dir)
+        else:
+            backend = QuantizedSearch.build(self.X_scaled)
+            if sq8_dir:
+                try:
+                    backend.save(sq8_dir)
+                    backend = QuantizedSearch.load(sq8_dir)
+                except OSError:
+                    pass
+        if rerank:
+            backend.rerank = rerank
+        self.backend = backend
+        return self
+
+    def recommend(self, current_song_features, n_recommendations=4):
+        # Igual que antes: se pide k+1 y se descarta el primero (la propia canción)
+        _, indices = self.kneighbors(self.transform(current_song_features), n_recommendations + 1)
+        # Un id < 0 es un hueco del backend, nunca una fila (df.iloc[-1] sería la última)
+        indices = indices[0][1:]
+        return indices[indices >= 0]
+
+
+def load_or_build_index(df, dataset_path, columns, cache_dir=CACHE_DIR, dataset_hash=None, backend=None):
+    dataset_hash = dataset_hash or file_hash(dataset_path)
+    directory = os.path.join(cache_dir, dataset_hash[:16])
+    if backend is None:
+        backend = 'ivf' if len(df) >= ANN_MIN_ROWS else 'sq8' if len(df) >= QUANT_MIN_ROWS else 'exact'
+
+    index = None
+    try:
+        index = RecommendationIndex.load(directory)
+        m = index.manifest
+        if not (m.get('index_version') == INDEX_VERSION and m.get('dataset_hash') == dataset_hash
+                and m.get('n_rows') == len(df)):
+            index = None
+    except (FileNotFoundError, ValueError, KeyError, json.JSONDecodeError):
+        index = None
+
+    if index is None:
+        index = RecommendationIndex.build(df, columns, dataset_hash=dataset_hash)
+        try:
+            index.save(directory)
+            index = RecommendationIndex.load(directory)
+        except OSError:
+            # Sin permisos de escritura: seguimos con el índice en memoria
+            directory = None
+
+    if backend == 'ivf':
+        index.use_ivf(directory)
+    elif backend == 'sq8':
+        index.use_quantized(directory)
+    return index
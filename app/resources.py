@@ -0,0 +1,151 @@
+import argparse
+import os
+import time
+
+from catalog_cache import source_hash
+from catalog_store import load_catalog_store
+from explanations import ContributionStore
+from features import FEATURE_SCHEMA, build_matrix, required_columns
+from incremental_catalog import load_or_build_incremental_index
+from model_registry import REGISTRY_DIR, Deployment, ModelHandle, ModelRegistry
+from neighbor_graph import load_neighbor_graph, load_or_build_graph
+from numpy_booster import load_model
+from recommender import file_hash, load_or_build_index
+from result_cache import PredictionCache
+from search_index import load_or_build_search_index
+from startup_profile import PROFILE
+
+# --- RECURSOS DE LA APP (SIN STREAMLIT) ---
+# Los pasos de load_resources en una función normal: la usa app.py (envuelta
+# en st.cache_resource), el perfil de arranque y el warm-up.
+#
+# Warm-up: deja construidas en disco todas las cachés (catálogo columnar,
+# índice KNN, grafo de vecinos, predicciones del catálogo, buscador, índice
+# filtrado, contribuciones por feature). Ejecutado en el despliegue, antes
+# de `streamlit run`, el primer visitante solo abre ficheros con mmap:
+#   python app/resources.py
+#
+# Modelo: la versión activa del registro (model_registry.py) si existe; si
+# no, modelo_xgboost_final.pkl (o su export NumPy) como siempre. model_handle()
+# vigila el registro y cambia de versión en caliente.
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(CURRENT_DIR, 'modelo_xgboost_final.pkl')
+# Apuntamos al nuevo dataset equilibrado
+DATASET_PATH = os.path.join(CURRENT_DIR, '..', 'dataset', 'dataset_demo_balanced.csv')
+CLASES = ['Acoustic', 'Classical', 'Dance', 'Hard-Rock']
+# Filas del catálogo para calentar una versión nueva antes de publicarla
+WARM_ROWS = 256
+
+
+def load_deployment(model_path=MODEL_PATH, registry_dir=REGISTRY_DIR):
+    registry = ModelRegistry(registry_dir)
+    if registry.active() is not None:
+        return registry.load()
+    # Sin registro: export NumPy del XGBoost (app/modelo_numpy), predecir no importa xgboost
+    return Deployment(load_model(model_path), None, file_hash(model_path), None, None)
+
+
+def load_index(df, dataset_path, dataset_hash):
+    # Con track_id, el índice sale del catálogo incremental (incremental_catalog.py):
+    # un CSV con canciones nuevas o quitadas solo procesa el delta. Sin track_id no
+    # hay con qué cruzar las versiones y se construye como siempre
+    if 'track_id' in df.columns:
+        return load_or_build_incremental_index(df, dataset_path, dataset_hash, FEATURE_SCHEMA)
+    return load_or_build_index(df, dataset_path, FEATURE_SCHEMA, dataset_hash=dataset_hash)
+
+
+def build_predictions(deployment, df, knn_index, graph, dataset_hash):
+    # Predicciones del catálogo, indexadas por (track_id, checksum del modelo) y
+    # guardadas en disco por (modelo, dataset)
+    resultados = PredictionCache(deployment.model, model_version=deployment.checksum, knn_index=knn_index, graph=graph)
+    return resultados.fill(df, dataset_hash=dataset_hash)
+
+
+def load_app_resources(model_path=MODEL_PATH, dataset_path=DATASET_PATH, profile=PROFILE, registry_dir=REGISTRY_DIR):
+    with profile.step('load_resources: modelo'):
+        deployment = load_deployment(model_path, registry_dir)
+        model = deployment.model
+
+    with profile.step('load_resources: catálogo'):
+        # Catálogo compacto (solo las columnas que usa la app, texto codificado,
+        # features float32) abierto con mmap; ver catalog_store.py
+        df = load_catalog_store(dataset_path)
+        dataset_hash = source_hash(dataset_path)
+
+    with profile.step('load_resources: índice KNN'):
+        # Se construye una vez por versión del dataset y se comparte entre
+        # todas las sesiones (arrays en disco con mmap); los cambios del
+        # catálogo entran como segmentos + tombstones
+        knn_index = load_index(df, dataset_path, dataset_hash)
+
+    with profile.step('load_resources: grafo de vecinos'):
+        # Top-k de cada canción precalculado offline (neighbor_graph.py); si no
+        # existe, los vecinos se calculan al vuelo con el índice KNN
+        graph = load_neighbor_graph(knn_index)
+
+    with profile.step('load_resources: predicciones'):
+        resultados = build_predictions(deployment, df, knn_index, graph, dataset_hash)
+
+    return model, df, knn_index, resultados
+
+
+def model_handle(df, knn_index, resultados, registry_dir=REGISTRY_DIR, interval=2.0):
+    # Modelo activo + sus predicciones del catálogo; cuando cambia la versión
+    # activa del registro se prepara la nueva en segundo plano y se sustituye
+    registry = ModelRegistry(registry_dir)
+    version = registry.find(resultados.model_version)
+    deployment = Deployment(resultados.model, version, resultados.model_version,
+                            registry.metadata(version) if version else None, resultados)
+    dataset_hash = knn_index.manifest.get('dataset_hash')
+    warm = build_matrix({c: df[c].to_numpy()[:WARM_ROWS] for c in required_columns(FEATURE_SCHEMA)}, FEATURE_SCHEMA)
+
+    def prepare(new):
+        return build_predictions(new, df, knn_index, resultados.graph, dataset_hash)
+
+    return ModelHandle(deployment, registry, prepare, warm_rows=warm, interval=interval).start()
+
+
+def load_search_index(df, dataset_hash):
+    return load_or_build_search_index(df, dataset_hash)
+
+
+def load_filtered_index(df, knn_index, resultados, classes=None):
+    # Búsqueda con filtros / varias semillas: particiones por género predicho
+    # (etiquetas de la caché de resultados), una versión por catálogo + modelo
+    from filtered_search import load_or_build_filtered_index
+    return load_or_build_filtered_index(knn_index, resultados.labels, df, resultados.model_version, classes=classes)
+
+
+def load_explanations(df, resultados, dataset_hash):
+    # Contribuciones por feature del catálogo para el modelo de resultados (una
+    # versión por catálogo + modelo, float16 con mmap; ver explanations.py)
+    store = ContributionStore(resultados.model, resultados.model_version)
+    return store.fill(df, dataset_hash=dataset_hash)
+
+
+def warm_up(model_path=MODEL_PATH, dataset_path=DATASET_PATH):
+    # El grafo primero: así load_app_resources ya lo abre con mmap
+    df, dataset_hash = load_catalog_store(dataset_path), source_hash(dataset_path)
+    load_or_build_graph(load_index(df, dataset_path, dataset_hash))
+    model, df, knn_index, resultados = load_app_resources(model_path, dataset_path)
+    load_search_index(df, knn_index.manifest['dataset_hash'])
+    load_filtered_index(df, knn_index, resultados, classes=CLASES)
+    load_explanations(df, resultados, knn_index.manifest['dataset_hash'])
+    return model, df, knn_index, resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precalcula las cachés de la app (warm-up de despliegue).")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    _, df, knn_index, _ = warm_up(args.model, args.dataset)
+    print(f"Cachés listas: {len(df):,} canciones, índice {knn_index.backend.kind} "
+          f"({time.perf_counter() - start:.1f} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from features import FEATURE_SCHEMA, build_matrix, required_columns
+from metrics import METRICS
+
+# --- CACHÉ DE RESULTADOS (PREDICCIÓN + VECINOS) ---
+# Clave: (track_id, versión del modelo). Para las canciones del catálogo todo
+# se precalcula en bloque al cargar (un único predict_proba vectorizado) y una
+# consulta repetida es un acceso a diccionario + array, no una llamada al
+# modelo. Los vecinos se calculan la primera vez que se piden y se guardan.
+# Las entradas ad-hoc (features que no están en el catálogo) van a un LRU
+# acotado. Todo expone contadores de aciertos / fallos / expulsiones (y, con
+# APP_METRICS=1, los reporta también a metrics.py junto a las latencias).
+#
+# Con dataset_hash, las probabilidades del catálogo se guardan en disco
+# (.npy por modelo + dataset) y los arranques siguientes las abren con mmap
+# en lugar de volver a llamar al modelo.
+#
+# Con un grafo de vecinos precalculado (neighbor_graph.py), los vecinos de
+# todo el catálogo ya están en disco: recomendar es leer una fila del array.
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'predictions')
+
+Result = namedtuple('Result', ['label', 'probs', 'neighbors'])
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024, name=None):
+        self.maxsize = maxsize
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                if self.name is not None:
+                    METRICS.cache(self.name, False)
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+        if self.name is not None:
+            METRICS.cache(self.name, True)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
+class PredictionCache:
+    def __init__(self, model, model_version, knn_index=None, n_neighbors=4, maxsize=1024, graph=None):
+        self.model = model
+        self.model_version = model_version
+        self.knn_index = knn_index
+        self.graph = graph
+        self.n_neighbors = n_neighbors
+        self.adhoc = LRUCache(maxsize, name='adhoc')
+        self._lock = threading.Lock()
+        self._row_of = {}
+        self.labels = None
+        self.probs = None
+        self.neighbors = None
+        self.hits = 0
+        self.misses = 0
+        self.neighbors_computed = 0
+
+    def _predict_catalog(self, df, batch_size):
+        # Predicción en bloque de todo el catálogo (por lotes para acotar memoria)
+        # Solo las columnas del modelo (con CatalogStore no se decodifica el texto)
+        columns = {c: df[c].to_numpy() for c in required_columns(FEATURE_SCHEMA)}
+        probs = []
+        for s in range(0, len(df), batch_size):
+            X = build_matrix({c: v[s:s + batch_size] for c, v in columns.items()}, FEATURE_SCHEMA)
+            probs.append(self.model.predict_proba(X).astype(np.float32))
+        return np.concatenate(probs) if probs else np.empty((0, 0), dtype=np.float32)
+
+    def _cached_probs(self, df, dataset_hash, cache_dir, batch_size):
+        path = os.path.join(cache_dir, f'{str(self.model_version)[:16]}_{dataset_hash[:16]}.npy')
+        try:
+            probs = np.load(path, mmap_mode='r')
+            if probs.shape[0] == len(df):
+                return probs
+        except (FileNotFoundError, ValueError):
+            pass
+        probs = self._predict_catalog(df, batch_size)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = path + '.tmp.npy'
+            np.save(tmp, probs)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+        return probs
+
+    def fill(self, df, id_column='track_id', batch_size=100_000, dataset_hash=None, cache_dir=CACHE_DIR):
+        n = len(df)
+        if dataset_hash is not None:
+            self.probs = self._cached_probs(df, dataset_hash, cache_dir, batch_size)
+        else:
+            self.probs = self._predict_catalog(df, batch_size)
+        self.labels = self.probs.argmax(axis=1) if n else np.empty(0, dtype=np.int64)
+        if self.graph is not None and len(self.graph) == n and self.graph.k >= self.n_neighbors:
+            # Grafo precalculado (mmap, solo lectura): no queda nada por calcular
+            self.neighbors = self.graph.ids[:, :self.n_neighbors]
+        else:
+            # Vecinos: -1 = aún no calculados
+            self.neighbors = np.full((n, self.n_neighbors), -1, dtype=np.int32)
+
+        ids = df[id_column].to_numpy() if id_column in df.columns else np.arange(n)
+        row_of = {}
+        for row, track_id in enumerate(ids):
+            # Duplicados: gana la primera aparición (como el buscador)
+            row_of.setdefault(track_id, row)
+        self._row_of = row_of
+        return self
+
+    def row_of(self, track_id):
+        return self._row_of.get(track_id)
+
+    def _neighbors_for_row(self, row, features):
+        with self._lock:
+            if self.neighbors[row, 0] < 0:
+                with METRICS.timer('vecinos (KNN)'):
+                    found = np.asarray(self.knn_index.recommend(features, self.n_neighbors))
+                # recommend puede devolver menos de n_neighbors (catálogo pequeño,
+                # filtros, listas IVF cortas): el resto de la fila se queda a -1
+                self.neighbors[row, :len(found)] = found
+                self.neighbors_computed += 1
+            neighbors = self.neighbors[row]
+            return neighbors[neighbors >= 0]
+
+    def lookup(self, track_id, features=None, model_version=None):
+        # features: la fila del catálogo (solo se usa si faltan los vecinos)
+        if model_version is not None and model_version != self.model_version:
+            return None
+        row = self._row_of.get(track_id)
+        METRICS.cache('predicciones', row is not None)
+        if row is None:
+            self.misses += 1
+            return None if features is None else self.lookup_features(features)
+
+        self.hits += 1
+        neighbors = self.neighbors[row]
+        METRICS.cache('vecinos', neighbors[0] >= 0)
+        if neighbors[0] < 0:
+            neighbors = None
+            if self.knn_index is not None and features is not None:
+                neighbors = self._neighbors_for_row(row, features)
+        else:
+            # Fila incompleta (menos vecinos que n_neighbors): sin el relleno -1
+            neighbors = neighbors[neighbors >= 0]
+        return Result(int(self.labels[row]), self.probs[row], neighbors)
+
+    def lookup_features(self, features):
+        # Entrada ad-hoc (no está en el catálogo): LRU por (versión, vector de features)
+        with METRICS.timer('features'):
+            X = build_matrix(features, FEATURE_SCHEMA)
+        key = (self.model_version, X.tobytes())
+
+        def compute():
+            with METRICS.timer('predict'):
+                probs = self.model.predict_proba(X)[0].astype(np.float32)
+            neighbors = None
+            if self.knn_index is not None:
+                with METRICS.timer('vecinos (KNN)'):
+                    neighbors = self.knn_index.recommend(features, self.n_neighbors)
+            return Result(int(probs.argmax()), probs, neighbors)
+
+        return self.adhoc.get_or_compute(key, compute)
+
+    def stats(self):
+        return {
+            'model_version': self.model_version,
+            'catalog_rows': len(self._row_of),
+            'hits': self.hits,
+            'misses': self.misses,
+            'neighbors_computed': self.neighbors_computed,
+            'adhoc': self.adhoc.stats(),
+        }
@@ -0,0 +1,190 @@
+import bisect
+import os
+import pickle
+import re
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+# --- ÍNDICE DE BÚSQUEDA (TYPEAHEAD) ---
+# Sustituye al selectbox con TODO el catálogo y al escaneo
+# df_music[df_music['display_name'] == ...]:
+#   - hash map display_name -> fila (búsqueda O(1) de la canción elegida)
+#   - índice de prefijos por palabra (nombre + artistas), normalizado sin
+#     acentos ni mayúsculas ("beyonce" encuentra "Beyoncé")
+#   - índice de trigramas para coincidencias aproximadas (erratas)
+#   - ranking por `popularity`
+#
+# Truco: cada entrada se identifica por su posición en el orden de
+# popularidad (rank). Las listas de postings están ordenadas por rank, así
+# que las N sugerencias más populares son simplemente los N primeros ids.
+# Se construye una vez por versión del catálogo y se guarda con pickle
+# (joblib envuelve cada uno de los miles de arrays pequeños: 10x más lento).
+
+INDEX_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'search_index')
+
+# Prefijos cortos (1-3 letras) con su top precalculado: son los más caros
+SHORT_PREFIX = 3
+SHORT_PREFIX_TOP = 50
+
+_NO_ALNUM = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    text = str(text)
+    if not text.isascii():
+        # Quitamos acentos: "Beyoncé" -> "beyonce"
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(_NO_ALNUM.sub(' ', text.casefold()).split())
+
+
+def trigrams(norm):
+    padded = f'  {norm} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    def __init__(self, display, rows, norms, tokens, token_postings, prefix_top, trigram_postings):
+        self.display = display                    # rank -> display_name
+        self.rows = rows                          # rank -> fila del DataFrame
+        self.norms = norms                        # rank -> texto normalizado
+        self.tokens = tokens                      # palabras ordenadas (para bisect)
+        self.token_postings = token_postings      # palabra -> ranks (ascendente)
+        self.prefix_top = prefix_top              # prefijo corto -> top ranks
+        self.trigram_postings = trigram_postings  # trigrama -> ranks
+        self._row_of = dict(zip(display, rows.tolist()))
+
+    def __len__(self):
+        return len(self.display)
+
+    @classmethod
+    def build(cls, df, name_col='display_name', popularity_col='popularity'):
+        names = df[name_col].astype(str).to_numpy()
+        first_row = {}
+        for row, name in enumerate(names):
+            # display_name repetido (misma canción en varios géneros): gana la primera fila
+            first_row.setdefault(name, row)
+        display = np.array(list(first_row), dtype=object)
+        rows = np.fromiter(first_row.values(), dtype=np.int64, count=len(first_row))
+
+        if popularity_col in df.columns:
+            popularity = df[popularity_col].to_numpy()[rows]
+        else:
+            popularity = np.zeros(len(rows))
+        order = np.argsort(-popularity, kind='stable')
+        display, rows = display[order].tolist(), rows[order]
+
+        norms = [normalize(d) for d in display]
+        token_lists = defaultdict(list)
+        trigram_lists = defaultdict(list)
+        for rank, norm in enumerate(norms):
+            for tok in set(norm.split()):
+                token_lists[tok].append(rank)
+            for tri in trigrams(norm):
+                trigram_lists[tri].append(rank)
+
+        tokens = sorted(token_lists)
+        token_postings = {t: np.asarray(token_lists[t], dtype=np.int32) for t in tokens}
+        trigram_postings = {t: np.asarray(v, dtype=np.int32) for t, v in trigram_lists.items()}
+
+        prefix_top = {}
+        for length in range(1, SHORT_PREFIX + 1):
+            for prefix in {t[:length] for t in tokens if len(t) >= length}:
+                lo, hi = _prefix_range(tokens, prefix)
+                ranks = np.unique(np.concatenate([token_postings[t] for t in tokens[lo:hi]]))
+                prefix_top[prefix] = ranks[:SHORT_PREFIX_TOP]
+
+        return cls(display, rows, norms, tokens, token_postings, prefix_top, trigram_postings)
+
+    # --- consultas ---
+    def row_of(self, display_name):
+        return self._row_of.get(display_name)
+
+    def _prefix_ranks(self, prefix):
+        lo, hi = _prefix_range(self.tokens, prefix)
+        if lo == hi:
+            return np.empty(0, dtype=np.int32)
+        if hi - lo == 1:
+            return self.token_postings[self.tokens[lo]]
+        return np.unique(np.concatenate([self.token_postings[t] for t in self.tokens[lo:hi]]))
+
+    def _match(self, words, limit):
+        *complete, last = words
+        if not complete:
+            if len(last) <= SHORT_PREFIX and len(self.prefix_top.get(last, ())) >= min(limit, SHORT_PREFIX_TOP):
+                return self.prefix_top[last][:limit]
+            return self._prefix_ranks(last)[:limit]
+
+        # Palabras completas: intersección empezando por la lista más corta
+        postings = sorted((self.token_postings.get(w, np.empty(0, dtype=np.int32)) for w in complete), key=len)
+        ranks = postings[0]
+        for p in postings[1:]:
+            if not len(ranks):
+                break
+            ranks = np.intersect1d(ranks, p, assume_unique=True)
+        # La última palabra es un prefijo: se filtran los candidatos en orden de
+        # popularidad y se para al llegar a `limit`
+        out = []
+        for r in ranks.tolist():
+            if any(w.startswith(last) for w in self.norms[r].split()):
+                out.append(r)
+                if len(out) == limit:
+                    break
+        return np.asarray(out, dtype=np.int32)
+
+    def _fuzzy(self, norm, limit, exclude=()):
+        grams = [g for g in trigrams(norm) if g in self.trigram_postings]
+        if not grams:
+            return np.empty(0, dtype=np.int32)
+        counts = np.bincount(np.concatenate([self.trigram_postings[g] for g in grams]), minlength=len(self))
+        counts[list(exclude)] = 0
+        min_shared = max(1, int(0.5 * len(trigrams(norm))))
+        cand = np.flatnonzero(counts >= min_shared)
+        # Más trigramas en común primero; a igualdad, más popular (rank menor)
+        cand = cand[np.lexsort((cand, -counts[cand]))]
+        return cand[:limit]
+
+    def suggest_ranks(self, query, limit=10, fuzzy=True):
+        norm = normalize(query)
+        if not norm:
+            return np.arange(min(limit, len(self)), dtype=np.int32)
+        ranks = self._match(norm.split(), limit)
+        if fuzzy and len(ranks) < limit:
+            extra = self._fuzzy(norm, limit - len(ranks), exclude=ranks)
+            ranks = np.concatenate((ranks, extra)).astype(np.int32)
+        return ranks
+
+    def suggest(self, query, limit=10, fuzzy=True):
+        return [self.display[r] for r in self.suggest_ranks(query, limit, fuzzy)]
+
+
+def _prefix_range(tokens, prefix):
+    lo = bisect.bisect_left(tokens, prefix)
+    hi = bisect.bisect_left(tokens, prefix + '\U0010ffff')
+    return lo, hi
+
+
+def load_or_build_search_index(df, dataset_hash, cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, f'{dataset_hash[:16]}.pkl')
+    try:
+        with open(path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached.get('version') == INDEX_VERSION and cached.get('n_rows') == len(df):
+            return cached['index']
+    except (FileNotFoundError, EOFError, KeyError, AttributeError, pickle.UnpicklingError):
+        pass
+
+    index = SearchIndex.build(df)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump({'version': INDEX_VERSION, 'n_rows': len(df), 'index': index}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return index
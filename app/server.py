@@ -0,0 +1,492 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from batch_classify import clases
+from catalog_cache import load_catalog, source_hash
+from features import FEATURE_SCHEMA, build_matrix, required_columns
+from filtered_search import load_or_build_filtered_index
+from metrics import METRICS
+from model_registry import REGISTRY_DIR, Deployment, ModelHandle, ModelRegistry
+from resources import WARM_ROWS, load_deployment, load_index
+
+# --- SERVIDOR DE INFERENCIA (asyncio + micro-batching) ---
+# Servicio HTTP independiente de Streamlit sobre el mismo modelo y catálogo:
+#
+#   POST /classify  {"track_id": "..."}  o  {"features": {"energy": ..., ...}}
+#   POST /similar   {"track_id": "...", "k": 4}  o  {"features": {...}, "k": 4}
+#                   con filtros / varias semillas (filtered_search.py):
+#                   {"track_ids": ["...", "..."], "genres": ["Dance"],
+#                    "filters": {"popularity": [40, 80], "explicit": false}, "fusion": "centroid"}
+#                   (en GET: ?track_ids=a,b&genres=Dance,Acoustic; los filtros solo por POST)
+#   GET  /health, GET /stats
+#   GET  /model     versión activa del registro de modelos (model_registry.py);
+#                   una versión nueva se carga, calienta y cambia en caliente
+#   GET  /metrics   latencias por ruta / etapa y contadores en texto de Prometheus
+#                   (con --metrics o APP_METRICS=1; ver metrics.py)
+#
+# Las peticiones concurrentes que llegan dentro de una ventana corta
+# (--max-wait-ms) se agrupan en UN predict_proba y UNA consulta de vecinos por
+# lotes (--max-batch). Si la cola supera --max-queue se responde 503
+# (backpressure) en lugar de acumular latencia.
+#
+# Uso:
+#   python app/server.py --port 8000 --max-batch 64 --max-wait-ms 5
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(CURRENT_DIR, 'modelo_xgboost_final.pkl')
+DATASET_PATH = os.path.join(CURRENT_DIR, '..', 'dataset', 'dataset_demo_balanced.csv')
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+# Límites por petición: cuerpo JSON y vecinos pedidos
+MAX_BODY = 1 << 20
+MAX_K = 100
+
+
+class Overloaded(Exception):
+    pass
+
+
+class NotFound(KeyError):
+    pass
+
+
+class MicroBatcher:
+    # Agrupa peticiones y llama a `process(items) -> resultados` una vez por lote.
+    # Un resultado que sea una excepción se propaga solo a su petición.
+    def __init__(self, process, max_batch=64, max_wait=0.005, max_queue=1024, executor=None):
+        self.process = process
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.executor = executor
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise Overloaded()
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            try:
+                # El cálculo va a un hilo: el event loop sigue aceptando peticiones
+                results = await loop.run_in_executor(self.executor, self.process, items)
+            except Exception as exc:
+                results = [exc] * len(batch)
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self):
+        return {'batches': self.batches, 'items': self.items, 'rejected': self.rejected,
+                'queue': self.queue.qsize(),
+                'avg_batch': self.items / self.batches if self.batches else 0.0}
+
+
+FILTERED_KEYS = ('track_ids', 'genres', 'filters', 'fusion')
+# En GET llegan como texto: ?track_ids=a,b&genres=Dance (o el parámetro repetido)
+LIST_KEYS = ('track_ids', 'genres')
+
+
+def parse_query(query):
+    item = {}
+    for key, values in parse_qs(query).items():
+        if key in LIST_KEYS:
+            item[key] = [v for value in values for v in value.split(',') if v]
+        else:
+            item[key] = values[0]
+    return item
+
+
+def parse_k(item, default=4):
+    # k de /similar: entero en [1, MAX_K]
+    value = item.get('k', default)
+    try:
+        k = int(value)
+    except (TypeError, ValueError):
+        k = None
+    if k is None or isinstance(value, float) and value != k:
+        raise ValueError(f"k debe ser un entero: {value!r}")
+    if not 1 <= k <= MAX_K:
+        raise ValueError(f"k debe estar entre 1 y {MAX_K}: {value!r}")
+    return k
+
+
+def parse_filtered(item):
+    # -> (semillas o None, opciones de FilteredIndex.search); ValueError si un tipo no encaja
+    seeds = item.get('track_ids')
+    if seeds is not None and not (isinstance(seeds, list) and all(isinstance(t, str) for t in seeds)):
+        raise ValueError(f"track_ids debe ser una lista de track_id: {seeds!r}")
+    if not seeds and 'track_id' in item:
+        seeds = [item['track_id']]
+    genres = item.get('genres')
+    if genres is not None and not isinstance(genres, (str, list)):
+        raise ValueError(f"genres debe ser un género o una lista: {genres!r}")
+    filters = item.get('filters') or {}
+    if not isinstance(filters, dict):
+        raise ValueError(f"filters debe ser un objeto {{columna: valor o [min, max]}}: {filters!r}")
+    options = {'genres': genres, 'fusion': item.get('fusion', 'centroid'),
+               'filters': {c: tuple(v) if isinstance(v, list) else v for c, v in filters.items()}}
+    return seeds or None, options
+
+
+def parse_features(features, columns):
+    # -> {columna: float}; ValueError si falta alguna o no es numérica
+    missing = [c for c in columns if c not in features]
+    if missing:
+        raise ValueError(f"faltan features: {missing}")
+    values = {}
+    for c in columns:
+        try:
+            values[c] = float(features[c])
+        except (TypeError, ValueError):
+            raise ValueError(f"feature no numérica: {c}={features[c]!r}")
+    return values
+
+
+class InferenceService:
+    def __init__(self, model, df, knn_index, filtered_index=None, handle=None):
+        # handle: modelo + índice filtrado activos (cambian en caliente); cada lote lee
+        # handle.current una sola vez y usa esa versión de principio a fin
+        self.handle = handle or ModelHandle(Deployment(model, None, None, None, filtered_index))
+        self.df = df
+        self.knn_index = knn_index
+        ids = df['track_id'].to_numpy() if 'track_id' in df.columns else np.arange(len(df))
+        self.row_of = {}
+        for row, track_id in enumerate(ids):
+            self.row_of.setdefault(str(track_id), row)
+        self.track_ids = ids
+        # Matriz del modelo del catálogo completo: una petición por track_id es un acceso por fila
+        self.X_catalog = build_matrix(df, FEATURE_SCHEMA)
+
+    @property
+    def model(self):
+        return self.handle.current.model
+
+    @property
+    def filtered_index(self):
+        return self.handle.current.resources
+
+    def _resolve(self, items, schema, dtype, catalog_matrix, with_k=False):
+        # -> (matriz de las peticiones válidas, posiciones, filas del catálogo, errores)
+        # Todo lo que puede fallar por petición se valida aquí: un error va solo a su
+        # posición y el resto del lote sigue
+        rows, feats, positions, errors = [], [], [], [None] * len(items)
+        columns = required_columns(schema)
+        for i, item in enumerate(items):
+            try:
+                if with_k:
+                    parse_k(item)
+                if 'track_id' in item:
+                    row = self.row_of.get(str(item['track_id']))
+                    if row is None:
+                        raise NotFound(f"track_id desconocido: {item['track_id']}")
+                    values = None
+                elif isinstance(item.get('features'), dict):
+                    row, values = -1, parse_features(item['features'], columns)
+                else:
+                    raise ValueError("se esperaba 'track_id' o 'features'")
+            except (ValueError, NotFound) as exc:
+                errors[i] = exc
+                continue
+            rows.append(row)
+            feats.append(values)
+            positions.append(i)
+
+        rows = np.asarray(rows, dtype=np.int64)
+        X = np.empty((len(rows), len(schema)), dtype=dtype)
+        known = rows >= 0
+        if known.any():
+            X[known] = catalog_matrix[rows[known]]
+        if (~known).any():
+            raw = [f for f in feats if f is not None]
+            cols = {c: np.array([f[c] for f in raw]) for c in columns}
+            X[~known] = build_matrix(cols, schema, dtype=dtype)
+        return X, positions, rows, errors
+
+    def classify_batch(self, items):
+        X, positions, rows, results = self._resolve(items, FEATURE_SCHEMA, np.float32, self.X_catalog)
+        METRICS.inc('batch_items', len(items), endpoint='classify')
+        if len(positions):
+            active = self.handle.current
+            classes = (active.metadata or {}).get('classes', clases)
+            with METRICS.timer('predict (lote)'):
+                probs = active.model.predict_proba(X)
+            for p, i in enumerate(positions):
+                results[i] = {
+                    'track_id': items[i].get('track_id'),
+                    'label': classes[int(probs[p].argmax())],
+                    'probs': {c: float(v) for c, v in zip(classes, probs[p])},
+                    'model_version': active.version,
+                }
+        return results
+
+    def _neighbors_payload(self, ids, dist):
+        return {'neighbors': [
+            {'track_id': str(self.track_ids[j]), 'name': str(self.df['name'].iat[j]) if 'name' in self.df.columns else None,
+             'artists': str(self.df['artists'].iat[j]) if 'artists' in self.df.columns else None,
+             'distance': float(d)}
+            for j, d in zip(ids, dist)
+        ]}
+
+    def similar_filtered(self, item):
+        # Filtros y/o varias semillas: una búsqueda en el índice particionado por petición
+        index, k = self.filtered_index, parse_k(item)
+        if index is None:
+            raise ValueError("búsqueda con filtros no disponible")
+        seeds, options = parse_filtered(item)
+        if seeds is None:
+            # Features sueltas como única semilla
+            X, _, _, errors = self._resolve([item], self.knn_index.columns, np.float64, self.knn_index.X_scaled)
+            if errors[0] is not None:
+                raise errors[0]
+            dist, ids = index.search(self.knn_index.transform(X), k, **options)
+            return self._neighbors_payload(ids, dist)
+        rows = [self.row_of.get(str(t)) for t in seeds]
+        missing = [t for t, r in zip(seeds, rows) if r is None]
+        if missing:
+            raise NotFound(f"track_id desconocido: {missing[0]}")
+        dist, ids = index.similar(rows, k, **options)
+        return self._neighbors_payload(ids, dist)
+
+    def similar_batch(self, items):
+        # Las peticiones con filtros o varias semillas van aparte; el resto, en un único kneighbors
+        results = [None] * len(items)
+        plain = []
+        for i, item in enumerate(items):
+            if any(item.get(key) for key in FILTERED_KEYS):
+                try:
+                    with METRICS.timer('similares con filtros'):
+                        results[i] = self.similar_filtered(item)
+                except Exception as exc:
+                    results[i] = exc
+            else:
+                plain.append(i)
+        if plain:
+            for i, result in zip(plain, self._similar_plain([items[i] for i in plain])):
+                results[i] = result
+        return results
+
+    def _similar_plain(self, items):
+        index = self.knn_index
+        X, positions, rows, results = self._resolve(items, index.columns, np.float64, index.X_scaled, with_k=True)
+        if not len(positions):
+            return results
+        # Filas del catálogo ya están escaladas; features sueltas se escalan aquí
+        raw = rows < 0
+        if raw.any():
+            X[raw] = index.transform(X[raw])
+        k_max = max(parse_k(items[i]) for i in positions)
+        METRICS.inc('batch_items', len(items), endpoint='similar')
+        with METRICS.timer('kneighbors (lote)'):
+            distances, indices = index.kneighbors(X, k_max + 1)
+
+        for p, i in enumerate(positions):
+            k = parse_k(items[i])
+            ids, dist = indices[p], distances[p]
+            # Se excluye la propia canción (o el vecino sobrante si no es del catálogo)
+            keep = ids != rows[p] if rows[p] >= 0 else np.arange(len(ids)) < len(ids) - 1
+            ids, dist = ids[keep][:k], dist[keep][:k]
+            results[i] = self._neighbors_payload(ids, dist)
+        return results
+
+
+class InferenceServer:
+    def __init__(self, service, max_batch=64, max_wait=0.005, max_queue=1024):
+        # Un hilo por endpoint: un lote a la vez, el booster usa sus propios hilos
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.batchers = {
+            '/classify': MicroBatcher(service.classify_batch, max_batch, max_wait, max_queue, self.executor),
+            '/similar': MicroBatcher(service.similar_batch, max_batch, max_wait, max_queue, self.executor),
+        }
+        self.started_at = time.time()
+
+    async def dispatch(self, method, target, body):
+        start = time.perf_counter()
+        status, payload = await self._route(method, target, body)
+        if METRICS.enabled:
+            path = urlsplit(target).path
+            route = path if path in self.batchers or path in ('/health', '/stats', '/metrics', '/model') else 'otras'
+            METRICS.observe(f'http {route}', (time.perf_counter() - start) * 1000)
+            METRICS.inc('http_requests', route=route, status=status)
+        return status, payload
+
+    async def _route(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, {'status': 'ok'}
+        if url.path == '/metrics':
+            for name, b in self.batchers.items():
+                METRICS.gauge('queue_size', b.queue.qsize(), endpoint=name)
+            return 200, METRICS.prometheus()
+        if url.path == '/stats':
+            return 200, {name: b.stats() for name, b in self.batchers.items()}
+        if url.path == '/model':
+            return 200, self.service.handle.info()
+        batcher = self.batchers.get(url.path)
+        if batcher is None:
+            return 404, {'error': 'ruta no encontrada'}
+
+        if method == 'GET':
+            item = parse_query(url.query)
+        elif method == 'POST':
+            try:
+                item = json.loads(body or b'{}')
+            except json.JSONDecodeError:
+                return 400, {'error': 'JSON inválido'}
+            if not isinstance(item, dict):
+                return 400, {'error': 'se esperaba un objeto JSON'}
+        else:
+            return 405, {'error': 'método no permitido'}
+
+        try:
+            return 200, await batcher.submit(item)
+        except Overloaded:
+            return 503, {'error': 'servidor saturado, reintenta'}
+        except NotFound as exc:
+            return 404, {'error': exc.args[0]}
+        except (ValueError, TypeError) as exc:
+            return 400, {'error': str(exc)}
+        except Exception as exc:
+            return 500, {'error': repr(exc)}
+
+    async def handle(self, reader, writer):
+        # HTTP/1.1 mínimo con keep-alive (suficiente para JSON pequeño)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, _ = line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    key, value = header.decode('latin-1').split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if not 0 <= length <= MAX_BODY:
+                    # No se lee el cuerpo: se responde y se cierra la conexión
+                    status, payload = 413, {'error': f'cuerpo de más de {MAX_BODY} bytes'}
+                    headers['connection'] = 'close'
+                else:
+                    body = await reader.readexactly(length)
+                    status, payload = await self.dispatch(method, target, body)
+                if isinstance(payload, str):
+                    # /metrics: formato de texto de Prometheus
+                    data, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+                else:
+                    data, content_type = json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8'
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        for batcher in self.batchers.values():
+            batcher.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"🎧 Servidor escuchando en http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def load_service(model_path=MODEL_PATH, dataset_path=DATASET_PATH, registry_dir=REGISTRY_DIR, interval=2.0):
+    deployment = load_deployment(model_path, registry_dir)
+    df = load_catalog(dataset_path)
+    knn_index = load_index(df, dataset_path, source_hash(dataset_path))
+
+    def prepare(d):
+        # Géneros predichos del catálogo para las particiones del índice filtrado:
+        # solo se predice el catálogo entero si el índice de esta versión no está en caché
+        def labels():
+            return d.model.predict_proba(build_matrix(df, FEATURE_SCHEMA)).argmax(axis=1)
+        classes = (d.metadata or {}).get('classes', clases)
+        return load_or_build_filtered_index(knn_index, labels, df, d.checksum, classes=classes)
+
+    deployment = deployment._replace(resources=prepare(deployment))
+    warm_rows = build_matrix(df.iloc[:WARM_ROWS], FEATURE_SCHEMA)
+    handle = ModelHandle(deployment, ModelRegistry(registry_dir), prepare, warm_rows=warm_rows, interval=interval)
+    return InferenceService(deployment.model, df, knn_index, handle=handle.start())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor HTTP de clasificación y similitud con micro-batching.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch', type=int, default=64, help="Tamaño máximo de lote")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="Espera máxima para completar un lote")
+    parser.add_argument('--max-queue', type=int, default=1024, help="Peticiones en cola antes de responder 503")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--metrics', action='store_true', help="Activa /metrics (igual que APP_METRICS=1)")
+    parser.add_argument('--registry', default=REGISTRY_DIR, help="Registro de modelos (versión activa en caliente)")
+    parser.add_argument('--watch-interval', type=float, default=2.0, help="Segundos entre comprobaciones del registro")
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        METRICS.enabled = True
+    service = load_service(args.model, args.dataset, args.registry, args.watch_interval)
+    server = InferenceServer(service, args.max_batch, args.max_wait_ms / 1000, args.max_queue)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import builtins
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+# --- PERFIL DE ARRANQUE (IMPORTS + load_resources) ---
+# Con APP_PROFILE=1 se registra, para cada import de primer nivel y cada paso
+# de load_resources, el tiempo y el RSS del proceso. Los imports se miden
+# envolviendo builtins.__import__: cada import se apunta al primer módulo que
+# lo dispara (con todo lo que arrastra), sin tocar el código de la app.
+#
+# Desactivado (por defecto) no instala nada y step() devuelve un
+# nullcontext: coste prácticamente cero.
+#
+#   APP_PROFILE=1 streamlit run app/app.py      (tabla en la app + JSON en stdout)
+#   python app/startup_profile.py                (mismo perfil, sin Streamlit)
+
+ENABLED = os.environ.get('APP_PROFILE', '').lower() not in ('', '0', 'false', 'no')
+
+# Imports más rápidos que esto no se apuntan
+MIN_IMPORT_MS = 1.0
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return float('nan')
+
+
+class StartupProfile:
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self.steps = []
+        self.started = time.perf_counter()
+        self.reported = False
+        self._depth = 0
+        self._original_import = None
+        if enabled:
+            self._install()
+
+    def _install(self):
+        original = self._original_import = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if self._depth or (level == 0 and name in sys.modules):
+                self._depth += 1
+                try:
+                    return original(name, globals, locals, fromlist, level)
+                finally:
+                    self._depth -= 1
+            self._depth += 1
+            t0, m0 = time.perf_counter(), rss_mb()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                self._depth -= 1
+                elapsed = (time.perf_counter() - t0) * 1000
+                if elapsed >= MIN_IMPORT_MS:
+                    self._record(f'import {name}', elapsed, m0)
+
+        builtins.__import__ = timed_import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _record(self, name, elapsed_ms, rss_before):
+        rss = rss_mb()
+        self.steps.append({'step': name, 'ms': elapsed_ms, 'rss_mb': rss, 'delta_mb': rss - rss_before,
+                           'at_ms': (time.perf_counter() - self.started) * 1000})
+
+    def step(self, name):
+        return self._step(name) if self.enabled else nullcontext()
+
+    @contextmanager
+    def _step(self, name):
+        t0, m0 = time.perf_counter(), rss_mb()
+        try:
+            yield
+        finally:
+            self._record(name, (time.perf_counter() - t0) * 1000, m0)
+
+    def mark(self, name):
+        # Hito sin duración (p. ej. "primer render")
+        if self.enabled:
+            self._record(name, 0.0, rss_mb())
+
+    def table(self):
+        lines = [f"{'paso':<44}{'ms':>10}{'Δ RSS':>10}{'RSS':>9}{'t':>10}"]
+        for s in self.steps:
+            lines.append(f"{s['step'][:44]:<44}{s['ms']:>10.1f}{s['delta_mb']:>8.1f}MB{s['rss_mb']:>7.0f}MB{s['at_ms']:>8.0f}ms")
+        return '\n'.join(lines)
+
+    def to_json(self):
+        return json.dumps({'profile': self.steps})
+
+
+# Un único perfil por proceso (sobrevive a los re-runs de Streamlit)
+PROFILE = StartupProfile()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perfil de arranque de la app sin Streamlit.")
+    parser.add_argument('--json', action='store_true', help="Salida en JSON")
+    args = parser.parse_args(argv)
+
+    global PROFILE
+    PROFILE.uninstall()
+    PROFILE = StartupProfile(enabled=True)
+    # Mismos imports que app.py (streamlit / plotly solo si están instalados)
+    for module in ('streamlit', 'catalog_cache', 'features', 'resources', 'result_cache', 'search_index'):
+        try:
+            __import__(module)
+        except ImportError:
+            PROFILE.mark(f'import {module} (no instalado)')
+
+    from resources import load_app_resources, load_search_index
+    model, df, knn_index, resultados = load_app_resources(profile=PROFILE)
+    with PROFILE.step('buscador (índice typeahead)'):
+        load_search_index(df, knn_index.manifest['dataset_hash'])
+    PROFILE.mark('listo para el primer render')
+    PROFILE.uninstall()
+    print(PROFILE.to_json() if args.json else PROFILE.table())
+
+
+if __name__ == '__main__':
+    main()
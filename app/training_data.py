@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from features import FEATURE_SCHEMA, build_matrix
+
+# --- DATOS DE ENTRENAMIENTO ---
+# La misma preparación que el notebook (filtro de géneros, duplicados por
+# track_id y por nombre + artistas, features compartidas) pero devolviendo
+# directamente matrices NumPy. Acepta tanto dataset.csv (track_genre /
+# track_name) como dataset_demo_balanced.csv (music_genre / name).
+
+GENEROS = ['acoustic', 'hard-rock', 'dance', 'classical']
+COLUMNAS_GENERO = ('track_genre', 'music_genre')
+COLUMNAS_NOMBRE = ('track_name', 'name')
+
+
+def _first_present(df, candidates):
+    for c in candidates:
+        if c in df.columns:
+            return c
+    raise KeyError(f"Ninguna de las columnas {candidates} está en el dataset")
+
+
+def load_training_data(path, genres=GENEROS, schema=FEATURE_SCHEMA):
+    # -> (X float32, y int, clases) con las clases en el orden del LabelEncoder
+    df = pd.read_csv(path)
+    genre_col = _first_present(df, COLUMNAS_GENERO)
+    genres = [g.lower() for g in genres]
+    datos = df[df[genre_col].astype(str).str.lower().isin(genres)]
+
+    if 'track_id' in datos.columns:
+        datos = datos.drop_duplicates(subset='track_id')
+    name_col = next((c for c in COLUMNAS_NOMBRE if c in datos.columns), None)
+    if name_col is not None and 'artists' in datos.columns:
+        datos = datos.drop_duplicates(subset=[name_col, 'artists'])
+    datos = datos.drop_duplicates()
+
+    clases = sorted(genres)
+    y = np.searchsorted(clases, datos[genre_col].astype(str).str.lower().to_numpy())
+    X = build_matrix(datos, schema)
+    return X, y, clases
+
+
+def split(X, y, test_size=0.30, random_state=42):
+    # Mismo split que el notebook: 70/30 estratificado con semilla 42
+    from sklearn.model_selection import train_test_split
+    return train_test_split(X, y, test_size=test_size, random_state=random_state, stratify=y)
@@ -0,0 +1,350 @@
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import xgboost as xgb
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+from training_data import load_training_data, split
+
+# --- BÚSQUEDA DE HIPERPARÁMETROS (SUCCESSIVE HALVING) ---
+# Sustituye al GridSearchCV del notebook (72 candidatos x cv=3, con
+# n_jobs=-1 en el grid Y en cada XGBClassifier: sobre-suscripción de cores y
+# cada candidato vuelve a trocear y convertir los mismos folds).
+#
+#   - Los folds se convierten UNA vez a xgb.DMatrix y se comparten entre
+#     todos los candidatos (hilos del mismo proceso, sin copias).
+#   - El recurso que se reparte es el nº de árboles: todos los candidatos
+#     empiezan con pocos rounds, solo el mejor 1/eta sigue entrenando (se
+#     continúa el booster, no se reentrena) y cada entrenamiento tiene
+#     early stopping sobre una parte apartada de SU fold de entrenamiento
+#     (stop_fraction): el fold de validación solo puntúa, si también
+#     decidiera cuándo parar la precisión saldría inflada y premiaría a las
+#     configuraciones que paran pronto. n_estimators no se
+#     explora como parámetro: cualquier valor <= rounds entrenados se evalúa
+#     gratis con iteration_range.
+#   - workers x threads explícito: workers boosters en paralelo con
+#     nthread=threads cada uno, sin pasar de los cores disponibles.
+#   - Cada (rung, candidato, fold) terminado se guarda (booster + línea en
+#     results.jsonl): una búsqueda interrumpida continúa donde se quedó.
+#
+# Uso:
+#   python app/tuning.py --dataset dataset/dataset.csv --workers 4 --threads 2 --compare-grid
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(CURRENT_DIR, '..', 'dataset', 'dataset_demo_balanced.csv')
+CACHE_DIR = os.path.join(CURRENT_DIR, '..', 'cache', 'tuning')
+
+# Espacio de búsqueda del notebook (param_grid_xgb)
+PARAM_GRID = {
+    'n_estimators': [100, 200],
+    'learning_rate': [0.01, 0.1, 0.2],
+    'max_depth': [3, 6, 10],
+    'subsample': [0.8, 1.0],
+    'colsample_bytree': [0.8, 1.0],
+}
+
+
+def plan_resources(n_tasks, n_workers=None, n_threads=None, n_cores=None):
+    # Reparte los cores entre boosters en paralelo (workers) e hilos por booster
+    n_cores = n_cores or os.cpu_count() or 1
+    if n_workers is None and n_threads is None:
+        # Datasets pequeños: paralelizar candidatos escala mejor que los hilos de un árbol
+        n_workers, n_threads = min(n_tasks, n_cores), 1
+    elif n_workers is None:
+        n_workers = max(1, n_cores // n_threads)
+    elif n_threads is None:
+        n_threads = max(1, n_cores // n_workers)
+    return max(1, min(n_workers, n_tasks)), max(1, n_threads)
+
+
+def grid_configs(param_grid):
+    # Todas las combinaciones salvo n_estimators (es el recurso)
+    keys = [k for k in param_grid if k != 'n_estimators']
+    return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+
+
+def booster_params(config, n_classes, n_threads, seed=42):
+    return {
+        'objective': 'multi:softprob',
+        'num_class': n_classes,
+        'eval_metric': 'mlogloss',
+        'eta': config['learning_rate'],
+        'max_depth': config['max_depth'],
+        'subsample': config['subsample'],
+        'colsample_bytree': config['colsample_bytree'],
+        'tree_method': 'hist',
+        'nthread': n_threads,
+        'seed': seed,
+    }
+
+
+class FoldCache:
+    # DMatrix de entrenamiento / early stopping / validación de cada fold,
+    # construidas una sola vez. El early stopping sale del fold de entrenamiento
+    def __init__(self, X, y, cv=3, stop_fraction=0.1, seed=42):
+        self.folds = []
+        for train_idx, val_idx in StratifiedKFold(n_splits=cv).split(X, y):
+            fit_idx, stop_idx = train_test_split(train_idx, test_size=stop_fraction,
+                                                 stratify=y[train_idx], random_state=seed)
+            dtrain = xgb.DMatrix(X[fit_idx], label=y[fit_idx])
+            dstop = xgb.DMatrix(X[stop_idx], label=y[stop_idx])
+            dval = xgb.DMatrix(X[val_idx], label=y[val_idx])
+            self.folds.append((dtrain, dstop, dval, y[val_idx]))
+
+    def __len__(self):
+        return len(self.folds)
+
+
+class SuccessiveHalving:
+    def __init__(self, X, y, param_grid=PARAM_GRID, cv=3, eta=3, min_rounds=20,
+                 early_stopping_rounds=20, stop_fraction=0.1, n_workers=None, n_threads=None,
+                 cache_dir=CACHE_DIR, seed=42):
+        self.X, self.y = X, y
+        self.n_classes = int(y.max()) + 1
+        self.param_grid = param_grid
+        self.configs = grid_configs(param_grid)
+        self.cv = cv
+        self.eta = eta
+        self.early_stopping_rounds = early_stopping_rounds
+        self.stop_fraction = stop_fraction
+        self.seed = seed
+        self.n_estimators = sorted(param_grid.get('n_estimators', [100]))
+        self.budgets = self._budgets(max(self.n_estimators), min_rounds)
+        self.n_workers, self.n_threads = plan_resources(len(self.configs) * cv, n_workers, n_threads)
+        self.run_dir = os.path.join(cache_dir, self._run_key())
+        self._lock = threading.Lock()
+
+    def _budgets(self, max_rounds, min_rounds):
+        # Rounds por rung: max_rounds / eta^i, tantos rungs como permitan
+        # los candidatos y sin bajar de min_rounds
+        n_rungs = 1 + int(math.log(len(self.configs), self.eta)) if len(self.configs) > 1 else 1
+        while n_rungs > 1 and max_rounds / self.eta ** (n_rungs - 1) < min_rounds:
+            n_rungs -= 1
+        return [int(round(max_rounds / self.eta ** (n_rungs - 1 - i))) for i in range(n_rungs)]
+
+    def _run_key(self):
+        h = hashlib.sha1()
+        h.update(np.ascontiguousarray(self.X).tobytes())
+        h.update(np.ascontiguousarray(self.y).tobytes())
+        h.update(json.dumps([self.param_grid, self.cv, self.eta, self.budgets,
+                             self.early_stopping_rounds, self.stop_fraction, self.seed],
+                            sort_keys=True).encode())
+        return h.hexdigest()[:16]
+
+    # --- persistencia (reanudación) ---
+    def _booster_path(self, rung, cand, fold):
+        # Un fichero por rung: reanudar un rung nunca parte de un booster de un rung posterior
+        return os.path.join(self.run_dir, 'boosters', f'r{rung}_c{cand:03d}_f{fold}.ubj')
+
+    def _load_results(self):
+        path = os.path.join(self.run_dir, 'results.jsonl')
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return {}
+        if data and not data.endswith(b'\n'):
+            # Interrumpido a mitad de una línea: se descarta ese registro
+            data = data[:data.rfind(b'\n') + 1]
+            with open(path, 'wb') as f:
+                f.write(data)
+        done = {}
+        for line in data.decode('utf-8').splitlines():
+            rec = json.loads(line)
+            done[(rec['rung'], rec['cand'], rec['fold'])] = rec
+        return done
+
+    def _record(self, rec):
+        with self._lock, open(os.path.join(self.run_dir, 'results.jsonl'), 'a') as f:
+            f.write(json.dumps(rec) + '\n')
+
+    # --- entrenamiento ---
+    def _train(self, folds, rung, cand, fold, prev):
+        dtrain, dstop, dval, y_val = folds.folds[fold]
+        budget = self.budgets[rung]
+        booster, rounds_done, stopped = None, 0, False
+        if prev is not None:
+            rounds_done, stopped = prev['rounds'], prev['stopped']
+            if not stopped:
+                booster = xgb.Booster(model_file=self._booster_path(prev['rung'], cand, fold))
+                booster.set_param({'nthread': self.n_threads})
+
+        if not stopped and budget > rounds_done:
+            params = booster_params(self.configs[cand], self.n_classes, self.n_threads, self.seed)
+            booster = xgb.train(params, dtrain, num_boost_round=budget - rounds_done,
+                                evals=[(dstop, 'stop')], early_stopping_rounds=self.early_stopping_rounds,
+                                xgb_model=booster, verbose_eval=False)
+            trained = booster.num_boosted_rounds()
+            stopped = trained < budget
+            # Con early stopping nos quedamos con la mejor iteración
+            rounds_done = booster.best_iteration + 1 if stopped else trained
+        elif booster is None:
+            booster = xgb.Booster(model_file=self._booster_path(prev['rung'], cand, fold))
+        path = self._booster_path(rung, cand, fold)
+        tmp = path + '.tmp.ubj'
+        booster.save_model(tmp)
+        os.replace(tmp, path)
+
+        # Precisión con `budget` rounds y con cada n_estimators del grid que quepa
+        scores = {}
+        for n in sorted(set([budget] + [n for n in self.n_estimators if n <= budget])):
+            probs = booster.predict(dval, iteration_range=(0, min(n, rounds_done)))
+            scores[str(n)] = float((probs.argmax(axis=1) == y_val).mean())
+
+        rec = {'rung': rung, 'cand': cand, 'fold': fold, 'budget': budget,
+               'rounds': rounds_done, 'stopped': stopped, 'scores': scores}
+        self._record(rec)
+        return rec
+
+    def run(self, verbose=True):
+        os.makedirs(os.path.join(self.run_dir, 'boosters'), exist_ok=True)
+        with open(os.path.join(self.run_dir, 'config.json'), 'w') as f:
+            json.dump({'param_grid': self.param_grid, 'cv': self.cv, 'eta': self.eta,
+                       'budgets': self.budgets, 'early_stopping_rounds': self.early_stopping_rounds,
+                       'stop_fraction': self.stop_fraction}, f, indent=2)
+
+        start = time.perf_counter()
+        done = self._load_results()
+        resumed = len(done)
+        folds = FoldCache(self.X, self.y, self.cv, self.stop_fraction, self.seed)
+        t_folds = time.perf_counter() - start
+
+        alive = list(range(len(self.configs)))
+        history = []
+        with ThreadPoolExecutor(max_workers=self.n_workers) as pool:
+            for rung, budget in enumerate(self.budgets):
+                t_rung = time.perf_counter()
+                pending = [(c, f) for c in alive for f in range(self.cv) if (rung, c, f) not in done]
+                futures = [pool.submit(self._train, folds, rung, c, f, done.get((rung - 1, c, f)))
+                           for c, f in pending]
+                for fut in futures:
+                    rec = fut.result()
+                    done[(rung, rec['cand'], rec['fold'])] = rec
+
+                mean = {c: float(np.mean([done[(rung, c, f)]['scores'][str(budget)] for f in range(self.cv)]))
+                        for c in alive}
+                history.append({'rung': rung, 'rounds': budget, 'candidates': len(alive),
+                                'trained': len(pending), 'seconds': time.perf_counter() - t_rung,
+                                'best': max(mean.values())})
+                if verbose:
+                    print(f"rung {rung}: {len(alive):3d} candidatos x {budget:3d} rounds -> "
+                          f"mejor {max(mean.values()) * 100:.2f}%  ({history[-1]['seconds']:.1f} s)")
+                if rung < len(self.budgets) - 1:
+                    keep = max(1, len(alive) // self.eta)
+                    # Empates: gana el candidato de menor índice (determinista)
+                    alive = sorted(alive, key=lambda c: (-mean[c], c))[:keep]
+
+        # Mejor combinación final (candidato, n_estimators)
+        last = len(self.budgets) - 1
+        best = None
+        for c in alive:
+            for n in done[(last, c, 0)]['scores']:
+                score = float(np.mean([done[(last, c, f)]['scores'][n] for f in range(self.cv)]))
+                if best is None or score > best[0]:
+                    best = (score, c, int(n))
+        score, cand, n_estimators = best
+
+        fits = sum(1 for key in done if key[0] <= last)
+        return {
+            'best_params': dict(self.configs[cand], n_estimators=n_estimators),
+            'best_cv_accuracy': score,
+            'seconds': time.perf_counter() - start,
+            'fold_build_seconds': t_folds,
+            'fits': fits,
+            'boosting_rounds': int(sum(rec['rounds'] - (done[(r - 1, c, f)]['rounds'] if r else 0)
+                                       for (r, c, f), rec in done.items())),
+            'resumed_fits': resumed,
+            'workers': self.n_workers,
+            'threads': self.n_threads,
+            'rungs': history,
+            'run_dir': self.run_dir,
+        }
+
+
+def refit(params, X_train, y_train, n_threads, seed=42):
+    from xgboost import XGBClassifier
+    model = XGBClassifier(**params, random_state=seed, n_jobs=n_threads, eval_metric='mlogloss')
+    return model.fit(X_train, y_train)
+
+
+def grid_search_baseline(X_train, y_train, param_grid=PARAM_GRID, cv=3):
+    # El GridSearchCV tal cual está en el notebook (referencia del informe)
+    from sklearn.model_selection import GridSearchCV
+    from xgboost import XGBClassifier
+    start = time.perf_counter()
+    grid = GridSearchCV(XGBClassifier(random_state=42, n_jobs=-1, eval_metric='mlogloss'),
+                        param_grid=param_grid, cv=cv, n_jobs=-1, scoring='accuracy')
+    grid.fit(X_train, y_train)
+    return grid, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Búsqueda de hiperparámetros de XGBoost con successive halving.")
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--cv', type=int, default=3)
+    parser.add_argument('--eta', type=int, default=3, help="Factor de descarte entre rungs")
+    parser.add_argument('--min-rounds', type=int, default=20, help="Rounds mínimos del primer rung")
+    parser.add_argument('--early-stopping', type=int, default=20)
+    parser.add_argument('--stop-fraction', type=float, default=0.1,
+                        help="Parte de cada fold de entrenamiento reservada para el early stopping")
+    parser.add_argument('--workers', type=int, default=None, help="Boosters entrenando en paralelo")
+    parser.add_argument('--threads', type=int, default=None, help="Hilos por booster")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--compare-grid', action='store_true', help="Ejecuta también el GridSearchCV del notebook")
+    parser.add_argument('--report', default=None, help="Ruta del informe JSON (por defecto en el directorio de la búsqueda)")
+    args = parser.parse_args(argv)
+
+    X, y, clases = load_training_data(args.dataset)
+    X_train, X_test, y_train, y_test = split(X, y)
+    print(f"Datos: {len(X_train)} train / {len(X_test)} test, clases {clases}")
+
+    search = SuccessiveHalving(X_train, y_train, cv=args.cv, eta=args.eta, min_rounds=args.min_rounds,
+                               early_stopping_rounds=args.early_stopping, stop_fraction=args.stop_fraction,
+                               n_workers=args.workers, n_threads=args.threads, cache_dir=args.cache_dir)
+    print(f"{len(search.configs)} configuraciones, rungs {search.budgets} rounds, "
+          f"{search.n_workers} workers x {search.n_threads} hilos")
+    result = search.run()
+    model = refit(result['best_params'], X_train, y_train, search.n_workers * search.n_threads)
+    result['test_accuracy'] = float((model.predict(X_test) == y_test).mean())
+
+    report = {'dataset': os.path.abspath(args.dataset), 'halving': result}
+    print(f"\nSuccessive halving: {result['seconds']:.1f} s, {result['fits']} entrenamientos, "
+          f"{result['boosting_rounds']} rounds en total")
+    print(f"  mejores parámetros: {result['best_params']}")
+    print(f"  CV {result['best_cv_accuracy'] * 100:.2f}% | test {result['test_accuracy'] * 100:.2f}%")
+
+    if args.compare_grid:
+        grid, seconds = grid_search_baseline(X_train, y_train, cv=args.cv)
+        n_candidates = len(grid.cv_results_['params'])
+        report['grid'] = {
+            'best_params': grid.best_params_,
+            'best_cv_accuracy': float(grid.best_score_),
+            'test_accuracy': float((grid.best_estimator_.predict(X_test) == y_test).mean()),
+            'seconds': seconds,
+            'fits': n_candidates * args.cv,
+            'boosting_rounds': int(sum(p['n_estimators'] for p in grid.cv_results_['params']) * args.cv),
+        }
+        g = report['grid']
+        print(f"\nGridSearchCV ({n_candidates} candidatos): {seconds:.1f} s, {g['fits']} entrenamientos, "
+              f"{g['boosting_rounds']} rounds en total")
+        print(f"  mejores parámetros: {g['best_params']}")
+        print(f"  CV {g['best_cv_accuracy'] * 100:.2f}% | test {g['test_accuracy'] * 100:.2f}%")
+        print(f"\nSpeedup: {seconds / result['seconds']:.1f}x | "
+              f"diferencia en test: {(result['test_accuracy'] - g['test_accuracy']) * 100:+.2f} puntos")
+
+    path = args.report or os.path.join(search.run_dir, 'report.json')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nInforme: {path}")
+
+
+if __name__ == '__main__':
+    main()
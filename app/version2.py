@@ -4,6 +4,10 @@ import joblib
 import numpy as np
 import plotly.graph_objects as go
 
+from catalog_cache import load_catalog, source_hash
+from explanations import ETIQUETAS, ContributionStore
+from recommender import file_hash
+
 # --- CONFIGURACIÓN DE LA PÁGINA ---
 st.set_page_config(page_title="Spotify AI Explorer", page_icon="🎧", layout="wide")
 
@@ -33,17 +37,22 @@ def load_model():
     except FileNotFoundError:
         return None
 
-@st.cache_data
+# cache_resource (y no cache_data): cache_data serializa una copia por sesión,
+# lo que anularía el mmap de la caché columnar del catálogo
+@st.cache_resource
 def load_data():
     try:
-        df = pd.read_csv('./dataset/universal_top_spotify_songs.csv')
-        df = df.dropna()
-        if 'name' in df.columns:
-            df['name'] = df['name'].astype(str)
-        return df
+        return load_catalog('./dataset/universal_top_spotify_songs.csv')
     except FileNotFoundError:
         return None
 
+# Contribuciones por feature de todo el catálogo (float16 con mmap, por modelo + dataset)
+@st.cache_resource
+def load_explanations(_model, _df):
+    store = ContributionStore(_model, file_hash('modelo_xgboost_final.pkl'))
+    # Sin track_id: se indexa por fila
+    return store.fill(_df, id_column=None, dataset_hash=source_hash('./dataset/universal_top_spotify_songs.csv'))
+
 model = load_model()
 df_music = load_data()
 
@@ -65,8 +74,7 @@ if model is None or df_music is None:
 # --- PANEL LATERAL (BUSCADOR) ---
 with st.sidebar:
     st.header("🔍 Buscador")
-    if 'name' in df_music.columns and 'artists' in df_music.columns:
-        df_music['display_name'] = df_music['name'] + " - " + df_music['artists']
+    if 'display_name' in df_music.columns:
         opciones = df_music['display_name'].unique()
         seleccion_nombre = st.selectbox("Elige canción:", opciones, index=None)
     else:
@@ -157,27 +165,12 @@ if seleccion_nombre:
     with col_text:
         st.markdown("#### 🧠 ¿Por qué la IA decidió esto?")
         
-        # Lógica explicativa simple
-        if pred_label == "Dance":
-            st.write(f"✅ **Alta Bailabilidad ({cancion_data['danceability']:.2f}):** Clave para el género Dance.")
-            if cancion_data['energy'] > 0.7:
-                st.write("✅ **Alta Energía:** Típico de música electrónica.")
-            st.write("ℹ️ La diferencia con Rock es que el Dance suele tener menos 'Acousticness' y ritmos más constantes.")
-            
-        elif pred_label == "Hard-Rock":
-            st.write("✅ **Alta Energía:** El Rock es intenso.")
-            if cancion_data['danceability'] < 0.6:
-                st.write(f"📉 **Menor Bailabilidad ({cancion_data['danceability']:.2f}):** A diferencia del Dance, el Rock es más caótico rítmicamente.")
-            st.write("🎸 **Volumen:** La distorsión suele aumentar la sonoridad percibida.")
-
-        elif pred_label == "Classical":
-            st.write(f"✅ **Alta Acusticidad ({cancion_data['acousticness']:.2f}):** La falta de instrumentos eléctricos es determinante.")
-            if cancion_data['instrumentalness'] > 0.5:
-                st.write("🎻 **Instrumental:** La ausencia de voz es un indicador fuerte.")
-
-        elif pred_label == "Acoustic":
-            st.write("✅ **Acusticidad Media-Alta:** Sonidos orgánicos.")
-            st.write("📉 **Energía Moderada:** Menos intensa que el Rock o Dance.")
+        # Lo que más ha pesado en el modelo para esta predicción (a favor o en contra)
+        explicaciones = load_explanations(model, df_music)
+        for feature, contribucion, valor in explicaciones.explain(cancion_data.name, cancion_data, pred_num, k=4):
+            icono = "✅" if contribucion > 0 else "📉"
+            sentido = "empuja hacia" if contribucion > 0 else "aleja de"
+            st.write(f"{icono} **{ETIQUETAS.get(feature, feature)} ({valor:.2f}):** {sentido} {pred_label} ({contribucion:+.2f})")
 
         st.markdown("---")
         st.write("**Probabilidades completas:**")
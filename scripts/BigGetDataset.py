@@ -2,6 +2,10 @@
 import kagglehub
 import shutil
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from ingest import OUTPUT_DIR, find_csv, ingest
 
 # Descargar el dataset
 path = kagglehub.dataset_download("maharshipandya/-spotify-tracks-dataset")
@@ -13,7 +17,11 @@ path = kagglehub.dataset_download("maharshipandya/-spotify-tracks-dataset")
 dest_path = os.path.join(os.getcwd(), "../dataset")
 
 # Mover/renombrar el archivo descargado
-shutil.move(path, dest_path)
+dest_path = shutil.move(path, dest_path)
 
 print("Dataset guardado en:", dest_path)
 
+# Ingesta en streaming: validación, filtro de géneros, duplicados y shards
+# columnares (lo que antes se hacía en el notebook con el CSV entero en memoria)
+manifest = ingest(find_csv(dest_path), OUTPUT_DIR)
+print(f"Ingesta: {manifest['rows_in']:,} filas -> {manifest['rows_out']:,} en {OUTPUT_DIR}")
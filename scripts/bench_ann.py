@@ -0,0 +1,69 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from ann import ExactSearch, IVFIndex
+
+# --- BENCHMARK ANN: recall@k y consultas/s frente a la búsqueda exacta ---
+# Vectores sintéticos con la dimensión de columnas_modelo (17), ya
+# estandarizados y agrupados en "géneros" (mezcla de gaussianas), como el
+# espacio en el que busca el recomendador.
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_ann.py --sizes 10000 100000 1000000 --k 10
+
+
+def synthetic_vectors(n, dim=17, n_clusters=64, seed=42):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 2.0, size=(n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    X = centers[labels] + rng.normal(0, 1.0, size=(n, dim)).astype(np.float32)
+    X -= X.mean(axis=0)
+    X /= X.std(axis=0)
+    return np.ascontiguousarray(X, dtype=np.float32)
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(np.intersect1d(f, t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for n in args.sizes:
+        X = synthetic_vectors(n)
+        Q = X[rng.choice(n, args.queries, replace=False)] + rng.normal(0, 0.1, (args.queries, X.shape[1])).astype(np.float32)
+
+        exact = ExactSearch(X)
+        (_, truth), t_exact = timed(lambda: exact.search(Q, args.k))
+        ivf, t_build = timed(lambda: IVFIndex.build(X))
+
+        print(f"\n=== {n:,} filas  (nlist={ivf.nlist}, construcción IVF {t_build:.2f}s) ===")
+        print(f"{'backend':<18}{'recall@' + str(args.k):>10}{'consultas/s':>14}")
+        print(f"{'exacto':<18}{1.0:>10.3f}{args.queries / t_exact:>14,.0f}")
+        for nprobe in args.nprobe:
+            if nprobe > ivf.nlist:
+                continue
+            (_, found), t = timed(lambda: ivf.search(Q, args.k, nprobe=nprobe))
+            print(f"{'ivf nprobe=' + str(nprobe):<18}{recall_at_k(found, truth):>10.3f}{args.queries / t:>14,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+# --- BENCHMARK DE ARRANQUE: CSV vs CACHÉ COLUMNAR (MMAP) ---
+# Mide, en procesos nuevos, el tiempo de carga del catálogo y la memoria
+# residente (RSS) separando páginas anónimas (privadas de cada proceso) y
+# páginas de fichero (compartibles entre workers vía page cache).
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_catalog_cache.py [n_filas]      (por defecto 114000)
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+DEMO = os.path.join(ROOT, 'dataset', 'dataset_demo_balanced.csv')
+
+CHILD = r"""
+import json, sys, time
+sys.path.insert(0, {app_dir!r})
+t0 = time.perf_counter()
+import catalog_cache
+import pandas as pd
+mode, csv_path, cache_dir = sys.argv[1:4]
+if mode == 'import':
+    df = pd.DataFrame()
+elif mode == 'csv':
+    df = catalog_cache.parse_csv(csv_path)
+else:
+    df = catalog_cache.load_catalog(csv_path, cache_dir=cache_dir)
+# Tocamos todas las columnas (lo mismo que hará el índice KNN / la app)
+for col in df.columns:
+    s = df[col]
+    if hasattr(s, 'cat'):
+        _ = s.cat.codes.max()
+    elif pd.api.types.is_numeric_dtype(s):
+        _ = s.to_numpy().sum()
+    else:
+        _ = s.str.len().sum()
+elapsed = time.perf_counter() - t0
+status = dict(l.split(':', 1) for l in open('/proc/self/status') if ':' in l)
+kb = lambda k: int(status.get(k, '0 kB').split()[0])
+print(json.dumps({{'seconds': elapsed, 'rows': len(df), 'rss_mb': kb('VmRSS') / 1024,
+                  'rss_anon_mb': kb('RssAnon') / 1024, 'rss_file_mb': kb('RssFile') / 1024}}))
+"""
+
+
+def make_catalog(n_rows, path):
+    # Catálogo sintético con el esquema de dataset_demo_balanced.csv
+    df = pd.read_csv(DEMO)
+    big = df.sample(n_rows, replace=True, random_state=42).reset_index(drop=True)
+    big['track_id'] = [f'synthetic{i:013d}' for i in range(n_rows)]
+    big['name'] = big['name'] + ' #' + big.index.astype(str)
+    big.to_csv(path, index=False)
+
+
+def run(mode, csv_path, cache_dir):
+    code = CHILD.format(app_dir=APP_DIR)
+    out = subprocess.run([sys.executable, '-c', code, mode, csv_path, cache_dir],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 114_000
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'catalog.csv')
+        cache_dir = os.path.join(tmp, 'cache')
+        make_catalog(n_rows, csv_path)
+        print(f"Catálogo sintético: {n_rows:,} filas, {os.path.getsize(csv_path) / 1e6:.1f} MB\n")
+
+        results = {
+            'solo imports (referencia)': run('import', csv_path, cache_dir),
+            'antes (read_csv)': run('csv', csv_path, cache_dir),
+            'primer arranque (construye caché)': run('cache', csv_path, cache_dir),
+            'arranques siguientes (mmap)': run('cache', csv_path, cache_dir),
+        }
+
+    print(f"{'modo':<36}{'tiempo':>9}{'RSS':>10}{'anónima':>10}{'fichero':>10}")
+    for name, r in results.items():
+        print(f"{name:<36}{r['seconds']:>8.2f}s{r['rss_mb']:>8.0f}MB{r['rss_anon_mb']:>8.0f}MB{r['rss_file_mb']:>8.0f}MB")
+    print("\n(RSS 'fichero' = páginas del page cache compartidas entre workers; 'anónima' = privada por proceso)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from benchmark import DATA_DIR, MODEL_PATH, catalog_path
+from catalog_cache import load_catalog, parse_csv
+from catalog_store import CatalogStore, load_catalog_store
+from features import FEATURE_SCHEMA, build_matrix
+from recommender import RecommendationIndex
+
+# --- BENCHMARK: df_music vs CatalogStore (MEMORIA) ---
+# Catálogo sintético de 114k filas (la escala de dataset.csv):
+#   1) memoria del catálogo: DataFrame de parse_csv (lo que era df_music; con
+#      el texto como 'str' de pandas 3 y como object de pandas < 3), DataFrame
+#      de la caché columnar (categorías + mmap) y CatalogStore.
+#      Objetivo: al menos 3x menos que df_music (falla si no se cumple).
+#   2) RSS / PSS de N procesos que abren el catálogo y lo recorren entero:
+#      con mmap las páginas del CatalogStore se comparten entre procesos.
+#   3) Paridad: mismas filas y display_name, y mismas predicciones / vecinos
+#      con las features en float32.
+#   4) Latencia de acceso a una fila (iloc[i]).
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_catalog_store.py --rows 114000 --processes 4
+
+TARGET = 3.0
+
+CHILD = r"""
+import json, sys, time
+sys.path.insert(0, {app_dir!r})
+import numpy as np
+{load}
+# Se recorre todo (como lo harían las sesiones de la app a lo largo del día)
+for col in df.columns:
+    if col != 'display_name':
+        v = df[col].to_numpy()
+        if v.dtype.kind in 'fiub':
+            float(np.asarray(v, dtype=np.float64).sum())
+status = dict(l.split(':', 1) for l in open('/proc/self/status') if ':' in l)
+rollup = dict(l.split(':', 1) for l in open('/proc/self/smaps_rollup') if ':' in l)
+print(json.dumps({{'rss_mb': int(status['VmRSS'].split()[0]) / 1024, 'pss_mb': int(rollup['Pss'].split()[0]) / 1024}}))
+sys.stdout.flush()
+sys.stdin.read()
+"""
+
+LOADS = {
+    'df_music (parse_csv)': "from catalog_cache import parse_csv; df = parse_csv({csv!r})",
+    'CatalogStore (mmap)': "from catalog_store import load_catalog_store; df = load_catalog_store({csv!r}, {store_dir!r})",
+}
+
+
+def processes(load, n):
+    # N procesos vivos a la vez: el PSS reparte las páginas compartidas entre ellos
+    child = CHILD.format(app_dir=APP_DIR, load=load)
+    procs = [subprocess.Popen([sys.executable, '-c', child], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+             for _ in range(n)]
+    results = [json.loads(p.stdout.readline()) for p in procs]
+    for p in procs:
+        p.stdin.close()
+        p.wait()
+    return results
+
+
+def baseline_rss():
+    out = subprocess.run([sys.executable, '-c', CHILD.format(app_dir=APP_DIR, load="import pandas as pd\ndf = pd.DataFrame()")],
+                         input='', capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[0])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=114_000)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    csv = catalog_path(args.rows)
+    store_dir = os.path.join(DATA_DIR, 'catalog_store')
+    catalog_dir = os.path.join(DATA_DIR, 'catalog_cache')
+
+    df = parse_csv(csv)
+    cached = load_catalog(csv, catalog_dir)
+    store = CatalogStore.from_frame(df)
+    store.save(os.path.join(store_dir, 'bench'))
+    store = CatalogStore.load(os.path.join(store_dir, 'bench'))
+
+    # pandas >= 3 lee el texto como 'str' (Arrow); con pandas < 3 eran objetos de Python
+    text = [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+    as_objects = df.astype({c: object for c in text})
+    sizes = {
+        'df_music, texto object (pandas < 3)': as_objects.memory_usage(deep=True).sum(),
+        'df_music (parse_csv, texto str + float64)': df.memory_usage(deep=True).sum(),
+        'caché columnar (categorías + mmap float64)': cached.memory_usage(deep=True).sum(),
+        'CatalogStore': store.nbytes,
+    }
+    print(f"Memoria del catálogo ({len(df):,} filas):")
+    for label, n in sizes.items():
+        print(f"  {label:<46}{n / 2 ** 20:8.1f} MB   {n / len(df):6.0f} B/fila")
+    ratio = sizes['df_music (parse_csv, texto str + float64)'] / store.nbytes
+    print(f"  reducción frente a df_music: {ratio:.1f}x (objetivo >= {TARGET:.0f}x); "
+          f"{sizes['df_music, texto object (pandas < 3)'] / store.nbytes:.1f}x con texto object")
+    print("  por columna:", ', '.join(f"{c} {n / 2 ** 20:.1f}" for c, n in store.memory_usage().items()), "MB")
+
+    print(f"\nRSS / PSS con {args.processes} procesos a la vez (catálogo recorrido entero):")
+    base = baseline_rss()
+    print(f"  {'proceso vacío (python + pandas)':<28} RSS {base['rss_mb']:6.0f} MB")
+    load_catalog_store(csv, store_dir)     # construida antes de lanzar los procesos
+    for label, load in LOADS.items():
+        r = processes(load.format(csv=csv, store_dir=store_dir), args.processes)
+        rss = np.mean([x['rss_mb'] for x in r])
+        pss = sum(x['pss_mb'] for x in r)
+        print(f"  {label:<28} RSS medio {rss:6.0f} MB   PSS total {pss:6.0f} MB "
+              f"({(pss - args.processes * base['pss_mb']) / args.processes:5.1f} MB/proceso sobre el vacío)")
+
+    print("\nParidad:")
+    same_rows = all((store[c].to_numpy() == df[c].to_numpy()).all()
+                    for c in ('track_id', 'name', 'artists', 'display_name', 'popularity', 'key'))
+    print(f"  texto, display_name y enteros idénticos: {'sí' if same_rows else 'NO'}")
+    from numpy_booster import load_model
+    model = load_model(MODEL_PATH)
+    pred_df = model.predict(build_matrix(df, FEATURE_SCHEMA))
+    pred_store = model.predict(build_matrix(store, FEATURE_SCHEMA))
+    print(f"  misma clase predicha (features float32): {(pred_df == pred_store).mean():.4%}")
+    sample = np.random.default_rng(0).integers(0, len(df), 500)
+    idx_df = RecommendationIndex.build(df, FEATURE_SCHEMA)
+    idx_store = RecommendationIndex.build(store, FEATURE_SCHEMA)
+    _, n_df = idx_df.kneighbors(idx_df.X_scaled[sample], 5)
+    _, n_store = idx_store.kneighbors(idx_store.X_scaled[sample], 5)
+    print(f"  mismos 4 vecinos recomendados: {(np.sort(n_df[:, 1:], 1) == np.sort(n_store[:, 1:], 1)).all(1).mean():.2%}")
+
+    print("\nAcceso a una fila (iloc[i]):")
+    for label, frame in (('df_music', df), ('CatalogStore', store)):
+        lat = []
+        for i in sample:
+            start = time.perf_counter()
+            frame.iloc[int(i)]
+            lat.append(time.perf_counter() - start)
+        print(f"  {label:<14} p50 {np.percentile(lat, 50) * 1e6:6.0f} µs")
+
+    assert same_rows
+    assert ratio >= TARGET, f"Reducción {ratio:.1f}x < {TARGET}x"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from benchmark import catalog_path
+from chart_linkage import ADAPTADOR, SIN_ENLACE, LinkIndex, adapt_schema, read_chart, title_key
+from search_index import normalize, trigrams
+
+# --- BENCHMARK: ENLACE top10s <-> CATÁLOGO (CALIDAD Y RENDIMIENTO) ---
+# Catálogo sintético (benchmark.catalog_path) con títulos aleatorios, en el
+# que se insertan las 603 canciones de top10s.csv con su ortografía "de
+# catálogo". El chart se genera con la verdad conocida:
+#   - las canciones de top10s y --bulk filas muestreadas del catálogo,
+#     pasadas al esquema de top10s (escala 0-100, segundos, bpm, dB) y con la
+#     ortografía alterada: igual, sufijo ("(feat. X)", " - Radio Edit"...),
+#     errata en el título, variante del artista (mayúsculas, acentos, "The")
+#   - negativos: títulos inventados de artistas del catálogo (deben quedar
+#     sin enlace; caen en los bloques del artista, el peor caso)
+#   - señuelos: remix de algunas canciones insertadas (mismo artista, título
+#     casi igual, otra grabación): no deben ganar al original
+# Se mide precisión / exhaustividad por tipo de alteración, parejas
+# comparadas frente a n·m (y lo que costaría compararlas todas, extrapolado)
+# y filas/s de construcción del índice y del enlace.
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_chart_linkage.py --rows 1000000 --bulk 100000
+
+SUFIJOS = [' - Radio Edit', ' (feat. Pitbull)', ' - Remastered 2015', ' [Single Version]', ' - From "The Movie"']
+ALTERACIONES = ['igual', 'sufijo', 'errata', 'artista']
+
+
+def typo(text, rng):
+    if len(text) < 5:
+        return text
+    i = int(rng.integers(1, len(text) - 1))
+    return text[:i] + text[i + 1:] if rng.random() < 0.5 else text[:i - 1] + text[i] + text[i - 1] + text[i + 1:]
+
+
+def artist_variant(artist, rng):
+    options = [artist.upper(), artist.lower(), 'The ' + artist, artist.replace('e', 'é', 1)]
+    return options[int(rng.integers(len(options)))]
+
+
+def perturb(title, artist, kind, rng):
+    if kind == 'sufijo':
+        return title + SUFIJOS[int(rng.integers(len(SUFIJOS)))], artist
+    if kind == 'errata':
+        return typo(title, rng), artist
+    if kind == 'artista':
+        return title, artist_variant(artist, rng)
+    return title, artist
+
+
+def to_chart_schema(rows):
+    # Inverso del adaptador: lo que publicaría una lista de éxitos
+    chart = pd.DataFrame({'title': rows['name'].to_numpy(), 'artist': rows['artists'].str.split(';').str[0].to_numpy()})
+    for target, (src, factor) in ADAPTADOR.items():
+        chart[src] = np.round(rows[target].to_numpy(dtype=np.float64) / factor).astype(np.int64)
+    return chart
+
+
+def build_bench(n_rows, n_bulk, rng):
+    catalog = pd.read_csv(catalog_path(n_rows))
+    real = read_chart()
+    vocabulary = sorted({w for t in real['title'] for w in normalize(t).split() if len(w) > 2})
+    words = rng.integers(0, len(vocabulary), (n_rows, 3))
+    vocab = np.asarray(vocabulary, dtype=object)
+    catalog['name'] = [' '.join(v).title() for v in vocab[words]]
+
+    # top10s insertado en el catálogo con su ortografía original
+    adapted = adapt_schema(real)
+    top = catalog.sample(len(real), random_state=0).reset_index(drop=True)
+    for col in ADAPTADOR:
+        top[col] = adapted[col].to_numpy() + rng.uniform(-0.004, 0.004, len(real)) * (adapted[col].to_numpy() <= 1)
+    top['name'], top['artists'] = real['title'].to_numpy(), real['artist'].to_numpy()
+    top['track_id'] = [f'top10s{i:015d}' for i in range(len(real))]
+    # Señuelos: remix de un tercio de las canciones de top10s
+    decoys = top.sample(frac=1 / 3, random_state=1).copy()
+    decoys['name'] = decoys['name'] + ' - Club Remix'
+    decoys['danceability'] = rng.uniform(0, 1, len(decoys))
+    decoys['track_id'] = [f'remix{i:016d}' for i in range(len(decoys))]
+    catalog = pd.concat([catalog, top, decoys], ignore_index=True)
+    top_rows = np.arange(n_rows, n_rows + len(real))
+
+    # Chart: top10s + bulk, con la verdad (fila del catálogo o -1)
+    bulk_rows = rng.choice(n_rows, n_bulk, replace=False)
+    truth = np.concatenate([top_rows, bulk_rows])
+    chart = to_chart_schema(catalog.iloc[truth])
+    kinds = rng.choice(len(ALTERACIONES), len(chart))
+    negative = rng.random(len(chart)) < 0.1
+    titles, artists = [], []
+    for title, artist, kind, neg in zip(chart['title'], chart['artist'], kinds, negative):
+        if neg:
+            title = ' '.join(vocab[rng.integers(0, len(vocab), 4)]).title() + ' Reprise'
+        title, artist = perturb(title, artist, ALTERACIONES[kind], rng)
+        titles.append(title)
+        artists.append(artist)
+    chart['title'], chart['artist'] = titles, artists
+    chart['top genre'], chart['year'] = 'pop', 2019
+    label = np.where(negative, 'negativo', np.asarray(ALTERACIONES)[kinds])
+    return catalog, chart, np.where(negative, -1, truth), label, len(real)
+
+
+def naive_seconds(chart, catalog, rng, sample=20_000):
+    # Coste de comparar todas las parejas (Jaccard de trigramas de título y
+    # artista), extrapolado desde una muestra
+    q = [(trigrams(title_key(t)), trigrams(normalize(a))) for t, a in zip(chart['title'][:20], chart['artist'][:20])]
+    rows = rng.choice(len(catalog), sample // len(q), replace=False)
+    cands = [(trigrams(title_key(t)), trigrams(normalize(a)))
+             for t, a in zip(catalog['name'].to_numpy()[rows], catalog['artists'].to_numpy()[rows])]
+    start = time.perf_counter()
+    for qt, qa in q:
+        for ct, ca in cands:
+            len(qt & ct) / len(qt | ct) + len(qa & ca) / len(qa | ca)
+    per_pair = (time.perf_counter() - start) / (len(q) * len(cands))
+    return per_pair * len(chart) * len(catalog)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000, help="filas del catálogo sintético")
+    parser.add_argument('--bulk', type=int, default=100_000, help="filas del chart muestreadas del catálogo")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    catalog, chart, truth, label, n_top = build_bench(args.rows, args.bulk, rng)
+    print(f"Catálogo {len(catalog):,} filas, chart {len(chart):,} filas ({n_top} de top10s)")
+
+    start = time.perf_counter()
+    index = LinkIndex.build(catalog)
+    build_s = time.perf_counter() - start
+    print(f"  índice: {build_s:.2f} s ({len(catalog) / build_s:,.0f} filas/s), {index.nbytes / 2 ** 20:.1f} MB")
+
+    names, artists = catalog['name'].to_numpy(), catalog['artists'].to_numpy()
+    for label_set, sel in (('top10s', slice(0, n_top)), ('top10s + bulk', slice(None))):
+        part = chart.iloc[sel].reset_index(drop=True)
+        start = time.perf_counter()
+        adapted = adapt_schema(part)
+        links, pairs = index.link(adapted)
+        link_s = time.perf_counter() - start
+        found, expected, kind = links['catalog_row'].to_numpy(), truth[sel], label[sel]
+        # top10s repite canciones (mismo título y artista en dos años): cualquiera de las copias vale
+        same = (found >= 0) & (expected >= 0)
+        same[same] = (names[found[same]] == names[expected[same]]) & (artists[found[same]] == artists[expected[same]])
+        found = np.where(same, expected, found)
+        stages = links['link_stage'].to_numpy()
+
+        print(f"\n{label_set}: {len(part):,} filas en {link_s:.2f} s ({len(part) / link_s:,.0f} filas/s), "
+              f"{pairs:,} parejas comparadas de {len(part) * len(catalog):,}")
+        print(f"  {'alteración':<11}{'filas':>8}{'precisión':>11}{'exhaustiv.':>12}  etapas")
+        for k in ALTERACIONES + ['negativo']:
+            mask = kind == k
+            linked = mask & (found >= 0)
+            correct = linked & (found == expected)
+            counts = pd.Series(stages[mask]).value_counts().to_dict()
+            if k == 'negativo':
+                # Aquí cualquier enlace es un error: se mide la tasa de "sin enlace"
+                print(f"  {k:<11}{mask.sum():>8,}{'-':>11}{1 - linked.sum() / mask.sum():>12.1%}  {counts}")
+                continue
+            precision = correct.sum() / linked.sum() if linked.any() else 1.0
+            print(f"  {k:<11}{mask.sum():>8,}{precision:>11.1%}{correct.sum() / mask.sum():>12.1%}  {counts}")
+        linked = found >= 0
+        correct = linked & (found == expected)
+        decoy = pd.Series(catalog['track_id'].to_numpy()[found[linked]]).str.startswith('remix')
+        print(f"  total: precisión {correct.sum() / linked.sum():.1%}, exhaustividad "
+              f"{correct.sum() / (expected >= 0).sum():.1%}, {int(decoy.sum())} enlazadas a un señuelo (remix), "
+              f"{int((stages == SIN_ENLACE).sum()):,} sin enlace")
+
+    seconds = naive_seconds(chart, catalog, rng)
+    print(f"\nTodas las parejas (n·m = {len(chart) * len(catalog):,}): ~{seconds / 3600:,.1f} h extrapolado")
+
+
+if __name__ == '__main__':
+    main()
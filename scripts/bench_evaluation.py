@@ -0,0 +1,110 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from benchmark import DEMO, catalog_path
+from evaluation import DEFAULT_PARAMS, SPLIT_SIZES, Evaluator, holdout_split, kfold_split
+from training_data import load_training_data
+
+# --- BENCHMARK: EVALUACIÓN EN UNA PASADA VS NOTEBOOK ---
+# Lo que hace el notebook, en serie:
+#   - cross_val_score con KFold(10, shuffle=True, random_state=42)
+#   - un fit más + predict_proba para las curvas ROC (split 70/30)
+#   - barrido de 17 tamaños de test, un fit por tamaño (con parámetros fijos;
+#     el notebook además repite el GridSearchCV en cada uno: con --grid se
+#     mide uno y se extrapola x17)
+# frente a Evaluator.run con las mismas particiones: primera ejecución (caché
+# vacía) y repetición (memoizada). Se comprueba la paridad: precisión de cada
+# fold frente a cross_val_score y AUC del 70/30 frente a predict_proba.
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_evaluation.py --workers 4
+#   python scripts/bench_evaluation.py --rows 20000 --grid
+
+
+def notebook(X, y, params, n_jobs, grid):
+    from sklearn.metrics import roc_auc_score
+    from sklearn.model_selection import KFold, cross_val_score, train_test_split
+    from xgboost import XGBClassifier
+
+    def model():
+        return XGBClassifier(**params, random_state=42, n_jobs=n_jobs, eval_metric='mlogloss')
+
+    times = {}
+    start = time.perf_counter()
+    scores = cross_val_score(model(), X, y, cv=KFold(n_splits=10, shuffle=True, random_state=42), scoring='accuracy')
+    times['cross_val_score (10 folds)'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    X_tr, X_te, y_tr, y_te = train_test_split(X, y, test_size=0.30, random_state=42, stratify=y)
+    probs = model().fit(X_tr, y_tr).predict_proba(X_te)
+    auc = {i: roc_auc_score(y_te == i, probs[:, i]) for i in range(probs.shape[1])}
+    times['fit + predict_proba (ROC)'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for t in SPLIT_SIZES:
+        X_tr, X_te, y_tr, y_te = train_test_split(X, y, test_size=t, random_state=42, stratify=y)
+        model().fit(X_tr, y_tr).predict(X_te)
+    times[f'barrido de {len(SPLIT_SIZES)} splits'] = time.perf_counter() - start
+
+    if grid:
+        from tuning import grid_search_baseline
+        X_tr, _, y_tr, _ = train_test_split(X, y, test_size=SPLIT_SIZES[0], random_state=42, stratify=y)
+        _, seconds = grid_search_baseline(X_tr, y_tr)
+        times[f'GridSearchCV x{len(SPLIT_SIZES)} (extrapolado)'] = seconds * len(SPLIT_SIZES)
+    return scores, auc, times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=None, help="catálogo sintético (por defecto el demo)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--grid', action='store_true', help="mide también un GridSearchCV por split")
+    args = parser.parse_args()
+
+    X, y, clases = load_training_data(catalog_path(args.rows) if args.rows else DEMO)
+    print(f"{len(y):,} filas, {os.cpu_count()} cores, parámetros {DEFAULT_PARAMS}")
+
+    n_jobs = (args.workers or os.cpu_count() or 1) * (args.threads or 1)
+    scores, auc, times = notebook(X, y, DEFAULT_PARAMS, n_jobs, args.grid)
+    print("\nNotebook (en serie):")
+    for label, seconds in times.items():
+        print(f"  {label:<36}{seconds:8.1f} s")
+    total = sum(v for k, v in times.items() if 'GridSearchCV' not in k)
+    print(f"  {'total (sin GridSearchCV)':<36}{total:8.1f} s")
+
+    specs = [kfold_split(10), holdout_split(0.30)] + [holdout_split(t) for t in SPLIT_SIZES if t != 0.30]
+    with tempfile.TemporaryDirectory() as tmp:
+        evaluator = Evaluator(X, y, clases, n_workers=args.workers, n_threads=args.threads, cache_dir=tmp)
+        print("\nEvaluator:")
+        start = time.perf_counter()
+        runs = evaluator.run(specs)
+        cold = time.perf_counter() - start
+        m = runs[0].manifest
+        print(f"  {'primera ejecución':<36}{cold:8.1f} s  ({m['workers']} procesos x {m['threads']} hilos, "
+              f"{sum(len(r.manifest['fold_seconds']) for r in runs)} entrenamientos)")
+
+        start = time.perf_counter()
+        again = Evaluator(X, y, clases, cache_dir=tmp).run(specs)
+        runs[0].roc_curves()
+        runs[0].report()
+        warm = time.perf_counter() - start
+        print(f"  {'repetición (memoizada)':<36}{warm * 1e3:8.1f} ms  (métricas + curvas ROC + report)")
+        print(f"  speedup primera ejecución {total / cold:.1f}x, repetición {total / warm:,.0f}x")
+
+        fold_diff = np.abs(np.array(again[0].metrics['fold_accuracy']) - scores).max()
+        auc_diff = max(abs(runs[1].metrics['auc'][c] - auc[i]) for i, c in enumerate(clases))
+        print(f"\nParidad: precisión por fold vs cross_val_score, diferencia máx. {fold_diff:.2e}; "
+              f"AUC 70/30 vs predict_proba, diferencia máx. {auc_diff:.2e}")
+
+
+if __name__ == '__main__':
+    main()
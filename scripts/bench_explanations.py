@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from benchmark import catalog_path
+from catalog_cache import source_hash
+from catalog_store import load_catalog_store
+from explanations import ContributionStore, contributions
+from features import FEATURE_SCHEMA, build_matrix
+from numpy_booster import EXPORT_DIR, NumpyBooster
+
+# --- BENCHMARK: CONTRIBUCIONES POR FEATURE DEL CATÁLOGO ---
+# Con el export NumPy del modelo de la app, para catálogos sintéticos:
+#   - pasada del catálogo entero (filas/s con 1..--threads hilos) y tamaño
+#     del .npy float16 frente a float32
+#   - fidelidad: error del float16 y suma de contribuciones frente al margen
+#   - explicar una canción: lectura del memmap (caché en disco ya hecha)
+#     frente a calcular sus contribuciones en la petición; ad-hoc con el LRU
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_explanations.py --sizes 10000,100000 --threads 1,2,4
+
+
+def per_call_ms(fn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - start) / n * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--threads', default='1,2,4')
+    parser.add_argument('--lookups', type=int, default=500)
+    args = parser.parse_args()
+    model = NumpyBooster.load(EXPORT_DIR)
+    rng = np.random.default_rng(0)
+
+    for n_rows in (int(s) for s in args.sizes.split(',')):
+        csv = catalog_path(n_rows)
+        df = load_catalog_store(csv)
+        print(f"\n{n_rows:,} filas")
+        with tempfile.TemporaryDirectory() as tmp:
+            for n_threads in (int(t) for t in args.threads.split(',')):
+                store = ContributionStore(model, 'bench', n_threads=n_threads)
+                store.fill(df, dataset_hash=f'{n_threads:016d}', cache_dir=tmp)
+                print(f"  pasada del catálogo, {n_threads} hilo(s): {store.build_seconds:6.2f} s "
+                      f"({n_rows / store.build_seconds:,.0f} filas/s)")
+            store = ContributionStore(model, 'bench').fill(df, dataset_hash=source_hash(csv), cache_dir=tmp)
+            print(f"  en disco: {store.contribs.nbytes / 2 ** 20:.1f} MB float16 "
+                  f"({store.contribs.nbytes * 2 / 2 ** 20:.1f} MB en float32)")
+
+            rows = rng.choice(n_rows, args.lookups)
+            X = build_matrix(df.iloc[rows], FEATURE_SCHEMA)
+            exact = contributions(model, X)
+            stored = store.contribs[rows].astype(np.float32)
+            margin = model.predict_margin(X)
+            print(f"  float16: error máx. {np.abs(stored - exact).max():.4f}, suma vs margen "
+                  f"{np.abs(stored.sum(axis=1) - margin).max():.4f} (float32: {np.abs(exact.sum(axis=1) - margin).max():.1e})")
+
+            ids = df['track_id'].to_numpy()[rows]
+            memmap_ms = per_call_ms(lambda i: store.lookup(ids[i]), len(rows))
+            compute_ms = per_call_ms(lambda i: contributions(model, X[i:i + 1]), len(rows))
+            features = [df.iloc[r] for r in rows[:50]]
+            miss_ms = per_call_ms(lambda i: store.lookup_features(features[i]), len(features))
+            hit_ms = per_call_ms(lambda i: store.lookup_features(features[i]), len(features))
+            print(f"  por canción: memmap {memmap_ms:.3f} ms, calculada en la petición {compute_ms:.2f} ms, "
+                  f"ad-hoc {miss_ms:.2f} ms (fallo) / {hit_ms:.3f} ms (LRU)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from bench_ingest import raw_csv
+from benchmark import DATA_DIR
+from ingest import ingest, read_manifest
+
+# --- BENCHMARK: ENTRENAMIENTO FUERA DE MEMORIA (114 GÉNEROS) ---
+# CSV en bruto de bench_ingest.py (esquema de dataset.csv, 114 géneros; las
+# etiquetas son aleatorias: la precisión no dice nada, se mide memoria y
+# velocidad). Para cada tamaño, cada modo en un proceso nuevo:
+#   - notebook: read_csv entero + drop_duplicates + features + XGBClassifier
+#     sobre el DataFrame (todos los géneros)
+#   - external_training con QuantileDMatrix y con ExtMemQuantileDMatrix,
+#     leyendo los shards de ingest.py --all-genres por bloques
+#   - ExtMem con --max-rows (presupuesto de filas de train)
+# Se compara el pico de memoria (ru_maxrss), el tiempo de construir la
+# matriz y las filas/s por round. ExtMem acota las features, pero xgboost
+# guarda gradientes por fila y clase: solo con --max-rows el pico deja de
+# crecer con el tamaño del dataset.
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_external_training.py --sizes 200000,1000000 --rounds 3 --max-rows 200000
+
+PARAMS = {'max_depth': 6, 'learning_rate': 0.3, 'subsample': 1.0, 'colsample_bytree': 0.8}
+
+NOTEBOOK = r"""
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+from xgboost import XGBClassifier
+from features import FEATURE_SCHEMA, build_matrix
+df = pd.read_csv({csv!r})
+datos = df.drop_duplicates(subset='track_id').drop_duplicates(subset=['track_name', 'artists'])
+X = build_matrix(datos, FEATURE_SCHEMA)
+y = LabelEncoder().fit_transform(datos['track_genre'])
+t1 = time.perf_counter()
+XGBClassifier(n_estimators={rounds}, tree_method='hist', n_jobs=1, random_state=42, **{params!r}).fit(X, y)
+build_s, rows, per_round = t1 - t0, len(y), len(y) * {rounds} / (time.perf_counter() - t1)
+"""
+
+EXTERNAL = r"""
+from external_training import ExternalTrainer
+trainer = ExternalTrainer({shards!r}, genres=None, params={params!r}, rounds={rounds}, matrix={matrix!r},
+                          batch_rows={batch_rows}, max_rows={max_rows!r}, n_threads=1, cache_dir={cache!r})
+_, r = trainer.run(verbose=False)
+build_s, rows, per_round = r['build_seconds'], r['rows_train'] + r['rows_val'], r['rows_per_s']
+"""
+
+CHILD = r"""
+import json, resource, sys, time
+sys.path.insert(0, {app_dir!r})
+t0 = time.perf_counter()
+{code}
+print(json.dumps({{'seconds': time.perf_counter() - t0, 'build_s': build_s, 'rows': rows, 'per_round': per_round,
+                  'peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def run(code):
+    child = CHILD.format(app_dir=APP_DIR, code=code)
+    out = subprocess.run([sys.executable, '-c', child], check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def shards_for(csv, n_rows):
+    out = os.path.join(DATA_DIR, f'ingested_all_{n_rows}')
+    try:
+        if read_manifest(out)['source_path'] == os.path.abspath(csv):
+            return out
+    except (OSError, KeyError):
+        pass
+    ingest(csv, out, genres=None)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='200000,1000000')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--batch-rows', type=int, default=100_000)
+    parser.add_argument('--max-rows', type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"{'filas':>10}  {'modo':<38}{'total':>8}{'matriz':>8}{'filas/s/round':>15}{'pico RSS':>10}")
+    for n_rows in (int(s) for s in args.sizes.split(',')):
+        csv = raw_csv(n_rows)
+        shards = shards_for(csv, n_rows)
+        with tempfile.TemporaryDirectory() as cache:
+            def external(matrix, max_rows=None):
+                return EXTERNAL.format(shards=shards, params=PARAMS, rounds=args.rounds, matrix=matrix,
+                                       batch_rows=args.batch_rows, max_rows=max_rows,
+                                       cache=os.path.join(cache, f'{matrix}_{max_rows}'))
+
+            modes = {
+                'notebook (pandas en memoria)': NOTEBOOK.format(csv=csv, rounds=args.rounds, params=PARAMS),
+                'external (QuantileDMatrix)': external('quantile'),
+                'external (ExtMem)': external('extmem'),
+                f'external (ExtMem, {args.max_rows:,} filas)': external('extmem', args.max_rows),
+            }
+            for label, code in modes.items():
+                r = run(code)
+                print(f"{n_rows:>10,}  {label:<38}{r['seconds']:7.1f}s{r['build_s']:7.1f}s"
+                      f"{r['per_round']:>15,.0f}{r['peak_mb']:>8.0f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from features import FEATURE_SCHEMA, FEATURE_SCHEMA_COMPLETO, add_features, build_matrix
+
+# --- MICRO-BENCHMARK + PARIDAD DEL FEATURE ENGINEERING ---
+# Compara la versión pandas de siempre (copy + columna a columna) con
+# features.build_matrix, para una sola fila y para el catálogo completo.
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_features.py [ruta_csv] [n_filas_bulk]
+
+DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataset', 'dataset_demo_balanced.csv')
+
+
+def pandas_features(df):
+    # Copia literal del código antiguo de app.py / notebook
+    df_input = df.copy()
+    df_input['intensity'] = df_input['energy'] * df_input['loudness']
+    df_input['dance_tempo'] = df_input['danceability'] / (df_input['tempo'] + 1)
+    df_input['chill_factor'] = df_input['valence'] - df_input['energy']
+    df_input['electric_ratio'] = df_input['energy'] / (df_input['acousticness'] + 0.01)
+    return df_input
+
+
+def check_parity(df):
+    ref = pandas_features(df)
+    for schema in (FEATURE_SCHEMA, FEATURE_SCHEMA_COMPLETO):
+        X64 = build_matrix(df, schema, dtype=np.float64)
+        assert np.array_equal(X64, ref[schema].to_numpy(dtype=np.float64)), "bulk float64"
+        X32 = build_matrix(df, schema)
+        assert X32.dtype == np.float32 and X32.flags['C_CONTIGUOUS']
+        assert np.array_equal(X32, ref[schema].to_numpy(dtype=np.float32)), "bulk float32"
+
+    row = df.iloc[0]
+    assert np.array_equal(build_matrix(row), ref.iloc[[0]][FEATURE_SCHEMA].to_numpy(dtype=np.float32)), "1 fila"
+
+    nb = add_features(df)
+    assert np.array_equal(nb[FEATURE_SCHEMA_COMPLETO].to_numpy(), ref[FEATURE_SCHEMA_COMPLETO].to_numpy()), "notebook"
+    print("✅ Paridad con pandas: OK")
+
+
+def bench(label, fn, number):
+    t = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"{label:<40} {t * 1e6:>12.1f} µs")
+    return t
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DATASET
+    n_bulk = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+
+    df = pd.read_csv(path).dropna()
+    check_parity(df)
+
+    big = df.sample(n_bulk, replace=True, random_state=42).reset_index(drop=True)
+    row = df.iloc[0]
+
+    print("\n--- 1 fila ---")
+    t_old = bench("pandas (DataFrame([fila]) + copy)", lambda: pandas_features(pd.DataFrame([row]))[FEATURE_SCHEMA], 200)
+    t_new = bench("build_matrix(fila)", lambda: build_matrix(row), 2000)
+    print(f"speedup x{t_old / t_new:.1f}")
+
+    print(f"\n--- {n_bulk:,} filas ---")
+    t_old = bench("pandas (copy + columnas)", lambda: pandas_features(big)[FEATURE_SCHEMA].to_numpy(np.float32), 5)
+    t_new = bench("build_matrix(df)", lambda: build_matrix(big), 5)
+    print(f"speedup x{t_old / t_new:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from benchmark import MODEL_PATH, catalog_path
+from catalog_cache import source_hash
+from catalog_store import load_catalog_store
+from features import FEATURE_SCHEMA
+from filtered_search import FilteredIndex
+from numpy_booster import load_model
+from recommender import file_hash, load_or_build_index
+from resources import CLASES
+from result_cache import PredictionCache
+
+# --- BENCHMARK: SIMILARES CON FILTROS Y VARIAS SEMILLAS ---
+# Catálogos sintéticos de 100k y 1M filas. Para cada escenario (sin filtro,
+# un género, género + rango de popularidad, rango de tempo, explícitas, 3
+# semillas) se mide la latencia p50 de FilteredIndex.similar frente a:
+#   - la búsqueda sin filtros del índice KNN (exacta e IVF): la referencia
+#   - post-filtrar kneighbors con k = 50 (lo que hacía falta antes): cuántas
+#     consultas se quedan con menos de 4 resultados
+# y se comprueba contra fuerza bruta (todas las filas que cumplen el filtro)
+# que los resultados son exactamente los más cercanos. También se muestra
+# la fracción de bloques que el min/max deja sin recorrer.
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_filtered_search.py --sizes 100000,1000000
+
+SCENARIOS = {
+    'sin filtro': {},
+    'género Dance': {'genres': ['Dance']},
+    'Dance + popularidad 60-80': {'genres': ['Dance'], 'filters': {'popularity': (60, 80)}},
+    'popularidad >= 70': {'filters': {'popularity': (70, None)}},
+    'tempo 120-125': {'filters': {'tempo': (120, 125)}},
+    'explícitas, Hard-Rock': {'genres': ['Hard-Rock'], 'filters': {'explicit': True}},
+    '3 semillas (centroide)': {'n_seeds': 3},
+    '3 semillas (mín.), Acoustic': {'n_seeds': 3, 'fusion': 'min', 'genres': ['Acoustic']},
+}
+K = 4
+POST_K = 50
+
+
+def p50(fn, queries):
+    times = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def brute_force(X, mask, seeds, fusion, k):
+    Q = X[seeds]
+    if fusion == 'centroid':
+        d2 = ((X - Q.mean(axis=0)) ** 2).sum(axis=1)
+    else:
+        d2 = np.min([((X - q) ** 2).sum(axis=1) for q in Q], axis=0)
+    d2[~mask] = np.inf
+    d2[seeds] = np.inf
+    best = np.argsort(d2, kind='stable')[:min(k, int(np.isfinite(d2).sum()))]
+    return np.sqrt(d2[best])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--queries', type=int, default=100)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    for n_rows in (int(s) for s in args.sizes.split(',')):
+        csv = catalog_path(n_rows)
+        df = load_catalog_store(csv)
+        dataset_hash = source_hash(csv)
+        index = load_or_build_index(df, csv, FEATURE_SCHEMA, dataset_hash=dataset_hash, backend='exact')
+        resultados = PredictionCache(load_model(MODEL_PATH), file_hash(MODEL_PATH)).fill(df, dataset_hash=dataset_hash)
+
+        start = time.perf_counter()
+        filtered = FilteredIndex.build(index, resultados.labels, df, classes=CLASES)
+        build_s = time.perf_counter() - start
+        X = np.asarray(index.X_scaled)
+        values = {c: df[c].to_numpy().astype(np.float64) for c in ('popularity', 'tempo', 'explicit')}
+        n_blocks = len(filtered.block_label)
+
+        queries = rng.integers(0, n_rows, args.queries)
+        print(f"\n{n_rows:,} filas: índice filtrado construido en {build_s:.1f} s "
+              f"({filtered.X.nbytes / 2 ** 20:.0f} MB, {n_blocks:,} bloques de {filtered.manifest['block_rows']})")
+        exact = p50(lambda i: index.kneighbors(X[i:i + 1], K + 1), queries)
+        ivf_index = load_or_build_index(df, csv, FEATURE_SCHEMA, dataset_hash=dataset_hash, backend='ivf')
+        ivf = p50(lambda i: ivf_index.kneighbors(X[i:i + 1], K + 1), queries)
+        print(f"  referencia sin filtros: KNN exacto {exact * 1e3:.2f} ms, IVF {ivf * 1e3:.2f} ms (p50)")
+        print(f"  {'escenario':<30}{'filas que cumplen':>18}{'bloques':>9}{'p50':>10}{'vs exacto':>11}"
+              f"{'post-filtro k=50 < 4':>22}{'exacto':>8}")
+
+        for label, spec in SCENARIOS.items():
+            genres, filters = spec.get('genres'), spec.get('filters')
+            fusion, n_seeds = spec.get('fusion', 'centroid'), spec.get('n_seeds', 1)
+            seeds = [rng.choice(n_rows, n_seeds, replace=False) for _ in queries]
+
+            mask = np.ones(n_rows, dtype=bool)
+            if genres:
+                mask &= np.isin(resultados.labels, [CLASES.index(g) for g in genres])
+            for col, bound in (filters or {}).items():
+                lo, hi = bound if isinstance(bound, tuple) else (bound, bound)
+                mask &= (values[col] >= (-np.inf if lo is None else lo)) & (values[col] <= (np.inf if hi is None else hi))
+            keep, _, _ = filtered.select_blocks(genres, filters)
+
+            t = p50(lambda s: filtered.similar(s, K, genres=genres, filters=filters, fusion=fusion), seeds)
+
+            # Antes: kneighbors con k grande sobre la primera semilla y filtrar después
+            short = 0
+            for s in seeds[:50]:
+                _, ids = index.kneighbors(X[s[:1]], POST_K + 1)
+                short += int(mask[ids[0][1:]].sum() < K)
+
+            ok = 0
+            for s in seeds[:10]:
+                d, _ = filtered.similar(s, K, genres=genres, filters=filters, fusion=fusion)
+                ok += int(np.allclose(d, brute_force(X, mask, s, fusion, K), atol=1e-6))
+            print(f"  {label:<30}{mask.mean():>17.2%}{keep.mean():>9.1%}{t * 1e3:>8.2f}ms"
+                  f"{t / exact:>10.2f}x{short / min(50, len(seeds)):>21.0%}{ok:>6}/10")
+
+
+if __name__ == '__main__':
+    main()
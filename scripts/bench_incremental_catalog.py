@@ -0,0 +1,132 @@
+import argparse
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from ann import ExactSearch
+from benchmark import DATA_DIR, JITTER, catalog_path
+from catalog_cache import parse_csv
+from features import FEATURE_SCHEMA, build_matrix
+from incremental_catalog import IncrementalCatalog, RunningStats, drift
+from recommender import RecommendationIndex
+
+# --- BENCHMARK: CATÁLOGO INCREMENTAL vs RECONSTRUCCIÓN COMPLETA ---
+# 1) Lo de hoy: reajustar StandardScaler + índice sobre todo el catálogo.
+# 2) add() de deltas de 100 / 1.000 / 10.000 filas: el coste debe seguir al
+#    delta, no al tamaño del catálogo.
+# 3) delete() por track_id (tombstones), latencia de consulta con varios
+#    segmentos, compactación y re-estandarización por deriva.
+# 4) Comprobaciones: estadísticas de Welford = recalculadas desde cero, y
+#    vecinos = búsqueda exacta sobre las filas vivas.
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_incremental_catalog.py --rows 100000
+
+DELTAS = (100, 1_000, 10_000)
+
+
+def new_tracks(df, n, seed, shift=None):
+    # Canciones "nuevas": remuestreo con ruido y track_id propio
+    rng = np.random.default_rng(seed)
+    new = df.iloc[rng.integers(0, len(df), n)].reset_index(drop=True)
+    for col, (sigma, lo, hi) in JITTER.items():
+        if new[col].dtype.kind == 'f':
+            new[col] = np.clip(new[col].to_numpy() + rng.normal(0, sigma, n), lo, hi)
+    for col, delta in (shift or {}).items():
+        new[col] = new[col] + delta
+    new['track_id'] = [f'new{seed:04d}{i:09d}' for i in range(n)]
+    return new
+
+
+def timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - start
+
+
+def check(catalog, columns, live_frames, n_queries=200):
+    # Estadísticas y vecinos contra el cálculo desde cero sobre las filas vivas
+    X = np.concatenate([build_matrix(f, columns, dtype=np.float64) for f in live_frames])
+    stats = RunningStats(len(columns)).update(X)
+    mean_err = np.max(np.abs(stats.mean - catalog.stats.mean) / catalog.scale)
+    var_err = np.max(np.abs(stats.var - catalog.stats.var) / stats.var)
+
+    X_scaled = (X - catalog.mean) / catalog.scale
+    Q = X_scaled[np.random.default_rng(0).integers(0, len(X), n_queries)]
+    truth_d, _ = ExactSearch(X_scaled).search(Q, 5)
+    got_d, got_i = catalog.search(Q, 5)
+    # Se comparan distancias: con empates el id puede variar
+    dist_err = float(np.max(np.abs(truth_d - got_d)))
+    print(f"  comprobación: media {mean_err:.1e}  varianza {var_err:.1e}  "
+          f"distancias top-5 {dist_err:.1e}  ({len(X):,} filas vivas)")
+    assert mean_err < 1e-9 and var_err < 1e-9 and dist_err < 1e-6
+    assert (got_i >= 0).all()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    df = parse_csv(catalog_path(args.rows))
+    directory = os.path.join(DATA_DIR, 'incremental_catalog')
+
+    print(f"Catálogo base: {len(df):,} filas")
+    _, t = timed(lambda: RecommendationIndex.build(df, FEATURE_SCHEMA))
+    print(f"  hoy: reajuste completo (StandardScaler + índice)   {t * 1000:9.1f} ms")
+    catalog, t = timed(lambda: IncrementalCatalog.create(directory, df))
+    print(f"  creación del catálogo incremental               {t * 1000:9.1f} ms")
+    columns = catalog.columns
+    live = [df]
+
+    print("\nAltas (un segmento por lote, sin compactar):")
+    for seed, n in enumerate(DELTAS, start=1):
+        new = new_tracks(df, n, seed)
+        _, t = timed(lambda: catalog.add(new, compact=False))
+        live.append(new)
+        print(f"  +{n:>7,} filas   {t * 1000:8.1f} ms   {t / n * 1e6:7.1f} µs/fila")
+
+    print("\nBajas por track_id (tombstones):")
+    victims = df['track_id'].to_numpy()[:1_000]
+    ids = catalog.ids_for_tracks(victims)     # mapa track_id -> id (una vez)
+    _, t = timed(lambda: catalog.delete(ids, compact=False))
+    live[0] = df.iloc[1_000:]
+    print(f"  -{len(ids):>7,} filas   {t * 1000:8.1f} ms")
+
+    Q = catalog.transform(df.iloc[5_000:5_256])
+    for label in ('con segmentos + tombstones', 'tras compactar'):
+        if label == 'tras compactar':
+            _, t = timed(catalog.compact)
+            print(f"\nCompactación ({len(live)} segmentos -> 1): {t * 1000:.1f} ms")
+        lat = []
+        for q in Q:
+            start = time.perf_counter()
+            catalog.search(q, 5)
+            lat.append(time.perf_counter() - start)
+        print(f"  consulta {label:<28} p50 {np.percentile(lat, 50) * 1000:.2f} ms  "
+              f"({len(catalog.segments)} segmentos)")
+        check(catalog, columns, live)
+
+    print("\nDeriva del escalado (lote con tempo +40 y loudness +3):")
+    shifted = new_tracks(df, len(df) // 5, 99, shift={'tempo': 40.0, 'loudness': 3.0})
+    _, t = timed(lambda: catalog.add(shifted, compact=False))
+    live.append(shifted)
+    print(f"  +{len(shifted):>7,} filas   {t * 1000:8.1f} ms   deriva {drift(catalog.stats, catalog.mean, catalog.scale):.3f}"
+          f"   -> compactar por: {catalog.needs_compaction()}")
+    catalog.maybe_compact(background=True)
+    catalog.wait()
+    print(f"  tras re-estandarizar en segundo plano: deriva "
+          f"{drift(catalog.stats, catalog.mean, catalog.scale):.1e}")
+    check(catalog, columns, live)
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from benchmark import DATA_DIR, DEMO, JITTER
+
+# --- BENCHMARK: INGESTA EN STREAMING vs NOTEBOOK ---
+# Genera CSV "en bruto" con el esquema de dataset.csv (114 géneros, ~20% de
+# track_id repetidos como el original) de 100k / 1M / 3M filas y mide, cada
+# uno en un proceso nuevo, el pico de memoria (ru_maxrss) y el tiempo de:
+#   - notebook: read_csv entero + filtro de géneros + drop_duplicates x2
+#   - ingest.py con filtro (4 géneros) y con --all-genres --partition
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_ingest.py --sizes 100000,1000000,3000000
+
+N_GENRES = 114
+GENRES = ['acoustic', 'hard-rock', 'dance', 'classical']
+
+NOTEBOOK = r"""
+import pandas as pd
+df = pd.read_csv({csv!r})
+datos = df[df['track_genre'].isin({genres!r})]
+datos = datos.drop_duplicates(subset='track_id')
+datos = datos.drop_duplicates(subset=['track_name', 'artists'])
+rows_out = len(datos)
+"""
+
+INGEST = r"""
+from ingest import ingest
+m = ingest({csv!r}, {out!r}, genres={genres!r}, partition={partition!r})
+rows_out = m['rows_out']
+dedup_mb = m['dedup_bytes'] / 2 ** 20
+"""
+
+CHILD = r"""
+import json, resource, sys, time
+sys.path.insert(0, {app_dir!r})
+dedup_mb = None
+t0 = time.perf_counter()
+{code}
+print(json.dumps({{'seconds': time.perf_counter() - t0, 'rows_out': rows_out, 'dedup_mb': dedup_mb,
+                  'peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def raw_csv(n_rows, seed=42, chunk=200_000):
+    # Se escribe por bloques: generar 3M filas tampoco debe cargar todo en memoria
+    path = os.path.join(DATA_DIR, f'raw_{n_rows}.csv')
+    if os.path.exists(path):
+        return path
+    os.makedirs(DATA_DIR, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    demo = pd.read_csv(DEMO).rename(columns={'name': 'track_name', 'music_genre': 'track_genre'})
+    genres = GENRES + [f'genre-{i:03d}' for i in range(N_GENRES - len(GENRES))]
+    tmp = path + '.tmp'
+    for start in range(0, n_rows, chunk):
+        n = min(chunk, n_rows - start)
+        df = demo.iloc[rng.integers(0, len(demo), n)].reset_index(drop=True)
+        for col, (sigma, lo, hi) in JITTER.items():
+            if df[col].dtype.kind == 'f':
+                df[col] = np.clip(df[col].to_numpy() + rng.normal(0, sigma, n), lo, hi)
+        ids = start + np.arange(n)
+        # ~20% de filas repiten un track_id anterior (la misma canción en otro género)
+        repeat = rng.random(n) < 0.2
+        ids[repeat] = rng.integers(0, max(start + 1, 1), int(repeat.sum())) if start else ids[repeat]
+        df['track_id'] = [f'raw{i:019d}' for i in ids]
+        df['track_name'] = df['track_name'].astype(str) + ' #' + pd.Series(ids).astype(str)
+        df['track_genre'] = np.asarray(genres)[rng.integers(0, N_GENRES, n)]
+        df.insert(0, 'Unnamed: 0', start + np.arange(n))
+        df.to_csv(tmp, index=False, mode='a' if start else 'w', header=not start)
+    os.replace(tmp, path)
+    return path
+
+
+def run(code):
+    child = CHILD.format(app_dir=APP_DIR, code=code)
+    out = subprocess.run([sys.executable, '-c', child], check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='100000,1000000,3000000')
+    args = parser.parse_args()
+
+    out = os.path.join(DATA_DIR, 'ingested')
+    print(f"{'filas':>10}  {'modo':<32}{'tiempo':>9}{'filas/s':>11}{'pico RSS':>10}{'hashes':>9}{'salida':>10}")
+    for n_rows in (int(s) for s in args.sizes.split(',')):
+        csv = raw_csv(n_rows)
+        modes = {
+            'notebook (pandas en memoria)': NOTEBOOK.format(csv=csv, genres=GENRES),
+            'ingest (4 géneros)': INGEST.format(csv=csv, out=out, genres=GENRES, partition=False),
+            'ingest (todos, por género)': INGEST.format(csv=csv, out=out, genres=None, partition=True),
+        }
+        for label, code in modes.items():
+            r = run(code)
+            dedup = f"{r['dedup_mb']:6.1f}MB" if r['dedup_mb'] is not None else f"{'-':>8}"
+            print(f"{n_rows:>10,}  {label:<32}{r['seconds']:8.1f}s{n_rows / r['seconds']:>11,.0f}"
+                  f"{r['peak_mb']:>8.0f}MB{dedup:>9}{r['rows_out']:>10,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from metrics import METRICS, Metrics, parse_prometheus
+from resources import load_app_resources, load_search_index
+
+# --- BENCHMARK: COSTE DE LA INSTRUMENTACIÓN ---
+#   1) Coste por llamada de timer() / cache() con las métricas desactivadas
+#      (lo que paga la app por defecto) y activadas.
+#   2) El camino de una canción en la app (buscador -> display_name -> fila ->
+#      predicción -> recomendaciones), sin Streamlit, con métricas desactivadas
+#      y activadas: diferencia de p50 por canción.
+#   3) Con métricas activadas: tabla p50/p95/p99 por etapa, exportación a un
+#      fichero de Prometheus y lectura de vuelta (python app/metrics.py <fichero>).
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_metrics.py --songs 2000
+
+
+def per_call(fn, n=200_000):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def song_path(df, buscador, resultados, knn_index, name):
+    # Mismos pasos (y timers) que app.py al elegir una sugerencia
+    with METRICS.timer('buscador'):
+        buscador.suggest(name[:6], limit=20)
+    with METRICS.timer('display_name -> fila'):
+        cancion = df.iloc[buscador.row_of(name)]
+    with METRICS.timer('predicción'):
+        resultado = resultados.lookup(cancion['track_id'], features=cancion)
+    with METRICS.timer('recomendaciones'):
+        ids = resultado.neighbors if resultado.neighbors is not None else knn_index.recommend(cancion)
+        df.iloc[ids]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--songs', type=int, default=2000)
+    args = parser.parse_args()
+
+    print("Coste por llamada:")
+    for enabled in (False, True):
+        m = Metrics(enabled=enabled)
+
+        def timed():
+            with m.timer('etapa'):
+                pass
+
+        label = 'activadas' if enabled else 'desactivadas'
+        print(f"  {label:<13} timer() {per_call(timed):7.0f} ns   cache() {per_call(lambda: m.cache('c', True)):6.0f} ns")
+    print(f"  {'sin timer':<13} bloque vacío {per_call(lambda: None):4.0f} ns")
+
+    model, df, knn_index, resultados = load_app_resources()
+    buscador = load_search_index(df, knn_index.manifest['dataset_hash'])
+    names = df['display_name'].to_numpy()[np.random.default_rng(0).integers(0, len(df), args.songs)]
+
+    print(f"\nCamino de una canción ({args.songs} canciones del catálogo, {len(df):,} filas):")
+    # Pasadas alternas y la mejor p50 de cada modo (la máquina tiene ruido)
+    p50 = {False: np.inf, True: np.inf}
+    for enabled in (False, True) * 4:
+        METRICS.enabled = enabled
+        METRICS.reset()
+        times = []
+        for name in names:
+            start = time.perf_counter()
+            song_path(df, buscador, resultados, knn_index, name)
+            times.append(time.perf_counter() - start)
+        p50[enabled] = min(p50[enabled], float(np.median(times)))
+    print(f"  p50 desactivadas {p50[False] * 1e6:7.1f} µs, activadas {p50[True] * 1e6:7.1f} µs "
+          f"(+{(p50[True] - p50[False]) * 1e6:.1f} µs)")
+
+    print("\nLatencias por etapa (última pasada, métricas activadas):")
+    print('  ' + METRICS.table().replace('\n', '\n  '))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'app.prom')
+        METRICS.write_prometheus(path)
+        with open(path) as f:
+            stages = parse_prometheus(f.read())
+        print(f"\nPrometheus: {os.path.getsize(path):,} bytes, {len(stages)} etapas con p50/p95/p99 leídas de vuelta")
+
+
+if __name__ == '__main__':
+    main()
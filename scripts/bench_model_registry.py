@@ -0,0 +1,114 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from benchmark import DEMO, MODEL_PATH
+from model_registry import ModelRegistry
+from numpy_booster import EXPORT_DIR
+from resources import CLASES
+from server import load_service
+from training_data import load_training_data
+
+# --- BENCHMARK: REGISTRO DE MODELOS Y CAMBIO EN CALIENTE ---
+#   1) Carga del modelo: joblib (.pkl) frente a una versión del registro
+#      (export NumPy con mmap), con y sin verificar el checksum.
+#   2) Cambio en caliente con carga: --threads hilos lanzan lotes de
+#      /classify contra el servicio (mismo código que app/server.py) mientras
+#      se publica una versión nueva (v2, entrenada aquí con menos árboles) y
+#      después se hace rollback a v1. Se cuentan errores (deben ser 0), qué
+#      versión ha respondido cada lote, la latencia p50/p99 antes y durante
+#      cada cambio y el tiempo de preparación + calentamiento de cada versión.
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_model_registry.py --threads 4 --seconds 3
+
+
+def timed(fn, repeat=5):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=3.0, help="duración de cada fase")
+    args = parser.parse_args()
+
+    import joblib
+    from xgboost import XGBClassifier
+
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(os.path.join(tmp, 'models'))
+        v1 = registry.publish(EXPORT_DIR, CLASES, notes='modelo_xgboost_final.pkl')
+        X, y, _ = load_training_data(DEMO)
+        small = XGBClassifier(n_estimators=50, max_depth=4, random_state=0, n_jobs=1).fit(X, y)
+        v2 = registry.publish(small, CLASES, notes='50 árboles', activate=False)
+
+        print("Carga del modelo (mejor de 5):")
+        print(f"  joblib.load(.pkl)                 {timed(lambda: joblib.load(MODEL_PATH)) * 1e3:8.1f} ms")
+        print(f"  registro, verificando checksum    {timed(lambda: registry.load(v1)) * 1e3:8.1f} ms")
+        print(f"  registro, sin verificar           {timed(lambda: registry.load(v1, verify=False)) * 1e3:8.1f} ms")
+
+        service = load_service(registry_dir=registry.root, interval=0.05)
+        ids = [str(t) for t in service.track_ids]
+        rng = np.random.default_rng(0)
+        log, errors, stop = [], [], threading.Event()
+
+        def client():
+            while not stop.is_set():
+                batch = [{'track_id': ids[i]} for i in rng.integers(0, len(ids), args.batch)]
+                start = time.perf_counter()
+                try:
+                    results = service.classify_batch(batch)
+                    bad = [r for r in results if isinstance(r, Exception)]
+                    if bad:
+                        errors.append(bad[0])
+                    log.append((time.perf_counter(), time.perf_counter() - start, results[0]['model_version']))
+                except Exception as exc:
+                    errors.append(exc)
+
+        threads = [threading.Thread(target=client) for _ in range(args.threads)]
+        for t in threads:
+            t.start()
+        phases = []
+        for label, action in (('v1 estable', None), (f'activar {v2}', lambda: registry.activate(v2)),
+                              (f'rollback a {v1}', registry.rollback)):
+            t0 = time.perf_counter()
+            if action is not None:
+                action()
+            time.sleep(args.seconds)
+            phases.append((label, t0, time.perf_counter()))
+        stop.set()
+        for t in threads:
+            t.join()
+        service.handle.stop()
+
+        print(f"\nCambio en caliente ({args.threads} hilos, lotes de {args.batch}):")
+        for label, t0, t1 in phases:
+            lat = np.array([d for ts, d, _ in log if t0 <= ts < t1]) * 1e3
+            versions = {}
+            for ts, _, v in log:
+                if t0 <= ts < t1:
+                    versions[v] = versions.get(v, 0) + 1
+            print(f"  {label:<18} {len(lat):6d} lotes  p50 {np.percentile(lat, 50):6.2f} ms  "
+                  f"p99 {np.percentile(lat, 99):6.2f} ms  versiones {versions}")
+        for swap in service.handle.swaps:
+            print(f"  cambio {swap['from']} -> {swap['to']}: preparación + calentamiento {swap['warm_up_s'] * 1e3:.0f} ms")
+        print(f"  errores: {len(errors)}" + (f" ({errors[0]!r})" if errors else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from benchmark import DATA_DIR, catalog_path
+
+# --- BENCHMARK: GRAFO TOP-K PRECALCULADO ---
+# Para catálogos sintéticos de 100k y 1M filas, en un proceso nuevo cada uno:
+#   - construcción del grafo (top-4, espacio estandarizado del índice KNN):
+#     tiempo, filas/s y pico de RSS (ru_maxrss) frente al de tener ya abiertos
+#     catálogo + índice. En 1M el todos-contra-todos exacto es O(n²): por
+#     defecto se calculan las primeras --sample-rows consultas contra el
+#     catálogo entero y se extrapola el total (lineal en el número de
+#     consultas y dividido entre los procesos del pool)
+#   - paridad con RecommendationIndex.recommend (búsqueda exacta) en 500 filas:
+#     mismos ids, y mismas distancias cuando difieren (empates / redondeo)
+#   - latencia de una recomendación: búsqueda KNN (exacta e IVF) vs lectura
+#     de una fila del grafo
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_neighbor_graph.py --sizes 100000,1000000 --workers 4
+
+CHILD = r"""
+import json, os, resource, sys, time
+sys.path.insert(0, {app_dir!r})
+import numpy as np
+from catalog_cache import source_hash
+from catalog_store import load_catalog_store
+from features import FEATURE_SCHEMA
+from neighbor_graph import NeighborGraph
+from recommender import load_or_build_index
+
+csv = {csv!r}
+df = load_catalog_store(csv)
+index = load_or_build_index(df, csv, FEATURE_SCHEMA, dataset_hash=source_hash(csv), backend='exact')
+base_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+t0 = time.perf_counter()
+graph = NeighborGraph.build(index, {out!r}, k=4, workers={workers!r}, rows={rows!r})
+seconds = time.perf_counter() - t0
+peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Paridad con la búsqueda exacta del índice (k+1 y se descarta la propia canción)
+rng = np.random.default_rng(0)
+sample = rng.choice(len(graph), min(500, len(graph)), replace=False)
+d_ref, i_ref = index.kneighbors(index.X_scaled[sample], 5)
+same_ids = (graph.ids[sample] == i_ref[:, 1:]).all(1)
+same_dist = np.isclose(graph.dist[sample].astype(np.float64), d_ref[:, 1:], rtol=2e-3, atol=2e-3).all(1)
+
+lat = {{}}
+for label in ('KNN exacto', 'KNN IVF', 'grafo'):
+    if label == 'KNN IVF':
+        index.use_ivf()
+    times = []
+    for i in sample[:200]:
+        start = time.perf_counter()
+        if label == 'grafo':
+            graph.neighbors(int(i))
+        else:
+            index.recommend(index.X_scaled[int(i)] * index.scale + index.mean)
+        times.append(time.perf_counter() - start)
+    lat[label] = float(np.median(times))
+
+print(json.dumps({{'n': len(index), 'rows': len(graph), 'seconds': seconds, 'peak_mb': peak_mb,
+                  'base_mb': base_mb, 'graph_mb': graph.nbytes / 2 ** 20,
+                  'workers': graph.manifest['workers'], 'same_ids': float(same_ids.mean()),
+                  'same_dist': float((same_ids | same_dist).mean()), 'lat': lat}}))
+"""
+
+
+def run(csv, out, workers, rows):
+    child = CHILD.format(app_dir=APP_DIR, csv=csv, out=out, workers=workers, rows=rows)
+    result = subprocess.run([sys.executable, '-c', child], check=True, capture_output=True, text=True).stdout
+    return json.loads(result.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--sample-rows', type=int, default=20_000,
+                        help="consultas calculadas en catálogos de más de --full-max filas")
+    parser.add_argument('--full-max', type=int, default=200_000)
+    args = parser.parse_args()
+
+    out = os.path.join(DATA_DIR, 'neighbor_graph')
+    print(f"{args.workers} procesos ({os.cpu_count()} cores)")
+    for n_rows in (int(s) for s in args.sizes.split(',')):
+        csv = catalog_path(n_rows)
+        rows = None if n_rows <= args.full_max else args.sample_rows
+        r = run(csv, out, args.workers, rows)
+        total = r['seconds'] * r['n'] / r['rows']
+        scope = 'completo' if r['rows'] == r['n'] else f"{r['rows']:,} consultas, total extrapolado"
+        print(f"\n{r['n']:,} filas ({scope}):")
+        print(f"  construcción: {total:8.1f} s  ({r['n'] / total:,.0f} filas/s, {r['workers']} procesos)")
+        print(f"  pico RSS: {r['peak_mb']:.0f} MB; antes de construir (catálogo + índice): {r['base_mb']:.0f} MB "
+              f"-> el grafo añade {r['peak_mb'] - r['base_mb']:.0f} MB")
+        print(f"  grafo en disco: {r['graph_mb'] * r['n'] / r['rows']:.1f} MB (int32 ids + float16 distancias)")
+        print(f"  paridad con la búsqueda exacta: ids {r['same_ids']:.2%}, ids o distancias {r['same_dist']:.2%}")
+        print("  latencia de una recomendación (mediana): " +
+              ', '.join(f"{label} {t * 1e6:,.1f} µs" for label, t in r['lat'].items()))
+
+
+if __name__ == '__main__':
+    main()
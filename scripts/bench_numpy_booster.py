@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from features import build_matrix
+from numpy_booster import EXPORT_DIR, MODEL_PATH, NumpyBooster
+
+# --- PARIDAD Y BENCHMARK: XGBOOST vs EVALUADOR NUMPY ---
+# 1) Paridad: mismas probabilidades (tolerancia) y mismas clases que
+#    model.predict_proba, con y sin valores NaN.
+# 2) Arranque en un proceso nuevo: import + carga del modelo (tiempo y RSS).
+# 3) Latencia por fila (p50/p99) y throughput por lotes.
+#
+# Uso (desde la raíz del repo, con app/modelo_numpy ya exportado):
+#   python scripts/bench_numpy_booster.py --rows 100000
+
+DEMO = os.path.join(ROOT, 'dataset', 'dataset_demo_balanced.csv')
+TOLERANCE = 1e-5
+
+STARTUP = {
+    'xgboost (joblib.load .pkl)': "import joblib; m = joblib.load({model!r})",
+    'numpy (NumpyBooster.load)': "from numpy_booster import NumpyBooster; m = NumpyBooster.load({export!r})",
+}
+
+CHILD = r"""
+import sys, time, json, warnings
+warnings.filterwarnings('ignore')
+sys.path.insert(0, {app_dir!r})
+t0 = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - t0
+status = dict(l.split(':', 1) for l in open('/proc/self/status') if ':' in l)
+print(json.dumps({{'seconds': elapsed, 'rss_mb': int(status['VmRSS'].split()[0]) / 1024,
+                  'xgboost_loaded': 'xgboost' in sys.modules}}))
+"""
+
+
+def startup(code):
+    child = CHILD.format(app_dir=APP_DIR, code=code.format(model=MODEL_PATH, export=EXPORT_DIR))
+    out = subprocess.run([sys.executable, '-c', child], check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def check_parity(model, booster, X, label):
+    a = model.predict_proba(X)
+    b = booster.predict_proba(X)
+    max_diff = float(np.abs(a - b).max())
+    same = float((a.argmax(axis=1) == b.argmax(axis=1)).mean())
+    print(f"  {label:<28} máx |dif| {max_diff:.2e}   misma clase {same:.2%}")
+    assert max_diff < TOLERANCE, f"Probabilidades distintas ({max_diff:.2e})"
+    assert same == 1.0, "Clases distintas"
+
+
+def latency(fn, X, n=500):
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(X), n)
+    lat = np.empty(n)
+    for i, r in enumerate(rows):
+        start = time.perf_counter()
+        fn(X[r:r + 1])
+        lat[i] = time.perf_counter() - start
+    return lat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000, help="Filas del lote para el throughput")
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    import joblib
+    model = joblib.load(MODEL_PATH)
+    booster = NumpyBooster.load(EXPORT_DIR)
+
+    X = build_matrix(pd.read_csv(DEMO))
+    rng = np.random.default_rng(42)
+    big = X[rng.integers(0, len(X), args.rows)] * rng.normal(1, 0.02, (args.rows, X.shape[1])).astype(np.float32)
+    with_nan = big[:20_000].copy()
+    with_nan[rng.random(with_nan.shape) < 0.05] = np.nan
+
+    print("Paridad de probabilidades:")
+    check_parity(model, booster, X, 'dataset demo')
+    check_parity(model, booster, big, f'sintético ({args.rows:,} filas)')
+    check_parity(model, booster, with_nan, 'sintético con 5% NaN')
+
+    print("\nArranque en proceso nuevo (import + carga del modelo):")
+    for label, code in STARTUP.items():
+        r = startup(code)
+        print(f"  {label:<28} {r['seconds'] * 1000:8.0f} ms   RSS {r['rss_mb']:6.0f} MB   "
+              f"xgboost importado: {'sí' if r['xgboost_loaded'] else 'no'}")
+
+    print("\nLatencia por fila (predict_proba de 1 fila):")
+    for label, fn in (('xgboost', model.predict_proba), ('numpy', booster.predict_proba)):
+        lat = latency(fn, X)
+        print(f"  {label:<28} p50 {np.percentile(lat, 50):.3f} ms   p99 {np.percentile(lat, 99):.3f} ms")
+
+    print(f"\nThroughput por lotes ({args.rows:,} filas):")
+    for label, fn in (('xgboost', model.predict_proba), ('numpy', booster.predict_proba)):
+        best = float('inf')
+        for _ in range(3):
+            start = time.perf_counter()
+            fn(big)
+            best = min(best, time.perf_counter() - start)
+        print(f"  {label:<28} {best:7.2f} s   {args.rows / best:10,.0f} filas/s")
+
+
+if __name__ == '__main__':
+    main()
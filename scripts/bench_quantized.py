@@ -0,0 +1,107 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from ann import ExactSearch, QuantizedSearch
+from benchmark import catalog_path
+from catalog_cache import source_hash
+from catalog_store import load_catalog_store
+from features import FEATURE_SCHEMA
+from recommender import load_or_build_index
+
+# --- BENCHMARK: VECTORES INT8 + RE-RANKING VS BÚSQUEDA EXACTA ---
+# Catálogos sintéticos de 100k y 1M filas, espacio estandarizado del índice
+# KNN (columnas_modelo). Para la búsqueda exacta en float64 (la de siempre),
+# sq8 con varios factores de re-ranking e IVF se mide:
+#   - memoria recorrida por consulta (lo que se escanea) y tamaño en disco
+#   - consultas/s de una en una (camino de get_recommendations) y en lotes
+#   - coincidencia del top-4 con la búsqueda exacta (mismos ids en el mismo
+#     orden; y con empates, mismas distancias), para canciones del catálogo
+#     (se excluye la propia canción, como recommend) y para features sueltas
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_quantized.py --sizes 100000,1000000 --queries 200
+
+K = 4
+
+
+def qps(search, Q, k, batch):
+    start = time.perf_counter()
+    if batch:
+        search(Q, k)
+    else:
+        for q in Q:
+            search(q[None, :], k)
+    return len(Q) / (time.perf_counter() - start)
+
+
+def agreement(found, ref, found_d, ref_d):
+    # (mismos ids, mismos ids o mismas distancias)
+    same_ids = (found == ref).all(axis=1)
+    same_dist = np.isclose(found_d, ref_d, rtol=1e-6, atol=1e-6).all(axis=1)
+    return float(same_ids.mean()), float((same_ids | same_dist).mean())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--rerank', default='2,4,8,16')
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    for n_rows in (int(s) for s in args.sizes.split(',')):
+        csv = catalog_path(n_rows)
+        df = load_catalog_store(csv)
+        index = load_or_build_index(df, csv, FEATURE_SCHEMA, dataset_hash=source_hash(csv), backend='exact')
+        X = index.X_scaled
+        rows = rng.choice(n_rows, args.queries, replace=False)
+        # Canciones del catálogo (k+1, se descarta la propia) y features sueltas (ruido)
+        Q_cat = np.asarray(X[rows])
+        Q_adhoc = Q_cat + rng.normal(0, 0.1, Q_cat.shape)
+
+        exact = ExactSearch(X)
+        start = time.perf_counter()
+        sq8 = QuantizedSearch.build(X)
+        build_s = time.perf_counter() - start
+        with tempfile.TemporaryDirectory() as tmp:
+            sq8.save(tmp)
+            disk_mb = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)) / 2 ** 20
+        ivf = load_or_build_index(df, csv, FEATURE_SCHEMA, dataset_hash=source_hash(csv), backend='ivf').backend
+
+        ref_cat = exact.search(Q_cat, K + 1)
+        ref_adhoc = exact.search(Q_adhoc, K)
+        print(f"\n{n_rows:,} filas (sq8 construido en {build_s:.2f} s, {disk_mb:.1f} MB en disco "
+              f"con los originales float32 para el re-ranking)")
+        print(f"  {'backend':<18}{'recorre/consulta':>17}{'1 a 1 (q/s)':>13}{'lote (q/s)':>12}"
+              f"{'top-4 catálogo':>16}{'top-4 sueltas':>15}")
+
+        backends = [('exacto float64', exact, (X.nbytes + exact.sq_norms.nbytes) / 2 ** 20, {})]
+        backends += [(f'sq8 re-rank x{r}', sq8, sq8.nbytes / 2 ** 20, {'rerank': int(r)})
+                     for r in args.rerank.split(',')]
+        backends.append((f'IVF nprobe={ivf.nprobe}', ivf, (ivf.vectors.nbytes + ivf.v_norms.nbytes) / 2 ** 20
+                         * ivf.nprobe / ivf.nlist, {}))
+        for label, backend, scanned_mb, opts in backends:
+            def search(Q, k):
+                return backend.search(Q, k, **opts)
+
+            d_cat, i_cat = search(Q_cat, K + 1)
+            d_adhoc, i_adhoc = search(Q_adhoc, K)
+            # Catálogo: se comparan los 4 vecinos tras descartar la propia canción
+            cat = agreement(i_cat[:, 1:], ref_cat[1][:, 1:], d_cat[:, 1:], ref_cat[0][:, 1:])
+            adhoc = agreement(i_adhoc, ref_adhoc[1], d_adhoc, ref_adhoc[0])
+            single = qps(search, Q_cat[:50], K + 1, batch=False)
+            batch = qps(search, Q_cat, K + 1, batch=True)
+            print(f"  {label:<18}{scanned_mb:>14.1f} MB{single:>13,.0f}{batch:>12,.0f}"
+                  f"{cat[0]:>9.1%} ({cat[1]:.1%}){adhoc[0]:>8.1%} ({adhoc[1]:.1%})")
+
+
+if __name__ == '__main__':
+    main()
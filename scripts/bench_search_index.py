@@ -0,0 +1,113 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from search_index import SearchIndex, normalize
+
+# --- BENCHMARK DEL BUSCADOR (TYPEAHEAD) ---
+# Catálogo sintético a escala real (~114k canciones) generado con el
+# vocabulario de nombres y artistas del dataset demo. Compara:
+#   - selección: escaneo df['display_name'] == ...  vs  hash map
+#   - sugerencias: prefijos cortos, palabras completas + prefijo, erratas
+#     y consultas sin acentos
+#
+# Uso (desde la raíz del repo):
+#   python scripts/bench_search_index.py --rows 114000 --queries 2000
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEMO = os.path.join(ROOT, 'dataset', 'dataset_demo_balanced.csv')
+
+
+def synthetic_catalog(n_rows, seed=42):
+    rng = np.random.default_rng(seed)
+    demo = pd.read_csv(DEMO).dropna()
+    words = np.array(sorted({w for name in demo['name'] for w in str(name).split()}), dtype=object)
+    artists = demo['artists'].astype(str).unique()
+    lengths = rng.integers(1, 5, n_rows)
+    names = [' '.join(rng.choice(words, k)) for k in lengths]
+    df = pd.DataFrame({
+        'track_id': [f'synthetic{i:013d}' for i in range(n_rows)],
+        'name': names,
+        'artists': rng.choice(artists, n_rows),
+        'popularity': rng.integers(0, 100, n_rows),
+    })
+    df['display_name'] = df['name'] + " - " + df['artists']
+    return df
+
+
+def make_queries(df, n, seed=0):
+    # Mezcla de lo que teclea un usuario mientras escribe
+    rng = np.random.default_rng(seed)
+    picks = df['display_name'].to_numpy()[rng.integers(0, len(df), n)]
+    kinds = {'prefijo corto': [], 'palabras + prefijo': [], 'errata': [], 'sin acentos': []}
+    for text in picks:
+        norm = normalize(text)
+        kinds['prefijo corto'].append(norm[:rng.integers(1, 4)])
+        words = norm.split()
+        cut = rng.integers(1, len(words) + 1)
+        last = words[cut - 1]
+        kinds['palabras + prefijo'].append(' '.join(words[:cut - 1] + [last[:max(1, len(last) // 2 + 1)]]))
+        pos = rng.integers(0, len(norm))
+        kinds['errata'].append(norm[:pos] + norm[pos + 1:])
+        kinds['sin acentos'].append(norm.upper())
+    return picks, kinds
+
+
+def timed_each(fn, items):
+    lat = np.empty(len(items))
+    for i, item in enumerate(items):
+        start = time.perf_counter()
+        fn(item)
+        lat[i] = time.perf_counter() - start
+    return lat * 1000
+
+
+def report(label, lat):
+    print(f"  {label:<22} p50 {np.percentile(lat, 50):8.3f} ms | p99 {np.percentile(lat, 99):8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=114_000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    df = synthetic_catalog(args.rows)
+    df['display_name'] = df['display_name'].astype('category')
+    print(f"catálogo: {len(df):,} filas, {df['display_name'].nunique():,} display_name únicos")
+
+    start = time.perf_counter()
+    index = SearchIndex.build(df)
+    print(f"construcción del índice: {time.perf_counter() - start:.2f} s "
+          f"({len(index.tokens):,} palabras, {len(index.trigram_postings):,} trigramas)")
+
+    picks, kinds = make_queries(df, args.queries)
+
+    print("\nselección de la canción elegida:")
+    as_object = df['display_name'].astype(str)
+    report('escaneo object (antes)', timed_each(lambda name: df[as_object == name].iloc[0], picks[:200]))
+    column = df['display_name']
+    report('escaneo categórico', timed_each(lambda name: df[column == name].iloc[0], picks[:200]))
+    lookup = timed_each(lambda name: df.iloc[index.row_of(name)], picks)
+    report('hash map', lookup)
+
+    # Corrección: la fila elegida es la misma que con el escaneo
+    for name in picks[:200]:
+        assert df.iloc[index.row_of(name)]['display_name'] == name
+
+    print(f"\nsugerencias (top {args.limit}):")
+    for kind, queries in kinds.items():
+        report(kind, timed_each(lambda q: index.suggest(q, args.limit), queries))
+
+    hits = sum(name in index.suggest(q, args.limit) for name, q in zip(picks, kinds['errata']))
+    print(f"\nerratas con la canción buscada entre las sugerencias: {hits / len(picks):.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+
+# --- SUITE DE BENCHMARKS (SIN STREAMLIT) ---
+# Mide los caminos calientes de la app sobre catálogos sintéticos con el
+# esquema de dataset_demo_balanced.csv (2k, 100k y 1M filas):
+#   load.*            pasos de load_app_resources tal como los sirve la app: export
+#                     NumPy del modelo, CatalogStore, índice sobre el catálogo
+#                     incremental y predicciones (repetidos --load-repeat veces;
+#                     las construcciones parten de cero en cada repetición)
+#   features.*        build_matrix para una fila y para el catálogo entero
+#   predict.*         model.predict / predict_proba, una fila y por lotes
+#   recommend.*       get_recommendations (una canción) y vecinos por lotes
+#   lookup.cached     consulta a la caché de resultados (camino de la app)
+#
+# Cada tamaño se ejecuta en un proceso nuevo (memoria y cachés limpias). Por
+# etapa se guardan mediana / p99 / mín y el pico de RSS. El resultado es un
+# JSON; con --baseline se compara etapa a etapa y se marca como regresión
+# lo que sea más lento que baseline * (1 + tolerancia). Se guarda también el
+# backend de búsqueda de cada tamaño: si no coincide con el del baseline, los
+# tiempos no son comparables y la comparación falla.
+#
+# Uso (desde la raíz del repo):
+#   python scripts/benchmark.py --sizes 2k,100k,1m --output resultados.json
+#   python scripts/benchmark.py --sizes 2k,100k --save-baseline
+#   python scripts/benchmark.py --sizes 2k,100k        (compara con el baseline guardado)
+
+DEMO = os.path.join(ROOT, 'dataset', 'dataset_demo_balanced.csv')
+MODEL_PATH = os.path.join(APP_DIR, 'modelo_xgboost_final.pkl')
+DATA_DIR = os.path.join(ROOT, 'cache', 'bench')
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+SIZES = {'2k': 2_000, '100k': 100_000, '1m': 1_000_000}
+
+# Columnas continuas que se perturban (rango válido) para no repetir filas exactas
+JITTER = {
+    'danceability': (0.02, 0.0, 1.0), 'energy': (0.02, 0.0, 1.0), 'speechiness': (0.01, 0.0, 1.0),
+    'acousticness': (0.02, 0.0, 1.0), 'instrumentalness': (0.02, 0.0, 1.0), 'liveness': (0.02, 0.0, 1.0),
+    'valence': (0.02, 0.0, 1.0), 'loudness': (0.5, -60.0, 0.0), 'tempo': (2.0, 30.0, 250.0),
+    'duration_ms': (5000.0, 10_000.0, None),
+}
+
+
+def synthetic_catalog(n_rows, path, seed=42):
+    # Remuestreo del catálogo demo + ruido: mismas columnas, tipos y rangos
+    rng = np.random.default_rng(seed)
+    demo = pd.read_csv(DEMO)
+    df = demo.iloc[rng.integers(0, len(demo), n_rows)].reset_index(drop=True)
+    for col, (sigma, lo, hi) in JITTER.items():
+        values = df[col].to_numpy(dtype=np.float64) + rng.normal(0, sigma, n_rows)
+        values = np.clip(values, lo, hi)
+        df[col] = values.round().astype(demo[col].dtype) if demo[col].dtype.kind == 'i' else values
+    df['popularity'] = np.clip(df['popularity'] + rng.integers(-3, 4, n_rows), 0, 100)
+    df['track_id'] = [f'synthetic{i:013d}' for i in range(n_rows)]
+    df['name'] = df['name'].astype(str) + ' #' + df.index.astype(str)
+    tmp = path + '.tmp'
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def catalog_path(n_rows):
+    path = os.path.join(DATA_DIR, f'catalog_{n_rows}.csv')
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        synthetic_catalog(n_rows, path)
+    return path
+
+
+# --- medición ---
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakRSS:
+    # Muestrea el RSS en un hilo mientras dura la etapa
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __enter__(self):
+        self.start = self.peak = current_rss_mb()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_mb())
+
+
+def measure(results, name, fn, repeat=1, rows=1):
+    # fn(i) -> resultado de la última repetición
+    times = np.empty(repeat)
+    with PeakRSS() as mem:
+        for i in range(repeat):
+            start = time.perf_counter()
+            out = fn(i)
+            times[i] = time.perf_counter() - start
+    median = float(np.median(times))
+    results[name] = {
+        'rows': rows,
+        'repeat': repeat,
+        'median_ms': median * 1000,
+        'p99_ms': float(np.percentile(times, 99)) * 1000,
+        'min_ms': float(times.min()) * 1000,
+        'rows_per_s': rows / median if median > 0 else None,
+        'peak_rss_mb': mem.peak,
+        'delta_rss_mb': mem.peak - mem.start,
+    }
+    return out
+
+
+def calibration(repeat=5):
+    # Carga fija (Python + NumPy) para normalizar entre máquinas / momentos de carga:
+    # una máquina un 30% más lenta hace un 30% más lentas todas las etapas
+    a = np.random.default_rng(0).random((256, 256))
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        total = 0
+        for i in range(200_000):
+            total += i
+        for _ in range(20):
+            a = a @ a
+            a /= np.abs(a).max()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+IMPORT_SNIPPET = ("import sys, time; sys.path.insert(0, {app!r}); t = time.perf_counter(); import resources; "
+                  "print(time.perf_counter() - t)")
+
+
+def record(results, name, seconds, rows=1):
+    # Como measure(), con tiempos tomados fuera (p. ej. en procesos hijos)
+    times = np.asarray(seconds)
+    median = float(np.median(times))
+    results[name] = {
+        'rows': rows, 'repeat': len(times), 'median_ms': median * 1000,
+        'p99_ms': float(np.percentile(times, 99)) * 1000, 'min_ms': float(times.min()) * 1000,
+        'rows_per_s': rows / median if median > 0 else None, 'peak_rss_mb': current_rss_mb(), 'delta_rss_mb': 0.0,
+    }
+
+
+def run_size(n_rows, repeat, batch_repeat, load_repeat=5, query_batch=256):
+    # Se ejecuta en el proceso hijo. Mide el camino que sirve la app (resources.py):
+    # export NumPy del modelo, CatalogStore e índice sobre el catálogo incremental
+    from catalog_cache import load_catalog, parse_csv, source_hash
+    from catalog_store import CatalogStore
+    from features import FEATURE_SCHEMA, build_matrix, required_columns
+    from incremental_catalog import load_or_build_incremental_index
+    from numpy_booster import load_model
+    from result_cache import PredictionCache
+
+    csv_path = catalog_path(n_rows)
+    cal = calibration()
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, n_rows, max(repeat, query_batch))
+    r = {}
+
+    # Imports de la app: cada repetición en un intérprete nuevo (en este ya estarían cargados)
+    snippet = IMPORT_SNIPPET.format(app=APP_DIR)
+    record(r, 'load.imports', [float(subprocess.run([sys.executable, '-c', snippet], check=True, capture_output=True,
+                                                    text=True).stdout.strip().splitlines()[-1])
+                               for _ in range(load_repeat)])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def fresh(name, i):
+            # Directorio vacío por repetición: cada una mide una construcción completa
+            return os.path.join(tmp, f'{name}_{i}')
+
+        # Los pasos de load_app_resources; los "build" parten de cero en cada repetición
+        model = measure(r, 'load.model', lambda i: load_model(MODEL_PATH), repeat=load_repeat)
+        measure(r, 'load.catalog_csv', lambda i: parse_csv(csv_path), repeat=load_repeat, rows=n_rows)
+        measure(r, 'load.catalog_store_build',
+                lambda i: CatalogStore.from_frame(load_catalog(csv_path, fresh('columnar', i))).save(fresh('store', i)),
+                repeat=load_repeat, rows=n_rows)
+        df = measure(r, 'load.catalog_store_cached', lambda i: CatalogStore.load(fresh('store', 0)),
+                     repeat=load_repeat, rows=n_rows)
+        dataset_hash = source_hash(csv_path, fresh('columnar', 0))
+        measure(r, 'load.knn_index_build',
+                lambda i: load_or_build_incremental_index(df, csv_path, dataset_hash, FEATURE_SCHEMA,
+                                                          catalog_root=fresh('inc', i), cache_dir=fresh('knn', i)),
+                repeat=load_repeat, rows=n_rows)
+        knn_index = measure(r, 'load.knn_index_cached',
+                            lambda i: load_or_build_incremental_index(df, csv_path, dataset_hash, FEATURE_SCHEMA,
+                                                                      catalog_root=fresh('inc', 0),
+                                                                      cache_dir=fresh('knn', 0)),
+                            repeat=load_repeat, rows=n_rows)
+        resultados = measure(r, 'load.prediction_cache_fill',
+                             lambda i: PredictionCache(model, 'bench', knn_index).fill(df),
+                             repeat=load_repeat, rows=n_rows)
+
+        # Feature engineering
+        measure(r, 'features.single', lambda i: build_matrix(df.iloc[rows[i]]), repeat=repeat)
+        columns = {c: df[c].to_numpy() for c in required_columns(FEATURE_SCHEMA)}
+        X = measure(r, 'features.batch', lambda i: build_matrix(columns), repeat=batch_repeat, rows=n_rows)
+
+        # Modelo
+        measure(r, 'predict.single', lambda i: model.predict(X[rows[i]:rows[i] + 1]), repeat=repeat)
+        measure(r, 'predict_proba.single', lambda i: model.predict_proba(X[rows[i]:rows[i] + 1]), repeat=repeat)
+        measure(r, 'predict.batch', lambda i: model.predict(X), repeat=batch_repeat, rows=n_rows)
+        measure(r, 'predict_proba.batch', lambda i: model.predict_proba(X), repeat=batch_repeat, rows=n_rows)
+
+        # Recomendador
+        measure(r, 'recommend.single', lambda i: knn_index.recommend(df.iloc[rows[i]], 4), repeat=repeat)
+        Q = np.asarray(knn_index.X_scaled[rows[:query_batch]])
+        measure(r, 'recommend.batch', lambda i: knn_index.kneighbors(Q, 5),
+                repeat=batch_repeat, rows=query_batch)
+
+        # Camino de la app con la caché de resultados
+        track_ids = df['track_id'].to_numpy()
+        measure(r, 'lookup.cached', lambda i: resultados.lookup(track_ids[rows[i]]), repeat=repeat)
+        backend = knn_index.backend.kind
+
+    return {'rows': n_rows, 'backend': backend, 'calibration_ms': (cal + calibration()) / 2, 'stages': r,
+            'max_rss_mb': max(s['peak_rss_mb'] for s in r.values())}
+
+
+# --- orquestación ---
+def environment():
+    import sklearn
+    import xgboost
+    try:
+        commit = subprocess.run(['git', '-C', ROOT, 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'xgboost': xgboost.__version__,
+        'sklearn': sklearn.__version__,
+    }
+
+
+def backend_mismatches(current, baseline):
+    # -> [(tamaño, backend del baseline, backend actual)]: con otro backend los tiempos no son comparables
+    out = []
+    for size, res in current['sizes'].items():
+        base = baseline.get('sizes', {}).get(size)
+        if base is not None and base.get('backend') != res.get('backend'):
+            out.append((size, base.get('backend'), res.get('backend')))
+    return out
+
+
+def compare(current, baseline, tolerance, min_ms=0.05, normalize=True):
+    # -> lista de (tamaño, etapa, baseline_ms, actual_ms, ratio, regresión)
+    # Con normalize, el ratio se corrige por el de la carga de calibración
+    rows = []
+    for size, res in current['sizes'].items():
+        base = baseline.get('sizes', {}).get(size)
+        if base is None or base.get('backend') != res.get('backend'):
+            continue
+        speed = 1.0
+        if normalize and base.get('calibration_ms') and res.get('calibration_ms'):
+            speed = res['calibration_ms'] / base['calibration_ms']
+        for stage, s in res['stages'].items():
+            b = base['stages'].get(stage)
+            if b is None:
+                continue
+            ratio = s['median_ms'] / (b['median_ms'] * speed) if b['median_ms'] > 0 else float('inf')
+            # Diferencias minúsculas en valor absoluto no cuentan (ruido del reloj)
+            regression = ratio > 1 + tolerance and s['median_ms'] - b['median_ms'] > min_ms
+            rows.append((size, stage, b['median_ms'], s['median_ms'], ratio, regression))
+    return rows
+
+
+def print_results(results):
+    for size, res in results['sizes'].items():
+        print(f"\n== {int(size):,} filas (backend {res['backend']}, pico RSS {res['max_rss_mb']:.0f} MB, "
+              f"calibración {res['calibration_ms']:.1f} ms) ==")
+        print(f"{'etapa':<28}{'mediana':>12}{'p99':>12}{'filas/s':>14}{'pico RSS':>11}")
+        for stage, s in res['stages'].items():
+            rate = f"{s['rows_per_s']:,.0f}" if s['rows_per_s'] else '-'
+            print(f"{stage:<28}{s['median_ms']:>10.3f}ms{s['p99_ms']:>10.3f}ms{rate:>14}{s['peak_rss_mb']:>9.0f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de carga, features, predicción y recomendación.")
+    parser.add_argument('--sizes', default='2k,100k,1m', help=f"Tamaños separados por comas ({', '.join(SIZES)} o nº de filas)")
+    parser.add_argument('--repeat', type=int, default=200, help="Repeticiones de las llamadas de una fila")
+    parser.add_argument('--batch-repeat', type=int, default=3, help="Repeticiones de las llamadas por lotes")
+    parser.add_argument('--load-repeat', type=int, default=5, help="Repeticiones de los pasos de carga")
+    parser.add_argument('--output', default=None, help="Fichero JSON de resultados")
+    parser.add_argument('--baseline', default=BASELINE, help="JSON de referencia con el que comparar")
+    parser.add_argument('--save-baseline', action='store_true', help="Guarda estos resultados como baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Margen antes de marcar una regresión")
+    parser.add_argument('--no-normalize', action='store_true', help="Compara tiempos brutos, sin corregir por la calibración")
+    parser.add_argument('--child', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_size(args.child, args.repeat, args.batch_repeat, args.load_repeat)))
+        return
+
+    results = {'meta': environment(), 'sizes': {}}
+    for size in args.sizes.split(','):
+        n_rows = SIZES.get(size.strip().lower()) or int(size)
+        print(f"Midiendo {n_rows:,} filas...", flush=True)
+        catalog_path(n_rows)  # generación fuera de la medición
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', str(n_rows),
+                              '--repeat', str(args.repeat), '--batch-repeat', str(args.batch_repeat),
+                              '--load-repeat', str(args.load_repeat)],
+                             check=True, capture_output=True, text=True).stdout
+        results['sizes'][str(n_rows)] = json.loads(out.strip().splitlines()[-1])
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResultados: {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline guardado: {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.tolerance, normalize=not args.no_normalize)
+        mismatches = backend_mismatches(results, baseline)
+        print(f"\nComparación con {args.baseline} (commit {baseline['meta'].get('commit')}, tolerancia {args.tolerance:.0%}):")
+        for size, base_backend, backend in mismatches:
+            print(f"  {int(size):>9,} backend {base_backend} en el baseline y {backend} ahora: no comparable "
+                  f"(vuelve a guardar el baseline)  <-- BACKEND DISTINTO")
+        for size, stage, b, c, ratio, regression in rows:
+            flag = '  <-- REGRESIÓN' if regression else ''
+            print(f"  {int(size):>9,} {stage:<28}{b:>10.3f} -> {c:>10.3f} ms  x{ratio:.2f}{flag}")
+        if mismatches or any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
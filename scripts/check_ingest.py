@@ -0,0 +1,115 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from ingest import ESQUEMA, ingest, load_ingested, read_manifest
+
+# --- COMPROBACIÓN DE LA INGESTA CON UN FIXTURE LOCAL ---
+# La descarga real (kagglehub) necesita red; aquí se genera un CSV pequeño con
+# el esquema de dataset.csv (track_name / track_genre / "Unnamed: 0") y casos
+# trampa: duplicados por track_id y por nombre + artistas (también entre
+# bloques distintos), géneros fuera del filtro, tipos y rangos inválidos y
+# textos vacíos. Se ingesta con bloques de 7 filas y shards de 10 y se
+# compara con el pipeline del notebook (pandas en memoria) sobre las filas
+# válidas.
+#
+# Uso (desde la raíz del repo):
+#   python scripts/check_ingest.py
+
+DEMO = os.path.join(ROOT, 'dataset', 'dataset_demo_balanced.csv')
+GENRES = ['acoustic', 'hard-rock', 'dance', 'classical']
+
+
+def make_fixture(path):
+    demo = pd.read_csv(DEMO).groupby('music_genre').head(10).reset_index(drop=True)
+    raw = demo.rename(columns={'name': 'track_name', 'music_genre': 'track_genre'})
+    raw['track_genre'] = raw['track_genre'].str.lower()
+    raw['bad'] = False
+
+    extra = []
+
+    def add(row, bad=False, **changes):
+        row = row.copy()
+        for col, value in changes.items():
+            row[col] = value
+        row['bad'] = bad
+        extra.append(row)
+
+    r = raw.iloc
+    add(r[0], track_genre='dance')                                   # mismo track_id, otro género
+    add(r[1], track_id='nuevo-id-1')                                  # mismo nombre + artistas
+    add(r[2], track_id='pop-1', track_genre='pop')                    # fuera del filtro...
+    add(r[2], track_id='pop-1', track_name='Otra canción')            # ...y luego dentro (se queda)
+    add(r[3], bad=True, track_id='malo-1', tempo='abc')               # tipo
+    add(r[4], bad=True, track_id='malo-2', danceability=1.5)          # rango
+    add(r[5], bad=True, track_id='malo-3', track_name=np.nan)         # texto vacío
+    add(r[6], bad=True, track_id='malo-4', popularity=50.5)           # entero con decimales
+    add(r[7], bad=True, track_id='malo-5', explicit='quizás')         # booleano
+    add(r[8], bad=True, track_id=r[9]['track_id'], energy=-1)         # inválida con id repetido: no cuenta
+    add(r[10], track_id='valido-tras-malo', track_name='Único')
+
+    fixture = pd.concat([raw, pd.DataFrame(extra)], ignore_index=True)
+    # Mezcla: los duplicados quedan en bloques distintos
+    fixture = fixture.sample(frac=1, random_state=0).reset_index(drop=True)
+    fixture.insert(0, 'Unnamed: 0', np.arange(len(fixture)))
+    fixture.drop(columns='bad').to_csv(path, index=False)
+    return fixture
+
+
+def notebook_pipeline(fixture):
+    # Lo que hacía el notebook, sobre las filas válidas
+    datos = fixture[~fixture['bad']]
+    datos = datos[datos['track_genre'].isin(GENRES)]
+    datos = datos.drop_duplicates(subset='track_id')
+    datos = datos.drop_duplicates(subset=['track_name', 'artists'])
+    return datos
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(tmp, 'dataset.csv')
+        fixture = make_fixture(csv_path)
+        expected = notebook_pipeline(fixture)
+
+        for partition in (False, True):
+            out = os.path.join(tmp, 'particionado' if partition else 'ingested')
+            manifest = ingest(csv_path, out, genres=GENRES, partition=partition, chunk_rows=7, shard_rows=10)
+            got = load_ingested(out)
+
+            assert list(got.columns) == ESQUEMA
+            assert manifest['rows_in'] == len(fixture)
+            assert sum(manifest['rejected'].values()) == int(fixture['bad'].sum()), manifest['rejected']
+            assert manifest['rows_out'] == len(expected) == len(got)
+            assert sum(s['rows'] for s in read_manifest(out)['shards']) == len(got)
+            assert all(s['rows'] <= 10 for s in manifest['shards'])
+            if partition:
+                assert all(s['partition'] in GENRES for s in manifest['shards'])
+                got = got.set_index('track_id').loc[expected['track_id']].reset_index()
+            # Mismas filas, mismo orden (primera aparición) y mismos valores
+            assert got['track_id'].tolist() == expected['track_id'].tolist()
+            assert got['name'].tolist() == expected['track_name'].tolist()
+            for col in ('popularity', 'duration_ms', 'key', 'mode', 'time_signature'):
+                assert (got[col].to_numpy() == expected[col].astype(np.int64).to_numpy()).all(), col
+            for col in ('danceability', 'energy', 'loudness', 'tempo', 'valence'):
+                assert np.allclose(got[col].to_numpy(), expected[col].astype(float).to_numpy()), col
+            assert (got['explicit'].to_numpy() == expected['explicit'].astype(str).str.lower().eq('true')).all()
+
+            label = 'particionado por género' if partition else 'filtrado'
+            print(f"OK {label:<24} {manifest['rows_in']} filas -> {manifest['rows_out']} en "
+                  f"{len(manifest['shards'])} shards | inválidas {manifest['rejected']} | "
+                  f"otro género {manifest['other_genre']} | duplicadas {manifest['dup_track_id']} + "
+                  f"{manifest['dup_name_artists']}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
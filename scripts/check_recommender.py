@@ -0,0 +1,115 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+from catalog_cache import parse_csv, source_hash
+from catalog_store import load_catalog_store
+from features import FEATURE_SCHEMA
+from incremental_catalog import load_or_build_incremental_index
+from neighbor_graph import load_neighbor_graph
+from recommender import RecommendationIndex
+from resources import DATASET_PATH, load_index
+
+# --- COMPROBACIÓN DEL RECOMENDADOR FRENTE A SKLEARN ---
+# El get_recommendations original: StandardScaler ajustado sobre el catálogo
+# entero + NearestNeighbors euclídeo con k+1 vecinos, descartando el primero.
+# Para cada canción del catálogo se compara con:
+#   - RecommendationIndex.build (índice exacto, sin cachés)
+#   - el índice del catálogo incremental recién creado (carpetas temporales)
+#   - el índice que sirve la app (resources.load_index, con sus cachés)
+#   - el grafo de vecinos precalculado, si hay uno válido para ese índice
+# Las recomendaciones deben coincidir salvo empates: mismas distancias (a
+# TOL) en el espacio escalado de sklearn aunque cambie qué fila empatada sale.
+# Termina con error (AssertionError) ante cualquier diferencia.
+#
+# Uso (desde la raíz del repo):
+#   python scripts/check_recommender.py [--dataset dataset/dataset_demo_balanced.csv]
+
+N_RECOMMENDATIONS = 4
+TOL = 1e-6
+# dist.npy del grafo es float16 (3 cifras significativas)
+GRAPH_RTOL = 2e-3
+
+
+def sklearn_recommendations(df, n_recommendations):
+    # Lo que hacía app.py: columnas del modelo como DataFrame, fit_transform y kneighbors
+    from sklearn.neighbors import NearestNeighbors
+    from sklearn.preprocessing import StandardScaler
+
+    df_features = df.copy()
+    df_features['intensity'] = df_features['energy'] * df_features['loudness']
+    df_features['dance_tempo'] = df_features['danceability'] / (df_features['tempo'] + 1)
+    df_features['chill_factor'] = df_features['valence'] - df_features['energy']
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(df_features[FEATURE_SCHEMA])
+    knn = NearestNeighbors(n_neighbors=n_recommendations + 1, algorithm='auto', metric='euclidean')
+    knn.fit(X_scaled)
+    distances, indices = knn.kneighbors(X_scaled)
+    return X_scaled, distances[:, 1:], indices[:, 1:]
+
+
+def compare(label, X_scaled, expected_dist, expected_ids, recommend):
+    # recommend(fila) -> filas recomendadas. Diferencias que no son empates
+    same, mismatches = 0, []
+    for row in range(len(expected_ids)):
+        got = np.asarray(recommend(row))
+        if np.array_equal(got, expected_ids[row]):
+            same += 1
+            continue
+        got_dist = np.sort(np.linalg.norm(X_scaled[got] - X_scaled[row], axis=1)) if len(got) else got
+        if len(got) != len(expected_ids[row]) or not np.allclose(got_dist, expected_dist[row], rtol=0, atol=TOL):
+            mismatches.append(row)
+    assert not mismatches, (f"{label}: {len(mismatches)} canciones con recomendaciones distintas "
+                            f"(no empates), p. ej. filas {mismatches[:5]}")
+    print(f"OK {label:<36} {same:,} idénticas, {len(expected_ids) - same:,} difieren solo en empates")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    args = parser.parse_args()
+
+    df = parse_csv(args.dataset)
+    X_scaled, expected_dist, expected_ids = sklearn_recommendations(df, N_RECOMMENDATIONS)
+    dataset_hash = source_hash(args.dataset)
+
+    exact = RecommendationIndex.build(df, FEATURE_SCHEMA, dataset_hash=dataset_hash)
+    assert np.abs(exact.X_scaled - X_scaled).max() <= TOL, "índice exacto: escalado distinto del de sklearn"
+    compare('índice exacto', X_scaled, expected_dist, expected_ids,
+            lambda r: exact.recommend(df.iloc[r], N_RECOMMENDATIONS))
+
+    tmp = tempfile.mkdtemp()
+    try:
+        incremental = load_or_build_incremental_index(df, args.dataset, dataset_hash,
+                                                      catalog_root=tmp, cache_dir=tmp)
+        assert np.abs(incremental.X_scaled - X_scaled).max() <= TOL, "catálogo incremental: escalado distinto"
+        compare('catálogo incremental (nuevo)', X_scaled, expected_dist, expected_ids,
+                lambda r: incremental.recommend(df.iloc[r], N_RECOMMENDATIONS))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # Lo que sirve la app: catálogo columnar + índice con sus cachés en disco
+    store = load_catalog_store(args.dataset)
+    served = load_index(store, args.dataset, dataset_hash)
+    assert len(served) == len(df), f"índice de la app: {len(served)} filas, el CSV tiene {len(df)}"
+    compare(f'índice de la app ({served.backend.kind})', X_scaled, expected_dist, expected_ids,
+            lambda r: served.recommend(store.iloc[r], N_RECOMMENDATIONS))
+
+    graph = load_neighbor_graph(served, N_RECOMMENDATIONS)
+    if graph is None:
+        print("-- sin grafo de vecinos válido para este índice (python app/resources.py lo construye)")
+    else:
+        got_dist = np.sort(graph.dist.astype(np.float64), axis=1)
+        assert np.allclose(got_dist, expected_dist, rtol=GRAPH_RTOL, atol=TOL), "grafo: distancias distintas"
+        compare('grafo de vecinos', X_scaled, expected_dist, expected_ids, graph.neighbors)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# --- PRUEBA DE CARGA DEL SERVIDOR DE INFERENCIA ---
+# Abre N conexiones keep-alive concurrentes contra app/server.py, lanza
+# peticiones /classify y /similar con track_ids reales del catálogo y mide
+# throughput y latencias p50/p99.
+#
+# Uso (desde la raíz del repo):
+#   python scripts/load_test.py --spawn --concurrency 64 --requests 5000
+#   python scripts/load_test.py --port 8000 --endpoint similar
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DATASET = os.path.join(ROOT, 'dataset', 'dataset_demo_balanced.csv')
+
+
+async def request(reader, writer, path, payload):
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':')[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, jobs, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while jobs:
+            path, payload = jobs.pop()
+            start = time.perf_counter()
+            status = await request(reader, writer, path, payload)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def wait_ready(host, port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.5)
+    raise RuntimeError("El servidor no arrancó a tiempo")
+
+
+async def run(args):
+    track_ids = pd.read_csv(DATASET, usecols=['track_id'])['track_id'].tolist()
+    rng = random.Random(42)
+    endpoints = ['/classify', '/similar'] if args.endpoint == 'mixed' else ['/' + args.endpoint]
+    jobs = [(rng.choice(endpoints), {'track_id': rng.choice(track_ids), 'k': 4}) for _ in range(args.requests)]
+
+    await wait_ready(args.host, args.port)
+    latencies, statuses = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(args.host, args.port, jobs, latencies, statuses)
+                           for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000
+    print(f"peticiones: {len(lat):,}  concurrencia: {args.concurrency}  endpoint: {args.endpoint}")
+    print(f"throughput: {len(lat) / elapsed:,.0f} req/s")
+    print(f"latencia:   p50 {np.percentile(lat, 50):.1f} ms | p99 {np.percentile(lat, 99):.1f} ms | máx {lat.max():.1f} ms")
+    print(f"códigos:    {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--endpoint', choices=['classify', 'similar', 'mixed'], default='mixed')
+    parser.add_argument('--spawn', action='store_true', help="Arranca un servidor local para la prueba")
+    parser.add_argument('--server-args', default='', help="Argumentos extra para app/server.py")
+    args = parser.parse_args()
+
+    proc = None
+    if args.spawn:
+        cmd = [sys.executable, os.path.join(ROOT, 'app', 'server.py'), '--host', args.host,
+               '--port', str(args.port)] + args.server_args.split()
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        asyncio.run(run(args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()